@@ -10,7 +10,25 @@ vertexai.init(
 )
 
 from google.adk.agents import LlmAgent
+from google.adk.apps import App
 from google.adk.tools.bigquery import BigQueryToolset
+from shared_libraries.bq_batch_query import execute_sql_batch
+from shared_libraries.instrumentation import instrumentation_plugins
+from shared_libraries.loop_budget import (
+    budget_after_model,
+    budget_after_tool,
+    budget_before_model,
+    budget_before_tool,
+)
+from shared_libraries.model_router import route_after_model, route_before_model
+from shared_libraries.rate_limiter import schedule_models
+from shared_libraries.replay import replay_agent
+from shared_libraries.sql_template_cache import (
+    template_after_agent,
+    template_after_tool,
+    template_before_model,
+)
+from shared_libraries.tabular_encoding import compact_tool_result
 
 bq_tools=BigQueryToolset()
 
@@ -58,9 +76,22 @@ bq_analyst = LlmAgent(
     6. Be mindful of data privacy and security best practices
     
     If you need to query data, use the BigQuery tool to execute SQL queries.
+    When an answer needs several independent queries (for example row count, date range,
+    distinct symbols and price statistics for a dataset summary), send them together in a
+    single execute_sql_batch call instead of one execute_sql call per query.
     Always explain your findings in a clear, business-friendly manner with actionable insights.
     """,
     description="A BigQuery data analyst specialized in financial market data analysis with access to historical stock market dataset.",
-    tools=[bq_tools]
+    tools=[bq_tools, execute_sql_batch],
+    # Runs past their tool/turn/time/token budget end with a partial answer.
+    # Repeated question shapes reuse learned SQL instead of a model turn.
+    before_model_callback=[budget_before_model, template_before_model, route_before_model],
+    after_model_callback=[route_after_model, budget_after_model],
+    before_tool_callback=budget_before_tool,
+    # Results reach the model as compact CSV (after the template cache and budget saw them).
+    after_tool_callback=[budget_after_tool, template_after_tool, compact_tool_result],
+    after_agent_callback=template_after_agent,
 )
-root_agent = bq_analyst
+root_agent = replay_agent(schedule_models(bq_analyst))
+# `adk web` / `adk run` serve the App; ADK_INSTRUMENTATION=1 adds the timing plugin.
+app = App(name="bq_data_analyst_agent", root_agent=root_agent, plugins=instrumentation_plugins())
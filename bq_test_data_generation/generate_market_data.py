@@ -7,43 +7,90 @@ This script creates 10,000 rows of realistic stock market data including:
 - Date ranges (last 2 years)
 - OHLCV data (Open, High, Low, Close, Volume)
 - Additional metrics (market cap, P/E ratio, etc.)
+
+With --calendar trading, every symbol gets the same NYSE trading days (see
+trading_calendar.py) instead of evenly spaced timestamps, and rows are laid
+out symbol by symbol, so columns reshape directly into dense
+(symbol x trading-day) arrays.
+
+With --symbols N it generates a synthetic universe of N symbols with
+correlated returns (see universe.py) and streams it to CSV, for wide tables
+that stress-test the analyst's queries.
+
+Every run validates and profiles the rows (see validation.py) before
+anything is written or uploaded.
+
+With --incremental it instead continues each symbol's random walk from its
+last stored close, generates only the missing trading days and appends them
+to the CSV and the table (or MERGEs them on date and symbol with
+--write merge), so a daily refresh costs only the new rows.
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
-from google.cloud import bigquery
 import os
 
-import vertexai
-vertexai.init(
-    project=os.getenv("GOOGLE_PROJECT_ID"),
-    location=os.getenv("GOOGLE_CLOUD_LOCATION"),
-    staging_bucket=os.getenv("GOOGLE_CLOUD_STORAGE_BUCKET")
-)
+from trading_calendar import trading_days
+
+# Stock symbols to use
+SYMBOLS = [
+    'AAPL', 'GOOGL', 'MSFT', 'TSLA', 'AMZN', 'META', 'NVDA', 'NFLX',
+    'AMD', 'INTC', 'CRM', 'ORCL', 'ADBE', 'PYPL', 'UBER', 'LYFT',
+    'ZOOM', 'SHOP', 'SQ', 'ROKU', 'TWTR', 'SNAP', 'PINS', 'SPOT',
+    'ZM', 'DOCU', 'OKTA', 'SNOW', 'PLTR', 'COIN'
+]
+
+# Base prices for each symbol (realistic starting points)
+BASE_PRICES = {
+    'AAPL': 150, 'GOOGL': 2500, 'MSFT': 300, 'TSLA': 800, 'AMZN': 3200,
+    'META': 200, 'NVDA': 400, 'NFLX': 400, 'AMD': 100, 'INTC': 50,
+    'CRM': 200, 'ORCL': 80, 'ADBE': 500, 'PYPL': 100, 'UBER': 40,
+    'LYFT': 30, 'ZOOM': 100, 'SHOP': 1000, 'SQ': 80, 'ROKU': 60,
+    'TWTR': 40, 'SNAP': 20, 'PINS': 25, 'SPOT': 150, 'ZM': 100,
+    'DOCU': 80, 'OKTA': 100, 'SNOW': 200, 'PLTR': 15, 'COIN': 150
+}
+
+# Volume (realistic trading volume); 1,000,000 for unlisted symbols
+BASE_VOLUMES = {
+    'AAPL': 50000000, 'GOOGL': 1500000, 'MSFT': 30000000, 'TSLA': 25000000,
+    'AMZN': 3000000, 'META': 20000000, 'NVDA': 15000000, 'NFLX': 5000000
+}
+
+# Market sector; 'Technology' for unlisted symbols
+SECTORS = {
+    'AAPL': 'Technology', 'GOOGL': 'Technology', 'MSFT': 'Technology',
+    'TSLA': 'Automotive', 'AMZN': 'E-commerce', 'META': 'Technology',
+    'NVDA': 'Technology', 'NFLX': 'Entertainment', 'AMD': 'Technology',
+    'INTC': 'Technology', 'CRM': 'Technology', 'ORCL': 'Technology'
+}
+
+# daily_prices table schema: (name, BigQuery type, mode)
+SCHEMA_FIELDS = [
+    ("date", "DATE", "REQUIRED"),
+    ("symbol", "STRING", "REQUIRED"),
+    ("open_price", "FLOAT", "REQUIRED"),
+    ("high_price", "FLOAT", "REQUIRED"),
+    ("low_price", "FLOAT", "REQUIRED"),
+    ("close_price", "FLOAT", "REQUIRED"),
+    ("volume", "INTEGER", "REQUIRED"),
+    ("market_cap", "FLOAT", "NULLABLE"),
+    ("pe_ratio", "FLOAT", "NULLABLE"),
+    ("dividend_yield", "FLOAT", "NULLABLE"),
+    ("sector", "STRING", "NULLABLE"),
+    ("created_at", "TIMESTAMP", "REQUIRED"),
+]
+
+COLUMNS = [name for name, _, _ in SCHEMA_FIELDS]
 
 def generate_stock_data(num_rows=10000):
     """
     Generate realistic stock market data.
     """
-    # Stock symbols to use
-    symbols = [
-        'AAPL', 'GOOGL', 'MSFT', 'TSLA', 'AMZN', 'META', 'NVDA', 'NFLX',
-        'AMD', 'INTC', 'CRM', 'ORCL', 'ADBE', 'PYPL', 'UBER', 'LYFT',
-        'ZOOM', 'SHOP', 'SQ', 'ROKU', 'TWTR', 'SNAP', 'PINS', 'SPOT',
-        'ZM', 'DOCU', 'OKTA', 'SNOW', 'PLTR', 'COIN'
-    ]
-    
-    # Base prices for each symbol (realistic starting points)
-    base_prices = {
-        'AAPL': 150, 'GOOGL': 2500, 'MSFT': 300, 'TSLA': 800, 'AMZN': 3200,
-        'META': 200, 'NVDA': 400, 'NFLX': 400, 'AMD': 100, 'INTC': 50,
-        'CRM': 200, 'ORCL': 80, 'ADBE': 500, 'PYPL': 100, 'UBER': 40,
-        'LYFT': 30, 'ZOOM': 100, 'SHOP': 1000, 'SQ': 80, 'ROKU': 60,
-        'TWTR': 40, 'SNAP': 20, 'PINS': 25, 'SPOT': 150, 'ZM': 100,
-        'DOCU': 80, 'OKTA': 100, 'SNOW': 200, 'PLTR': 15, 'COIN': 150
-    }
+    symbols = SYMBOLS
+    base_prices = BASE_PRICES
     
     # Generate date range (last 2 years)
     end_date = datetime.now()
@@ -85,10 +132,7 @@ def generate_stock_data(num_rows=10000):
             low_price = round(min(open_price, close_price) * (1 - daily_range), 2)
             
             # Volume (realistic trading volume)
-            base_volume = {
-                'AAPL': 50000000, 'GOOGL': 1500000, 'MSFT': 30000000, 'TSLA': 25000000,
-                'AMZN': 3000000, 'META': 20000000, 'NVDA': 15000000, 'NFLX': 5000000
-            }.get(symbol, 1000000)
+            base_volume = BASE_VOLUMES.get(symbol, 1000000)
             
             volume = int(base_volume * (1 + np.random.normal(0, 0.3)))
             volume = max(volume, 100000)  # Minimum volume
@@ -99,13 +143,7 @@ def generate_stock_data(num_rows=10000):
             dividend_yield = round(random.uniform(0, 0.05), 4) if random.random() > 0.3 else 0
             
             # Market sector
-            sectors = {
-                'AAPL': 'Technology', 'GOOGL': 'Technology', 'MSFT': 'Technology',
-                'TSLA': 'Automotive', 'AMZN': 'E-commerce', 'META': 'Technology',
-                'NVDA': 'Technology', 'NFLX': 'Entertainment', 'AMD': 'Technology',
-                'INTC': 'Technology', 'CRM': 'Technology', 'ORCL': 'Technology'
-            }
-            sector = sectors.get(symbol, 'Technology')
+            sector = SECTORS.get(symbol, 'Technology')
             
             data.append({
                 'date': date.strftime('%Y-%m-%d'),
@@ -128,6 +166,8 @@ def create_bigquery_dataset_and_table(project_id, dataset_id='hist_stock_market'
     """
     Create BigQuery dataset and table if they don't exist.
     """
+    from google.cloud import bigquery
+
     client = bigquery.Client(project=project_id)
     
     # Create dataset
@@ -144,18 +184,8 @@ def create_bigquery_dataset_and_table(project_id, dataset_id='hist_stock_market'
     
     # Define table schema
     schema = [
-        bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
-        bigquery.SchemaField("symbol", "STRING", mode="REQUIRED"),
-        bigquery.SchemaField("open_price", "FLOAT", mode="REQUIRED"),
-        bigquery.SchemaField("high_price", "FLOAT", mode="REQUIRED"),
-        bigquery.SchemaField("low_price", "FLOAT", mode="REQUIRED"),
-        bigquery.SchemaField("close_price", "FLOAT", mode="REQUIRED"),
-        bigquery.SchemaField("volume", "INTEGER", mode="REQUIRED"),
-        bigquery.SchemaField("market_cap", "FLOAT", mode="NULLABLE"),
-        bigquery.SchemaField("pe_ratio", "FLOAT", mode="NULLABLE"),
-        bigquery.SchemaField("dividend_yield", "FLOAT", mode="NULLABLE"),
-        bigquery.SchemaField("sector", "STRING", mode="NULLABLE"),
-        bigquery.SchemaField("created_at", "TIMESTAMP", mode="REQUIRED"),
+        bigquery.SchemaField(name, field_type, mode=mode)
+        for name, field_type, mode in SCHEMA_FIELDS
     ]
     
     # Create table
@@ -171,15 +201,214 @@ def create_bigquery_dataset_and_table(project_id, dataset_id='hist_stock_market'
     
     return f"{project_id}.{dataset_id}.{table_id}"
 
-def upload_to_bigquery(df, table_id, project_id):
+def _normal(rng, scale, shape, loc=0.0):
+    values = rng.standard_normal(shape)
+    values *= scale
+    values += loc
+    return values
+
+def random_walk_arrays(last_close, days, rng, base_volume, daily_return=None):
+    """
+    Continue one random walk per symbol for ``days`` days, as (symbols, days) arrays.
+
+    Uses the same distributions as ``generate_stock_data``, drawn in one batch.
+    ``daily_return`` replaces the independent daily returns (see universe.py);
+    it is overwritten. Arithmetic is done in place, so wide universes only
+    need one buffer per output column.
+    """
+    last_close = np.asarray(last_close, dtype=float)[:, None]
+    shape = (last_close.shape[0], days)
+    if daily_return is None:
+        daily_return = _normal(rng, 0.02, shape, loc=0.001)
+    daily_return += 1
+    close_price = np.cumprod(daily_return, axis=1, out=daily_return)
+    close_price *= last_close
+    np.maximum(close_price, 1.0, out=close_price)
+    close_price.round(2, out=close_price)
+
+    # Open price: the close with a small gap
+    open_price = _normal(rng, 0.005, shape, loc=1.0)
+    open_price *= close_price
+    open_price.round(2, out=open_price)
+
+    # High and low prices: a daily range around the open/close body
+    daily_range = np.abs(_normal(rng, 0.015, shape))
+    high_price = np.maximum(open_price, close_price)
+    high_price *= 1 + daily_range
+    high_price.round(2, out=high_price)
+    low_price = np.minimum(open_price, close_price)
+    np.subtract(1, daily_range, out=daily_range)
+    low_price *= daily_range
+    low_price.round(2, out=low_price)
+    del daily_range
+
+    volume = _normal(rng, 0.3, shape, loc=1.0)
+    volume *= np.asarray(base_volume, dtype=float)[:, None]
+    volume = np.maximum(volume.astype(np.int64), 100000)
+
+    market_cap = rng.integers(1000000000, 50000000000, shape, endpoint=True).astype(float)
+    pe_ratio = rng.uniform(10, 50, shape).round(2)
+    pe_ratio[rng.random(shape) <= 0.1] = np.nan
+    dividend_yield = rng.uniform(0, 0.05, shape).round(4)
+    dividend_yield[rng.random(shape) <= 0.3] = 0.0
+    return {
+        'open_price': open_price,
+        'high_price': high_price,
+        'low_price': low_price,
+        'close_price': close_price,
+        'volume': volume,
+        'market_cap': market_cap,
+        'pe_ratio': pe_ratio,
+        'dividend_yield': dividend_yield,
+    }
+
+def panel_frame(symbols, dates, arrays, sectors):
+    """
+    Flatten (symbols, dates) arrays into rows ordered by symbol, then date.
+    """
+    symbols = np.asarray(symbols)
+    days = len(dates)
+    return pd.DataFrame({
+        'date': np.tile(pd.DatetimeIndex(dates).strftime('%Y-%m-%d'), len(symbols)),
+        'symbol': np.repeat(symbols, days),
+        **{column: values.reshape(-1) for column, values in arrays.items()},
+        'sector': np.repeat(np.asarray(sectors), days),
+        'created_at': datetime.now().isoformat(),
+    })[COLUMNS]
+
+def generate_trading_day_data(num_rows=10000, end_date=None, symbols=None, seed=None):
+    """
+    Generate stock market data on NYSE trading days, aligned across symbols.
+
+    Every symbol gets the same ``num_rows // len(symbols)`` trading days ending
+    at ``end_date`` (default: today), and rows are ordered by symbol, then
+    date. Row ``i * days + j`` is therefore symbol ``i`` on trading day ``j``,
+    and ``dense_arrays`` can reshape columns to (symbols, days) directly.
+    """
+    symbols = list(symbols or SYMBOLS)
+    rng = np.random.default_rng(seed)
+    dates = trading_days(end=end_date or datetime.now(), periods=num_rows // len(symbols))
+    arrays = random_walk_arrays(
+        [BASE_PRICES.get(symbol, 100) for symbol in symbols],
+        len(dates),
+        rng,
+        [BASE_VOLUMES.get(symbol, 1000000) for symbol in symbols],
+    )
+    return panel_frame(
+        symbols, dates, arrays, [SECTORS.get(symbol, 'Technology') for symbol in symbols]
+    )
+
+def dense_arrays(df, columns=('open_price', 'high_price', 'low_price', 'close_price', 'volume')):
+    """
+    View a symbol-major, date-aligned frame as (symbols, days) arrays.
+
+    Returns:
+        ``(symbols, dates, {column: array})``; the arrays are reshaped views of
+        the frame's columns, with no sorting or resampling.
+
+    Raises:
+        ValueError: If the rows are not one block of the same dates per symbol.
+    """
+    symbol = df['symbol'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, symbol[1:] != symbol[:-1]])
+    days = len(df) // max(len(starts), 1)
+    date = df['date'].to_numpy()
+    if (len(starts) * days != len(df) or (np.diff(starts) != days).any()
+            or (date.reshape(len(starts), days) != date[:days]).any()):
+        raise ValueError("Rows are not a dense symbol x trading-day layout")
+    return (
+        symbol[starts],
+        pd.DatetimeIndex(date[:days]),
+        {column: df[column].to_numpy().reshape(len(starts), days) for column in columns},
+    )
+
+def generate_incremental_data(last_rows, end_date=None, seed=None):
+    """
+    Generate only the trading days missing after each symbol's last stored row.
+
+    Symbols stored up to the same day are continued together, so a universe
+    refreshed in step generates the new days for every symbol in one batch.
+
+    Args:
+        last_rows: One row per symbol with ``symbol``, ``date``, ``close_price``
+            and optionally ``sector`` (see ``last_rows_from_csv`` and
+            ``last_rows_from_bigquery``).
+        end_date: Last day to generate (default: today).
+        seed: Seed for reproducible data.
+
+    Returns:
+        New rows in the ``daily_prices`` column order; empty when up to date.
+    """
+    rng = np.random.default_rng(seed)
+    end = end_date or datetime.now()
+    if 'sector' not in last_rows:
+        last_rows = last_rows.assign(sector=None)
+    frames = []
+    for last_date, group in last_rows.groupby(pd.to_datetime(last_rows['date'])):
+        dates = trading_days(last_date + pd.Timedelta(days=1), end)
+        if not len(dates):
+            continue
+        symbols = group['symbol'].tolist()
+        arrays = random_walk_arrays(
+            group['close_price'].to_numpy(dtype=float),
+            len(dates),
+            rng,
+            [BASE_VOLUMES.get(symbol, 1000000) for symbol in symbols],
+        )
+        sectors = [
+            sector if isinstance(sector, str) else SECTORS.get(symbol, 'Technology')
+            for symbol, sector in zip(symbols, group['sector'])
+        ]
+        frames.append(panel_frame(symbols, dates, arrays, sectors))
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def last_rows_from_csv(csv_filename):
+    """
+    Last stored row of every symbol in a CSV written by this script.
+    """
+    df = pd.read_csv(csv_filename, usecols=['date', 'symbol', 'close_price', 'sector'])
+    return df.sort_values(['symbol', 'date']).groupby('symbol', as_index=False).last()
+
+def last_rows_from_bigquery(table_id, project_id):
+    """
+    Last stored row of every symbol in the BigQuery table.
+    """
+    from google.cloud import bigquery
+
+    client = bigquery.Client(project=project_id)
+    query = f"""
+        SELECT symbol, date, close_price, sector
+        FROM `{table_id}`
+        WHERE TRUE
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY date DESC) = 1
+    """
+    return client.query(query).to_dataframe()
+
+def append_to_csv(df, csv_filename):
+    """
+    Append new rows to an existing CSV without rewriting it.
+
+    Appending changes the file's size and modification time, which is what
+    the financial advisor's price store watches to rebuild its Arrow cache.
+    """
+    df[COLUMNS].to_csv(csv_filename, mode='a', header=False, index=False)
+
+def upload_to_bigquery(df, table_id, project_id, write_disposition="WRITE_TRUNCATE"):
     """
     Upload DataFrame to BigQuery.
+
+    ``WRITE_TRUNCATE`` (the default) overwrites existing data; incremental
+    runs pass ``WRITE_APPEND``.
     """
+    from google.cloud import bigquery
+
     client = bigquery.Client(project=project_id)
     
     # Configure the load job
     job_config = bigquery.LoadJobConfig(
-        write_disposition="WRITE_TRUNCATE",  # Overwrite existing data
+        write_disposition=write_disposition,
     )
     
     # Upload data
@@ -188,22 +417,109 @@ def upload_to_bigquery(df, table_id, project_id):
     
     print(f"Uploaded {len(df)} rows to {table_id}")
 
-def main():
+def upload_csv_to_bigquery(csv_filename, table_id, project_id, write_disposition="WRITE_TRUNCATE"):
+    """
+    Load a CSV written by this script straight from disk, for tables too
+    wide to hold as a DataFrame.
+    """
+    from google.cloud import bigquery
+
+    client = bigquery.Client(project=project_id)
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.CSV,
+        skip_leading_rows=1,
+        schema=client.get_table(table_id).schema,
+        write_disposition=write_disposition,
+    )
+    with open(csv_filename, "rb") as source:
+        job = client.load_table_from_file(source, table_id, job_config=job_config)
+    job.result()
+
+    print(f"Uploaded {job.output_rows} rows to {table_id}")
+
+def merge_into_bigquery(df, table_id, project_id):
+    """
+    Upsert rows into BigQuery on (date, symbol).
+
+    Rows are loaded into a staging table with the target's schema and then
+    MERGEd, so re-running an incremental refresh never duplicates a day.
+    """
+    from google.cloud import bigquery
+
+    client = bigquery.Client(project=project_id)
+    staging_id = f"{table_id}_staging"
+    job_config = bigquery.LoadJobConfig(
+        schema=client.get_table(table_id).schema,
+        write_disposition="WRITE_TRUNCATE",
+    )
+    client.load_table_from_dataframe(df, staging_id, job_config=job_config).result()
+
+    updates = ", ".join(f"{c} = S.{c}" for c in COLUMNS if c not in ('date', 'symbol'))
+    query = f"""
+        MERGE `{table_id}` T
+        USING `{staging_id}` S
+        ON T.date = S.date AND T.symbol = S.symbol
+        WHEN MATCHED THEN UPDATE SET {updates}
+        WHEN NOT MATCHED THEN INSERT ROW
+    """
+    try:
+        job = client.query(query)
+        job.result()
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+    print(f"Merged {len(df)} rows into {table_id} ({job.num_dml_affected_rows} affected)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='Rows to generate for a full refresh')
+    parser.add_argument('--symbols', type=int,
+                        help='Generate a synthetic universe of this many correlated symbols '
+                             '(see universe.py) on aligned trading days')
+    parser.add_argument('--days', type=int, default=504,
+                        help='Trading days per symbol for --symbols')
+    parser.add_argument('--calendar', choices=['spread', 'trading'], default='spread',
+                        help='Evenly spaced timestamps per symbol, or aligned NYSE trading days')
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only generate trading days after each symbol's last stored row")
+    parser.add_argument('--source', choices=['csv', 'bigquery'], default='csv',
+                        help='Where an incremental run reads the last stored rows from')
+    parser.add_argument('--write', choices=['append', 'merge'], default='append',
+                        help='How an incremental run writes to BigQuery')
+    parser.add_argument('--end-date', help='Last day of an incremental run (default: today)')
+    parser.add_argument('--csv', help='CSV file (default: stock_market_data_<rows>_rows.csv)')
+    parser.add_argument('--seed', type=int, help='Seed for reproducible data')
+    parser.add_argument('--no-upload', action='store_true', help='Only write the CSV')
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """
     Main function to generate and upload stock market data.
     """
+    args = parse_args(argv)
+
     # Configuration
     PROJECT_ID = os.getenv('GOOGLE_CLOUD_PROJECT') or os.getenv('GCP_PROJECT') or 'myproject-454701'
     DATASET_ID = 'hist_stock_market'
     TABLE_ID = 'daily_prices'
-    NUM_ROWS = 10000
+    NUM_ROWS = args.rows
+    csv_filename = args.csv or f"stock_market_data_{NUM_ROWS}_rows.csv"
+    
+    if args.incremental:
+        return run_incremental(args, csv_filename, PROJECT_ID, f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}")
+    if args.symbols:
+        return run_universe(args, PROJECT_ID, DATASET_ID, TABLE_ID)
     
     print(f"🏗️  Generating {NUM_ROWS} rows of stock market data...")
     
     # Generate data
-    df = generate_stock_data(NUM_ROWS)
+    if args.calendar == 'trading':
+        df = generate_trading_day_data(NUM_ROWS, seed=args.seed)
+    else:
+        df = generate_stock_data(NUM_ROWS)
     
     print(f"✅ Generated {len(df)} rows of data")
+    _validate(df)
     print(f"📊 Data summary:")
     print(f"   - Date range: {df['date'].min()} to {df['date'].max()}")
     print(f"   - Symbols: {', '.join(sorted(df['symbol'].unique()))}")
@@ -211,13 +527,13 @@ def main():
     print(f"   - Price range: ${df['close_price'].min():.2f} - ${df['close_price'].max():.2f}")
     
     # Save to CSV for backup
-    csv_filename = f"stock_market_data_{NUM_ROWS}_rows.csv"
     df.to_csv(csv_filename, index=False)
     print(f"💾 Saved data to {csv_filename}")
     
     # Upload to BigQuery
-    if PROJECT_ID != 'your-project-id':
+    if PROJECT_ID != 'your-project-id' and not args.no_upload:
         print(f"🚀 Uploading to BigQuery project: {PROJECT_ID}")
+        _init_vertexai()
         
         # Create dataset and table
         full_table_id = create_bigquery_dataset_and_table(PROJECT_ID, DATASET_ID, TABLE_ID)
@@ -231,10 +547,77 @@ def main():
         print(f"   SELECT * FROM `{full_table_id}` LIMIT 10;")
         print(f"   SELECT symbol, AVG(close_price) as avg_price FROM `{full_table_id}` GROUP BY symbol ORDER BY avg_price DESC;")
         print(f"   SELECT DATE_TRUNC(date, MONTH) as month, AVG(close_price) as avg_price FROM `{full_table_id}` WHERE symbol = 'AAPL' GROUP BY month ORDER BY month;")
-    else:
+    elif not args.no_upload:
         print("⚠️  Please set GOOGLE_CLOUD_PROJECT environment variable to upload to BigQuery")
         print("   Example: export GOOGLE_CLOUD_PROJECT='your-project-id'")
         print(f"   Data saved locally as {csv_filename}")
 
+def _validate(df):
+    """
+    Check generated rows against the table schema and invariants before
+    anything is written or uploaded; raises ``validation.ValidationError``.
+    """
+    from validation import print_profile, validate_frame
+
+    print_profile(validate_frame(df))
+
+def _init_vertexai():
+    import vertexai
+    vertexai.init(
+        project=os.getenv("GOOGLE_PROJECT_ID"),
+        location=os.getenv("GOOGLE_CLOUD_LOCATION"),
+        staging_bucket=os.getenv("GOOGLE_CLOUD_STORAGE_BUCKET")
+    )
+
+def run_incremental(args, csv_filename, project_id, full_table_id):
+    """
+    Daily refresh: generate and write only the days missing since the last run.
+    """
+    if args.source == 'bigquery':
+        last_rows = last_rows_from_bigquery(full_table_id, project_id)
+    else:
+        last_rows = last_rows_from_csv(csv_filename)
+    print(f"🔁 Continuing {len(last_rows)} symbols from their last stored close "
+          f"(latest {last_rows['date'].max()})...")
+    df = generate_incremental_data(last_rows, args.end_date, args.seed)
+    if df.empty:
+        print("✅ Already up to date")
+        return
+    print(f"✅ Generated {len(df)} new rows ({df['date'].min()} to {df['date'].max()})")
+    _validate(df)
+
+    if os.path.exists(csv_filename):
+        append_to_csv(df, csv_filename)
+        print(f"💾 Appended to {csv_filename}")
+
+    if project_id != 'your-project-id' and not args.no_upload:
+        _init_vertexai()
+        if args.write == 'merge':
+            merge_into_bigquery(df, full_table_id, project_id)
+        else:
+            upload_to_bigquery(df, full_table_id, project_id, write_disposition="WRITE_APPEND")
+
+def run_universe(args, project_id, dataset_id, table_id):
+    """
+    Wide-table mode: stream a synthetic universe to CSV, then load the file.
+    """
+    from universe import UniverseSpec, write_universe_csv
+    from validation import MarketDataValidator, print_profile
+
+    csv_filename = args.csv or f"stock_market_data_{args.symbols}_symbols_{args.days}_days.csv"
+    print(f"🏗️  Generating {args.symbols:,} symbols x {args.days:,} trading days...")
+    validator = MarketDataValidator()
+    rows = write_universe_csv(
+        csv_filename, UniverseSpec(num_symbols=args.symbols), args.days, seed=args.seed,
+        validator=validator,
+    )
+    print_profile(validator)
+    print(f"💾 Saved {rows:,} rows to {csv_filename}")
+
+    if project_id != 'your-project-id' and not args.no_upload:
+        _init_vertexai()
+        full_table_id = create_bigquery_dataset_and_table(project_id, dataset_id, table_id)
+        upload_csv_to_bigquery(csv_filename, full_table_id, project_id)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for the market data generator (no BigQuery access needed).
+
+    cd bq_test_data_generation
+    python -m pytest test_generate_market_data.py
+    python test_generate_market_data.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import generate_market_data as gmd
+from trading_calendar import is_trading_day
+
+FIXTURE_CSV = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "stock_market_data_10000_rows.csv"
+)
+
+
+def test_incremental_continues_each_walk():
+    last_rows = pd.DataFrame({
+        "symbol": ["AAPL", "NFLX"],
+        "date": ["2025-09-05", "2025-09-03"],  # a Friday and a Wednesday
+        "close_price": [200.0, 50.0],
+    })
+    df = gmd.generate_incremental_data(last_rows, end_date="2025-09-12", seed=1)
+    assert list(df.columns) == gmd.COLUMNS
+
+    aapl = df[df["symbol"] == "AAPL"]
+    assert list(aapl["date"]) == [f"2025-09-{d:02d}" for d in (8, 9, 10, 11, 12)]
+    nflx = df[df["symbol"] == "NFLX"]
+    assert list(nflx["date"]) == [f"2025-09-{d:02d}" for d in (4, 5, 8, 9, 10, 11, 12)]
+    assert (nflx["sector"] == "Entertainment").all()
+
+    # The first new close is one daily step away from the stored close.
+    assert abs(aapl["close_price"].iloc[0] / 200.0 - 1) < 0.15
+    assert abs(nflx["close_price"].iloc[0] / 50.0 - 1) < 0.15
+    assert (df["high_price"] >= df[["open_price", "close_price"]].max(axis=1)).all()
+    assert (df["low_price"] <= df[["open_price", "close_price"]].min(axis=1)).all()
+    assert (df["volume"] >= 100000).all()
+
+    up_to_date = gmd.generate_incremental_data(last_rows, end_date="2025-09-03")
+    assert up_to_date.empty and list(up_to_date.columns) == gmd.COLUMNS
+
+
+def test_incremental_run_appends_only_new_days():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "prices.csv")
+        shutil.copy(FIXTURE_CSV, csv_path)
+        before = pd.read_csv(csv_path)
+        last_date = before["date"].max()
+        end_date = (pd.Timestamp(last_date) + pd.offsets.BDay(3)).strftime("%Y-%m-%d")
+
+        args = ["--incremental", "--csv", csv_path, "--end-date", end_date,
+                "--no-upload", "--seed", "7"]
+        gmd.main(args)
+        after = pd.read_csv(csv_path)
+        new_rows = after.iloc[len(before):]
+        assert after.iloc[: len(before)].equals(before)
+        assert not after.duplicated(["date", "symbol"]).any()
+        assert (new_rows["date"] > last_date).all()
+        assert new_rows["date"].max() == end_date
+
+        # Each symbol picks up from its own last stored close.
+        last_close = before.sort_values("date").groupby("symbol")["close_price"].last()
+        first_new = new_rows.groupby("symbol")["close_price"].first()
+        ratio = first_new / last_close[first_new.index]
+        assert ((ratio - 1).abs() < 0.15).all()
+
+        # A second run for the same day has nothing to add.
+        gmd.main(args)
+        assert len(pd.read_csv(csv_path)) == len(after)
+
+
+def test_refresh_cost_scales_with_new_rows():
+    last_rows = gmd.last_rows_from_csv(FIXTURE_CSV)
+    end_date = pd.Timestamp(last_rows["date"].max()) + pd.offsets.BDay(1)
+
+    start = time.perf_counter()
+    df = gmd.generate_incremental_data(last_rows, end_date=end_date, seed=3)
+    incremental = time.perf_counter() - start
+    start = time.perf_counter()
+    gmd.generate_stock_data(10000)
+    full = time.perf_counter() - start
+
+    print(f"   - one new day: {len(df)} rows in {incremental * 1000:.0f} ms; "
+          f"full 10,000 row regeneration: {full * 1000:.0f} ms")
+    assert len(df) == last_rows["symbol"].nunique()
+    assert incremental < full
+
+
+def test_trading_day_mode_is_dense():
+    df = gmd.generate_trading_day_data(9000, end_date="2024-12-31", seed=2)
+    assert len(df) == 9000 and list(df.columns) == gmd.COLUMNS
+    assert is_trading_day(df["date"]).all()
+    assert df["date"].min() > "2023-01-01" and df["date"].max() == "2024-12-31"
+
+    symbols, dates, arrays = gmd.dense_arrays(df)
+    assert list(symbols) == gmd.SYMBOLS and len(dates) == 300
+    close = arrays["close_price"]
+    assert close.shape == (30, 300)
+    assert np.shares_memory(close, df["close_price"].to_numpy())
+    # Row i * days + j is symbol i on trading day j.
+    row = df.iloc[7 * 300 + 42]
+    assert row["symbol"] == symbols[7] and row["date"] == dates[42].strftime("%Y-%m-%d")
+    assert close[7, 42] == row["close_price"]
+
+    assert (arrays["high_price"] >= np.maximum(arrays["open_price"], close)).all()
+    assert (arrays["low_price"] <= np.minimum(arrays["open_price"], close)).all()
+
+    # The evenly spaced layout is not dense.
+    try:
+        gmd.dense_arrays(pd.read_csv(FIXTURE_CSV))
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+def test_incremental_after_trading_day_run_stays_dense():
+    df = gmd.generate_trading_day_data(3000, end_date="2024-06-28", seed=4)
+    last_rows = df.groupby("symbol", as_index=False, sort=False).last()
+    new_rows = gmd.generate_incremental_data(last_rows, end_date="2024-07-10", seed=5)
+    # July 4th is skipped; every symbol gets the same seven days.
+    symbols, dates, _ = gmd.dense_arrays(new_rows)
+    assert list(symbols) == gmd.SYMBOLS
+    assert [d.day for d in dates] == [1, 2, 3, 5, 8, 9, 10]
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing market data generator...\n")
+
+    tests = [
+        ("Continue Random Walk", test_incremental_continues_each_walk),
+        ("Incremental Append", test_incremental_run_appends_only_new_days),
+        ("Refresh Cost", test_refresh_cost_scales_with_new_rows),
+        ("Trading-day Mode", test_trading_day_mode_is_dense),
+        ("Dense Incremental", test_incremental_after_trading_day_run_stays_dense),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
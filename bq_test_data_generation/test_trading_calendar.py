@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the NYSE trading calendar.
+
+    cd bq_test_data_generation
+    python -m pytest test_trading_calendar.py
+    python test_trading_calendar.py
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from trading_calendar import is_trading_day, trading_day_positions, trading_days
+
+
+def test_trading_days_per_year():
+    # Published NYSE counts (2025 excludes the one-off closure on January 9).
+    for year, expected in ((2022, 251), (2023, 250), (2024, 252), (2025, 251)):
+        assert len(trading_days(f"{year}-01-01", f"{year}-12-31")) == expected
+
+
+def test_holidays_and_observance():
+    closed = [
+        "2024-01-01", "2024-01-15", "2024-02-19", "2024-03-29", "2024-05-27",
+        "2024-06-19", "2024-07-04", "2024-09-02", "2024-11-28", "2024-12-25",
+        "2021-07-05",  # Independence Day on a Sunday
+        "2022-06-20",  # Juneteenth on a Sunday
+        "2021-12-24",  # Christmas on a Saturday
+    ]
+    open_ = [
+        "2021-12-31",  # New Year's Day on a Saturday is not observed
+        "2021-06-18",  # before Juneteenth became a market holiday
+        "2024-07-05", "2024-11-29",
+    ]
+    assert not is_trading_day(closed).any()
+    assert is_trading_day(open_).all()
+    assert not is_trading_day(["2024-07-06", "2024-07-07"]).any()
+
+
+def test_periods_and_positions():
+    days = trading_days(end="2024-07-08 15:30", periods=3)
+    assert list(days.strftime("%Y-%m-%d")) == ["2024-07-03", "2024-07-05", "2024-07-08"]
+
+    calendar = trading_days("2024-01-01", "2024-12-31")
+    positions = trading_day_positions(["2024-01-02", "2024-01-03", "2024-12-31"], calendar)
+    assert np.array_equal(positions, [0, 1, len(calendar) - 1])
+    for not_trading in ("2024-07-04", "2025-01-02"):
+        try:
+            trading_day_positions([not_trading], calendar)
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    assert is_trading_day(pd.DatetimeIndex([])).size == 0
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing NYSE trading calendar...\n")
+
+    tests = [
+        ("Trading Days per Year", test_trading_days_per_year),
+        ("Holidays and Observance", test_holidays_and_observance),
+        ("Periods and Positions", test_periods_and_positions),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for synthetic universes with correlated returns.
+
+    cd bq_test_data_generation
+    python -m pytest test_universe.py
+    python test_universe.py --benchmark   # 5,000 symbols x 2,500 days
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import generate_market_data as gmd
+from trading_calendar import is_trading_day
+from universe import (
+    UniverseSpec,
+    build_universe,
+    correlated_returns,
+    generate_universe_arrays,
+    generate_universe_data,
+    write_universe_csv,
+)
+
+
+def _sector_correlations(universe, returns):
+    """Mean pairwise correlation for every pair of sectors."""
+    corr = np.corrcoef(returns)
+    k = len(universe.sector_names)
+    means = np.full((k, k), np.nan)
+    for a in range(k):
+        for b in range(k):
+            rows = np.flatnonzero(universe.sector_index == a)
+            cols = np.flatnonzero(universe.sector_index == b)
+            block = corr[np.ix_(rows, cols)]
+            if a == b:
+                block = block[~np.eye(len(rows), dtype=bool)]
+            if block.size:
+                means[a, b] = block.mean()
+    return means
+
+
+def test_universe_spec():
+    spec = UniverseSpec(num_symbols=2000, sector_weights={"Technology": 3, "Energy": 1})
+    universe = build_universe(spec, np.random.default_rng(1))
+    assert len(universe) == 2000 and len(set(universe.symbols)) == 2000
+    assert list(universe.symbols[:30]) == gmd.SYMBOLS
+    assert universe.base_price[0] == gmd.BASE_PRICES["AAPL"]
+    assert universe.sectors[3] == "Automotive"  # TSLA keeps its sector
+    synthetic = universe.sectors[30:]
+    assert abs((synthetic == "Technology").mean() - 0.75) < 0.04
+    assert abs(np.median(universe.base_price[30:]) - spec.price_median) < 10
+    assert (universe.base_price >= 1).all() and (universe.volatility > 0).all()
+
+    small = build_universe(UniverseSpec(num_symbols=5), np.random.default_rng(1))
+    assert list(small.symbols) == gmd.SYMBOLS[:5]
+
+
+def test_factor_model_correlations():
+    spec = UniverseSpec(
+        num_symbols=700, intra_sector_correlation=0.4, inter_sector_correlation=0.5,
+        include_known_symbols=False,
+    )
+    rng = np.random.default_rng(2)
+    universe = build_universe(spec, rng)
+    returns = correlated_returns(universe, spec, 3000, rng)
+    means = _sector_correlations(universe, returns)
+    within = np.diag(means)
+    across = means[~np.eye(len(means), dtype=bool)]
+    assert np.allclose(within, 0.4, atol=0.05), within
+    assert np.allclose(across, 0.4 * 0.5, atol=0.05), across
+
+    # Volatility and drift per symbol follow the spec.
+    assert np.allclose(returns.std(axis=1) / universe.volatility, 1, atol=0.08)
+    # The shared sector factors make the cross-sectional mean noisy (~2e-4/day).
+    assert abs(returns.mean() - spec.drift) < 8e-4
+
+
+def test_cholesky_of_sector_matrix():
+    matrix = np.array([
+        [1.0, 0.8, -0.4],
+        [0.8, 1.0, -0.2],
+        [-0.4, -0.2, 1.0],
+    ])
+    spec = UniverseSpec(
+        num_symbols=450, sector_weights={"A": 1, "B": 1, "C": 1},
+        intra_sector_correlation=0.6, sector_correlation=matrix,
+        include_known_symbols=False,
+    )
+    rng = np.random.default_rng(3)
+    universe = build_universe(spec, rng)
+    returns = correlated_returns(universe, spec, 4000, rng)
+    expected = 0.6 * matrix
+    np.fill_diagonal(expected, 0.6)
+    assert np.allclose(_sector_correlations(universe, returns), expected, atol=0.06)
+
+    for bad in (np.eye(2), matrix * 2, np.array([[1, 0.9, 0.9], [0.9, 1, -0.9], [0.9, -0.9, 1]])):
+        try:
+            correlated_returns(universe, UniverseSpec(
+                num_symbols=450, sector_weights={"A": 1, "B": 1, "C": 1},
+                sector_correlation=bad, include_known_symbols=False,
+            ), 10, rng)
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+
+
+def test_prices_keep_the_correlation():
+    spec = UniverseSpec(num_symbols=200, intra_sector_correlation=0.5,
+                        inter_sector_correlation=0.0, include_known_symbols=False)
+    universe, dates, arrays = generate_universe_arrays(spec, 1500, "2024-12-31", seed=4)
+    close = arrays["close_price"]
+    assert close.shape == (200, 1500) and is_trading_day(dates).all()
+    means = _sector_correlations(universe, np.diff(np.log(close), axis=1))
+    assert np.allclose(np.diag(means), 0.5, atol=0.06)
+    assert np.abs(means[~np.eye(len(means), dtype=bool)]).max() < 0.06
+    assert (arrays["high_price"] >= np.maximum(arrays["open_price"], close)).all()
+    assert (arrays["low_price"] <= np.minimum(arrays["open_price"], close)).all()
+
+    df = generate_universe_data(UniverseSpec(num_symbols=40), 20, "2024-12-31", seed=4)
+    symbols, _, dense = gmd.dense_arrays(df)
+    assert len(symbols) == 40 and dense["close_price"].shape == (40, 20)
+
+
+def test_streamed_csv_matches_frame():
+    spec = UniverseSpec(num_symbols=600)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "universe.csv")
+        rows = write_universe_csv(path, spec, 30, "2024-12-31", seed=5)
+        written = pd.read_csv(path)
+    frame = generate_universe_data(spec, 30, "2024-12-31", seed=5)
+    assert rows == len(written) == len(frame) == 600 * 30
+    assert list(written.columns) == gmd.COLUMNS
+    for column in ("date", "symbol", "sector", "volume"):
+        assert (written[column].to_numpy() == frame[column].to_numpy()).all()
+    for column in ("close_price", "pe_ratio", "market_cap"):
+        assert np.allclose(written[column], frame[column], equal_nan=True)
+
+
+def test_empty_universe_writes_header_only():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "universe.csv")
+        rows = write_universe_csv(path, UniverseSpec(num_symbols=0), 30, "2024-12-31")
+        written = pd.read_csv(path)
+        assert os.listdir(tmp) == ["universe.csv"]
+    assert rows == len(written) == 0
+    assert list(written.columns) == gmd.COLUMNS
+
+
+def benchmark(symbols=5000, days=2500):
+    """Time to generate a correlated universe as (symbols, days) arrays."""
+    spec = UniverseSpec(num_symbols=symbols)
+    start = time.perf_counter()
+    generate_universe_arrays(spec, days, "2025-09-05", seed=6)
+    seconds = time.perf_counter() - start
+    rows = symbols * days
+    print(f"   - {symbols:,} symbols x {days:,} days = {rows:,} rows in {seconds:.2f}s "
+          f"({rows / seconds / 1e6:.1f}M rows/s)")
+    return seconds
+
+
+def test_benchmark_small():
+    assert benchmark(symbols=1000, days=500) < 5
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing synthetic universes...\n")
+
+    tests = [
+        ("Universe Spec", test_universe_spec),
+        ("Factor Model Correlations", test_factor_model_correlations),
+        ("Sector Matrix Cholesky", test_cholesky_of_sector_matrix),
+        ("Price Correlations", test_prices_keep_the_correlation),
+        ("Streamed CSV", test_streamed_csv_matches_frame),
+        ("Empty Universe CSV", test_empty_universe_writes_header_only),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (5,000 symbols x 2,500 days)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the streaming market data validator.
+
+    cd bq_test_data_generation
+    python -m pytest test_validation.py
+    python test_validation.py --benchmark   # validation vs generation throughput
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import generate_market_data as gmd
+from universe import UniverseSpec, generate_universe_arrays, universe_record_batches, write_universe_csv
+from validation import MarketDataValidator, ValidationError, validate_csv, validate_frame
+
+FIXTURE_CSV = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "stock_market_data_10000_rows.csv"
+)
+
+
+def _problems(df):
+    return validate_frame(df, fail_fast=False).problems
+
+
+def test_generated_data_is_valid():
+    for df in (
+        pd.read_csv(FIXTURE_CSV),
+        gmd.generate_stock_data(3000),
+        gmd.generate_trading_day_data(3000, seed=1),
+    ):
+        assert _problems(df) == []
+
+
+def test_invariants_and_required_columns():
+    df = gmd.generate_trading_day_data(3000, seed=2)
+    bad = df.copy()
+    bad.loc[[5, 17], "high_price"] = bad.loc[[5, 17], "close_price"] - 1
+    bad.loc[40, "low_price"] = bad.loc[40, "open_price"] + 1
+    bad.loc[41, "close_price"] = np.nan
+    bad.loc[42, "symbol"] = None
+    bad.loc[43, "volume"] = -5
+    problems = _problems(bad)
+    assert any("high_price < max" in p and "2 rows" in p and "rows 5, 17" in p for p in problems)
+    assert any("low_price > min" in p and "rows 40" in p for p in problems)
+    assert any("REQUIRED column 'close_price'" in p for p in problems)
+    assert any("REQUIRED column 'symbol'" in p for p in problems)
+    assert any("volume < 0" in p for p in problems)
+
+    # NULLABLE columns may be null.
+    nullable = df.assign(pe_ratio=np.nan, sector=None)
+    assert _problems(nullable) == []
+
+    try:
+        validate_frame(bad)
+        assert False, "expected ValidationError"
+    except ValidationError as e:
+        assert len(e.problems) == len(problems)
+
+
+def test_schema_checks():
+    df = gmd.generate_trading_day_data(600, seed=3)
+    assert any("missing column 'volume'" in p for p in _problems(df.drop(columns="volume")))
+    assert any("column 'volume' has type" in p for p in _problems(df.assign(volume="many")))
+    dates = df["date"].copy()
+    dates.iloc[3] = "2024-13-45"
+    assert any("unparseable DATE" in p for p in _problems(df.assign(date=dates)))
+    assert any("unparseable TIMESTAMP" in p for p in _problems(df.assign(created_at="soon")))
+
+
+def test_profile_across_batches():
+    df = gmd.generate_trading_day_data(9000, seed=4)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    streamed = MarketDataValidator()
+    for batch in table.to_batches(max_chunksize=1000):
+        streamed.validate(batch)
+    profile = streamed.profile()
+    assert profile["rows"] == 9000 and profile["batches"] == 9
+
+    columns = profile["columns"]
+    close = df["close_price"]
+    assert np.isclose(columns["close_price"]["mean"], close.mean())
+    assert np.isclose(columns["close_price"]["std"], close.std(ddof=0))
+    assert columns["close_price"]["min"] == close.min()
+    assert columns["volume"]["max"] == df["volume"].max()
+    assert columns["pe_ratio"]["nulls"] == df["pe_ratio"].isna().sum()
+    assert columns["symbol"]["distinct"] == 30
+    assert columns["date"]["min"] == df["date"].min() and columns["date"]["distinct"] == 300
+
+
+def test_universe_stream_fails_fast():
+    spec = UniverseSpec(num_symbols=600)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "universe.csv")
+        validator = MarketDataValidator()
+        rows = write_universe_csv(path, spec, 20, seed=5, validator=validator)
+        assert rows == validator.rows == 12000
+        assert validate_csv(path, block_size=64 << 10).problems == []
+
+        # A bad batch stops the stream: nothing is left at the target path.
+        universe, dates, arrays = generate_universe_arrays(spec, 20, seed=5)
+        arrays["low_price"][400, 3] = arrays["high_price"][400, 3] + 1
+        validator = MarketDataValidator()
+        written = []
+        try:
+            for batch in validator.validated(universe_record_batches(universe, dates, arrays)):
+                written.append(batch)
+            assert False, "expected ValidationError"
+        except ValidationError as e:
+            assert f"rows {400 * 20 + 3}" in str(e)
+        assert len(written) == 1  # batches of 250 symbols; symbol 400 is in the second
+
+        os.remove(path)
+        original = gmd.random_walk_arrays
+
+        def corrupt(*args, **kwargs):
+            arrays = original(*args, **kwargs)
+            arrays["close_price"][-1, -1] = np.nan
+            return arrays
+
+        import universe as universe_module
+        universe_module.random_walk_arrays = corrupt
+        try:
+            write_universe_csv(path, spec, 20, seed=5, validator=MarketDataValidator())
+            assert False, "expected ValidationError"
+        except ValidationError:
+            pass
+        finally:
+            universe_module.random_walk_arrays = original
+        assert os.listdir(tmp) == []
+
+
+def benchmark(symbols=4000, days=2500):
+    """Validation throughput against generation throughput, rows/s."""
+    spec = UniverseSpec(num_symbols=symbols)
+    start = time.perf_counter()
+    universe, dates, arrays = generate_universe_arrays(spec, days, seed=6)
+    batches = list(universe_record_batches(universe, dates, arrays))
+    generation = time.perf_counter() - start
+    validator = MarketDataValidator()
+    for batch in batches:
+        validator.validate(batch)
+    rows = symbols * days
+    print(f"   - generation: {rows / generation / 1e6:.1f}M rows/s, "
+          f"validation: {rows / validator.seconds / 1e6:.1f}M rows/s "
+          f"({rows:,} rows)")
+    return rows / generation, rows / validator.seconds
+
+
+def test_benchmark_small():
+    generation, validation = benchmark(symbols=1000, days=500)
+    assert validation > generation
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing market data validation...\n")
+
+    tests = [
+        ("Generated Data", test_generated_data_is_valid),
+        ("Invariants and Modes", test_invariants_and_required_columns),
+        ("Schema Checks", test_schema_checks),
+        ("Streaming Profile", test_profile_across_batches),
+        ("Fail Fast", test_universe_stream_fails_fast),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (10M rows)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+NYSE trading calendar for generating market data on real trading days.
+
+Built on pandas' holiday rules, so no extra dependency is needed. It covers
+the regular NYSE holidays, including Good Friday and Juneteenth (from 2022),
+with the exchange's weekend observance: a Saturday holiday closes the
+Friday before, except New Year's Day. One-off closures (national days of
+mourning, weather) are not modelled.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar,
+    GoodFriday,
+    Holiday,
+    USLaborDay,
+    USMartinLutherKingJr,
+    USMemorialDay,
+    USPresidentsDay,
+    USThanksgivingDay,
+    nearest_workday,
+    sunday_to_monday,
+)
+from pandas.tseries.offsets import CustomBusinessDay
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """
+    Full-day NYSE market holidays.
+    """
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01",
+                observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+NYSE_TRADING_DAY = CustomBusinessDay(calendar=NYSEHolidayCalendar())
+
+
+def trading_days(start=None, end=None, periods=None):
+    """
+    NYSE trading days in ``[start, end]``, or ``periods`` days up to ``end``.
+
+    Any two of ``start``, ``end`` and ``periods`` may be given, as with
+    ``pd.date_range``. Times of day are dropped.
+    """
+    start = pd.Timestamp(start).normalize() if start is not None else None
+    end = pd.Timestamp(end).normalize() if end is not None else None
+    return pd.date_range(start=start, end=end, periods=periods, freq=NYSE_TRADING_DAY)
+
+
+def is_trading_day(dates):
+    """
+    Boolean mask of which ``dates`` are NYSE trading days.
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates)).normalize()
+    if dates.empty:
+        return np.zeros(0, dtype=bool)
+    holidays = NYSEHolidayCalendar().holidays(dates.min(), dates.max())
+    return (dates.dayofweek < 5) & ~dates.isin(holidays)
+
+
+def trading_day_positions(dates, calendar):
+    """
+    Column of each date in a dense (symbol x trading-day) array over ``calendar``.
+
+    Raises:
+        ValueError: If a date is not one of the calendar's trading days.
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates)).normalize()
+    positions = calendar.searchsorted(dates)
+    found = positions < len(calendar)
+    found[found] = calendar[positions[found]] == dates[found]
+    if not found.all():
+        raise ValueError(f"{dates[~found][0].date()} is not a trading day in the calendar")
+    return positions
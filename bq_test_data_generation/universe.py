@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Synthetic stock universes of any size with correlated daily returns.
+
+A ``UniverseSpec`` describes the universe: symbol count, sector mix, and
+lognormal distributions of base price, base volume and daily volatility.
+The first symbols are the 30 hardcoded ones from generate_market_data.py,
+with their base prices, volumes and sectors. Synthetic tickers fill the
+rest.
+
+Returns follow a sector factor model:
+
+    r[i, t] = drift + vol[i] * (sqrt(rho) * F[sector(i), t] + sqrt(1 - rho) * e[i, t])
+
+The sector factors ``F`` are standard normals correlated through the
+Cholesky factor of the sector correlation matrix. Two symbols in the same
+sector therefore have correlation ``rho`` (``intra_sector_correlation``).
+Symbols in sectors ``a`` and ``b`` have correlation ``rho * C[a, b]``.
+Everything is drawn as (symbols, days) arrays with one matrix product for
+the factors, so 5,000 symbols x 2,500 days take seconds.
+"""
+
+import dataclasses
+import os
+import string
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from generate_market_data import (
+    BASE_PRICES,
+    BASE_VOLUMES,
+    COLUMNS,
+    SECTORS,
+    SYMBOLS,
+    panel_frame,
+    random_walk_arrays,
+)
+from trading_calendar import trading_days
+
+DEFAULT_SECTOR_WEIGHTS = {
+    'Technology': 0.25,
+    'Healthcare': 0.15,
+    'Financials': 0.15,
+    'Consumer': 0.15,
+    'Industrials': 0.1,
+    'Energy': 0.1,
+    'Utilities': 0.1,
+}
+
+
+@dataclasses.dataclass
+class UniverseSpec:
+    """
+    Shape of a synthetic universe; medians and log-sigmas define lognormals.
+    """
+    num_symbols: int = 30
+    sector_weights: dict = dataclasses.field(
+        default_factory=lambda: dict(DEFAULT_SECTOR_WEIGHTS)
+    )
+    price_median: float = 80.0
+    price_sigma: float = 1.0
+    volume_median: float = 1500000.0
+    volume_sigma: float = 1.0
+    volatility_median: float = 0.02
+    volatility_sigma: float = 0.3
+    drift: float = 0.0005
+    intra_sector_correlation: float = 0.4
+    inter_sector_correlation: float = 0.5
+    # Full sector correlation matrix, overriding inter_sector_correlation.
+    sector_correlation: Optional[np.ndarray] = None
+    include_known_symbols: bool = True
+
+
+@dataclasses.dataclass
+class Universe:
+    """
+    Per-symbol attributes of a generated universe, as parallel arrays.
+    """
+    symbols: np.ndarray
+    sectors: np.ndarray
+    sector_names: list
+    sector_index: np.ndarray
+    base_price: np.ndarray
+    base_volume: np.ndarray
+    volatility: np.ndarray
+
+    def __len__(self):
+        return self.symbols.size
+
+
+def synthetic_tickers(count, exclude=()):
+    """
+    ``count`` distinct four-letter tickers not in ``exclude``, in a fixed order.
+    """
+    exclude = set(exclude)
+    if count + len(exclude) > 26**4:
+        raise ValueError(f"Cannot make {count} four-letter tickers")
+    letters = np.array(list(string.ascii_uppercase))
+    # 7919 is coprime with 26**4, so this permutes the codes and spreads
+    # consecutive indexes over the alphabet (AAAA, ALSP, AXLE, ...).
+    codes = np.arange(count + len(exclude)) * 7919 % 26**4
+    digits = codes[:, None] // 26 ** np.arange(3, -1, -1) % 26
+    tickers = (''.join(row) for row in letters[digits])
+    return [ticker for ticker in tickers if ticker not in exclude][:count]
+
+
+def sector_correlation_matrix(spec, sector_names):
+    """
+    Correlation between sector factors; validated positive definite.
+
+    Raises:
+        ValueError: If the matrix is the wrong shape or not a correlation matrix.
+    """
+    k = len(sector_names)
+    if spec.sector_correlation is not None:
+        matrix = np.asarray(spec.sector_correlation, dtype=float)
+    else:
+        matrix = np.full((k, k), spec.inter_sector_correlation)
+        np.fill_diagonal(matrix, 1.0)
+    if matrix.shape != (k, k) or not np.allclose(matrix, matrix.T) or not np.allclose(
+        np.diag(matrix), 1.0
+    ):
+        raise ValueError(f"sector_correlation must be a {k}x{k} correlation matrix")
+    if np.linalg.eigvalsh(matrix).min() <= 0:
+        raise ValueError("sector_correlation must be positive definite")
+    return matrix
+
+
+def build_universe(spec, rng):
+    """
+    Draw symbols, sectors, base prices, volumes and volatilities for ``spec``.
+    """
+    n = spec.num_symbols
+    known = SYMBOLS[:n] if spec.include_known_symbols else []
+    sector_names = list(spec.sector_weights)
+    for symbol in known:
+        sector = SECTORS.get(symbol, 'Technology')
+        if sector not in sector_names:
+            sector_names.append(sector)
+
+    weights = np.array([spec.sector_weights[s] for s in spec.sector_weights], dtype=float)
+    drawn = rng.choice(len(weights), size=n - len(known), p=weights / weights.sum())
+    sector_index = np.concatenate((
+        [sector_names.index(SECTORS.get(symbol, 'Technology')) for symbol in known],
+        drawn,
+    )).astype(np.intp)
+
+    def lognormal(median, sigma):
+        return median * np.exp(sigma * rng.standard_normal(n))
+
+    base_price = lognormal(spec.price_median, spec.price_sigma).round(2)
+    base_volume = lognormal(spec.volume_median, spec.volume_sigma)
+    for i, symbol in enumerate(known):
+        base_price[i] = BASE_PRICES.get(symbol, 100)
+        base_volume[i] = BASE_VOLUMES.get(symbol, 1000000)
+    symbols = np.array(known + synthetic_tickers(n - len(known), exclude=SYMBOLS))
+    return Universe(
+        symbols=symbols,
+        sectors=np.array(sector_names)[sector_index],
+        sector_names=sector_names,
+        sector_index=sector_index,
+        base_price=np.maximum(base_price, 1.0),
+        base_volume=np.maximum(base_volume, 100000.0),
+        volatility=lognormal(spec.volatility_median, spec.volatility_sigma),
+    )
+
+
+def correlated_returns(universe, spec, days, rng, dtype=np.float64):
+    """
+    Daily returns shaped (symbols, days) from the sector factor model.
+    """
+    correlation = sector_correlation_matrix(spec, universe.sector_names)
+    cholesky = np.linalg.cholesky(correlation)
+    factors = cholesky @ rng.standard_normal((len(universe.sector_names), days))
+
+    rho = spec.intra_sector_correlation
+    returns = rng.standard_normal((len(universe), days), dtype=dtype)
+    returns *= np.sqrt(1.0 - rho)
+    # Add each symbol's sector factor row one sector at a time, so the
+    # temporary is one sector's rows rather than the whole universe.
+    scaled = (np.sqrt(rho) * factors).astype(dtype)
+    for k in range(len(universe.sector_names)):
+        members = np.flatnonzero(universe.sector_index == k)
+        if members.size:
+            returns[members] += scaled[k]
+    returns *= universe.volatility.astype(dtype)[:, None]
+    returns += dtype(spec.drift)
+    return returns
+
+
+def generate_universe_arrays(spec, days, end_date=None, seed=None):
+    """
+    Generate a universe and its OHLCV arrays on ``days`` NYSE trading days.
+
+    Returns:
+        ``(universe, dates, arrays)`` with arrays shaped (symbols, days).
+    """
+    rng = np.random.default_rng(seed)
+    universe = build_universe(spec, rng)
+    dates = trading_days(end=end_date or datetime.now(), periods=days)
+    returns = correlated_returns(universe, spec, days, rng)
+    # The first day is generated from the base price like generate_stock_data.
+    arrays = random_walk_arrays(
+        universe.base_price, days, rng, universe.base_volume, daily_return=returns
+    )
+    return universe, dates, arrays
+
+
+def generate_universe_data(spec, days, end_date=None, seed=None):
+    """
+    Rows for ``generate_universe_arrays`` in the daily_prices schema.
+
+    Rows are dense and symbol-major like ``generate_trading_day_data``.
+    """
+    universe, dates, arrays = generate_universe_arrays(spec, days, end_date, seed)
+    return panel_frame(universe.symbols, dates, arrays, universe.sectors)
+
+
+def _dictionary(indices, values):
+    return pa.DictionaryArray.from_arrays(
+        pa.array(np.asarray(indices, dtype=np.int32)), pa.array(values)
+    )
+
+
+def universe_record_batches(universe, dates, arrays, symbols_per_batch=250):
+    """
+    Yield the universe's rows as Arrow record batches of whole symbols.
+
+    Numeric columns are views of the (symbols, days) arrays and the string
+    columns are dictionary encoded, so a 12.5M row universe streams out
+    without a 12.5M row DataFrame. NaN P/E ratios become nulls.
+    """
+    days = len(dates)
+    date_strings = list(dates.strftime('%Y-%m-%d'))
+    created_at = datetime.now().isoformat()
+    for start in range(0, len(universe), symbols_per_batch):
+        block = slice(start, min(start + symbols_per_batch, len(universe)))
+        count = block.stop - block.start
+        rows = count * days
+        columns = {
+            'date': _dictionary(np.tile(np.arange(days), count), date_strings),
+            'symbol': _dictionary(np.repeat(np.arange(count), days), universe.symbols[block]),
+            **{
+                name: pa.array(values[block].reshape(-1), from_pandas=True)
+                for name, values in arrays.items()
+            },
+            'sector': _dictionary(
+                np.repeat(np.arange(count), days), universe.sectors[block]
+            ),
+            'created_at': _dictionary(np.zeros(rows), [created_at]),
+        }
+        yield pa.record_batch([columns[name] for name in COLUMNS], names=COLUMNS)
+
+
+def write_universe_csv(csv_filename, spec, days, end_date=None, seed=None, validator=None):
+    """
+    Generate a universe and stream it to a CSV in the daily_prices layout.
+
+    With a ``validation.MarketDataValidator``, each batch is checked before it
+    is written. The file only replaces ``csv_filename`` once every batch has
+    passed.
+
+    Returns:
+        The number of rows written; an empty universe writes only the header.
+    """
+    universe, dates, arrays = generate_universe_arrays(spec, days, end_date, seed)
+    batches = universe_record_batches(universe, dates, arrays)
+    if validator is not None:
+        batches = validator.validated(batches)
+    rows = 0
+    options = pa_csv.WriteOptions(quoting_style='needed')
+    partial = f"{csv_filename}.partial"
+    writer = None
+    try:
+        for batch in batches:
+            if writer is None:
+                writer = pa_csv.CSVWriter(partial, batch.schema, write_options=options)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+        if writer is None:
+            # An empty universe still gets the header, so loaders see the schema.
+            schema = pa.schema([(name, pa.string()) for name in COLUMNS])
+            writer = pa_csv.CSVWriter(partial, schema, write_options=options)
+        writer.close()
+        writer = None
+        os.replace(partial, csv_filename)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+    return rows
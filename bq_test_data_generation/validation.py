@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Streaming validation and profiling of daily_prices data before upload.
+
+A bad fixture used to surface only when a BigQuery load failed, minutes
+into the upload. ``MarketDataValidator`` checks Arrow record batches as
+they are produced or read, and fails on the first bad batch. It checks:
+
+- schema: every column of ``SCHEMA_FIELDS`` is present, with a compatible
+  Arrow type;
+- modes: REQUIRED columns have no nulls (NaN counts as null);
+- DATE and TIMESTAMP strings parse;
+- invariants: ``high >= max(open, close)``, ``low <= min(open, close)``,
+  positive prices, non-negative volume and dividend yield.
+
+At the same time it accumulates column statistics: counts, nulls,
+min/max/mean/std, distinct values and date range. These are mergeable
+running sums, so memory stays constant however many rows stream through.
+Checks are NumPy operations on zero-copy column views. String columns are
+deduplicated before parsing, so dictionary-encoded batches from universe.py
+are never decoded row by row.
+
+    python validation.py stock_market_data_10000_rows.csv
+"""
+
+import dataclasses
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+from generate_market_data import SCHEMA_FIELDS
+
+# Distinct values kept per string column; beyond this only the count is exact.
+MAX_DISTINCT = 100000
+MAX_EXAMPLES = 5
+
+
+class ValidationError(ValueError):
+    """
+    Raised when a batch violates the schema or an invariant.
+    """
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__("Invalid market data:\n  - " + "\n  - ".join(problems))
+
+
+@dataclasses.dataclass
+class ColumnProfile:
+    """
+    Running statistics of one column.
+    """
+    count: int = 0
+    nulls: int = 0
+    minimum: object = None
+    maximum: object = None
+    total: float = 0.0
+    total_squares: float = 0.0
+    distinct: set = dataclasses.field(default_factory=set)
+    distinct_overflow: bool = False
+
+    def add_numbers(self, values, valid):
+        self.count += values.size
+        self.nulls += int(values.size - np.count_nonzero(valid))
+        values = values if valid.all() else values[valid]
+        if values.size:
+            low, high = values.min(), values.max()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+            values = values.astype(np.float64, copy=False)
+            self.total += float(values.sum())
+            self.total_squares += float(np.dot(values, values))
+
+    def add_values(self, count, nulls, uniques):
+        self.count += count
+        self.nulls += nulls
+        if len(uniques):
+            low, high = min(uniques), max(uniques)
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+        if not self.distinct_overflow:
+            self.distinct.update(uniques)
+            if len(self.distinct) > MAX_DISTINCT:
+                self.distinct_overflow = True
+
+    def summary(self):
+        summary = {"count": self.count, "nulls": self.nulls}
+        if self.minimum is not None:
+            summary["min"] = _plain(self.minimum)
+            summary["max"] = _plain(self.maximum)
+        valid = self.count - self.nulls
+        if self.total_squares and valid:
+            mean = self.total / valid
+            summary["mean"] = mean
+            summary["std"] = max(self.total_squares / valid - mean * mean, 0.0) ** 0.5
+        if self.distinct:
+            key = "distinct_at_least" if self.distinct_overflow else "distinct"
+            summary[key] = len(self.distinct)
+        return summary
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _is_string(arrow_type):
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+_COMPATIBLE = {
+    "FLOAT": lambda t: pa.types.is_floating(t) or pa.types.is_integer(t),
+    "INTEGER": pa.types.is_integer,
+    "STRING": _is_string,
+    "DATE": lambda t: pa.types.is_date(t) or pa.types.is_timestamp(t) or _is_string(t),
+    "TIMESTAMP": lambda t: pa.types.is_timestamp(t) or _is_string(t),
+}
+_PARSE_AS = {"DATE": pa.date32(), "TIMESTAMP": pa.timestamp("us")}
+
+
+def _uniques(column):
+    """
+    Distinct non-null values of a string column, without decoding dictionaries.
+    """
+    uniques = pc.unique(column)
+    if pa.types.is_dictionary(uniques.type):
+        uniques = uniques.dictionary.take(uniques.indices)
+    return uniques.drop_null()
+
+
+class MarketDataValidator:
+    """
+    Validates and profiles a stream of daily_prices record batches.
+
+    Args:
+        fields: ``(name, BigQuery type, mode)`` tuples; the daily_prices schema
+            by default.
+        fail_fast: Raise ``ValidationError`` on the first bad batch. Otherwise
+            problems are collected in ``problems``.
+    """
+
+    def __init__(self, fields=SCHEMA_FIELDS, fail_fast=True):
+        self.fields = list(fields)
+        self.fail_fast = fail_fast
+        self.rows = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.problems = []
+        self.columns = {name: ColumnProfile() for name, _, _ in self.fields}
+
+    def validate(self, batch):
+        """
+        Check one record batch (or table) and add it to the profile.
+
+        Returns:
+            The problems found in this batch.
+
+        Raises:
+            ValidationError: If ``fail_fast`` and the batch has problems.
+        """
+        start = time.perf_counter()
+        problems = []
+        offset = self.rows
+        numbers = {}
+        for name, field_type, mode in self.fields:
+            if name not in batch.schema.names:
+                problems.append(f"missing column '{name}'")
+                continue
+            column = batch.column(name)
+            if isinstance(column, pa.ChunkedArray):
+                column = column.combine_chunks()
+            if not (pa.types.is_null(column.type) or _COMPATIBLE[field_type](column.type)):
+                problems.append(f"column '{name}' has type {column.type}, expected {field_type}")
+                continue
+            profile = self.columns[name]
+            if pa.types.is_null(column.type):
+                # An all-null column (e.g. from pandas) fits any NULLABLE type.
+                profile.add_values(len(column), len(column), [])
+                missing = np.ones(len(column), bool)
+            elif field_type in ("FLOAT", "INTEGER"):
+                values = column.to_numpy(zero_copy_only=False)
+                valid = ~np.isnan(values) if values.dtype.kind == "f" else np.ones(values.size, bool)
+                profile.add_numbers(values, valid)
+                numbers[name] = values
+                missing = ~valid
+            else:
+                uniques = _uniques(column)
+                if field_type in _PARSE_AS and _is_string(column.type):
+                    try:
+                        pc.cast(uniques, _PARSE_AS[field_type])
+                    except pa.ArrowInvalid as e:
+                        problems.append(f"column '{name}' has unparseable {field_type} values: {e}")
+                profile.add_values(len(column), column.null_count, uniques.to_pylist())
+                missing = column.is_null().to_numpy(zero_copy_only=False)
+            if mode == "REQUIRED" and missing.any():
+                problems.append(self._rows(f"REQUIRED column '{name}' is null", missing, offset))
+
+        if {"open_price", "high_price", "low_price", "close_price"} <= numbers.keys():
+            open_, high, low, close = (
+                numbers[c] for c in ("open_price", "high_price", "low_price", "close_price")
+            )
+            body_high = np.maximum(open_, close)
+            body_low = np.minimum(open_, close)
+            for message, bad in (
+                ("high_price < max(open_price, close_price)", high < body_high),
+                ("low_price > min(open_price, close_price)", low > body_low),
+                ("low_price <= 0", low <= 0),
+            ):
+                if bad.any():
+                    problems.append(self._rows(message, bad, offset))
+        for name in ("volume", "dividend_yield"):
+            if name in numbers and (numbers[name] < 0).any():
+                problems.append(self._rows(f"{name} < 0", numbers[name] < 0, offset))
+
+        self.rows += batch.num_rows
+        self.batches += 1
+        self.seconds += time.perf_counter() - start
+        self.problems.extend(problems)
+        if problems and self.fail_fast:
+            raise ValidationError(problems)
+        return problems
+
+    @staticmethod
+    def _rows(message, mask, offset):
+        rows = np.flatnonzero(mask)
+        examples = ", ".join(str(offset + i) for i in rows[:MAX_EXAMPLES])
+        return f"{message} in {rows.size} rows (e.g. rows {examples})"
+
+    def validated(self, batches):
+        """
+        Pass ``batches`` through, validating each before it is yielded.
+        """
+        for batch in batches:
+            self.validate(batch)
+            yield batch
+
+    def profile(self):
+        """
+        Column statistics accumulated so far.
+        """
+        return {
+            "rows": self.rows,
+            "batches": self.batches,
+            "rows_per_second": self.rows / self.seconds if self.seconds else None,
+            "columns": {name: p.summary() for name, p in self.columns.items()},
+        }
+
+
+def validate_frame(df, fail_fast=True):
+    """
+    Validate and profile a pandas DataFrame in the daily_prices layout.
+    """
+    validator = MarketDataValidator(fail_fast=fail_fast)
+    validator.validate(pa.Table.from_pandas(df, preserve_index=False))
+    return validator
+
+
+def validate_csv(csv_filename, block_size=16 << 20, fail_fast=True):
+    """
+    Stream a CSV through the validator in blocks of ``block_size`` bytes.
+    """
+    validator = MarketDataValidator(fail_fast=fail_fast)
+    reader = pa_csv.open_csv(
+        csv_filename,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in ("date", "created_at")}
+        ),
+    )
+    for batch in reader:
+        validator.validate(batch)
+    return validator
+
+
+def print_profile(validator):
+    profile = validator.profile()
+    rate = profile["rows_per_second"]
+    print(f"🔎 Validated {profile['rows']:,} rows in {profile['batches']} batches"
+          + (f" ({rate / 1e6:.1f}M rows/s)" if rate else ""))
+    for name, stats in profile["columns"].items():
+        details = ", ".join(
+            f"{key}={value:,.4g}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in stats.items()
+        )
+        print(f"   - {name}: {details}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Usage: python validation.py <csv> [<csv> ...]")
+        return 2
+    status = 0
+    for csv_filename in argv:
+        validator = validate_csv(csv_filename, fail_fast=False)
+        print_profile(validator)
+        for problem in validator.problems:
+            print(f"❌ {problem}")
+        status = status or int(bool(validator.problems))
+    return status
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -11,6 +11,7 @@ from vertexai.preview.reasoning_engines import AdkApp
 import os
 # IMPORT the agent
 from teaching_assistant_agent.agent import root_agent
+from shared_libraries.instrumentation import instrumentation_plugins
 
 # init vertexai
 
@@ -23,7 +24,9 @@ vertexai.init(
 
 # Create Agent Engine APP
 
+# ADK_INSTRUMENTATION=1 at deploy time ships the timing plugin with the app.
 adk_app = AdkApp(agent=root_agent,
+                  plugins=instrumentation_plugins(),
                   enable_tracing=True
                 )
 
@@ -14,4 +14,12 @@
 
 """Financial coordinator: provide reasonable investment strategies"""
 
-from . import agent
+import importlib
+
+
+def __getattr__(name):
+    # ``agent`` loads on first access rather than with the package, so the
+    # process pool workers that only import ``tools`` never build the agent.
+    if name == "agent":
+        return importlib.import_module(f"{__name__}.agent")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -16,9 +16,16 @@ from dotenv import load_dotenv
 load_dotenv()
 """Financial coordinator: provide reasonable investment strategies"""
 
-from google.adk.agents import LlmAgent
+from google.adk.apps import App
 from google.adk.tools.agent_tool import AgentTool
 
+from shared_libraries.compaction import HistoryCompactor
+from shared_libraries.instrumentation import instrumentation_plugins
+from shared_libraries.model_router import route_after_model, route_before_model
+from shared_libraries.rate_limiter import schedule_models
+from shared_libraries.replay import replay_agent
+from shared_libraries.sub_agent_streaming import StreamingCoordinator
+
 from . import prompt
 from .sub_agents.data_analyst import data_analyst_agent
 from .sub_agents.execution_analyst import execution_analyst_agent
@@ -26,9 +33,26 @@ from .sub_agents.risk_analyst import risk_analyst_agent
 from .sub_agents.trading_analyst import trading_analyst_agent
 
 MODEL = "gemini-2.5-flash"
+# Upper bound (estimated tokens) for the history sent on each coordinator turn.
+COORDINATOR_TOKEN_BUDGET = 8000
 
+# Older sub-agent reports are replaced by summaries pointing at their state
+# keys; the sub-agents read the full reports from state themselves.
+compact_history = HistoryCompactor(
+    output_keys={
+        agent.name: agent.output_key
+        for agent in (
+            data_analyst_agent,
+            trading_analyst_agent,
+            execution_analyst_agent,
+            risk_analyst_agent,
+        )
+    },
+    token_budget=COORDINATOR_TOKEN_BUDGET,
+)
 
-financial_coordinator_agent = LlmAgent(
+# On streaming runs the sub-agents' reports reach the client as they are written.
+financial_coordinator_agent = StreamingCoordinator(
     name="financial_coordinator",
     model=MODEL,
     description=(
@@ -39,6 +63,9 @@ financial_coordinator_agent = LlmAgent(
     ),
     instruction=prompt.FINANCIAL_COORDINATOR_PROMPT,
     output_key="financial_coordinator_output",
+    # Compact first, then pick the model tier for the (smaller) request.
+    before_model_callback=[compact_history, route_before_model],
+    after_model_callback=route_after_model,
     tools=[
         AgentTool(agent=data_analyst_agent),
         AgentTool(agent=trading_analyst_agent),
@@ -46,4 +73,8 @@ financial_coordinator_agent = LlmAgent(
         AgentTool(agent=risk_analyst_agent),
     ],
 )
-root_agent = financial_coordinator_agent
+# Coordinator and sub-agent calls share the process-wide quota scheduler;
+# REPLAY_MODE serves recorded model and tool calls in tests.
+root_agent = replay_agent(schedule_models(financial_coordinator_agent))
+# `adk web` / `adk run` serve the App; ADK_INSTRUMENTATION=1 adds the timing plugin.
+app = App(name="financial_advisor_agent", root_agent=root_agent, plugins=instrumentation_plugins())
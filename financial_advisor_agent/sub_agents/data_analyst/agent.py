@@ -17,6 +17,12 @@
 from google.adk import Agent
 from google.adk.tools import google_search
 
+from shared_libraries.search_cache import (
+    cache_search_after_model,
+    cache_search_before_model,
+)
+from shared_libraries.model_router import route_after_model, route_before_model
+
 from . import prompt
 
 MODEL = "gemini-2.5-flash"
@@ -27,4 +33,6 @@ data_analyst_agent = Agent(
     instruction=prompt.DATA_ANALYST_PROMPT,
     output_key="market_data_analysis_output",
     tools=[google_search],
+    before_model_callback=[cache_search_before_model, route_before_model],
+    after_model_callback=[route_after_model, cache_search_after_model],
 )
@@ -16,7 +16,12 @@
 
 from google.adk import Agent
 
+from shared_libraries.compaction import include_state_inputs
+from shared_libraries.model_router import route_after_model, route_before_model
+from shared_libraries.tabular_encoding import compact_tool_result
+
 from . import prompt
+from ...tools.execution_cost import estimate_execution_costs
 
 MODEL = "gemini-2.5-flash"
 
@@ -24,5 +29,12 @@ execution_analyst_agent = Agent(
     model=MODEL,
     name="execution_analyst_agent",
     instruction=prompt.EXECUTION_ANALYST_PROMPT,
+    tools=[estimate_execution_costs],
     output_key="execution_plan_output",
+    before_model_callback=[
+        include_state_inputs("proposed_trading_strategies_output"),
+        route_before_model,
+    ],
+    after_model_callback=route_after_model,
+    after_tool_callback=compact_tool_result,
 )
@@ -36,6 +36,12 @@ and sensitivity to short-term market noise versus longer-term trends.
 user_execution_preferences: (User-defined, e.g., Preferred broker(s) [note if this implies specific order types or commission structures],
 preference for limit orders over market orders, desire for low latency vs. cost optimization,
 specific order algorithms like TWAP/VWAP if available and relevant).
+Execution Cost Data:
+Before recommending order types, sizing or TWAP/VWAP usage for a ticker, call estimate_execution_costs with the order
+sizes under consideration (several sizes can be compared in one call). Base liquidity statements (ADV, % of ADV, spread)
+and cost comparisons between immediate execution and TWAP/VWAP schedules on its output, quote the figures in basis points,
+and keep the discussion of costs brief rather than speculating about them.
+
 Requested Output: Detailed Execution Strategy Analysis
 
 Provide a comprehensive analysis structured as follows. For each section, deliver detailed reasoning,
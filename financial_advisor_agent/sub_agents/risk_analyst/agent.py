@@ -16,7 +16,13 @@
 
 from google.adk import Agent
 
+from shared_libraries.compaction import include_state_inputs
+from shared_libraries.model_router import route_after_model, route_before_model
+from shared_libraries.tabular_encoding import compact_tool_result
+
 from . import prompt
+from ...tools.monte_carlo import simulate_portfolio_risk
+from ...tools.quant_tools import RISK_TOOLS
 
 MODEL="gemini-2.5-flash"
 
@@ -24,5 +30,15 @@ risk_analyst_agent = Agent(
     model=MODEL,
     name="risk_analyst_agent",
     instruction=prompt.RISK_ANALYST_PROMPT,
+    tools=[*RISK_TOOLS, simulate_portfolio_risk],
     output_key="final_risk_assessment_output",
+    before_model_callback=[
+        include_state_inputs(
+            "proposed_trading_strategies_output",
+            "execution_plan_output",
+        ),
+        route_before_model,
+    ],
+    after_model_callback=route_after_model,
+    after_tool_callback=compact_tool_result,
 )
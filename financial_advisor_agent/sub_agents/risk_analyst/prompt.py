@@ -36,6 +36,15 @@ Long-term (months to years)). This impacts timeframe relevance, review frequency
 user_execution_preferences: User-defined preferences regarding execution (e.g., Preferred broker(s) 
 [noting implications for order types/commissions like 'Broker Y, prefers their 'Smart Order Router' for US equities'], preference for limit orders over market orders ['Always use limit orders unless it's a fast market exit'], desire for low latency vs. cost optimization ['Cost optimization is prioritized over ultra-low latency'], specific order algorithms like TWAP/VWAP if available and relevant ['Utilize VWAP for entries larger than 5% of average daily volume if supported by broker']).
 
+* Quantitative Tools:
+Base every numeric risk figure on tool output rather than free-text estimates. For each ticker in the plan, call
+get_risk_metrics (historical and parametric VaR, CVaR, rolling volatility range, maximum drawdown),
+get_return_statistics (return, volatility, Sharpe ratio) and, when the user's capital is known, get_position_size
+(ATR-based stop distance, fixed-fractional and scaled-Kelly position sizes). For drawdown thresholds, gap risk and
+horizon VaR of the proposed portfolio, call simulate_portfolio_risk over the user's investment period (e.g. 21 trading
+days per month) and report the probability of breaching the drawdown the user can tolerate. If a tool returns status
+"error", say that the figure is unavailable instead of guessing it.
+
 * Requested Output Structure: Comprehensive Risk Analysis Report
 
 The analysis must cover, but is not limited to, the following sections. Ensure each section directly references and integrates 
@@ -16,7 +16,13 @@
 
 from google.adk import Agent
 
+from shared_libraries.compaction import include_state_inputs
+from shared_libraries.model_router import route_after_model, route_before_model
+from shared_libraries.tabular_encoding import compact_tool_result
+
 from . import prompt
+from ...tools.backtest import BACKTEST_TOOLS
+from ...tools.quant_tools import TRADING_TOOLS
 
 MODEL="gemini-2.5-flash"
 
@@ -24,5 +30,12 @@ trading_analyst_agent = Agent(
     model=MODEL,
     name="trading_analyst_agent",
     instruction=prompt.TRADING_ANALYST_PROMPT,
+    tools=[*TRADING_TOOLS, *BACKTEST_TOOLS],
     output_key="proposed_trading_strategies_output",
+    before_model_callback=[
+        include_state_inputs("market_data_analysis_output"),
+        route_before_model,
+    ],
+    after_model_callback=route_after_model,
+    after_tool_callback=compact_tool_result,
 )
@@ -67,6 +67,15 @@ higher potential reward scenarios (with commensurate risk).
 ** Scenario Diversity: Aim to cover a range of potential market outlooks if supported by the analysis 
 (e.g., strategies for bullish, bearish, or neutral/range-bound conditions).
 
+* Quantitative Tools:
+Do not estimate returns, volatility, drawdowns or indicator values by hand. For every ticker a strategy relies on, call
+get_return_statistics (annualized return and volatility, Sharpe ratio, maximum drawdown) and get_technical_indicators
+(ATR, RSI, Bollinger Bands) and quote the numbers they return. If a tool returns status "error", say that the figure is
+unavailable instead of guessing it.
+Where a strategy maps onto a rule the backtester supports (sma_crossover, breakout, mean_reversion, dca), call
+backtest_strategy to report its historical performance against buy-and-hold after costs, and use
+optimize_strategy_parameters to pick its parameters rather than proposing them from intuition.
+
 * Expected Output (from trading_analyst):
 
 ** Content: A collection containing five or more detailed potential trading strategies.
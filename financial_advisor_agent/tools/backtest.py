@@ -0,0 +1,466 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Vectorized backtesting across every symbol of a ``PricePanel`` at once.
+
+A strategy turns indicator arrays shaped (dates, symbols) into target
+positions in [0, 1], decided at each close. The engine holds the position
+from the next bar, charges commission plus slippage on every change of
+position, and reports per-symbol and equal-weight portfolio statistics. No
+Python loop runs over dates or symbols.
+
+``parameter_sweep`` evaluates the cartesian product of a parameter grid,
+in chunks spread over a process pool. Each worker receives the price arrays
+once and caches the rolling indicators that its combinations share.
+
+``backtest_strategy`` and ``optimize_strategy_parameters`` at the bottom are
+the function tools given to the trading analyst.
+"""
+
+import concurrent.futures
+import dataclasses
+import itertools
+import math
+import os
+from collections.abc import Callable, Mapping, Sequence
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import quant
+from .price_data import PricePanel, UnknownSymbolError, load_price_panel
+from .worker_pool import pool_context
+
+# Below this many combinations a sweep runs in-process; pool start-up costs more.
+MIN_PARALLEL_COMBINATIONS = 200
+MAX_SWEEP_COMBINATIONS = 5000
+
+
+class _Indicators:
+    """Rolling statistics over a close-price panel, computed once per window."""
+
+    def __init__(self, close: np.ndarray):
+        self.close = close
+        self._frame = pd.DataFrame(close)
+        self._cache: dict[tuple[str, int], np.ndarray] = {}
+
+    def _cached(self, name: str, window: int, compute) -> np.ndarray:
+        key = (name, window)
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def sma(self, window: int) -> np.ndarray:
+        return self._cached(
+            "sma", window, lambda: self._frame.rolling(window).mean().to_numpy()
+        )
+
+    def std(self, window: int) -> np.ndarray:
+        return self._cached(
+            "std", window, lambda: self._frame.rolling(window).std(ddof=0).to_numpy()
+        )
+
+    def prior_high(self, window: int) -> np.ndarray:
+        """Highest close of the ``window`` bars before each bar."""
+        return self._cached(
+            "prior_high",
+            window,
+            lambda: self._frame.rolling(window).max().shift(1).to_numpy(),
+        )
+
+    def prior_low(self, window: int) -> np.ndarray:
+        return self._cached(
+            "prior_low",
+            window,
+            lambda: self._frame.rolling(window).min().shift(1).to_numpy(),
+        )
+
+
+def _hold_between(entries: np.ndarray, exits: np.ndarray) -> np.ndarray:
+    """Long from each entry signal until the next exit signal (exits win ties)."""
+    state = np.where(exits, 0.0, np.where(entries, 1.0, np.nan))
+    return pd.DataFrame(state).ffill().fillna(0.0).to_numpy()
+
+
+def _buy_and_hold(ind: _Indicators) -> np.ndarray:
+    return np.ones_like(ind.close)
+
+
+def _sma_crossover(ind: _Indicators, fast_window: int = 20, slow_window: int = 50):
+    with np.errstate(invalid="ignore"):
+        return (ind.sma(fast_window) > ind.sma(slow_window)).astype(float)
+
+
+def _breakout(ind: _Indicators, entry_window: int = 20, exit_window: int = 10):
+    with np.errstate(invalid="ignore"):
+        entries = ind.close > ind.prior_high(entry_window)
+        exits = ind.close < ind.prior_low(exit_window)
+    return _hold_between(entries, exits)
+
+
+def _mean_reversion(
+    ind: _Indicators, window: int = 20, entry_z: float = 2.0, exit_z: float = 0.5
+):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (ind.close - ind.sma(window)) / ind.std(window)
+        entries = z < -entry_z
+        exits = z > -exit_z
+    return _hold_between(entries, exits)
+
+
+def _dca(ind: _Indicators, interval: int = 21, installments: int = 6):
+    """Dollar-cost averaging: add 1/installments every ``interval`` bars."""
+    bars = np.arange(ind.close.shape[0])[:, None]
+    filled = np.minimum(bars // interval + 1, installments) / installments
+    return np.broadcast_to(filled, ind.close.shape).astype(float)
+
+
+@dataclasses.dataclass(frozen=True)
+class Strategy:
+    rule: Callable[..., np.ndarray]
+    defaults: Mapping[str, float]
+    description: str
+
+    def parameters(self, overrides: Optional[Mapping[str, Any]]) -> dict[str, Any]:
+        params = dict(self.defaults)
+        for name, value in (overrides or {}).items():
+            if name not in params:
+                raise ValueError(
+                    f"Unknown parameter '{name}'; expected one of {sorted(params)}"
+                )
+            params[name] = type(self.defaults[name])(value)
+        return params
+
+
+STRATEGIES = {
+    "buy_and_hold": Strategy(_buy_and_hold, {}, "Always fully invested."),
+    "sma_crossover": Strategy(
+        _sma_crossover,
+        {"fast_window": 20, "slow_window": 50},
+        "Long while the fast moving average is above the slow one.",
+    ),
+    "breakout": Strategy(
+        _breakout,
+        {"entry_window": 20, "exit_window": 10},
+        "Enter above the prior entry_window-bar high, exit below the prior "
+        "exit_window-bar low.",
+    ),
+    "mean_reversion": Strategy(
+        _mean_reversion,
+        {"window": 20, "entry_z": 2.0, "exit_z": 0.5},
+        "Enter when the close is entry_z standard deviations below its moving "
+        "average, exit once it recovers above -exit_z.",
+    ),
+    "dca": Strategy(
+        _dca,
+        {"interval": 21, "installments": 6},
+        "Invest 1/installments of the allocation every interval bars.",
+    ),
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class Costs:
+    commission_bps: float = 1.0
+    slippage_bps: float = 5.0
+
+    @property
+    def rate(self) -> float:
+        return (self.commission_bps + self.slippage_bps) / 10_000
+
+
+@dataclasses.dataclass
+class BacktestResult:
+    """Daily net returns per symbol and for the equal-weight portfolio."""
+
+    symbols: tuple[str, ...]
+    symbol_returns: np.ndarray
+    portfolio_returns: np.ndarray
+    exposure: np.ndarray
+    trades: np.ndarray
+    costs_paid: np.ndarray
+
+    def portfolio_stats(self) -> dict[str, float]:
+        stats = _return_stats(self.portfolio_returns)
+        stats.update(
+            exposure=float(self.exposure.mean()),
+            trades=int(self.trades.sum()),
+            costs_paid=float(self.costs_paid.mean()),
+        )
+        return stats
+
+    def symbol_stats(self) -> dict[str, dict[str, float]]:
+        equity = np.cumprod(1.0 + self.symbol_returns, axis=0)
+        peaks = np.maximum.accumulate(equity, axis=0)
+        drawdowns = (1.0 - equity / peaks).max(axis=0)
+        return {
+            symbol: {
+                "total_return": float(equity[-1, i] - 1.0),
+                "max_drawdown": float(drawdowns[i]),
+                "exposure": float(self.exposure[i]),
+                "trades": int(self.trades[i]),
+            }
+            for i, symbol in enumerate(self.symbols)
+        }
+
+
+def _return_stats(returns: np.ndarray) -> dict[str, float]:
+    annual_return = quant.annualized_return(returns)
+    annual_volatility = quant.annualized_volatility(returns)
+    equity = np.cumprod(1.0 + returns)
+    return {
+        "total_return": float(equity[-1] - 1.0) if equity.size else 0.0,
+        "annualized_return": annual_return,
+        "annualized_volatility": annual_volatility,
+        "sharpe_ratio": annual_return / annual_volatility if annual_volatility else 0.0,
+        "max_drawdown": quant.max_drawdown(equity).max_drawdown,
+    }
+
+
+def _simulate(
+    close: np.ndarray, returns: np.ndarray, target: np.ndarray, cost_rate: float
+) -> tuple[np.ndarray, ...]:
+    target = np.where(np.isnan(close), 0.0, target)
+    held = np.vstack([np.zeros((1, target.shape[1])), target[:-1]])
+    traded = np.abs(target - held)
+    net = held * returns - cost_rate * traded
+    return net, held, traded
+
+
+def _returns(close: np.ndarray) -> np.ndarray:
+    previous = np.vstack([close[:1], close[:-1]])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = close / previous - 1.0
+    return np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def run_backtest(
+    panel: PricePanel,
+    strategy: str,
+    parameters: Optional[Mapping[str, Any]] = None,
+    costs: Costs = Costs(),
+) -> BacktestResult:
+    """Backtests ``strategy`` on every symbol of ``panel``."""
+    spec = _strategy(strategy)
+    indicators = _Indicators(panel.close)
+    target = spec.rule(indicators, **spec.parameters(parameters))
+    net, held, traded = _simulate(panel.close, _returns(panel.close), target, costs.rate)
+    return BacktestResult(
+        symbols=panel.symbols,
+        symbol_returns=net,
+        portfolio_returns=net.mean(axis=1),
+        exposure=held.mean(axis=0),
+        trades=(traded > 0).sum(axis=0),
+        costs_paid=costs.rate * traded.sum(axis=0),
+    )
+
+
+def _strategy(name: str) -> Strategy:
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{name}'; expected one of {sorted(STRATEGIES)}")
+    return STRATEGIES[name]
+
+
+# Worker-side state for parameter sweeps.
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(close: np.ndarray, cost_rate: float) -> None:
+    _worker.update(
+        close=close,
+        returns=_returns(close),
+        indicators=_Indicators(close),
+        cost_rate=cost_rate,
+    )
+
+
+def _evaluate(strategy: str, combos: Sequence[dict[str, Any]]) -> list[dict[str, float]]:
+    spec = STRATEGIES[strategy]
+    results = []
+    for params in combos:
+        target = spec.rule(_worker["indicators"], **params)
+        net, held, traded = _simulate(
+            _worker["close"], _worker["returns"], target, _worker["cost_rate"]
+        )
+        stats = _return_stats(net.mean(axis=1))
+        stats.update(exposure=float(held.mean()), trades=int((traded > 0).sum()))
+        results.append(stats)
+    return results
+
+
+def expand_grid(strategy: str, grid: Mapping[str, Sequence[Any]]) -> list[dict[str, Any]]:
+    """Cartesian product of ``grid`` merged over the strategy defaults."""
+    spec = _strategy(strategy)
+    names = list(grid)
+    return [
+        spec.parameters(dict(zip(names, values)))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+def parameter_sweep(
+    panel: PricePanel,
+    strategy: str,
+    grid: Mapping[str, Sequence[Any]],
+    costs: Costs = Costs(),
+    workers: Optional[int] = None,
+) -> list[tuple[dict[str, Any], dict[str, float]]]:
+    """Portfolio stats for every combination of ``grid``, in grid order.
+
+    Args:
+        panel: Prices to test on.
+        strategy: Key of ``STRATEGIES``.
+        grid: Parameter name -> candidate values.
+        costs: Commission and slippage charged per unit of turnover.
+        workers: Process count. Defaults to the CPU count; 1 runs in-process.
+    """
+    combos = expand_grid(strategy, grid)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(combos) < MIN_PARALLEL_COMBINATIONS:
+        _init_worker(panel.close, costs.rate)
+        try:
+            return list(zip(combos, _evaluate(strategy, combos)))
+        finally:
+            _worker.clear()
+
+    # A few chunks per worker keeps the pool busy when combinations differ
+    # in cost, while still reusing each worker's indicator cache.
+    chunk_size = max(1, math.ceil(len(combos) / (workers * 4)))
+    chunks = [combos[i : i + chunk_size] for i in range(0, len(combos), chunk_size)]
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=pool_context(),
+        initializer=_init_worker,
+        initargs=(panel.close, costs.rate),
+    ) as pool:
+        results = pool.map(_evaluate, itertools.repeat(strategy), chunks)
+        return list(zip(combos, itertools.chain.from_iterable(results)))
+
+
+def _round_stats(stats: Mapping[str, float]) -> dict[str, float]:
+    return {
+        key: value if isinstance(value, int) else round(float(value), 4)
+        for key, value in stats.items()
+    }
+
+
+def backtest_strategy(
+    strategy: str,
+    symbols: Optional[list[str]] = None,
+    parameters: Optional[dict[str, float]] = None,
+    commission_bps: float = 1.0,
+    slippage_bps: float = 5.0,
+) -> dict[str, Any]:
+    """Backtests a trading strategy on daily_prices history.
+
+    Strategies: "buy_and_hold"; "sma_crossover" (fast_window, slow_window);
+    "breakout" (entry_window, exit_window); "mean_reversion" (window,
+    entry_z, exit_z); "dca" (interval, installments).
+
+    Args:
+        strategy: Strategy name from the list above.
+        symbols: Tickers to trade; all 30 symbols when omitted.
+        parameters: Strategy parameters overriding the defaults.
+        commission_bps: Commission per trade, in basis points of notional.
+        slippage_bps: Slippage per trade, in basis points of notional.
+
+    Returns:
+        Equal-weight portfolio statistics (total and annualized return,
+        volatility, Sharpe ratio, max drawdown, exposure, trades), the same
+        for buy-and-hold as a benchmark, and the best and worst symbols.
+    """
+    try:
+        panel = load_price_panel(symbols)
+        costs = Costs(commission_bps, slippage_bps)
+        result = run_backtest(panel, strategy, parameters, costs)
+        benchmark = run_backtest(panel, "buy_and_hold", costs=costs)
+    except (UnknownSymbolError, ValueError) as e:
+        return {"status": "error", "error_message": str(e)}
+    by_return = sorted(
+        result.symbol_stats().items(), key=lambda item: item[1]["total_return"]
+    )
+    return {
+        "status": "success",
+        "strategy": strategy,
+        "parameters": _strategy(strategy).parameters(parameters),
+        "symbols": len(panel.symbols),
+        "bars": len(panel.dates),
+        "portfolio": _round_stats(result.portfolio_stats()),
+        "buy_and_hold": _round_stats(benchmark.portfolio_stats()),
+        "best_symbols": {s: _round_stats(v) for s, v in reversed(by_return[-3:])},
+        "worst_symbols": {s: _round_stats(v) for s, v in by_return[:3]},
+    }
+
+
+def optimize_strategy_parameters(
+    strategy: str,
+    grid: dict[str, list[float]],
+    symbols: Optional[list[str]] = None,
+    rank_by: str = "sharpe_ratio",
+    top_n: int = 5,
+    commission_bps: float = 1.0,
+    slippage_bps: float = 5.0,
+) -> dict[str, Any]:
+    """Sweeps a strategy's parameter grid and returns the best combinations.
+
+    Args:
+        strategy: "sma_crossover", "breakout", "mean_reversion" or "dca".
+        grid: Parameter name -> list of candidate values, e.g.
+            {"fast_window": [5, 10, 20], "slow_window": [50, 100, 200]}.
+        symbols: Tickers to trade; all 30 symbols when omitted.
+        rank_by: "sharpe_ratio", "total_return", "annualized_return" or
+            "max_drawdown" (ranked ascending).
+        top_n: Number of combinations to return.
+        commission_bps: Commission per trade, in basis points of notional.
+        slippage_bps: Slippage per trade, in basis points of notional.
+
+    Returns:
+        The number of combinations tested and the top_n parameter sets with
+        their portfolio statistics.
+    """
+    if rank_by not in ("sharpe_ratio", "total_return", "annualized_return", "max_drawdown"):
+        return {"status": "error", "error_message": f"Cannot rank by '{rank_by}'"}
+    combinations = math.prod(len(values) for values in grid.values())
+    if combinations > MAX_SWEEP_COMBINATIONS:
+        return {
+            "status": "error",
+            "error_message": (
+                f"Grid has {combinations} combinations; the limit is "
+                f"{MAX_SWEEP_COMBINATIONS}"
+            ),
+        }
+    try:
+        panel = load_price_panel(symbols)
+        results = parameter_sweep(
+            panel, strategy, grid, Costs(commission_bps, slippage_bps)
+        )
+    except (UnknownSymbolError, ValueError) as e:
+        return {"status": "error", "error_message": str(e)}
+    results.sort(
+        key=lambda item: item[1][rank_by], reverse=rank_by != "max_drawdown"
+    )
+    return {
+        "status": "success",
+        "strategy": strategy,
+        "combinations_tested": len(results),
+        "ranked_by": rank_by,
+        "top": [
+            {"parameters": params, **_round_stats(stats)}
+            for params, stats in results[:top_n]
+        ],
+    }
+
+
+BACKTEST_TOOLS = [backtest_strategy, optimize_strategy_parameters]
@@ -0,0 +1,246 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Execution cost model for the execution analyst.
+
+Everything is estimated from the daily OHLCV columns of ``daily_prices``:
+
+* liquidity: average daily volume (ADV) and dollar volume over a window;
+* spread: the Corwin-Schultz high/low estimator, averaged over the window;
+* market impact: the square-root model,
+  ``impact = impact_coefficient * daily_volatility * sqrt(shares / volume)``;
+* schedules: TWAP (equal shares per day) and VWAP (shares in proportion to
+  each day's volume) are replayed from every historical start date. Each
+  day fills at the typical price ``(high + low + close) / 3`` plus that
+  day's impact. The result is a distribution of implementation shortfall
+  against the arrival price.
+
+All of it is computed for many order sizes at once, with arrays shaped
+(order sizes, start dates, days).
+"""
+
+import math
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from . import quant
+from .price_data import UnknownSymbolError, load_price_history
+
+# Square-root impact coefficient; empirical estimates cluster around 0.5-1.
+DEFAULT_IMPACT_COEFFICIENT = 0.8
+BPS = 10_000
+
+
+class Liquidity(NamedTuple):
+    adv_shares: float
+    adv_dollars: float
+    daily_volatility: float
+    spread: float
+
+
+def corwin_schultz_spread(high, low) -> np.ndarray:
+    """Bid-ask spread estimates (fractions of price) from consecutive bars.
+
+    Corwin & Schultz (2012), with negative estimates set to zero. Element
+    ``i`` uses bars ``i`` and ``i + 1``.
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    log_range = np.log(high / low) ** 2
+    beta = log_range[:-1] + log_range[1:]
+    gamma = np.log(np.maximum(high[:-1], high[1:]) / np.minimum(low[:-1], low[1:])) ** 2
+    denominator = 3.0 - 2.0 * math.sqrt(2.0)
+    alpha = (np.sqrt(2.0 * beta) - np.sqrt(beta)) / denominator - np.sqrt(
+        gamma / denominator
+    )
+    spread = 2.0 * (np.exp(alpha) - 1.0) / (1.0 + np.exp(alpha))
+    return np.maximum(spread, 0.0)
+
+
+def liquidity_profile(high, low, close, volume, window: int = 20) -> Liquidity:
+    """Liquidity and volatility over the last ``window`` bars."""
+    close = np.asarray(close, dtype=float)[-window - 1 :]
+    volume = np.asarray(volume, dtype=float)[-window:]
+    high = np.asarray(high, dtype=float)[-window:]
+    low = np.asarray(low, dtype=float)[-window:]
+    returns = quant.simple_returns(close)
+    return Liquidity(
+        adv_shares=float(volume.mean()),
+        adv_dollars=float((volume * close[1:]).mean()),
+        daily_volatility=float(returns.std(ddof=1)),
+        spread=float(corwin_schultz_spread(high, low).mean()),
+    )
+
+
+def square_root_impact(
+    shares, volume, daily_volatility, coefficient: float = DEFAULT_IMPACT_COEFFICIENT
+) -> np.ndarray:
+    """Expected impact (fraction of price) of trading ``shares`` against ``volume``."""
+    participation = np.asarray(shares, dtype=float) / np.asarray(volume, dtype=float)
+    return coefficient * np.asarray(daily_volatility) * np.sqrt(participation)
+
+
+class ScheduleCosts(NamedTuple):
+    """Implementation shortfall (fractions of arrival notional), sizes x starts."""
+
+    shortfall: np.ndarray
+    impact: np.ndarray
+    max_participation: np.ndarray
+
+
+def simulate_schedule(
+    order_sizes,
+    high,
+    low,
+    close,
+    volume,
+    days: int,
+    schedule: str = "twap",
+    side: str = "buy",
+    volatility_window: int = 20,
+    coefficient: float = DEFAULT_IMPACT_COEFFICIENT,
+) -> ScheduleCosts:
+    """Replays a multi-day schedule from every historical start date.
+
+    The order arrives at the close before the first execution day. Day ``d``
+    of the schedule fills ``shares[d]`` at the typical price, plus
+    square-root impact against that day's volume, using the volatility
+    known at arrival.
+    """
+    if schedule not in ("twap", "vwap"):
+        raise ValueError(f"Unknown schedule '{schedule}'; expected 'twap' or 'vwap'")
+    if side not in ("buy", "sell"):
+        raise ValueError(f"Unknown side '{side}'; expected 'buy' or 'sell'")
+    sizes = np.asarray(order_sizes, dtype=float)[:, None, None]
+    close = np.asarray(close, dtype=float)
+    typical = (np.asarray(high, float) + np.asarray(low, float) + close) / 3.0
+    volume = np.asarray(volume, dtype=float)
+
+    # Arrival at bar a (a >= volatility_window), execution on bars a+1..a+days.
+    arrivals = np.arange(volatility_window, close.size - days)
+    if arrivals.size == 0:
+        raise ValueError("Not enough history for the requested schedule")
+    window = arrivals[:, None] + 1 + np.arange(days)  # (starts, days)
+    day_volume = volume[window]
+    returns = quant.simple_returns(close)
+    volatility = np.lib.stride_tricks.sliding_window_view(returns, volatility_window)
+    arrival_volatility = volatility[arrivals - volatility_window].std(axis=1, ddof=1)
+
+    if schedule == "twap":
+        weights = np.full((arrivals.size, days), 1.0 / days)
+    else:
+        weights = day_volume / day_volume.sum(axis=1, keepdims=True)
+    shares = sizes * weights  # (sizes, starts, days)
+    impact = square_root_impact(
+        shares, day_volume, arrival_volatility[:, None], coefficient
+    )
+    direction = 1.0 if side == "buy" else -1.0
+    arrival_price = close[arrivals][:, None]
+    drift = direction * (typical[window] / arrival_price - 1.0)
+    per_day = weights * (drift + impact)
+    return ScheduleCosts(
+        shortfall=per_day.sum(axis=2),
+        impact=(weights * impact).sum(axis=2),
+        max_participation=(shares / day_volume).max(axis=2),
+    )
+
+
+def estimate_execution_costs(
+    symbol: str,
+    order_sizes: list[float],
+    side: str = "buy",
+    schedule_days: int = 5,
+    max_participation: float = 0.1,
+    adv_window: int = 20,
+) -> dict[str, Any]:
+    """Estimates trading costs of one or more order sizes from daily_prices data.
+
+    Args:
+        symbol: Ticker symbol, e.g. "AAPL".
+        order_sizes: Order sizes in shares; several sizes are compared at once.
+        side: "buy" or "sell".
+        schedule_days: Trading days over which TWAP/VWAP schedules execute.
+        max_participation: Largest acceptable fraction of a day's volume.
+        adv_window: Trading days used for average daily volume and volatility.
+
+    Returns:
+        Liquidity (ADV in shares and dollars, daily volatility, estimated
+        spread) and, for each order size: its notional and % of ADV, the
+        half-spread and single-day market impact costs, the days needed to
+        stay under max_participation, and the historical implementation
+        shortfall (mean and 95th percentile, in basis points) of TWAP and
+        VWAP schedules over schedule_days.
+    """
+    if not order_sizes or min(order_sizes) <= 0:
+        return {"status": "error", "error_message": "order_sizes must be positive"}
+    if schedule_days < 1:
+        return {"status": "error", "error_message": "schedule_days must be positive"}
+    if not 0 < max_participation <= 1:
+        return {
+            "status": "error",
+            "error_message": "max_participation must be in (0, 1]",
+        }
+    try:
+        history = load_price_history(symbol)
+        high, low, close, volume = (
+            history.high, history.low, history.close, history.volume.astype(float)
+        )
+        liquidity = liquidity_profile(high, low, close, volume, adv_window)
+        schedules = {
+            name: simulate_schedule(
+                order_sizes, high, low, close, volume, schedule_days, name, side,
+                volatility_window=adv_window,
+            )
+            for name in ("twap", "vwap")
+        }
+    except (UnknownSymbolError, ValueError) as e:
+        return {"status": "error", "error_message": str(e)}
+
+    sizes = np.asarray(order_sizes, dtype=float)
+    single_day_impact = square_root_impact(
+        sizes, liquidity.adv_shares, liquidity.daily_volatility
+    )
+    days_needed = np.ceil(sizes / (max_participation * liquidity.adv_shares))
+    orders = []
+    for i, size in enumerate(sizes):
+        order = {
+            "shares": int(size) if float(size).is_integer() else float(size),
+            "notional": round(float(size * close[-1]), 2),
+            "pct_of_adv": round(float(size / liquidity.adv_shares), 4),
+            "half_spread_bps": round(liquidity.spread / 2 * BPS, 2),
+            "single_day_impact_bps": round(float(single_day_impact[i]) * BPS, 2),
+            "days_at_max_participation": int(days_needed[i]),
+        }
+        for name, costs in schedules.items():
+            shortfall = costs.shortfall[i] * BPS
+            order[f"{name}_shortfall_mean_bps"] = round(float(shortfall.mean()), 2)
+            order[f"{name}_shortfall_p95_bps"] = round(
+                float(np.percentile(shortfall, 95)), 2
+            )
+            order[f"{name}_impact_bps"] = round(float(costs.impact[i].mean()) * BPS, 2)
+        orders.append(order)
+    return {
+        "status": "success",
+        "symbol": symbol.upper(),
+        "side": side,
+        "last_close": round(float(close[-1]), 2),
+        "adv_shares": round(liquidity.adv_shares),
+        "adv_dollars": round(liquidity.adv_dollars, 2),
+        "daily_volatility": round(liquidity.daily_volatility, 4),
+        "estimated_spread_bps": round(liquidity.spread * BPS, 2),
+        "schedule_days": schedule_days,
+        "historical_start_dates": int(schedules["twap"].shortfall.shape[1]),
+        "orders": orders,
+    }
@@ -0,0 +1,283 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Monte Carlo simulation of portfolio paths for the risk analyst.
+
+Daily portfolio returns are either bootstrapped from history (optionally in
+blocks, to keep short-range autocorrelation) or drawn from a geometric
+Brownian motion fitted to it. Paths are generated in chunks shaped
+(paths, horizon), sized so a chunk's working arrays stay under
+``memory_limit_mb``. Only three numbers per path are kept: terminal return,
+maximum drawdown and worst single day. A million paths therefore need
+tens of megabytes rather than gigabytes.
+
+Every chunk draws from its own child of one ``SeedSequence``. A given seed
+gives the same paths whether chunks run in-process or on a process pool.
+"""
+
+import concurrent.futures
+import dataclasses
+import math
+import os
+from typing import Any, Optional
+
+import numpy as np
+
+from . import quant
+from .price_data import UnknownSymbolError, load_price_panel
+from .worker_pool import pool_context
+
+DEFAULT_MEMORY_LIMIT_MB = 128
+MAX_TOOL_PATHS = 2_000_000
+# Float64 arrays of a chunk alive at the same time: returns/equity and peaks.
+_ARRAYS_PER_CHUNK = 2
+
+
+@dataclasses.dataclass
+class SimulationResult:
+    """Per-path outcomes over the horizon, as fractions of the starting value."""
+
+    final_returns: np.ndarray
+    max_drawdowns: np.ndarray
+    worst_days: np.ndarray
+    horizon: int
+    method: str
+
+    @property
+    def paths(self) -> int:
+        return self.final_returns.size
+
+    def summary(
+        self, confidence: float = 0.95, drawdown_threshold: float = 0.2
+    ) -> dict[str, Any]:
+        percentiles = (1, 5, 25, 50, 75, 95, 99)
+        final = np.percentile(self.final_returns, percentiles)
+        drawdown = np.percentile(self.max_drawdowns, (50, 95, 99))
+        return {
+            "paths": self.paths,
+            "horizon_days": self.horizon,
+            "method": self.method,
+            "expected_return": float(self.final_returns.mean()),
+            "final_return_percentiles": {
+                f"p{p}": float(v) for p, v in zip(percentiles, final)
+            },
+            "probability_of_loss": float((self.final_returns < 0).mean()),
+            "var": quant.value_at_risk(self.final_returns, confidence),
+            "cvar": quant.conditional_value_at_risk(self.final_returns, confidence),
+            "max_drawdown_median": float(drawdown[0]),
+            "max_drawdown_p95": float(drawdown[1]),
+            "max_drawdown_p99": float(drawdown[2]),
+            "probability_drawdown_exceeds_threshold": float(
+                (self.max_drawdowns > drawdown_threshold).mean()
+            ),
+            "worst_day_p5": float(np.percentile(self.worst_days, 5)),
+        }
+
+
+def chunk_paths(horizon: int, memory_limit_mb: float) -> int:
+    """Paths per chunk keeping the chunk's working arrays under the limit."""
+    per_path = horizon * 8 * _ARRAYS_PER_CHUNK
+    return max(1, int(memory_limit_mb * 1024 * 1024 // per_path))
+
+
+def _draw_returns(
+    rng: np.random.Generator,
+    history: np.ndarray,
+    paths: int,
+    horizon: int,
+    method: str,
+    block_size: int,
+) -> np.ndarray:
+    if method == "gbm":
+        log_returns = np.log1p(history)
+        draws = rng.standard_normal((paths, horizon))
+        draws *= log_returns.std(ddof=1)
+        draws += log_returns.mean()
+        np.expm1(draws, out=draws)
+        return draws
+    # Block bootstrap: random start days, consecutive runs of block_size days.
+    blocks = math.ceil(horizon / block_size)
+    starts = rng.integers(0, history.size - block_size + 1, (paths, blocks))
+    if block_size == 1:
+        return history[starts]
+    index = (starts[:, :, None] + np.arange(block_size)).reshape(paths, -1)
+    return history[index[:, :horizon]]
+
+
+def _simulate_chunk(
+    history: np.ndarray,
+    paths: int,
+    horizon: int,
+    method: str,
+    block_size: int,
+    seed: np.random.SeedSequence,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    returns = _draw_returns(rng, history, paths, horizon, method, block_size)
+    worst_days = returns.min(axis=1)
+    # Reuse the returns buffer for the equity curve.
+    equity = np.log1p(returns, out=returns)
+    np.cumsum(equity, axis=1, out=equity)
+    np.exp(equity, out=equity)
+    peaks = np.maximum.accumulate(equity, axis=1)
+    np.divide(equity, peaks, out=peaks)
+    max_drawdowns = 1.0 - peaks.min(axis=1)
+    # Starting value of 1 is a peak too.
+    max_drawdowns = np.maximum(max_drawdowns, 1.0 - equity.min(axis=1))
+    return equity[:, -1] - 1.0, max_drawdowns, worst_days
+
+
+def simulate_paths(
+    history: np.ndarray,
+    paths: int,
+    horizon: int,
+    method: str = "bootstrap",
+    block_size: int = 1,
+    seed: Optional[int] = None,
+    memory_limit_mb: float = DEFAULT_MEMORY_LIMIT_MB,
+    workers: int = 1,
+) -> SimulationResult:
+    """Simulates ``paths`` portfolio paths of ``horizon`` days.
+
+    Args:
+        history: Historical daily portfolio returns.
+        paths: Number of paths.
+        horizon: Days per path.
+        method: "bootstrap" (resample history) or "gbm" (lognormal fit).
+        block_size: Consecutive historical days per bootstrap draw.
+        seed: Seed for reproducible paths.
+        memory_limit_mb: Ceiling for one chunk's working arrays.
+        workers: Processes generating chunks; 1 runs in-process.
+    """
+    if method not in ("bootstrap", "gbm"):
+        raise ValueError(f"Unknown method '{method}'; expected 'bootstrap' or 'gbm'")
+    history = np.asarray(history, dtype=float)
+    history = history[~np.isnan(history)]
+    if history.size < max(2, block_size):
+        raise ValueError("Not enough historical returns to simulate from")
+    size = chunk_paths(horizon, memory_limit_mb)
+    bounds = [(start, min(start + size, paths)) for start in range(0, paths, size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(bounds))
+    outputs = [np.empty(paths) for _ in range(3)]
+
+    def store(bound, chunk):
+        for out, values in zip(outputs, chunk):
+            out[bound[0] : bound[1]] = values
+
+    arguments = [
+        (history, stop - start, horizon, method, block_size, child)
+        for (start, stop), child in zip(bounds, seeds)
+    ]
+    if workers <= 1 or len(bounds) == 1:
+        for bound, args in zip(bounds, arguments):
+            store(bound, _simulate_chunk(*args))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=pool_context()
+        ) as pool:
+            futures = {
+                pool.submit(_simulate_chunk, *args): bound
+                for bound, args in zip(bounds, arguments)
+            }
+            for future in concurrent.futures.as_completed(futures):
+                store(futures[future], future.result())
+    return SimulationResult(*outputs, horizon=horizon, method=method)
+
+
+def portfolio_returns(symbols: list[str], weights: Optional[list[float]] = None) -> np.ndarray:
+    """Daily returns of a portfolio rebalanced to ``weights`` every day."""
+    if not symbols:
+        raise ValueError("symbols must not be empty")
+    if weights is None:
+        weights = np.full(len(symbols), 1.0 / len(symbols))
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (len(symbols),):
+        raise ValueError("weights must have one entry per symbol")
+    if not weights.sum() > 0:
+        raise ValueError("weights must sum to a positive number")
+    panel = load_price_panel(symbols)
+    returns = np.nan_to_num(quant.simple_returns(panel.close), nan=0.0)
+    return returns @ (weights / weights.sum())
+
+
+def simulate_portfolio_risk(
+    symbols: list[str],
+    weights: Optional[list[float]] = None,
+    horizon_days: int = 21,
+    paths: int = 100_000,
+    method: str = "bootstrap",
+    block_size: int = 5,
+    confidence: float = 0.95,
+    drawdown_threshold: float = 0.2,
+    portfolio_value: float = 100_000.0,
+) -> dict[str, Any]:
+    """Monte Carlo distribution of a portfolio's return and drawdown.
+
+    Args:
+        symbols: Tickers in the portfolio, e.g. ["AAPL", "MSFT"].
+        weights: Portfolio weights (normalized to sum to 1); equal if omitted.
+        horizon_days: Trading days to simulate.
+        paths: Number of simulated paths (up to 2,000,000).
+        method: "bootstrap" (resample historical days) or "gbm" (geometric
+            Brownian motion fitted to history).
+        block_size: Consecutive days per bootstrap draw, preserving short-term
+            momentum and volatility clustering.
+        confidence: Confidence level for VaR and CVaR.
+        drawdown_threshold: Drawdown (e.g. 0.2 = 20%) whose probability of
+            being breached within the horizon is reported.
+        portfolio_value: Current portfolio value, for currency amounts.
+
+    Returns:
+        Expected return, return percentiles, probability of loss, horizon VaR
+        and CVaR (also in currency), drawdown percentiles, the probability of
+        breaching drawdown_threshold and the 5th percentile worst single day
+        (gap risk).
+    """
+    if not 0 < paths <= MAX_TOOL_PATHS:
+        return {"status": "error", "error_message": f"paths must be 1-{MAX_TOOL_PATHS}"}
+    if horizon_days < 1:
+        return {"status": "error", "error_message": "horizon_days must be positive"}
+    if not symbols:
+        return {"status": "error", "error_message": "symbols must not be empty"}
+    if weights is not None and not sum(weights) > 0:
+        return {"status": "error", "error_message": "weights must sum to a positive number"}
+    try:
+        history = portfolio_returns(symbols, weights)
+        result = simulate_paths(
+            history,
+            paths,
+            horizon_days,
+            method=method,
+            block_size=block_size if method == "bootstrap" else 1,
+            workers=min(os.cpu_count() or 1, 8) if paths >= 500_000 else 1,
+        )
+    except (UnknownSymbolError, ValueError) as e:
+        return {"status": "error", "error_message": str(e)}
+    summary = result.summary(confidence, drawdown_threshold)
+    rounded = {
+        key: round(value, 4) if isinstance(value, float) else value
+        for key, value in summary.items()
+    }
+    rounded["final_return_percentiles"] = {
+        key: round(value, 4) for key, value in summary["final_return_percentiles"].items()
+    }
+    return {
+        "status": "success",
+        "symbols": [symbol.upper() for symbol in symbols],
+        "confidence": confidence,
+        "drawdown_threshold": drawdown_threshold,
+        **rounded,
+        "var_amount": round(summary["var"] * portfolio_value, 2),
+        "cvar_amount": round(summary["cvar"] * portfolio_value, 2),
+    }
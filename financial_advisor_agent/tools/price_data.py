@@ -0,0 +1,415 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process-wide, read-only columnar store of daily prices for the quant tools.
+
+``PriceStore`` keeps ``daily_prices`` as one Arrow table sorted by symbol and
+date, plus each symbol's row offsets. A symbol's history is a set of NumPy
+views into the table's buffers, so every indicator, backtest and simulation
+shares the same memory and nothing is re-parsed per call.
+
+Sources:
+
+* CSV (default): ``DAILY_PRICES_CSV``, or the checked-in 10,000 row fixture
+  written by ``bq_test_data_generation/generate_market_data.py``. The CSV is
+  converted once into an Arrow IPC file in ``PRICE_STORE_CACHE_DIR`` (default:
+  the system temp directory), which records the CSV's modification time
+  and size it was built from and is rebuilt when they differ. That file is
+  memory-mapped, so worker processes share the pages through the OS page
+  cache.
+* BigQuery: when ``DAILY_PRICES_TABLE`` is set, the table is fetched once
+  with ``to_arrow()`` and held in memory.
+
+The store loads lazily on first use. At most every ``check_interval``
+seconds it also checks the CSV's size and modification time, and rebuilds
+when the file has changed. Arrays handed out earlier stay valid.
+"""
+
+import dataclasses
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+FIXTURE_CSV = (
+    Path(__file__).resolve().parents[2]
+    / "bq_test_data_generation"
+    / "stock_market_data_10000_rows.csv"
+)
+
+PRICE_COLUMNS = ["date", "open_price", "high_price", "low_price", "close_price", "volume"]
+
+_SCHEMA = pa.schema(
+    [
+        ("symbol", pa.string()),
+        ("date", pa.timestamp("s")),
+        ("open_price", pa.float64()),
+        ("high_price", pa.float64()),
+        ("low_price", pa.float64()),
+        ("close_price", pa.float64()),
+        ("volume", pa.int64()),
+    ]
+)
+
+
+class UnknownSymbolError(ValueError):
+    """Raised when a symbol has no rows in the configured price source."""
+
+
+class SymbolHistory(NamedTuple):
+    """Date-sorted columns of one symbol; views into the store, do not modify."""
+
+    dates: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return self.dates.size
+
+    def between(
+        self, start_date: Optional[str] = None, end_date: Optional[str] = None
+    ) -> "SymbolHistory":
+        """Rows within ``[start_date, end_date]``, still as views."""
+        start = 0
+        stop = self.dates.size
+        if start_date:
+            start = np.searchsorted(self.dates, np.datetime64(start_date, "s"), "left")
+        if end_date:
+            end = np.datetime64(end_date, "D") + np.timedelta64(1, "D")
+            stop = np.searchsorted(self.dates, end.astype("datetime64[s]"), "left")
+        return SymbolHistory(*(column[start:stop] for column in self))
+
+    def date_strings(self) -> np.ndarray:
+        return np.datetime_as_string(self.dates, unit="D")
+
+
+@dataclasses.dataclass(frozen=True)
+class PricePanel:
+    """All symbols aligned on one date axis; arrays are shaped (dates, symbols).
+
+    Prices are forward-filled across dates a symbol did not report, and NaN
+    before its first row.
+    """
+
+    dates: np.ndarray
+    symbols: tuple[str, ...]
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def select(self, symbols) -> "PricePanel":
+        columns = [self.symbols.index(symbol.strip().upper()) for symbol in symbols]
+        return dataclasses.replace(
+            self,
+            symbols=tuple(self.symbols[i] for i in columns),
+            **{
+                field: getattr(self, field)[:, columns]
+                for field in ("open", "high", "low", "close", "volume")
+            },
+        )
+
+
+# Schema metadata key of the source CSV's ``(mtime_ns, size)`` in the Arrow file.
+_STAMP_KEY = b"source_stamp"
+
+
+def _column(table: pa.Table, name: str) -> np.ndarray:
+    column = table.column(name).combine_chunks()
+    try:
+        return column.to_numpy(zero_copy_only=True)
+    except pa.ArrowInvalid:
+        # Nulls (e.g. a sparse BigQuery table) need a copy.
+        return column.to_numpy(zero_copy_only=False)
+
+
+def _source_stamp(csv_path: str) -> tuple[int, int]:
+    stat = os.stat(csv_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _built_from(schema: pa.Schema) -> Optional[tuple[int, int]]:
+    """Source stamp recorded in an Arrow file's schema, if any."""
+    stamp = (schema.metadata or {}).get(_STAMP_KEY, b"").split(b":")
+    return (int(stamp[0]), int(stamp[1])) if len(stamp) == 2 else None
+
+
+def _open_arrow_file(arrow_path: str, memory_map: bool):
+    """IPC reader for ``arrow_path``, or None if it is missing or unreadable."""
+    try:
+        source = pa.memory_map(arrow_path) if memory_map else pa.OSFile(arrow_path)
+        return pa.ipc.open_file(source)
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+
+class _Snapshot:
+    """One loaded version of the table with its per-symbol offsets."""
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+        symbols = table.column("symbol").combine_chunks()
+        boundaries = np.flatnonzero(
+            pc.not_equal(symbols[1:], symbols[:-1]).to_numpy(zero_copy_only=False)
+        ) + 1
+        starts = np.concatenate(([0], boundaries))
+        stops = np.concatenate((boundaries, [len(table)]))
+        names = symbols.take(pa.array(starts)).to_pylist() if len(table) else []
+        self.offsets = {
+            name: (int(start), int(stop))
+            for name, start, stop in zip(names, starts, stops)
+        }
+        self.columns = {
+            "dates": _column(table, "date"),
+            "open": _column(table, "open_price"),
+            "high": _column(table, "high_price"),
+            "low": _column(table, "low_price"),
+            "close": _column(table, "close_price"),
+            "volume": _column(table, "volume"),
+        }
+        self.panel: Optional[PricePanel] = None
+
+    def history(self, symbol: str) -> Optional[SymbolHistory]:
+        bounds = self.offsets.get(symbol)
+        if bounds is None:
+            return None
+        start, stop = bounds
+        return SymbolHistory(
+            *(self.columns[field][start:stop] for field in SymbolHistory._fields)
+        )
+
+
+def _normalize(table: pa.Table) -> pa.Table:
+    table = table.select(_SCHEMA.names).cast(_SCHEMA)
+    # One chunk per column keeps every column a single zero-copy NumPy view.
+    return table.sort_by([("symbol", "ascending"), ("date", "ascending")]).combine_chunks()
+
+
+def build_arrow_file(csv_path: str, arrow_path: str) -> None:
+    """Converts a ``daily_prices`` CSV into a sorted Arrow IPC file (atomically).
+
+    The CSV's ``(mtime_ns, size)`` is stored in the file's schema metadata.
+    It is taken before reading, so a CSV rewritten meanwhile is picked up by
+    the next check.
+    """
+    stamp = _source_stamp(csv_path)
+    table = pa_csv.read_csv(
+        csv_path,
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=_SCHEMA.names,
+            column_types={"date": pa.timestamp("s"), "volume": pa.int64()},
+        ),
+    )
+    table = _normalize(table).replace_schema_metadata(
+        {_STAMP_KEY: f"{stamp[0]}:{stamp[1]}".encode()}
+    )
+    partial = f"{arrow_path}.{os.getpid()}.tmp"
+    with pa.OSFile(partial, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(partial, arrow_path)
+
+
+class PriceStore:
+    """Read-only columnar price store; see the module docstring.
+
+    Args:
+        csv_path: CSV source; ignored when ``table_id`` is given.
+        table_id: BigQuery ``project.dataset.table`` to load instead.
+        cache_dir: Where the Arrow IPC file built from the CSV is kept.
+        memory_map: Memory-map the Arrow file instead of reading it into RAM.
+        check_interval: Seconds between checks of the CSV for changes.
+    """
+
+    def __init__(
+        self,
+        csv_path: Optional[str] = None,
+        table_id: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        memory_map: bool = True,
+        check_interval: float = 1.0,
+    ):
+        self.csv_path = str(csv_path or FIXTURE_CSV)
+        self.table_id = table_id
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "price_store")
+        self.memory_map = memory_map
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        self._source_stamp: Optional[tuple[int, int]] = None
+        self._checked_at = 0.0
+
+    @property
+    def arrow_path(self) -> str:
+        digest = hashlib.sha1(os.path.abspath(self.csv_path).encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"daily_prices_{digest}.arrow")
+
+    def _changed(self) -> bool:
+        try:
+            return _source_stamp(self.csv_path) != self._source_stamp
+        except FileNotFoundError:
+            # Mid-rewrite or removed: keep serving the loaded version.
+            return False
+
+    def _load(self) -> _Snapshot:
+        if self.table_id:
+            from google.cloud import bigquery
+
+            rows = bigquery.Client().query(
+                f"SELECT symbol, {', '.join(PRICE_COLUMNS)} FROM `{self.table_id}`"
+            )
+            return _Snapshot(_normalize(rows.to_arrow()))
+        arrow_path = self.arrow_path
+        reader = _open_arrow_file(arrow_path, self.memory_map)
+        if reader is None or _built_from(reader.schema) != _source_stamp(self.csv_path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            build_arrow_file(self.csv_path, arrow_path)
+            reader = _open_arrow_file(arrow_path, self.memory_map)
+        table = reader.read_all()
+        # The stamp of the file actually read, even if another process rebuilt it.
+        self._source_stamp = _built_from(reader.schema)
+        return _Snapshot(table)
+
+    def _current(self) -> _Snapshot:
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and (
+            self.table_id or now - self._checked_at < self.check_interval
+        ):
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or (
+                not self.table_id and self._changed()
+            ):
+                self._snapshot = self._load()
+                self.version += 1
+            self._checked_at = now
+            return self._snapshot
+
+    def refresh(self) -> None:
+        """Reloads on next access (BigQuery sources have no change signal)."""
+        with self._lock:
+            self._snapshot = None
+
+    @property
+    def symbols(self) -> tuple[str, ...]:
+        return tuple(self._current().offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self._current().table.nbytes
+
+    def history(
+        self,
+        symbol: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> SymbolHistory:
+        """Columns of ``symbol`` within ``[start_date, end_date]``.
+
+        Raises:
+            UnknownSymbolError: If there are no rows for the symbol.
+        """
+        history = self._current().history(symbol.strip().upper())
+        if history is None:
+            raise UnknownSymbolError(f"No price history for symbol '{symbol}'")
+        if start_date or end_date:
+            history = history.between(start_date, end_date)
+        return history
+
+    def panel(self, symbols=None) -> PricePanel:
+        """Every symbol (or ``symbols``) aligned on one date axis; cached per version."""
+        snapshot = self._current()
+        if snapshot.panel is None:
+            snapshot.panel = _build_panel(snapshot)
+        if not symbols:
+            return snapshot.panel
+        missing = [s for s in symbols if s.strip().upper() not in snapshot.offsets]
+        if missing:
+            raise UnknownSymbolError(
+                f"No price history for symbol(s) {', '.join(missing)}"
+            )
+        return snapshot.panel.select(symbols)
+
+
+def _build_panel(snapshot: _Snapshot) -> PricePanel:
+    symbols = tuple(snapshot.offsets)
+    dates = np.unique(snapshot.columns["dates"])
+    fields = {}
+    for field in ("open", "high", "low", "close", "volume"):
+        wide = np.full((dates.size, len(symbols)), np.nan)
+        for j, symbol in enumerate(symbols):
+            start, stop = snapshot.offsets[symbol]
+            rows = np.searchsorted(dates, snapshot.columns["dates"][start:stop])
+            wide[rows, j] = snapshot.columns[field][start:stop]
+        if field == "volume":
+            wide = np.nan_to_num(wide, nan=0.0)
+        else:
+            wide = pd.DataFrame(wide).ffill().to_numpy()
+        fields[field] = np.ascontiguousarray(wide)
+    return PricePanel(dates=dates, symbols=symbols, **fields)
+
+
+_default_store: Optional[PriceStore] = None
+_default_lock = threading.Lock()
+
+
+def price_store() -> PriceStore:
+    """The process-wide store for the configured source."""
+    global _default_store
+    if _default_store is None:
+        with _default_lock:
+            if _default_store is None:
+                _default_store = PriceStore(
+                    csv_path=os.getenv("DAILY_PRICES_CSV") or None,
+                    table_id=os.getenv("DAILY_PRICES_TABLE") or None,
+                    cache_dir=os.getenv("PRICE_STORE_CACHE_DIR") or None,
+                )
+    return _default_store
+
+
+def load_price_history(
+    symbol: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> SymbolHistory:
+    """Date-sorted OHLCV columns for ``symbol`` from the shared store.
+
+    Raises:
+        UnknownSymbolError: If there are no rows for the symbol.
+    """
+    return price_store().history(symbol, start_date, end_date)
+
+
+def load_price_panel(symbols=None) -> PricePanel:
+    """Every symbol of the shared store (or ``symbols``) as a ``PricePanel``.
+
+    Raises:
+        UnknownSymbolError: If one of ``symbols`` has no rows.
+    """
+    return price_store().panel(symbols)
@@ -0,0 +1,257 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Function tools exposing the quant primitives to the trading and risk analysts.
+
+Each tool loads a symbol's price history (see ``price_data``), runs the
+vectorized computations from ``quant`` and returns a small, rounded summary
+dict. The model then reads a handful of numbers instead of deriving them
+step by step in its own output.
+"""
+
+import math
+from typing import Any
+
+import numpy as np
+
+from . import quant
+from .price_data import UnknownSymbolError, load_price_history
+
+
+def _error(message: str) -> dict[str, Any]:
+    return {"status": "error", "error_message": message}
+
+
+def _round(value: float, digits: int = 4) -> float | None:
+    value = float(value)
+    return None if math.isnan(value) else round(value, digits)
+
+
+def _history(symbol: str, start_date: str, end_date: str, min_rows: int):
+    history = load_price_history(symbol, start_date or None, end_date or None)
+    if len(history) < min_rows:
+        raise UnknownSymbolError(
+            f"Only {len(history)} rows for '{symbol}' in the requested range; "
+            f"at least {min_rows} are needed"
+        )
+    return history
+
+
+def get_return_statistics(
+    symbol: str, start_date: str = "", end_date: str = ""
+) -> dict[str, Any]:
+    """Return, volatility, Sharpe ratio and maximum drawdown of a stock.
+
+    Args:
+        symbol: Ticker symbol, e.g. "AAPL".
+        start_date: Optional first date (YYYY-MM-DD).
+        end_date: Optional last date (YYYY-MM-DD).
+
+    Returns:
+        Annualized return and volatility, Sharpe ratio (zero risk-free rate),
+        total return and the largest peak-to-trough drawdown with its dates.
+    """
+    try:
+        history = _history(symbol, start_date, end_date, min_rows=3)
+    except UnknownSymbolError as e:
+        return _error(str(e))
+    close = history.close
+    returns = quant.simple_returns(close)
+    annual_return = quant.annualized_return(returns)
+    annual_volatility = quant.annualized_volatility(returns)
+    drawdown = quant.max_drawdown(close)
+    dates = history.date_strings()
+    return {
+        "status": "success",
+        "symbol": symbol.upper(),
+        "start_date": dates[0],
+        "end_date": dates[-1],
+        "observations": len(close),
+        "last_close": _round(close[-1], 2),
+        "total_return": _round(close[-1] / close[0] - 1.0),
+        "annualized_return": _round(annual_return),
+        "annualized_volatility": _round(annual_volatility),
+        "sharpe_ratio": _round(
+            annual_return / annual_volatility if annual_volatility else 0.0, 2
+        ),
+        "max_drawdown": _round(drawdown.max_drawdown),
+        "max_drawdown_peak_date": dates[drawdown.peak_index],
+        "max_drawdown_trough_date": dates[drawdown.trough_index],
+    }
+
+
+def get_risk_metrics(
+    symbol: str,
+    confidence: float = 0.95,
+    volatility_window: int = 20,
+    start_date: str = "",
+    end_date: str = "",
+) -> dict[str, Any]:
+    """Value at Risk, expected shortfall and volatility regime of a stock.
+
+    Args:
+        symbol: Ticker symbol, e.g. "AAPL".
+        confidence: VaR confidence level, e.g. 0.95 or 0.99.
+        volatility_window: Observations per rolling volatility window.
+        start_date: Optional first date (YYYY-MM-DD).
+        end_date: Optional last date (YYYY-MM-DD).
+
+    Returns:
+        One-period historical and parametric VaR, CVaR (expected shortfall),
+        all as positive loss fractions, plus current, minimum and maximum
+        annualized rolling volatility and the maximum drawdown.
+    """
+    if not 0.5 < confidence < 1.0:
+        return _error("confidence must be between 0.5 and 1.0")
+    try:
+        history = _history(symbol, start_date, end_date, min_rows=volatility_window + 2)
+    except UnknownSymbolError as e:
+        return _error(str(e))
+    close = history.close
+    returns = quant.simple_returns(close)
+    rolling = quant.rolling_volatility(returns, volatility_window)
+    return {
+        "status": "success",
+        "symbol": symbol.upper(),
+        "observations": len(close),
+        "confidence": confidence,
+        "var_historical": _round(quant.value_at_risk(returns, confidence)),
+        "var_parametric": _round(
+            quant.value_at_risk(returns, confidence, method="parametric")
+        ),
+        "cvar_historical": _round(quant.conditional_value_at_risk(returns, confidence)),
+        "worst_period_return": _round(returns.min()),
+        "rolling_volatility_current": _round(rolling[-1]),
+        "rolling_volatility_min": _round(np.nanmin(rolling)),
+        "rolling_volatility_max": _round(np.nanmax(rolling)),
+        "max_drawdown": _round(quant.max_drawdown(close).max_drawdown),
+    }
+
+
+def get_technical_indicators(
+    symbol: str,
+    atr_window: int = 14,
+    rsi_window: int = 14,
+    bollinger_window: int = 20,
+    bollinger_num_std: float = 2.0,
+) -> dict[str, Any]:
+    """Latest ATR, RSI and Bollinger Band values of a stock.
+
+    Args:
+        symbol: Ticker symbol, e.g. "AAPL".
+        atr_window: Average True Range period.
+        rsi_window: Relative Strength Index period.
+        bollinger_window: Bollinger Band moving-average period.
+        bollinger_num_std: Band width in standard deviations.
+
+    Returns:
+        ATR (in price units and as a fraction of the close), RSI (0-100),
+        Bollinger middle/upper/lower bands, %B (position of the close within
+        the bands) and band width.
+    """
+    try:
+        history = _history(
+            symbol,
+            "",
+            "",
+            min_rows=max(atr_window, rsi_window, bollinger_window) + 1,
+        )
+    except UnknownSymbolError as e:
+        return _error(str(e))
+    close = history.close
+    atr = quant.average_true_range(
+        history.high, history.low, close, atr_window
+    )
+    rsi = quant.relative_strength_index(close, rsi_window)
+    bands = quant.bollinger_bands(close, bollinger_window, bollinger_num_std)
+    spread = bands.upper[-1] - bands.lower[-1]
+    return {
+        "status": "success",
+        "symbol": symbol.upper(),
+        "as_of": history.date_strings()[-1],
+        "close": _round(close[-1], 2),
+        "atr": _round(atr[-1], 2),
+        "atr_pct_of_close": _round(atr[-1] / close[-1]),
+        "rsi": _round(rsi[-1], 1),
+        "bollinger_middle": _round(bands.middle[-1], 2),
+        "bollinger_upper": _round(bands.upper[-1], 2),
+        "bollinger_lower": _round(bands.lower[-1], 2),
+        "bollinger_percent_b": _round(
+            (close[-1] - bands.lower[-1]) / spread if spread else 0.5, 3
+        ),
+        "bollinger_bandwidth": _round(spread / bands.middle[-1]),
+    }
+
+
+def get_position_size(
+    symbol: str,
+    capital: float,
+    risk_per_trade: float = 0.01,
+    atr_multiple: float = 2.0,
+    kelly_scale: float = 0.5,
+    atr_window: int = 14,
+) -> dict[str, Any]:
+    """Position size from ATR-based stop distance and a scaled Kelly fraction.
+
+    Args:
+        symbol: Ticker symbol, e.g. "AAPL".
+        capital: Account equity available for the position.
+        risk_per_trade: Fraction of capital lost if the stop is hit (0.01 = 1%).
+        atr_multiple: Stop-loss distance in ATRs below the entry.
+        kelly_scale: Fraction of full Kelly to use (0.5 = half Kelly).
+        atr_window: Average True Range period.
+
+    Returns:
+        Entry price, stop-loss price, shares and position value from
+        fixed-fractional risk, the full and scaled Kelly fractions, and the
+        recommended shares (the smaller of the two sizing rules).
+    """
+    if capital <= 0:
+        return _error("capital must be positive")
+    if not 0 < risk_per_trade < 1:
+        return _error("risk_per_trade must be between 0 and 1")
+    try:
+        history = _history(symbol, "", "", min_rows=atr_window + 2)
+    except UnknownSymbolError as e:
+        return _error(str(e))
+    close = history.close
+    atr = quant.average_true_range(
+        history.high, history.low, close, atr_window
+    )[-1]
+    entry = close[-1]
+    stop_distance = atr_multiple * atr
+    risk_shares = math.floor(capital * risk_per_trade / stop_distance) if stop_distance else 0
+    full_kelly = quant.kelly_fraction_from_returns(quant.simple_returns(close))
+    scaled_kelly = min(max(full_kelly * kelly_scale, 0.0), 1.0)
+    kelly_shares = math.floor(capital * scaled_kelly / entry)
+    shares = min(risk_shares, kelly_shares)
+    return {
+        "status": "success",
+        "symbol": symbol.upper(),
+        "entry_price": _round(entry, 2),
+        "atr": _round(atr, 2),
+        "stop_loss_price": _round(entry - stop_distance, 2),
+        "fixed_fractional_shares": risk_shares,
+        "fixed_fractional_position_value": _round(risk_shares * entry, 2),
+        "kelly_fraction_full": _round(full_kelly),
+        "kelly_fraction_scaled": _round(scaled_kelly),
+        "kelly_shares": kelly_shares,
+        "recommended_shares": shares,
+        "recommended_position_value": _round(shares * entry, 2),
+        "capital_at_risk": _round(shares * stop_distance, 2),
+    }
+
+
+TRADING_TOOLS = [get_return_statistics, get_technical_indicators]
+RISK_TOOLS = [get_risk_metrics, get_return_statistics, get_position_size]
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Tests and sweep benchmark for the vectorized backtesting engine.
+
+    python -m pytest financial_advisor_agent/tools/test_backtest.py
+    python -m financial_advisor_agent.tools.test_backtest --benchmark
+"""
+
+import math
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from financial_advisor_agent.tools import backtest
+from financial_advisor_agent.tools.backtest import Costs, parameter_sweep, run_backtest
+from financial_advisor_agent.tools.price_data import PricePanel, load_price_panel
+from financial_advisor_agent.tools.worker_pool import PRELOAD_MODULES, pool_context
+
+SWEEP_GRID = {
+    "fast_window": list(range(2, 42, 2)),  # 20 values
+    "slow_window": list(range(20, 270, 5)),  # 50 values
+}
+
+
+def _panel(bars=300, symbols=4, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, (bars, symbols)), axis=0))
+    close[:10, 0] = np.nan  # a symbol that starts trading later
+    return PricePanel(
+        dates=np.arange(bars),
+        symbols=tuple(f"S{i}" for i in range(symbols)),
+        open=close,
+        high=close,
+        low=close,
+        close=close,
+        volume=np.ones_like(close),
+    )
+
+
+def _loop_sma_crossover(close, fast, slow, cost_rate):
+    """Bar-by-bar reference: decide at the close, hold from the next bar."""
+    net = np.zeros_like(close)
+    for j in range(close.shape[1]):
+        position = 0.0
+        for t in range(close.shape[0]):
+            if t > 0 and not math.isnan(close[t - 1, j]):
+                net[t, j] = position * (close[t, j] / close[t - 1, j] - 1)
+            target = 0.0
+            if t + 1 >= slow and not np.isnan(close[t + 1 - slow : t + 1, j]).any():
+                fast_ma = close[t + 1 - fast : t + 1, j].mean()
+                slow_ma = close[t + 1 - slow : t + 1, j].mean()
+                target = 1.0 if fast_ma > slow_ma else 0.0
+            net[t, j] -= cost_rate * abs(target - position)
+            position = target
+    return net
+
+
+def test_matches_bar_by_bar_reference():
+    panel = _panel()
+    costs = Costs(commission_bps=2, slippage_bps=8)
+    result = run_backtest(
+        panel, "sma_crossover", {"fast_window": 5, "slow_window": 30}, costs
+    )
+    expected = _loop_sma_crossover(panel.close, 5, 30, costs.rate)
+    assert np.allclose(result.symbol_returns, expected)
+    assert np.allclose(result.portfolio_returns, expected.mean(axis=1))
+    assert result.trades.sum() > 0
+
+
+def test_no_lookahead():
+    panel = _panel()
+    params = {"entry_window": 20, "exit_window": 10}
+    before = run_backtest(panel, "breakout", params).symbol_returns
+    shocked = panel.close.copy()
+    shocked[200:] *= 3.0
+    after = run_backtest(
+        PricePanel(**{**panel.__dict__, "close": shocked}), "breakout", params
+    ).symbol_returns
+    assert np.array_equal(before[:200], after[:200])
+
+
+def test_costs_and_benchmarks():
+    panel = _panel()
+    free = run_backtest(panel, "buy_and_hold", costs=Costs(0, 0))
+    growth = np.nanprod(1 + free.symbol_returns, axis=0)
+    first = np.array([panel.close[~np.isnan(panel.close[:, j]), j][0] for j in range(4)])
+    assert np.allclose(growth, panel.close[-1] / first)
+
+    params = {"window": 10, "entry_z": 1.0, "exit_z": 0.0}
+    cheap = run_backtest(panel, "mean_reversion", params, Costs(0, 0))
+    expensive = run_backtest(panel, "mean_reversion", params, Costs(10, 40))
+    assert cheap.trades.sum() == expensive.trades.sum() > 0
+    assert expensive.portfolio_stats()["total_return"] < cheap.portfolio_stats()["total_return"]
+
+    dca = run_backtest(panel, "dca", {"interval": 10, "installments": 4})
+    assert math.isclose(dca.exposure[1:].min(), dca.exposure[1:].max())
+    assert dca.trades[1] == 4
+
+
+def test_parallel_sweep_matches_serial():
+    panel = load_price_panel()
+    grid = {"fast_window": [5, 10, 15, 20], "slow_window": list(range(30, 130, 2))}
+    serial = parameter_sweep(panel, "sma_crossover", grid, workers=1)
+    parallel = parameter_sweep(panel, "sma_crossover", grid, workers=2)
+    # Workers must not be forked from the (threaded) agent server.
+    assert pool_context().get_start_method() in ("forkserver", "spawn")
+    assert len(serial) == len(parallel) == 200
+    assert serial == parallel
+    single = run_backtest(panel, "sma_crossover", serial[7][0]).portfolio_stats()
+    assert math.isclose(single["sharpe_ratio"], serial[7][1]["sharpe_ratio"])
+
+
+def test_worker_preload_does_not_import_the_agent():
+    # The fork server imports these; pulling in the agent would build its
+    # models and clients in every pool worker.
+    probe = (
+        "import sys\n"
+        f"for name in {PRELOAD_MODULES!r}: __import__(name)\n"
+        "print('financial_advisor_agent.agent' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_tools():
+    result = backtest.backtest_strategy(
+        "sma_crossover", parameters={"fast_window": 10, "slow_window": 40}
+    )
+    assert result["status"] == "success"
+    assert result["symbols"] == 30
+    assert result["parameters"] == {"fast_window": 10, "slow_window": 40}
+    assert len(result["best_symbols"]) == len(result["worst_symbols"]) == 3
+
+    subset = backtest.backtest_strategy("breakout", symbols=["aapl", "MSFT"])
+    assert subset["symbols"] == 2
+
+    sweep = backtest.optimize_strategy_parameters(
+        "mean_reversion",
+        grid={"window": [10, 20], "entry_z": [1.0, 1.5, 2.0]},
+        rank_by="sharpe_ratio",
+        top_n=3,
+    )
+    assert sweep["combinations_tested"] == 6
+    sharpes = [row["sharpe_ratio"] for row in sweep["top"]]
+    assert sharpes == sorted(sharpes, reverse=True)
+
+    assert backtest.backtest_strategy("astrology")["status"] == "error"
+    assert backtest.backtest_strategy("breakout", symbols=["NOPE"])["status"] == "error"
+    assert (
+        backtest.backtest_strategy("breakout", parameters={"speed": 1})["status"]
+        == "error"
+    )
+    too_big = {"fast_window": list(range(100)), "slow_window": list(range(100))}
+    assert (
+        backtest.optimize_strategy_parameters("sma_crossover", too_big)["status"]
+        == "error"
+    )
+
+
+def benchmark(workers=None):
+    """1,000-combination SMA crossover sweep over the 10k-row fixture."""
+    panel = load_price_panel()
+    timings = {}
+    for label, count in (("serial", 1), ("process pool", workers)):
+        start = time.perf_counter()
+        results = parameter_sweep(panel, "sma_crossover", SWEEP_GRID, workers=count)
+        timings[label] = time.perf_counter() - start
+        print(
+            f"   - {label:12s} {len(results):,} combinations x {len(panel.symbols)} "
+            f"symbols in {timings[label]:.2f}s"
+        )
+    return timings
+
+
+def test_benchmark_small():
+    timings = benchmark()
+    assert timings["serial"] < 10.0
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing backtesting engine...\n")
+
+    tests = [
+        ("Bar-by-bar Reference", test_matches_bar_by_bar_reference),
+        ("No Lookahead", test_no_lookahead),
+        ("Costs and Benchmarks", test_costs_and_benchmarks),
+        ("Parallel Sweep", test_parallel_sweep_matches_serial),
+        ("Worker Preload", test_worker_preload_does_not_import_the_agent),
+        ("Agent Tools", test_tools),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (1,000 combinations)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for the execution cost model.
+
+    python -m pytest financial_advisor_agent/tools/test_execution_cost.py
+"""
+
+import math
+import time
+
+import numpy as np
+
+from financial_advisor_agent.tools import execution_cost
+from financial_advisor_agent.tools.execution_cost import (
+    corwin_schultz_spread,
+    simulate_schedule,
+    square_root_impact,
+)
+
+
+def _bars(days=300, seed=5):
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+    high = close * (1 + np.abs(rng.normal(0, 0.01, days)))
+    low = close * (1 - np.abs(rng.normal(0, 0.01, days)))
+    volume = rng.uniform(0.5e6, 1.5e6, days)
+    return high, low, close, volume
+
+
+def test_corwin_schultz_matches_formula():
+    high = np.array([10.2, 10.3, 10.1])
+    low = np.array([9.9, 10.0, 9.8])
+    spreads = corwin_schultz_spread(high, low)
+    k = 3 - 2 * math.sqrt(2)
+    beta = math.log(10.2 / 9.9) ** 2 + math.log(10.3 / 10.0) ** 2
+    gamma = math.log(10.3 / 9.9) ** 2
+    alpha = (math.sqrt(2 * beta) - math.sqrt(beta)) / k - math.sqrt(gamma / k)
+    expected = max(2 * (math.exp(alpha) - 1) / (1 + math.exp(alpha)), 0.0)
+    assert math.isclose(spreads[0], expected, abs_tol=1e-12)
+    assert (spreads >= 0).all()
+
+
+def test_square_root_impact_scaling():
+    impact = square_root_impact([1e4, 4e4, 1.6e5], 1e6, 0.02, coefficient=1.0)
+    assert np.allclose(impact[1:] / impact[:-1], 2.0)
+    assert math.isclose(impact[0], 0.02 * math.sqrt(0.01))
+
+
+def _loop_shortfall(size, high, low, close, volume, days, schedule, start, window):
+    arrival = close[start]
+    returns = close[start - window + 1 : start + 1] / close[start - window : start] - 1
+    volatility = returns.std(ddof=1)
+    execution = range(start + 1, start + 1 + days)
+    total_volume = sum(volume[d] for d in execution)
+    shortfall = 0.0
+    for d in execution:
+        weight = 1 / days if schedule == "twap" else volume[d] / total_volume
+        typical = (high[d] + low[d] + close[d]) / 3
+        impact = 0.8 * volatility * math.sqrt(size * weight / volume[d])
+        shortfall += weight * (typical / arrival - 1 + impact)
+    return shortfall
+
+
+def test_schedule_matches_loop_for_every_size():
+    high, low, close, volume = _bars()
+    sizes = [1e4, 1e5, 5e5]
+    for schedule in ("twap", "vwap"):
+        costs = simulate_schedule(sizes, high, low, close, volume, 5, schedule)
+        assert costs.shortfall.shape == (3, 300 - 5 - 20)
+        for i, size in enumerate(sizes):
+            for column, start in ((0, 20), (100, 120), (-1, 294)):
+                expected = _loop_shortfall(
+                    size, high, low, close, volume, 5, schedule, start, 20
+                )
+                assert math.isclose(costs.shortfall[i, column], expected, rel_tol=1e-9)
+        # Larger orders always cost more impact.
+        assert (np.diff(costs.impact, axis=0) > 0).all()
+
+    sell = simulate_schedule(sizes, high, low, close, volume, 5, "twap", side="sell")
+    buy = simulate_schedule(sizes, high, low, close, volume, 5, "twap")
+    assert np.allclose(sell.shortfall - sell.impact, -(buy.shortfall - buy.impact))
+
+
+def test_spreading_an_order_reduces_impact():
+    high, low, close, volume = _bars()
+    size = [2e6]
+    one_day = simulate_schedule(size, high, low, close, volume, 1, "twap")
+    ten_days = simulate_schedule(size, high, low, close, volume, 10, "twap")
+    assert ten_days.impact.mean() < one_day.impact.mean() / 2
+    assert ten_days.max_participation.max() < one_day.max_participation.min()
+
+
+def test_tool_on_fixture():
+    result = execution_cost.estimate_execution_costs(
+        "AAPL", order_sizes=[10_000, 1_000_000, 5_000_000]
+    )
+    assert result["status"] == "success"
+    assert result["adv_shares"] > 0 and result["estimated_spread_bps"] >= 0
+    orders = result["orders"]
+    assert [o["shares"] for o in orders] == [10_000, 1_000_000, 5_000_000]
+    impacts = [o["single_day_impact_bps"] for o in orders]
+    assert impacts == sorted(impacts)
+    assert orders[-1]["days_at_max_participation"] > orders[0]["days_at_max_participation"]
+    assert orders[-1]["twap_impact_bps"] < orders[-1]["single_day_impact_bps"]
+
+    assert execution_cost.estimate_execution_costs("NOPE", [1])["status"] == "error"
+    assert execution_cost.estimate_execution_costs("AAPL", [])["status"] == "error"
+    assert (
+        execution_cost.estimate_execution_costs("AAPL", [1], side="short")["status"]
+        == "error"
+    )
+    for participation in (0, -0.1, 1.5):
+        result = execution_cost.estimate_execution_costs(
+            "AAPL", [1], max_participation=participation
+        )
+        assert result["status"] == "error"
+
+
+def test_many_order_sizes_in_one_call():
+    high, low, close, volume = _bars(days=2_000)
+    sizes = np.geomspace(1e3, 1e7, 200)
+    start = time.perf_counter()
+    costs = simulate_schedule(sizes, high, low, close, volume, 10, "vwap")
+    seconds = time.perf_counter() - start
+    print(f"   - 200 order sizes x {costs.shortfall.shape[1]} start dates x 10 days "
+          f"in {seconds * 1000:.0f} ms")
+    assert costs.shortfall.shape == (200, 2_000 - 10 - 20)
+    assert seconds < 2.0
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing execution cost model...\n")
+
+    tests = [
+        ("Corwin-Schultz Spread", test_corwin_schultz_matches_formula),
+        ("Square-root Impact", test_square_root_impact_scaling),
+        ("Schedule vs Loop", test_schedule_matches_loop_for_every_size),
+        ("Spreading Orders", test_spreading_an_order_reduces_impact),
+        ("Execution Cost Tool", test_tool_on_fixture),
+        ("Vectorized Sizes", test_many_order_sizes_in_one_call),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
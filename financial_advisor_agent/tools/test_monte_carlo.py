@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the Monte Carlo risk simulation.
+
+    python -m pytest financial_advisor_agent/tools/test_monte_carlo.py
+    python -m financial_advisor_agent.tools.test_monte_carlo --benchmark   # 1M paths
+"""
+
+import math
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from financial_advisor_agent.tools import monte_carlo
+from financial_advisor_agent.tools.monte_carlo import simulate_paths
+from financial_advisor_agent.tools.worker_pool import pool_context
+
+
+def _history(days=500, mu=0.0004, sigma=0.015, seed=11):
+    return np.expm1(np.random.default_rng(seed).normal(mu, sigma, days))
+
+
+def test_gbm_matches_fitted_moments():
+    history = _history()
+    log_history = np.log1p(history)
+    result = simulate_paths(history, 200_000, 21, method="gbm", seed=1)
+    log_final = np.log1p(result.final_returns)
+    assert abs(log_final.mean() - 21 * log_history.mean()) < 5e-4
+    assert abs(log_final.std() - math.sqrt(21) * log_history.std(ddof=1)) < 5e-4
+
+
+def test_bootstrap_draws_historical_days():
+    history = np.array([-0.05, 0.01, 0.02, 0.03])
+    result = simulate_paths(history, 10_000, 10, seed=2)
+    assert set(np.unique(result.worst_days)) <= set(history)
+    assert result.worst_days.min() == -0.05
+
+    blocks = simulate_paths(history, 2_000, 8, block_size=4, seed=2)
+    assert set(np.unique(blocks.worst_days)) <= set(history)
+
+
+def test_drawdown_matches_loop():
+    history = _history()
+    seed = np.random.SeedSequence(5)
+    returns = monte_carlo._draw_returns(
+        np.random.default_rng(seed), history, 200, 30, "bootstrap", 3
+    )
+    final, drawdowns, worst = monte_carlo._simulate_chunk(
+        history, 200, 30, "bootstrap", 3, seed
+    )
+    for path, daily in enumerate(returns):
+        equity, peak, deepest = 1.0, 1.0, 0.0
+        for r in daily:
+            equity *= 1 + r
+            peak = max(peak, equity)
+            deepest = max(deepest, 1 - equity / peak)
+        assert math.isclose(final[path], equity - 1, abs_tol=1e-12)
+        assert math.isclose(drawdowns[path], deepest, abs_tol=1e-12)
+        assert worst[path] == daily.min()
+
+
+def test_parallel_matches_serial():
+    history = _history()
+    kwargs = dict(paths=50_000, horizon=63, seed=3, memory_limit_mb=4)
+    assert monte_carlo.chunk_paths(63, 4) < 50_000  # several chunks
+    serial = simulate_paths(history, **kwargs)
+    parallel = simulate_paths(history, workers=2, **kwargs)
+    assert pool_context().get_start_method() in ("forkserver", "spawn")
+    assert np.array_equal(serial.final_returns, parallel.final_returns)
+    assert np.array_equal(serial.max_drawdowns, parallel.max_drawdowns)
+
+
+def _peak_memory_mb(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def test_memory_ceiling_at_one_million_paths():
+    history = _history()
+    paths, horizon, limit_mb = 1_000_000, 21, 16
+    result, peak_mb = _peak_memory_mb(
+        lambda: simulate_paths(history, paths, horizon, memory_limit_mb=limit_mb, seed=4)
+    )
+    outputs_mb = 3 * paths * 8 / 2**20
+    unchunked_mb = paths * horizon * 8 * 2 / 2**20
+    print(f"   - peak {peak_mb:.0f} MB (chunk limit {limit_mb} MB + {outputs_mb:.0f} MB "
+          f"of per-path results; unchunked would need ~{unchunked_mb:.0f} MB)")
+    assert result.paths == paths
+    assert peak_mb < limit_mb * 1.25 + outputs_mb + 4
+
+
+def test_tool_on_fixture():
+    result = monte_carlo.simulate_portfolio_risk(
+        ["AAPL", "MSFT", "NVDA"], weights=[0.5, 0.3, 0.2], paths=20_000, horizon_days=63
+    )
+    assert result["status"] == "success"
+    assert result["cvar"] >= result["var"]
+    assert result["cvar_amount"] >= result["var_amount"]
+    percentiles = list(result["final_return_percentiles"].values())
+    assert percentiles == sorted(percentiles)
+    assert 0 <= result["probability_drawdown_exceeds_threshold"] <= 1
+
+    gbm = monte_carlo.simulate_portfolio_risk(["AAPL"], method="gbm", paths=10_000)
+    assert gbm["method"] == "gbm"
+    assert monte_carlo.simulate_portfolio_risk(["NOPE"])["status"] == "error"
+    assert monte_carlo.simulate_portfolio_risk(["AAPL"], method="x")["status"] == "error"
+    assert (
+        monte_carlo.simulate_portfolio_risk(["AAPL", "MSFT"], weights=[1.0])["status"]
+        == "error"
+    )
+    assert monte_carlo.simulate_portfolio_risk([])["status"] == "error"
+    assert (
+        monte_carlo.simulate_portfolio_risk(["AAPL", "MSFT"], weights=[1.0, -1.0])[
+            "status"
+        ]
+        == "error"
+    )
+
+
+def benchmark(paths=1_000_000, horizon=252, workers=1):
+    """Paths per second and peak traced memory for both generators."""
+    history = _history()
+    rates = {}
+    for method in ("bootstrap", "gbm"):
+        start = time.perf_counter()
+        _, peak_mb = _peak_memory_mb(
+            lambda: simulate_paths(
+                history, paths, horizon, method=method, block_size=5, workers=workers
+            )
+        )
+        seconds = time.perf_counter() - start
+        rates[method] = paths / seconds
+        print(f"   - {method:9s} {paths:,} paths x {horizon} days: {seconds:.2f}s "
+              f"({rates[method]:,.0f} paths/s, peak {peak_mb:.0f} MB)")
+    return rates
+
+
+def test_benchmark_small():
+    rates = benchmark(paths=100_000, horizon=21)
+    assert min(rates.values()) > 50_000
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing Monte Carlo risk simulation...\n")
+
+    tests = [
+        ("GBM Moments", test_gbm_matches_fitted_moments),
+        ("Bootstrap Draws", test_bootstrap_draws_historical_days),
+        ("Drawdown vs Loop", test_drawdown_matches_loop),
+        ("Parallel Chunks", test_parallel_matches_serial),
+        ("Memory Ceiling", test_memory_ceiling_at_one_million_paths),
+        ("Risk Tool", test_tool_on_fixture),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (1M paths x 252 days)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the columnar price store.
+
+    python -m pytest financial_advisor_agent/tools/test_price_store.py
+    python -m financial_advisor_agent.tools.test_price_store --benchmark
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from financial_advisor_agent.tools.price_data import (
+    FIXTURE_CSV,
+    PriceStore,
+    UnknownSymbolError,
+    _column,
+)
+
+
+def _store(tmp, **kwargs):
+    csv_path = os.path.join(tmp, "prices.csv")
+    shutil.copy(FIXTURE_CSV, csv_path)
+    return PriceStore(csv_path=csv_path, cache_dir=tmp, **kwargs), csv_path
+
+
+def test_history_matches_csv():
+    store = PriceStore(cache_dir=tempfile.mkdtemp())
+    frame = pd.read_csv(FIXTURE_CSV, parse_dates=["date"])
+    for symbol in ("AAPL", "NVDA"):
+        rows = frame[frame["symbol"] == symbol].sort_values("date")
+        history = store.history(symbol.lower())
+        assert np.array_equal(history.close, rows["close_price"].to_numpy())
+        assert np.array_equal(history.volume, rows["volume"].to_numpy())
+        assert np.array_equal(
+            history.dates, rows["date"].to_numpy().astype("datetime64[s]")
+        )
+
+        window = store.history(symbol, "2023-03-01", "2023-06-30")
+        expected = rows[(rows["date"] >= "2023-03-01") & (rows["date"] <= "2023-06-30")]
+        assert np.array_equal(window.close, expected["close_price"].to_numpy())
+    assert set(store.symbols) == set(frame["symbol"].unique())
+
+    try:
+        store.history("NOPE")
+        assert False, "expected UnknownSymbolError"
+    except UnknownSymbolError:
+        pass
+
+
+def test_slices_share_one_buffer():
+    store = PriceStore(cache_dir=tempfile.mkdtemp())
+    first = store.history("AAPL")
+    again = store.history("AAPL", "2023-01-01")
+    other = store.history("MSFT")
+    assert np.shares_memory(first.close, again.close)
+    assert first.close.base is not None and not first.close.flags.owndata
+    # Every symbol is a view into the same column buffer.
+    column = store._current().columns["close"]
+    assert np.shares_memory(first.close, column) and np.shares_memory(other.close, column)
+    assert store.version == 1
+
+
+def test_refresh_on_file_change():
+    with tempfile.TemporaryDirectory() as tmp:
+        store, csv_path = _store(tmp, check_interval=0.0)
+        before = store.history("AAPL")
+        assert store.version == 1
+
+        frame = pd.read_csv(csv_path)
+        frame.loc[frame["symbol"] == "AAPL", "close_price"] *= 2
+        extra = frame[frame["symbol"] == "AAPL"].tail(1).assign(symbol="ZZZZ")
+        pd.concat([frame, extra]).to_csv(csv_path, index=False)
+        os.utime(csv_path, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+        after = store.history("AAPL")
+        assert store.version == 2
+        assert np.allclose(after.close, before.close * 2)
+        assert "ZZZZ" in store.symbols
+        # Arrays handed out before the refresh are still readable.
+        assert np.isfinite(before.close).all()
+
+        # An unchanged file is not reloaded.
+        store.history("AAPL")
+        assert store.version == 2
+
+
+def test_reuses_arrow_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        store, csv_path = _store(tmp)
+        store.history("AAPL")
+        built = os.stat(store.arrow_path).st_mtime_ns
+        second = PriceStore(csv_path=csv_path, cache_dir=tmp)
+        assert np.array_equal(second.history("AAPL").close, store.history("AAPL").close)
+        assert os.stat(second.arrow_path).st_mtime_ns == built
+
+
+def test_rebuilds_for_an_older_source():
+    with tempfile.TemporaryDirectory() as tmp:
+        store, csv_path = _store(tmp)
+        store.history("AAPL")
+        # Restoring an older CSV leaves the Arrow file newer than its source.
+        frame = pd.read_csv(csv_path)
+        frame[frame["symbol"] != "AAPL"].to_csv(csv_path, index=False)
+        os.utime(csv_path, ns=(10**18, 10**18))
+        assert os.stat(csv_path).st_mtime_ns < os.stat(store.arrow_path).st_mtime_ns
+        restarted = PriceStore(csv_path=csv_path, cache_dir=tmp)
+        assert "AAPL" not in restarted.symbols
+
+
+def test_empty_and_null_columns():
+    table = pa.table({"close_price": pa.chunked_array([], pa.float64())})
+    assert len(_column(table, "close_price")) == 0
+    table = pa.table({"close_price": pa.chunked_array([[1.0, None], [3.0]])})
+    close = _column(table, "close_price")
+    assert close[0] == 1.0 and np.isnan(close[1]) and close[2] == 3.0
+
+
+def test_panel_is_cached_per_version():
+    store = PriceStore(cache_dir=tempfile.mkdtemp())
+    panel = store.panel()
+    assert store.panel() is panel
+    subset = store.panel(["msft", "AAPL"])
+    assert subset.symbols == ("MSFT", "AAPL")
+    history = store.history("MSFT")
+    rows = np.searchsorted(panel.dates, history.dates)
+    assert np.array_equal(subset.close[rows, 0], history.close)
+
+
+def benchmark(lookups=200):
+    """Per-symbol slice latency and memory: store vs re-reading the CSV."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store, csv_path = _store(tmp)
+        symbols = store.symbols
+        results = {}
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(lookups):
+            store.history(symbols[i % len(symbols)], "2023-01-01", "2023-12-31").close.mean()
+        results["store"] = (time.perf_counter() - start) / lookups
+        results["store_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(lookups):
+            frame = pd.read_csv(csv_path, parse_dates=["date"])
+            rows = frame[
+                (frame["symbol"] == symbols[i % len(symbols)])
+                & (frame["date"] >= "2023-01-01")
+                & (frame["date"] <= "2023-12-31")
+            ]
+            rows["close_price"].mean()
+        results["read_csv"] = (time.perf_counter() - start) / lookups
+        results["read_csv_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        table_mb = store.nbytes / 2**20
+
+    print(f"   - store:    {results['store'] * 1e6:8.1f} µs/slice, "
+          f"peak {results['store_mb']:.2f} MB (table {table_mb:.2f} MB, mapped)")
+    print(f"   - read_csv: {results['read_csv'] * 1e6:8.1f} µs/slice, "
+          f"peak {results['read_csv_mb']:.2f} MB")
+    print(f"   - speedup:  {results['read_csv'] / results['store']:.0f}x")
+    return results
+
+
+def test_benchmark_small():
+    results = benchmark(lookups=20)
+    assert results["store"] * 10 < results["read_csv"]
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing columnar price store...\n")
+
+    tests = [
+        ("History vs CSV", test_history_matches_csv),
+        ("Zero-copy Slices", test_slices_share_one_buffer),
+        ("Refresh on Change", test_refresh_on_file_change),
+        ("Arrow File Reuse", test_reuses_arrow_file),
+        ("Older Source Rebuild", test_rebuilds_for_an_older_source),
+        ("Empty and Null Columns", test_empty_and_null_columns),
+        ("Panel Cache", test_panel_is_cached_per_version),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (per-symbol slices)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Tests and microbenchmarks for the quantitative tools.
+
+The vectorized implementations are checked against straightforward loop
+versions of the textbook definitions, and the agent-facing tools are run on
+the checked-in daily_prices fixture.
+
+    python -m pytest financial_advisor_agent/tools/test_quant.py
+    python -m financial_advisor_agent.tools.test_quant --benchmark   # 100k rows
+"""
+
+import math
+import sys
+import time
+
+import numpy as np
+from google.adk.tools import FunctionTool
+
+from financial_advisor_agent.tools import quant, quant_tools
+
+
+def _prices(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n)))
+    spread = np.abs(rng.normal(0, 0.01, n)) * close
+    high = close + spread
+    low = close - spread * rng.uniform(0.5, 1.5, n)
+    return high, low, close
+
+
+def _loop_max_drawdown(prices):
+    peak, worst = prices[0], 0.0
+    for price in prices:
+        peak = max(peak, price)
+        worst = max(worst, 1 - price / peak)
+    return worst
+
+
+def _loop_wilder(values, window):
+    out = [math.nan] * len(values)
+    average = sum(values[:window]) / window
+    out[window - 1] = average
+    for i in range(window, len(values)):
+        average = (average * (window - 1) + values[i]) / window
+        out[i] = average
+    return out
+
+
+def _loop_atr(high, low, close, window):
+    ranges = [high[0] - low[0]] + [
+        max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        for i in range(1, len(close))
+    ]
+    return _loop_wilder(ranges, window)
+
+
+def _loop_rsi(close, window):
+    changes = [close[i] - close[i - 1] for i in range(1, len(close))]
+    gains = _loop_wilder([max(c, 0) for c in changes], window)
+    losses = _loop_wilder([max(-c, 0) for c in changes], window)
+    return [math.nan] + [
+        math.nan if math.isnan(g) else 100.0 if l == 0 else 100 - 100 / (1 + g / l)
+        for g, l in zip(gains, losses)
+    ]
+
+
+def test_returns_and_drawdown_match_loops():
+    _, _, close = _prices(2_000)
+    returns = quant.simple_returns(close)
+    assert np.allclose(returns, [close[i] / close[i - 1] - 1 for i in range(1, len(close))])
+    assert np.allclose(quant.log_returns(close), np.log1p(returns))
+
+    drawdown = quant.max_drawdown(close)
+    assert math.isclose(drawdown.max_drawdown, _loop_max_drawdown(close))
+    assert close[drawdown.peak_index] == close[: drawdown.trough_index + 1].max()
+    assert quant.max_drawdown([1, 2, 3]).max_drawdown == 0.0
+    assert math.isclose(quant.max_drawdown([100, 50, 150, 75]).max_drawdown, 0.5)
+
+
+def test_volatility_and_tail_risk():
+    rng = np.random.default_rng(1)
+    returns = rng.normal(0.0005, 0.01, 200_000)
+    assert abs(quant.annualized_volatility(returns) - 0.01 * math.sqrt(252)) < 0.002
+    rolling = quant.rolling_volatility(returns[:100], window=20)
+    assert np.isnan(rolling[:19]).all()
+    assert math.isclose(rolling[50], returns[31:51].std(ddof=1) * math.sqrt(252))
+
+    historical = quant.value_at_risk(returns, 0.99)
+    parametric = quant.value_at_risk(returns, 0.99, method="parametric")
+    assert abs(historical - parametric) < 5e-4  # normal returns: methods agree
+    cvar = quant.conditional_value_at_risk(returns, 0.99)
+    worst = np.sort(returns)[: int(len(returns) * 0.01)]
+    assert math.isclose(cvar, -worst.mean())
+    assert cvar > historical
+    assert math.isclose(quant.annualized_return(np.full(252, 0.001)), 1.001**252 - 1)
+
+
+def test_indicators_match_loops():
+    high, low, close = _prices(500)
+    atr = quant.average_true_range(high, low, close, 14)
+    assert np.allclose(atr, _loop_atr(high, low, close, 14), equal_nan=True)
+    rsi = quant.relative_strength_index(close, 14)
+    assert np.allclose(rsi, _loop_rsi(close, 14), equal_nan=True)
+    assert np.isnan(rsi[:14]).all() and np.nanmin(rsi) >= 0 and np.nanmax(rsi) <= 100
+    assert quant.relative_strength_index(np.arange(1.0, 40.0))[-1] == 100.0
+
+    bands = quant.bollinger_bands(close, 20, 2.0)
+    window = close[80:100]
+    assert math.isclose(bands.middle[99], window.mean())
+    assert math.isclose(bands.upper[99], window.mean() + 2 * window.std())
+    assert math.isclose(bands.lower[99], window.mean() - 2 * window.std())
+
+
+def test_kelly_sizing():
+    assert math.isclose(quant.kelly_fraction(0.6, 1.0), 0.2)
+    assert quant.kelly_fraction(0.4, 1.0) < 0
+    returns = np.array([0.02, -0.01, 0.015, -0.005, 0.01])
+    assert math.isclose(
+        quant.kelly_fraction_from_returns(returns), returns.mean() / returns.var(ddof=1)
+    )
+    assert quant.kelly_fraction_from_returns(np.zeros(10)) == 0.0
+
+
+def test_tools_on_fixture():
+    stats = quant_tools.get_return_statistics("aapl")
+    assert stats["status"] == "success"
+    assert stats["observations"] > 300
+    assert stats["max_drawdown"] > 0
+    assert stats["max_drawdown_peak_date"] <= stats["max_drawdown_trough_date"]
+
+    risk = quant_tools.get_risk_metrics("MSFT", confidence=0.99)
+    assert risk["status"] == "success"
+    assert risk["cvar_historical"] >= risk["var_historical"] > 0
+    assert risk["rolling_volatility_min"] <= risk["rolling_volatility_current"]
+
+    indicators = quant_tools.get_technical_indicators("NVDA")
+    assert indicators["bollinger_lower"] < indicators["bollinger_middle"]
+    assert 0 <= indicators["rsi"] <= 100
+
+    size = quant_tools.get_position_size("AAPL", capital=100_000)
+    assert size["recommended_shares"] <= size["fixed_fractional_shares"]
+    assert size["capital_at_risk"] <= 100_000 * 0.01 + 1e-6
+    assert size["stop_loss_price"] < size["entry_price"]
+
+    assert quant_tools.get_return_statistics("NOPE")["status"] == "error"
+    assert quant_tools.get_risk_metrics("AAPL", confidence=1.5)["status"] == "error"
+    assert (
+        quant_tools.get_return_statistics("AAPL", start_date="2030-01-01")["status"]
+        == "error"
+    )
+
+
+def test_tools_have_function_declarations():
+    for tool in quant_tools.TRADING_TOOLS + quant_tools.RISK_TOOLS:
+        declaration = FunctionTool(tool)._get_declaration()
+        assert declaration.name == tool.__name__
+        assert declaration.description
+        if declaration.parameters is not None:
+            properties = declaration.parameters.properties
+        else:  # newer ADK versions emit a JSON schema instead
+            properties = declaration.parameters_json_schema["properties"]
+        assert "symbol" in properties
+
+
+def benchmark(rows=100_000, repeats=5):
+    """Best-of-``repeats`` wall time for each primitive on ``rows`` prices."""
+    high, low, close = _prices(rows)
+    returns = quant.simple_returns(close)
+    cases = {
+        "simple_returns": lambda: quant.simple_returns(close),
+        "rolling_volatility(20)": lambda: quant.rolling_volatility(returns, 20),
+        "max_drawdown": lambda: quant.max_drawdown(close),
+        "value_at_risk": lambda: quant.value_at_risk(returns, 0.99),
+        "conditional_value_at_risk": lambda: quant.conditional_value_at_risk(returns, 0.99),
+        "average_true_range(14)": lambda: quant.average_true_range(high, low, close, 14),
+        "relative_strength_index(14)": lambda: quant.relative_strength_index(close, 14),
+        "bollinger_bands(20)": lambda: quant.bollinger_bands(close, 20),
+        "kelly_fraction_from_returns": lambda: quant.kelly_fraction_from_returns(returns),
+        "loop max_drawdown (reference)": lambda: _loop_max_drawdown(close.tolist()),
+        "loop ATR (reference)": lambda: _loop_atr(
+            high.tolist(), low.tolist(), close.tolist(), 14
+        ),
+    }
+    timings = {}
+    for name, case in cases.items():
+        best = math.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            case()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(f"   - {name:32s} {best * 1000:8.2f} ms")
+    return timings
+
+
+def test_benchmark_small():
+    timings = benchmark(rows=100_000, repeats=2)
+    for name, seconds in timings.items():
+        if "reference" not in name:
+            assert seconds < 0.25, f"{name} took {seconds:.3f}s on 100k rows"
+    assert timings["max_drawdown"] < timings["loop max_drawdown (reference)"]
+    assert timings["average_true_range(14)"] < timings["loop ATR (reference)"]
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing quantitative tools...\n")
+
+    tests = [
+        ("Returns and Drawdown", test_returns_and_drawdown_match_loops),
+        ("Volatility and Tail Risk", test_volatility_and_tail_risk),
+        ("Indicators", test_indicators_match_loops),
+        ("Kelly Sizing", test_kelly_sizing),
+        ("Tools on Fixture", test_tools_on_fixture),
+        ("Function Declarations", test_tools_have_function_declarations),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (100k rows)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,41 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process pool start-up shared by the backtest and Monte Carlo tools.
+
+Forking a threaded server (ADK runners, BigQuery clients) can copy held
+locks into the children, so workers start from a fork server instead. The
+server preloads only numpy, pandas and the numerical tool modules; none of
+them import the agent, so the server never builds models or API clients.
+"""
+
+import multiprocessing
+from multiprocessing.context import BaseContext
+
+# Leaf modules only: importing one of these must not import ``agent``.
+PRELOAD_MODULES = (
+    "numpy",
+    "pandas",
+    "financial_advisor_agent.tools.backtest",
+    "financial_advisor_agent.tools.monte_carlo",
+)
+
+
+def pool_context() -> BaseContext:
+    """Returns the multiprocessing context the tool process pools use."""
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(list(PRELOAD_MODULES))
+    return context
@@ -0,0 +1,674 @@
+"""Run a JSONL file of requests through an agent as one offline batch.
+
+Nightly jobs push hundreds of tickers through the financial advisor and
+thousands of study-plan prompts through ``teaching_assistant_agent``.
+``BatchRunner`` runs them without one interactive session after another:
+
+* Items run on ``concurrency`` workers, each item in its own session of one
+  shared runner, at ``Priority.BACKGROUND`` so the rate-limit scheduler
+  still serves interactive traffic first.
+* Results are written as items finish, to JSONL (one flushed line per item)
+  or Parquet (a directory of part files, each written atomically).
+* The output is the checkpoint: a rerun skips every id that already has an
+  ``ok`` result, so a crashed batch resumes where it stopped and only failed
+  or unfinished items run again.
+
+``VertexBatchRunner`` sends single-call agents (an instruction and at most
+``google_search``, like the teaching assistant) through Vertex AI batch
+prediction instead, at the batch price. The job name is checkpointed, so a
+resumed run polls the submitted job instead of submitting another; items
+the job does not cover then go out in a second job.
+
+Input lines are objects with a ``message`` and optionally ``id``,
+``user_id`` and ``state``; items without an ``id`` are keyed by a hash of
+their content. From the command line:
+
+    python -m shared_libraries.batch_runner financial_advisor_agent tickers.jsonl results.jsonl
+    python -m shared_libraries.batch_runner teaching_assistant_agent prompts.jsonl results.parquet \\
+        --vertex-batch --gcs-prefix gs://my-bucket/batches
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import hashlib
+import importlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional
+
+from google.adk.agents import LlmAgent
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.agent_tool import AgentTool
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.google_search_tool import GoogleSearchTool
+from google.genai import types
+
+from shared_libraries.instrumentation import instrumentation_plugins
+from shared_libraries.rate_limiter import Priority, priority_scope
+
+logger = logging.getLogger(__name__)
+
+# Label of Vertex batch requests carrying the position of their item.
+VERTEX_ITEM_LABEL = "batch_item"
+
+_RESULT_COLUMNS = (
+    ("id", "string"),
+    ("status", "string"),
+    ("response", "string"),
+    ("outputs", "string"),
+    ("error", "string"),
+    ("seconds", "float64"),
+    ("prompt_tokens", "int64"),
+    ("completion_tokens", "int64"),
+    ("finished_at", "float64"),
+)
+
+
+@dataclasses.dataclass
+class BatchItem:
+    id: str
+    message: str
+    user_id: str = "batch"
+    state: dict = dataclasses.field(default_factory=dict)
+
+    @classmethod
+    def from_json(cls, record: dict) -> "BatchItem":
+        if not isinstance(record.get("message"), str):
+            raise ValueError("batch item needs a string 'message'")
+        state = record.get("state") or {}
+        item_id = record.get("id")
+        if item_id is None:
+            canonical = json.dumps({"message": record["message"], "state": state}, sort_keys=True)
+            item_id = hashlib.sha1(canonical.encode()).hexdigest()[:16]
+        return cls(str(item_id), record["message"], str(record.get("user_id") or "batch"), state)
+
+
+def read_items(path: str) -> Iterator[BatchItem]:
+    """Yields the items of a JSONL file lazily; blank lines are skipped.
+
+    Raises:
+        ValueError: A line is not a JSON object with a ``message``.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield BatchItem.from_json(json.loads(line))
+            except (ValueError, AttributeError) as e:
+                raise ValueError(f"{path}:{number}: {e}") from e
+
+
+@dataclasses.dataclass
+class BatchResult:
+    """Outcome of one item.
+
+    Attributes:
+        status: ``ok`` or ``error``.
+        response: Final text of the agent.
+        outputs: ``output_key`` state of the agent tree, e.g. the financial
+            advisor's sub-agent reports.
+    """
+
+    id: str
+    status: str
+    response: str = ""
+    outputs: dict = dataclasses.field(default_factory=dict)
+    error: Optional[str] = None
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    finished_at: float = 0.0
+
+    def as_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+@dataclasses.dataclass
+class BatchRunStats:
+    total: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def record(self, result: BatchResult) -> None:
+        self.total += 1
+        if result.status == "ok":
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.prompt_tokens += result.prompt_tokens
+        self.completion_tokens += result.completion_tokens
+
+    def as_dict(self) -> dict:
+        data = dataclasses.asdict(self)
+        data["items_per_second"] = self.total / self.seconds if self.seconds else 0.0
+        return data
+
+
+def _read_journal(path: str) -> list[dict]:
+    """Records of a JSONL file, cutting off a partial last line left by a crash."""
+    if not os.path.exists(path):
+        return []
+    records = []
+    good = 0
+    with open(path, "rb+") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            good += len(line)
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning("Skipping unreadable line in %s", path)
+        if good < os.path.getsize(path):
+            logger.warning("Dropping partial last line of %s", path)
+            f.truncate(good)
+    return records
+
+
+class JsonlSink:
+    """Results as JSON lines, each flushed as soon as it is written.
+
+    A rerun appends to the file, so an item that failed and later succeeded
+    has two lines; the last one per id is current.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed = {r["id"] for r in _read_journal(path) if r.get("status") == "ok"}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, result: BatchResult) -> None:
+        self._file.write(json.dumps(result.as_dict(), default=str) + "\n")
+        self._file.flush()
+        if result.status == "ok":
+            self.completed.add(result.id)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class ParquetSink:
+    """Results as a directory of Parquet part files.
+
+    Rows are journaled to ``_pending.jsonl`` as they arrive and written out as
+    ``part-NNNNN.parquet`` every ``rows_per_file`` rows (and on close), through
+    a temporary file renamed into place. A crash loses neither parts nor
+    journaled rows.
+    """
+
+    def __init__(self, path: str, rows_per_file: int = 100):
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.rows_per_file = rows_per_file
+        os.makedirs(path, exist_ok=True)
+        self.completed: set[str] = set()
+        parts = sorted(name for name in os.listdir(path) if re.fullmatch(r"part-\d+\.parquet", name))
+        for name in parts:
+            table = pq.read_table(os.path.join(path, name), columns=["id", "status"])
+            for item_id, status in zip(table["id"].to_pylist(), table["status"].to_pylist()):
+                if status == "ok":
+                    self.completed.add(item_id)
+        self._next_part = int(parts[-1][5:-8]) + 1 if parts else 0
+        self._journal_path = os.path.join(path, "_pending.jsonl")
+        # Rows already in a part were journaled before a crash cut the reset short.
+        self._rows = [
+            r for r in _read_journal(self._journal_path) if r["id"] not in self.completed
+        ]
+        self.completed.update(r["id"] for r in self._rows if r["status"] == "ok")
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+    def write(self, result: BatchResult) -> None:
+        row = result.as_dict()
+        row["outputs"] = json.dumps(row["outputs"], default=str)
+        self._journal.write(json.dumps(row, default=str) + "\n")
+        self._journal.flush()
+        self._rows.append(row)
+        if result.status == "ok":
+            self.completed.add(result.id)
+        if len(self._rows) >= self.rows_per_file:
+            self._flush()
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in _RESULT_COLUMNS])
+        table = pa.Table.from_pylist(self._rows, schema=schema)
+        part = os.path.join(self.path, f"part-{self._next_part:05d}.parquet")
+        pq.write_table(table, part + ".tmp")
+        os.replace(part + ".tmp", part)
+        self._next_part += 1
+        self._rows = []
+        self._journal.close()
+        self._journal = open(self._journal_path, "w", encoding="utf-8")
+
+    def close(self) -> None:
+        if self._journal.closed:
+            return
+        self._flush()
+        self._journal.close()
+        os.remove(self._journal_path)
+
+
+def open_sink(path: str, rows_per_file: int = 100):
+    """``ParquetSink`` for ``*.parquet`` paths, ``JsonlSink`` otherwise."""
+    if path.endswith(".parquet"):
+        return ParquetSink(path, rows_per_file)
+    return JsonlSink(path)
+
+
+def _output_keys(agent) -> list[str]:
+    keys, stack, seen = [], [agent], set()
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        if getattr(current, "output_key", None):
+            keys.append(current.output_key)
+        stack.extend(current.sub_agents)
+        stack.extend(t.agent for t in getattr(current, "tools", []) if isinstance(t, AgentTool))
+    return keys
+
+
+def _text(content: Optional[types.Content]) -> str:
+    if not content or not content.parts:
+        return ""
+    return "".join(part.text for part in content.parts if part.text and not part.thought)
+
+
+class BatchRunner:
+    """Runs batch items through an agent with bounded concurrency.
+
+    Args:
+        agent: Root agent of the batch.
+        sink: ``JsonlSink`` or ``ParquetSink``; also the checkpoint.
+        concurrency: Items in flight at once.
+        timeout_seconds: Limit per item; None for no limit.
+        app_name: App name of the batch sessions.
+    """
+
+    def __init__(
+        self,
+        agent,
+        sink,
+        concurrency: int = 8,
+        timeout_seconds: Optional[float] = None,
+        app_name: str = "batch",
+    ):
+        self.sink = sink
+        self.concurrency = concurrency
+        self.timeout_seconds = timeout_seconds
+        self.app_name = app_name
+        self.runner = InMemoryRunner(
+            agent=agent, app_name=app_name, plugins=instrumentation_plugins()
+        )
+        self.stats = BatchRunStats()
+        self._output_keys = _output_keys(agent)
+
+    async def run(self, items: Iterable[BatchItem]) -> BatchRunStats:
+        """Runs every item without an ``ok`` result in the sink."""
+        start = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.concurrency)
+
+        async def produce() -> None:
+            seen = set()
+            for item in items:
+                if item.id in seen or item.id in self.sink.completed:
+                    self.stats.skipped += 1
+                    continue
+                seen.add(item.id)
+                await queue.put(item)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def work() -> None:
+            while (item := await queue.get()) is not None:
+                result = await self._run_item(item)
+                self.sink.write(result)
+                self.stats.record(result)
+
+        try:
+            with priority_scope(Priority.BACKGROUND):
+                await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+        finally:
+            self.stats.seconds += time.perf_counter() - start
+        return self.stats
+
+    async def _run_item(self, item: BatchItem) -> BatchResult:
+        start = time.perf_counter()
+        sessions = self.runner.session_service
+        session = await sessions.create_session(
+            app_name=self.app_name, user_id=item.user_id, state=dict(item.state)
+        )
+        result = BatchResult(id=item.id, status="ok")
+
+        async def consume() -> None:
+            async for event in self.runner.run_async(
+                user_id=item.user_id,
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text=item.message)]),
+            ):
+                if event.partial:
+                    continue
+                usage = event.usage_metadata
+                if usage:
+                    result.prompt_tokens += usage.prompt_token_count or 0
+                    result.completion_tokens += usage.candidates_token_count or 0
+                if event.is_final_response() and _text(event.content):
+                    result.response = _text(event.content)
+
+        try:
+            await asyncio.wait_for(consume(), self.timeout_seconds)
+            final = await sessions.get_session(
+                app_name=self.app_name, user_id=item.user_id, session_id=session.id
+            )
+            result.outputs = {k: final.state[k] for k in self._output_keys if k in final.state}
+        except Exception as e:
+            logger.warning("Batch item %s failed: %s", item.id, e)
+            result.status = "error"
+            result.error = f"{type(e).__name__}: {e}"
+        finally:
+            await sessions.delete_session(
+                app_name=self.app_name, user_id=item.user_id, session_id=session.id
+            )
+        result.seconds = time.perf_counter() - start
+        result.finished_at = time.time()
+        return result
+
+
+def _check_batchable(agent) -> None:
+    if not isinstance(agent, LlmAgent) or agent.sub_agents:
+        raise ValueError(f"{agent.name} is not a single LlmAgent; run it with BatchRunner")
+    if not isinstance(agent.instruction, str):
+        raise ValueError(f"{agent.name} builds its instruction per call; run it with BatchRunner")
+    for tool in agent.tools:
+        if isinstance(tool, GoogleSearchTool):
+            continue
+        if isinstance(tool, BaseTool) and tool._get_declaration() is None:
+            # Declaration-less tools only edit the request in a live run (for
+            # example recall_memory adding student memories); batch requests
+            # are built without them.
+            logger.warning("%s: %s is not applied in Vertex batch requests", agent.name, tool.name)
+            continue
+        name = getattr(tool, "name", getattr(tool, "__name__", tool))
+        raise ValueError(f"{agent.name} calls tool {name}; run it with BatchRunner")
+
+
+_GENERATION_FIELDS = {
+    "temperature": "temperature",
+    "top_p": "topP",
+    "top_k": "topK",
+    "max_output_tokens": "maxOutputTokens",
+    "candidate_count": "candidateCount",
+    "seed": "seed",
+}
+
+
+def vertex_request(agent: LlmAgent, item: BatchItem, key: str) -> dict:
+    """One line of a Vertex batch prediction input file for ``item``.
+
+    ``{key}`` placeholders of the instruction are filled from the item's state.
+    """
+    instruction = re.sub(
+        r"\{(\w+)\}",
+        lambda m: str(item.state[m.group(1)]) if m.group(1) in item.state else m.group(0),
+        agent.instruction,
+    )
+    request: dict[str, Any] = {
+        "contents": [{"role": "user", "parts": [{"text": item.message}]}],
+        "labels": {VERTEX_ITEM_LABEL: key},
+    }
+    if instruction:
+        request["systemInstruction"] = {"parts": [{"text": instruction}]}
+    if any(isinstance(tool, GoogleSearchTool) for tool in agent.tools):
+        request["tools"] = [{"googleSearch": {}}]
+    config = agent.generate_content_config
+    if config:
+        values = config.model_dump(exclude_none=True)
+        generation = {alias: values[name] for name, alias in _GENERATION_FIELDS.items() if name in values}
+        if generation:
+            request["generationConfig"] = generation
+    return {"request": request}
+
+
+def parse_prediction(record: dict) -> tuple[str, BatchResult]:
+    """(label key, result) of one line of a Vertex batch prediction output."""
+    key = record["request"]["labels"][VERTEX_ITEM_LABEL]
+    response = record.get("response") or {}
+    candidates = response.get("candidates") or []
+    parts = (candidates[0].get("content") or {}).get("parts", []) if candidates else []
+    text = "".join(p.get("text", "") for p in parts if not p.get("thought"))
+    usage = response.get("usageMetadata") or {}
+    error = record.get("status") or None
+    if not error and not text:
+        error = f"no text (finishReason {candidates[0].get('finishReason') if candidates else None})"
+    return key, BatchResult(
+        id="",
+        status="error" if error else "ok",
+        response=text,
+        error=error,
+        prompt_tokens=usage.get("promptTokenCount", 0),
+        completion_tokens=usage.get("candidatesTokenCount", 0),
+        finished_at=time.time(),
+    )
+
+
+def _split_gcs(uri: str) -> tuple[str, str]:
+    if not uri.startswith("gs://"):
+        raise ValueError(f"not a gs:// URI: {uri}")
+    bucket, _, path = uri[5:].partition("/")
+    return bucket, path
+
+
+class VertexBatchRunner:
+    """Runs a single-call agent through Vertex AI batch prediction.
+
+    Args:
+        agent: ``LlmAgent`` with a string instruction and no tools other than
+            ``google_search``; its callbacks do not run.
+        sink: ``JsonlSink`` or ``ParquetSink``.
+        gcs_prefix: ``gs://`` folder for job input and output.
+        checkpoint_path: Job checkpoint; defaults to ``<sink path>.vertex-job.json``.
+        poll_seconds: Seconds between job status checks.
+        client: ``google.genai.Client``; defaults to a Vertex AI client.
+        storage_client: ``google.cloud.storage.Client``.
+
+    Raises:
+        ValueError: The agent needs more than one model call per item.
+    """
+
+    _DONE = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+    _FAILED = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+    def __init__(
+        self,
+        agent,
+        sink,
+        gcs_prefix: str,
+        checkpoint_path: Optional[str] = None,
+        poll_seconds: float = 30.0,
+        client=None,
+        storage_client=None,
+    ):
+        _check_batchable(agent)
+        self.agent = agent
+        self.sink = sink
+        self.gcs_prefix = gcs_prefix.rstrip("/")
+        self.checkpoint_path = checkpoint_path or f"{sink.path}.vertex-job.json"
+        self.poll_seconds = poll_seconds
+        self.stats = BatchRunStats()
+        self._client = client
+        self._storage = storage_client
+
+    def _genai(self):
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client(vertexai=True)
+        return self._client
+
+    def _gcs(self):
+        if self._storage is None:
+            from google.cloud import storage
+
+            self._storage = storage.Client()
+        return self._storage
+
+    def _save_checkpoint(self, checkpoint: dict) -> None:
+        with open(self.checkpoint_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+
+    def _submit(self, pending: list[BatchItem]) -> dict:
+        # Unique per job: a resumed job and its follow-up may start in the same second.
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        keys = {f"item-{i:06d}": item.id for i, item in enumerate(pending)}
+        lines = [
+            json.dumps(vertex_request(self.agent, item, key))
+            for key, item in zip(keys, pending)
+        ]
+        src = f"{self.gcs_prefix}/{run_id}/input.jsonl"
+        bucket, path = _split_gcs(src)
+        self._gcs().bucket(bucket).blob(path).upload_from_string(
+            "\n".join(lines) + "\n", content_type="application/jsonl"
+        )
+        job = self._genai().batches.create(
+            model=self.agent.canonical_model.model,
+            src=src,
+            config=types.CreateBatchJobConfig(
+                display_name=f"{self.agent.name}-{run_id}",
+                dest=f"{self.gcs_prefix}/{run_id}/output",
+            ),
+        )
+        logger.info("Submitted Vertex batch job %s with %d items", job.name, len(pending))
+        checkpoint = {"job": job.name, "keys": keys}
+        self._save_checkpoint(checkpoint)
+        return checkpoint
+
+    async def _wait(self, name: str):
+        while True:
+            job = self._genai().batches.get(name=name)
+            state = getattr(job.state, "name", str(job.state))
+            if state in self._DONE:
+                return job
+            if state in self._FAILED:
+                os.remove(self.checkpoint_path)
+                raise RuntimeError(f"Vertex batch job {name} ended in {state}: {job.error}")
+            await asyncio.sleep(self.poll_seconds)
+
+    def _predictions(self, job) -> Iterator[dict]:
+        bucket, prefix = _split_gcs(job.dest.gcs_uri)
+        for blob in self._gcs().list_blobs(bucket, prefix=prefix):
+            if blob.name.endswith("predictions.jsonl"):
+                for line in blob.download_as_text().splitlines():
+                    if line.strip():
+                        yield json.loads(line)
+
+    async def _collect(self, checkpoint: dict) -> None:
+        job = await self._wait(checkpoint["job"])
+        keys = checkpoint["keys"]
+        answered = set()
+        for record in self._predictions(job):
+            key, result = parse_prediction(record)
+            result.id = keys.get(key, key)
+            if result.id in answered or result.id in self.sink.completed:
+                continue
+            answered.add(result.id)
+            self.sink.write(result)
+            self.stats.record(result)
+        for key, item_id in keys.items():
+            if item_id not in answered and item_id not in self.sink.completed:
+                result = BatchResult(item_id, "error", error="no prediction", finished_at=time.time())
+                self.sink.write(result)
+                self.stats.record(result)
+        os.remove(self.checkpoint_path)
+
+    async def run(self, items: Iterable[BatchItem]) -> BatchRunStats:
+        """Submits one job for every item without an ``ok`` result.
+
+        A checkpointed job is collected first; only items it did not cover
+        are submitted afterwards.
+        """
+        start = time.perf_counter()
+        try:
+            covered = set()
+            if os.path.exists(self.checkpoint_path):
+                with open(self.checkpoint_path, encoding="utf-8") as f:
+                    checkpoint = json.load(f)
+                logger.info("Resuming Vertex batch job %s", checkpoint["job"])
+                await self._collect(checkpoint)
+                covered.update(checkpoint["keys"].values())
+            pending, seen = [], set()
+            for item in items:
+                if item.id in covered:
+                    continue
+                if item.id in seen or item.id in self.sink.completed:
+                    self.stats.skipped += 1
+                    continue
+                seen.add(item.id)
+                pending.append(item)
+            if pending:
+                if covered:
+                    logger.info("Submitting %d items not in the resumed job", len(pending))
+                await self._collect(self._submit(pending))
+        finally:
+            self.stats.seconds += time.perf_counter() - start
+        return self.stats
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a JSONL file of requests through an agent.")
+    parser.add_argument("agent", help="package whose agent module defines root_agent")
+    parser.add_argument("input", help="JSONL file of {id, message, user_id, state} objects")
+    parser.add_argument("output", help="results file (.jsonl) or directory (.parquet)")
+    parser.add_argument(
+        "--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "8"))
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=float(os.getenv("BATCH_ITEM_TIMEOUT_SECONDS", "0")) or None,
+        help="seconds per item",
+    )
+    parser.add_argument("--rows-per-file", type=int, default=100, help="rows per Parquet part")
+    parser.add_argument("--vertex-batch", action="store_true", help="use Vertex AI batch prediction")
+    parser.add_argument("--gcs-prefix", default=os.getenv("BATCH_GCS_PREFIX"))
+    parser.add_argument("--poll-seconds", type=float, default=30.0)
+    args = parser.parse_args(argv)
+    if args.vertex_batch and not args.gcs_prefix:
+        parser.error("--vertex-batch needs --gcs-prefix or BATCH_GCS_PREFIX")
+
+    logging.basicConfig(level=logging.INFO)
+    agent = importlib.import_module(f"{args.agent}.agent").root_agent
+    sink = open_sink(args.output, args.rows_per_file)
+    try:
+        if args.vertex_batch:
+            runner = VertexBatchRunner(agent, sink, args.gcs_prefix, poll_seconds=args.poll_seconds)
+        else:
+            runner = BatchRunner(agent, sink, args.concurrency, args.timeout, app_name=args.agent)
+        stats = asyncio.run(runner.run(read_items(args.input)))
+    finally:
+        sink.close()
+    print(json.dumps(stats.as_dict()))
+    return 0 if stats.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    exit(main())
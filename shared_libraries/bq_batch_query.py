@@ -0,0 +1,220 @@
+"""Concurrent multi-query tool for the BigQuery analyst.
+
+Overview questions ("records, date range, distinct symbols and price
+statistics") used to cost the analyst one ``execute_sql`` call per figure:
+a model round trip plus a BigQuery job, one after the other. The
+``execute_sql_batch`` tool takes every independent query in one call and
+runs them concurrently:
+
+* Jobs run on a process-wide thread pool of ``BQ_BATCH_MAX_CONCURRENCY``
+  workers, so concurrent sessions together never have more jobs in flight.
+* Like ADK's ``execute_sql`` in its default blocked write mode, each query
+  is dry-run first and anything but SELECT is refused. Rows are capped per
+  query and flagged with ``result_is_likely_truncated``.
+* Identical queries in one batch run once.
+* One failing query does not fail the batch; its result carries the error
+  and the batch status becomes ``PARTIAL``.
+
+Results come back in request order, in the ``execute_sql`` format, so the
+model reads them the same way.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+TOOL_LABEL = "execute_sql_batch"
+
+
+def _bigquery_client(project: str):
+    from google.cloud import bigquery
+
+    return bigquery.Client(project=project)
+
+
+def _json_value(value: Any) -> Any:
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError, OverflowError):
+        return str(value)
+
+
+@dataclasses.dataclass
+class BatchStats:
+    """Counters for one ``BatchQueryRunner``."""
+
+    batches: int = 0
+    queries: int = 0
+    deduplicated: int = 0
+    failed: int = 0
+    peak_in_flight: int = 0
+    job_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        stats = dataclasses.asdict(self)
+        # Job time over wall time: how many jobs overlapped on average.
+        stats["overlap"] = round(self.job_seconds / self.wall_seconds, 2) if self.wall_seconds else 0.0
+        return stats
+
+
+class BatchQueryRunner:
+    """Runs batches of BigQuery queries on a bounded thread pool.
+
+    Args:
+        max_concurrency: Maximum BigQuery jobs in flight across all batches.
+        max_rows: Rows returned per query.
+        max_queries: Largest batch accepted.
+        read_only: Dry-run each query and refuse anything but SELECT.
+        maximum_bytes_billed: Optional per-job cap.
+        client_factory: Project id to BigQuery client; clients are reused.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_rows: int = 50,
+        max_queries: int = 10,
+        read_only: bool = True,
+        maximum_bytes_billed: Optional[int] = None,
+        client_factory: Callable[[str], Any] = _bigquery_client,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_rows = max_rows
+        self.max_queries = max_queries
+        self.read_only = read_only
+        self.maximum_bytes_billed = maximum_bytes_billed
+        self.client_factory = client_factory
+        self.stats = BatchStats()
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix="bq-batch")
+        self._clients: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def _client(self, project_id: str):
+        with self._lock:
+            client = self._clients.get(project_id)
+            if client is None:
+                client = self._clients[project_id] = self.client_factory(project_id)
+            return client
+
+    def _job_config(self, **kwargs):
+        from google.cloud import bigquery
+
+        return bigquery.QueryJobConfig(labels={"adk-bigquery-tool": TOOL_LABEL}, **kwargs)
+
+    def run_query(self, project_id: str, query: str) -> dict[str, Any]:
+        """Runs one query; errors are returned, not raised."""
+        with self._lock:
+            self._in_flight += 1
+            self.stats.peak_in_flight = max(self.stats.peak_in_flight, self._in_flight)
+        start = time.perf_counter()
+        try:
+            client = self._client(project_id)
+            if self.read_only:
+                dry_run = client.query(query, project=project_id, job_config=self._job_config(dry_run=True))
+                if dry_run.statement_type != "SELECT":
+                    return {
+                        "status": "ERROR",
+                        "error_details": "Read-only mode only supports SELECT statements.",
+                    }
+            job_config = self._job_config()
+            if self.maximum_bytes_billed:
+                job_config.maximum_bytes_billed = self.maximum_bytes_billed
+            rows = [
+                {key: _json_value(value) for key, value in row.items()}
+                for row in client.query_and_wait(
+                    query, job_config=job_config, project=project_id, max_results=self.max_rows
+                )
+            ]
+            result = {"status": "SUCCESS", "rows": rows}
+            if len(rows) >= self.max_rows:
+                result["result_is_likely_truncated"] = True
+            return result
+        except Exception as e:
+            logger.debug("Batch query failed: %s", e)
+            return {"status": "ERROR", "error_details": str(e)}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.stats.job_seconds += time.perf_counter() - start
+
+    async def run(self, project_id: str, queries: list[str]) -> dict[str, Any]:
+        """Runs ``queries`` concurrently and returns all results in order."""
+        if not queries:
+            return {"status": "ERROR", "error_details": "No queries given."}
+        if len(queries) > self.max_queries:
+            return {
+                "status": "ERROR",
+                "error_details": f"At most {self.max_queries} queries per batch, got {len(queries)}.",
+            }
+        start = time.perf_counter()
+        unique = list(dict.fromkeys(" ".join(q.split()) for q in queries))
+        loop = asyncio.get_running_loop()
+        results = dict(zip(unique, await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self.run_query, project_id, query)
+            for query in unique
+        ))))
+        ordered = [{"query": q, **results[" ".join(q.split())]} for q in queries]
+        failed = sum(r["status"] != "SUCCESS" for r in results.values())
+        with self._lock:
+            self.stats.batches += 1
+            self.stats.queries += len(unique)
+            self.stats.deduplicated += len(queries) - len(unique)
+            self.stats.failed += failed
+            self.stats.wall_seconds += time.perf_counter() - start
+        status = "SUCCESS" if not failed else "ERROR" if failed == len(unique) else "PARTIAL"
+        return {"status": status, "results": ordered}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+_default_runner: Optional[BatchQueryRunner] = None
+_default_runner_lock = threading.Lock()
+
+
+def default_runner() -> BatchQueryRunner:
+    """Process-wide runner configured from the environment.
+
+    BQ_BATCH_MAX_CONCURRENCY (default 4), BQ_BATCH_MAX_ROWS (default 50) and
+    BQ_BATCH_MAXIMUM_BYTES_BILLED (unset: no cap).
+    """
+    global _default_runner
+    with _default_runner_lock:
+        if _default_runner is None:
+            max_bytes = os.getenv("BQ_BATCH_MAXIMUM_BYTES_BILLED")
+            _default_runner = BatchQueryRunner(
+                max_concurrency=int(os.getenv("BQ_BATCH_MAX_CONCURRENCY", "4")),
+                max_rows=int(os.getenv("BQ_BATCH_MAX_ROWS", "50")),
+                maximum_bytes_billed=int(max_bytes) if max_bytes else None,
+            )
+        return _default_runner
+
+
+async def execute_sql_batch(project_id: str, queries: list[str]) -> dict:
+    """Run several independent BigQuery SELECT queries concurrently.
+
+    Use this instead of consecutive execute_sql calls whenever the queries
+    do not depend on each other's results, e.g. row count, date range,
+    distinct symbols and price statistics for a dataset summary.
+
+    Args:
+        project_id: The GCP project id in which the queries are executed.
+        queries: The GoogleSQL SELECT queries, at most 10.
+
+    Returns:
+        dict: "status" is SUCCESS, PARTIAL or ERROR. "results" holds one
+        entry per query, in order, with the query, its status and either
+        "rows" or "error_details".
+    """
+    return await default_runner().run(project_id, queries)
@@ -0,0 +1,296 @@
+"""History compaction for long multi-agent advisory sessions.
+
+The financial coordinator calls its sub-agents through ``AgentTool``; every
+report they return (market analysis, trading strategies, execution plan,
+risk assessment) stays in the coordinator's history as a function response
+and is re-sent to the model on every later turn. The same reports are also
+stored in session state under each sub-agent's ``output_key``.
+
+``HistoryCompactor`` is a ``before_model_callback`` that rewrites the
+outgoing request only (session events are left untouched):
+
+1. sub-agent reports older than ``keep_recent_turns`` user turns are replaced
+   by a short extractive summary plus the state key holding the full text;
+2. if the request is still above ``token_budget``, recent reports are
+   summarized too (except the newest one), long text parts in older turns are
+   truncated, and finally the oldest turns are dropped.
+
+Because the full reports stay in state, sub-agents do not need them in the
+coordinator's history: ``include_state_inputs`` injects the state keys a
+sub-agent depends on straight into its own request.
+"""
+
+import collections
+import dataclasses
+import json
+import logging
+from collections.abc import Mapping
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# Rough Gemini tokenizer ratio for English text and JSON payloads.
+CHARS_PER_TOKEN = 4
+# Requests kept in ``CompactionStats.recent`` and report ids remembered so a
+# report is counted once however many later requests stub it again.
+RECENT_REQUESTS = 256
+REMEMBERED_REPORTS = 4096
+
+
+def content_chars(contents: list[types.Content]) -> int:
+    """Characters of text and JSON payload carried by a list of contents."""
+    chars = 0
+    for content in contents:
+        for part in content.parts or []:
+            if part.text:
+                chars += len(part.text)
+            if part.function_call:
+                chars += len(json.dumps(part.function_call.args or {}, default=str))
+            if part.function_response:
+                chars += len(
+                    json.dumps(part.function_response.response or {}, default=str)
+                )
+    return chars
+
+
+def estimate_tokens(contents: list[types.Content]) -> int:
+    """Cheap, deterministic token estimate for a list of contents."""
+    return content_chars(contents) // CHARS_PER_TOKEN
+
+
+def summarize_report(text: str, max_chars: int = 600) -> str:
+    """Extractive summary: headings plus the first line after each heading."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    picked = []
+    take_next = True
+    for line in lines:
+        is_heading = line.startswith(("#", "**")) or line.endswith(":")
+        if is_heading or take_next:
+            picked.append(line)
+        take_next = is_heading
+    summary = " | ".join(picked)
+    if len(summary) > max_chars:
+        summary = summary[: max_chars - 3].rstrip() + "..."
+    return summary
+
+
+@dataclasses.dataclass
+class CompactionStats:
+    """Running totals, plus ``(tokens_before, tokens_after)`` of recent requests."""
+
+    requests: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    reports_compacted: int = 0
+    turns_dropped: int = 0
+    recent: collections.deque = dataclasses.field(
+        default_factory=lambda: collections.deque(maxlen=RECENT_REQUESTS)
+    )
+
+    def record(self, before: int, after: int) -> None:
+        self.requests += 1
+        self.tokens_before += before
+        self.tokens_after += after
+        self.recent.append((before, after))
+
+    def as_dict(self) -> dict[str, float]:
+        stats = dataclasses.asdict(self)
+        del stats["recent"]
+        stats["saved_ratio"] = (
+            round(1 - self.tokens_after / self.tokens_before, 4) if self.tokens_before else 0.0
+        )
+        return stats
+
+
+def _split_turns(contents: list[types.Content]) -> list[list[types.Content]]:
+    """Groups contents into turns, each starting at a user text message."""
+    turns: list[list[types.Content]] = []
+    for content in contents:
+        starts_turn = content.role == "user" and any(
+            part.text for part in content.parts or []
+        )
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+class HistoryCompactor:
+    """``before_model_callback`` enforcing a per-request token budget.
+
+    Args:
+        output_keys: Tool (sub-agent) name -> state key holding its output.
+        token_budget: Target upper bound for the request's contents.
+        keep_recent_turns: User turns whose reports are always sent in full.
+        summary_chars: Length of the summaries left in place of reports.
+        truncate_chars: Length older text parts are cut to when over budget.
+    """
+
+    def __init__(
+        self,
+        output_keys: Mapping[str, str],
+        token_budget: int = 8000,
+        keep_recent_turns: int = 1,
+        summary_chars: int = 600,
+        truncate_chars: int = 1200,
+    ):
+        self.output_keys = dict(output_keys)
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.summary_chars = summary_chars
+        self.truncate_chars = truncate_chars
+        self.stats = CompactionStats()
+        self._counted_reports: collections.OrderedDict[object, None] = collections.OrderedDict()
+
+    def __call__(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        before = estimate_tokens(llm_request.contents)
+        llm_request.contents = self.compact(llm_request.contents)
+        after = estimate_tokens(llm_request.contents)
+        self.stats.record(before, after)
+        if after > self.token_budget:
+            logger.warning(
+                "Request still uses ~%d tokens after compaction (budget %d)",
+                after,
+                self.token_budget,
+            )
+        return None
+
+    def compact(self, contents: list[types.Content]) -> list[types.Content]:
+        turns = _split_turns(contents)
+        recent = max(len(turns) - self.keep_recent_turns, 0)
+        turns = [
+            [self._stub_reports(c) for c in turn] if i < recent else turn
+            for i, turn in enumerate(turns)
+        ]
+        if self._fits(turns):
+            return _flatten(turns)
+
+        # Over budget: summarize every report except the newest one.
+        newest = self._newest_report(turns)
+        turns = [
+            [c if (i, j) == newest else self._stub_reports(c) for j, c in enumerate(turn)]
+            for i, turn in enumerate(turns)
+        ]
+        if self._fits(turns):
+            return _flatten(turns)
+
+        turns = [
+            [self._truncate_text(c) for c in turn] if i < len(turns) - 1 else turn
+            for i, turn in enumerate(turns)
+        ]
+        while len(turns) > 1 and not self._fits(turns):
+            turns.pop(0)
+            self.stats.turns_dropped += 1
+        return _flatten(turns)
+
+    def _fits(self, turns: list[list[types.Content]]) -> bool:
+        return estimate_tokens(_flatten(turns)) <= self.token_budget
+
+    def _newest_report(self, turns) -> Optional[tuple[int, int]]:
+        newest = None
+        for i, turn in enumerate(turns):
+            for j, content in enumerate(turn):
+                if any(self._is_full_report(p) for p in content.parts or []):
+                    newest = (i, j)
+        return newest
+
+    def _is_full_report(self, part: types.Part) -> bool:
+        response = part.function_response
+        return (
+            response is not None
+            and response.name in self.output_keys
+            and not (response.response or {}).get("compacted")
+        )
+
+    def _stub_reports(self, content: types.Content) -> types.Content:
+        if not any(self._is_full_report(p) for p in content.parts or []):
+            return content
+        parts = []
+        for part in content.parts:
+            if not self._is_full_report(part):
+                parts.append(part)
+                continue
+            response = part.function_response
+            payload = response.response or {}
+            text = payload.get("result", payload)
+            if not isinstance(text, str):
+                text = json.dumps(text, default=str)
+            key = self.output_keys[response.name]
+            parts.append(
+                types.Part(
+                    function_response=types.FunctionResponse(
+                        id=response.id,
+                        name=response.name,
+                        response={
+                            "compacted": True,
+                            "state_key": key,
+                            "summary": summarize_report(text, self.summary_chars),
+                            "note": (
+                                f"Full output ({len(text)} chars) is stored in "
+                                f"session state under '{key}'."
+                            ),
+                        },
+                    )
+                )
+            )
+            self._count_report(response.id or (response.name, text))
+        return types.Content(role=content.role, parts=parts)
+
+    def _count_report(self, report_id: object) -> None:
+        # Requests are rebuilt from session events, so the same report is
+        # stubbed again on every later turn.
+        if report_id in self._counted_reports:
+            self._counted_reports.move_to_end(report_id)
+            return
+        self._counted_reports[report_id] = None
+        if len(self._counted_reports) > REMEMBERED_REPORTS:
+            self._counted_reports.popitem(last=False)
+        self.stats.reports_compacted += 1
+
+    def _truncate_text(self, content: types.Content) -> types.Content:
+        limit = self.truncate_chars
+        if not any(p.text and len(p.text) > limit for p in content.parts or []):
+            return content
+        parts = [
+            types.Part(text=p.text[:limit] + " [...]")
+            if p.text and len(p.text) > limit
+            else p
+            for p in content.parts
+        ]
+        return types.Content(role=content.role, parts=parts)
+
+
+def _flatten(turns: list[list[types.Content]]) -> list[types.Content]:
+    return [content for turn in turns for content in turn]
+
+
+def include_state_inputs(*state_keys: str):
+    """Builds a ``before_model_callback`` adding state values to the request.
+
+    Sub-agents called through ``AgentTool`` receive a copy of the parent's
+    state, so they can read upstream reports directly instead of relying on
+    the coordinator to paste them into the request.
+    """
+
+    def callback(
+        callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        sections = [
+            f"### {key}\n{callback_context.state[key]}"
+            for key in state_keys
+            if callback_context.state.get(key)
+        ]
+        if sections:
+            llm_request.append_instructions(
+                ["Inputs available from session state:\n\n" + "\n\n".join(sections)]
+            )
+        return None
+
+    return callback
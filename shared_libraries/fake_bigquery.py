@@ -0,0 +1,1947 @@
+"""In-process stand-in for ``google.cloud.bigquery`` backed by SQLite.
+
+The BigQuery paths of the toolkit are the data generator's loads and MERGE,
+the price store's ``DAILY_PRICES_TABLE`` source and the analyst's SQL tools.
+All of them need a live project. This module implements the part of the
+``bigquery`` client API they use, on top of one embedded SQLite database
+per process, so those paths can be tested and benchmarked offline:
+
+* ``Client`` with dataset and table creation, lookup, listing and deletion;
+* load jobs from DataFrames (``load_table_from_dataframe``) and from CSV,
+  Parquet or newline-delimited JSON files (``load_table_from_file``), with
+  the write dispositions, schema checks and REQUIRED columns;
+* queries (``query``, ``query_and_wait``) with named, positional and array
+  parameters, DML, MERGE and DDL, returning ``Row`` objects, DataFrames or
+  Arrow tables;
+* dry runs that compile the statement and report ``total_bytes_processed``
+  with BigQuery's per-type sizes for the columns actually read;
+* latency injection through ``LatencyModel``.
+
+Every ``Client`` shares one process-wide ``FakeBigQueryBackend``, so data
+loaded through one client is visible to the next, as it is in a project.
+Code that imports ``google.cloud.bigquery`` itself picks up the fake inside
+``install()``:
+
+    from shared_libraries import fake_bigquery
+
+    with fake_bigquery.install(latency=fake_bigquery.LatencyModel.bigquery()):
+        create_bigquery_dataset_and_table("test-project")
+        upload_to_bigquery(df, "test-project.hist_stock_market.daily_prices", ...)
+
+SQL is GoogleSQL translated to SQLite. Backticked and project-qualified
+names, ``@params``, ``UNNEST(@array)``, ``QUALIFY``, ``MERGE``, ``EXTRACT``,
+``DATE_TRUNC``/``DATE_ADD``/``DATE_SUB``/``DATE_DIFF``, ``FORMAT_DATE``,
+``PARSE_DATE``, ``SAFE_DIVIDE``, ``IF``, ``COUNTIF``, ``STDDEV``, ``VARIANCE``,
+``CORR`` and ``APPROX_COUNT_DISTINCT`` (the aggregates also as window
+functions) are supported; other GoogleSQL features are not. Each dataset is
+an attached in-memory database, so SQLite's limit of 10 attached databases
+applies. Projects are not isolated: ``a.ds.t`` and ``b.ds.t`` are the same
+table. DATE and TIMESTAMP columns come back as ``date`` and ``datetime``
+values, but expressions over them (``MAX(date)``) come back as ISO strings.
+"""
+
+import collections
+import contextlib
+import dataclasses
+import datetime
+import io
+import json
+import math
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import types
+import uuid
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+
+try:
+    from google.api_core.exceptions import BadRequest, Conflict, NotFound
+except ImportError:  # google-cloud-bigquery (and api_core) not installed
+
+    class GoogleAPICallError(Exception):
+        """Stand-in for ``google.api_core.exceptions.GoogleAPICallError``."""
+
+        code: Optional[int] = None
+
+    class BadRequest(GoogleAPICallError):
+        code = 400
+
+    class NotFound(GoogleAPICallError):
+        code = 404
+
+    class Conflict(GoogleAPICallError):
+        code = 409
+
+
+DEFAULT_PROJECT = "fake-project"
+# Minimum bytes billed per query by on-demand pricing.
+MIN_BYTES_BILLED = 10 * 1024 * 1024
+MAX_JOB_HISTORY = 1000
+
+
+# --------------------------------------------------------------------------
+# Client-side value types, named like their google.cloud.bigquery originals.
+# --------------------------------------------------------------------------
+
+
+class SourceFormat:
+    CSV = "CSV"
+    PARQUET = "PARQUET"
+    NEWLINE_DELIMITED_JSON = "NEWLINE_DELIMITED_JSON"
+
+
+class WriteDisposition:
+    WRITE_TRUNCATE = "WRITE_TRUNCATE"
+    WRITE_APPEND = "WRITE_APPEND"
+    WRITE_EMPTY = "WRITE_EMPTY"
+
+
+class CreateDisposition:
+    CREATE_IF_NEEDED = "CREATE_IF_NEEDED"
+    CREATE_NEVER = "CREATE_NEVER"
+
+
+_TYPE_ALIASES = {
+    "INT64": "INTEGER",
+    "FLOAT64": "FLOAT",
+    "BOOL": "BOOLEAN",
+    "NUMERIC": "FLOAT",
+    "BIGNUMERIC": "FLOAT",
+    "DATETIME": "TIMESTAMP",
+    "JSON": "STRING",
+}
+
+
+class SchemaField:
+    """A column of a table or query result."""
+
+    def __init__(
+        self,
+        name: str,
+        field_type: str,
+        mode: str = "NULLABLE",
+        description: Optional[str] = None,
+    ):
+        self.name = name
+        self.field_type = field_type.upper()
+        self.mode = (mode or "NULLABLE").upper()
+        self.description = description
+
+    @property
+    def is_nullable(self) -> bool:
+        return self.mode == "NULLABLE"
+
+    def _key(self):
+        return (self.name, _TYPE_ALIASES.get(self.field_type, self.field_type), self.mode)
+
+    def __eq__(self, other):
+        return isinstance(other, SchemaField) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"SchemaField({self.name!r}, {self.field_type!r}, {self.mode!r})"
+
+
+class DatasetReference:
+    def __init__(self, project: str, dataset_id: str):
+        self.project = project
+        self.dataset_id = dataset_id
+
+    @classmethod
+    def from_string(cls, dataset_id: str, default_project: Optional[str] = None):
+        project, _, dataset = dataset_id.rpartition(".")
+        return cls(project or default_project or DEFAULT_PROJECT, dataset)
+
+    def table(self, table_id: str) -> "TableReference":
+        return TableReference(self, table_id)
+
+    def __eq__(self, other):
+        return isinstance(other, DatasetReference) and (
+            (self.project, self.dataset_id) == (other.project, other.dataset_id)
+        )
+
+    def __hash__(self):
+        return hash((self.project, self.dataset_id))
+
+    def __repr__(self):
+        return f"DatasetReference({self.project!r}, {self.dataset_id!r})"
+
+
+class TableReference:
+    def __init__(self, dataset_ref: DatasetReference, table_id: str):
+        self.project = dataset_ref.project
+        self.dataset_id = dataset_ref.dataset_id
+        self.table_id = table_id
+
+    @classmethod
+    def from_string(cls, table_id: str, default_project: Optional[str] = None):
+        parts = table_id.replace(":", ".").split(".")
+        if len(parts) == 2:
+            parts.insert(0, default_project or DEFAULT_PROJECT)
+        if len(parts) != 3 or not all(parts):
+            raise ValueError(f"table_id must be 'dataset.table' or 'project.dataset.table': {table_id!r}")
+        return cls(DatasetReference(parts[0], parts[1]), parts[2])
+
+    @property
+    def dataset_ref(self) -> DatasetReference:
+        return DatasetReference(self.project, self.dataset_id)
+
+    @property
+    def path(self) -> str:
+        return f"/projects/{self.project}/datasets/{self.dataset_id}/tables/{self.table_id}"
+
+    def __str__(self):
+        return f"{self.project}.{self.dataset_id}.{self.table_id}"
+
+    def __eq__(self, other):
+        return isinstance(other, TableReference) and str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return f"TableReference({self.project!r}, {self.dataset_id!r}, {self.table_id!r})"
+
+
+class Dataset:
+    def __init__(self, dataset_ref):
+        if isinstance(dataset_ref, str):
+            dataset_ref = DatasetReference.from_string(dataset_ref)
+        self.reference = dataset_ref
+        self.location: Optional[str] = None
+        self.description: Optional[str] = None
+        self.labels: dict[str, str] = {}
+
+    project = property(lambda self: self.reference.project)
+    dataset_id = property(lambda self: self.reference.dataset_id)
+    full_dataset_id = property(lambda self: f"{self.project}:{self.dataset_id}")
+
+    def table(self, table_id: str) -> TableReference:
+        return self.reference.table(table_id)
+
+
+class Table:
+    def __init__(self, table_ref, schema: Optional[Iterable[SchemaField]] = None):
+        if isinstance(table_ref, str):
+            table_ref = TableReference.from_string(table_ref)
+        self.reference = table_ref
+        self.schema = list(schema or [])
+        self.description: Optional[str] = None
+        self.labels: dict[str, str] = {}
+        self.num_rows: Optional[int] = None
+        self.num_bytes: Optional[int] = None
+
+    project = property(lambda self: self.reference.project)
+    dataset_id = property(lambda self: self.reference.dataset_id)
+    table_id = property(lambda self: self.reference.table_id)
+    full_table_id = property(lambda self: f"{self.project}:{self.dataset_id}.{self.table_id}")
+    path = property(lambda self: self.reference.path)
+
+    def __repr__(self):
+        return f"Table({self.reference!r})"
+
+
+@dataclasses.dataclass
+class ScalarQueryParameter:
+    name: Optional[str]
+    type_: str
+    value: Any
+
+
+@dataclasses.dataclass
+class ArrayQueryParameter:
+    name: Optional[str]
+    array_type: str
+    values: list
+
+
+@dataclasses.dataclass
+class ConnectionProperty:
+    key: str
+    value: str
+
+
+@dataclasses.dataclass
+class EncryptionConfiguration:
+    kms_key_name: Optional[str] = None
+
+
+class _JobConfig:
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+class QueryJobConfig(_JobConfig):
+    dry_run = False
+    use_query_cache = True
+    query_parameters: list = []
+    labels: dict = {}
+    maximum_bytes_billed: Optional[int] = None
+    default_dataset = None
+    connection_properties: list = []
+    destination_encryption_configuration = None
+
+
+class LoadJobConfig(_JobConfig):
+    source_format = SourceFormat.PARQUET
+    schema: Optional[list] = None
+    write_disposition = WriteDisposition.WRITE_APPEND
+    create_disposition = CreateDisposition.CREATE_IF_NEEDED
+    skip_leading_rows = 0
+    autodetect = False
+
+
+class Row:
+    """A result row; values by position, key (``row["symbol"]``) or attribute."""
+
+    __slots__ = ("_values", "_index")
+
+    def __init__(self, values: tuple, field_to_index: dict[str, int]):
+        self._values = values
+        self._index = field_to_index
+
+    def __getattr__(self, name):
+        try:
+            return self._values[self._index[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._values[self._index[key]]
+        return self._values[key]
+
+    def get(self, key: str, default=None):
+        index = self._index.get(key)
+        return default if index is None else self._values[index]
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self) -> tuple:
+        return self._values
+
+    def items(self):
+        return ((key, self._values[index]) for key, index in self._index.items())
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, Row):
+            return self._values == other._values and self._index == other._index
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Row({self._values!r}, {self._index!r})"
+
+
+_ARROW_TYPES = {
+    "STRING": pa.string(),
+    "INTEGER": pa.int64(),
+    "FLOAT": pa.float64(),
+    "BOOLEAN": pa.bool_(),
+    "DATE": pa.date32(),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+    "BYTES": pa.binary(),
+}
+_PANDAS_TYPES = {pa.int64(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype()}
+
+
+class RowIterator:
+    """Rows of a finished query."""
+
+    def __init__(self, schema: list[SchemaField], rows: list[tuple]):
+        self.schema = schema
+        self._rows = rows
+        self._index = {field.name: i for i, field in enumerate(schema)}
+
+    @property
+    def total_rows(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Row]:
+        return (Row(values, self._index) for values in self._rows)
+
+    def to_arrow(self, **_) -> pa.Table:
+        columns = list(zip(*self._rows)) if self._rows else [()] * len(self.schema)
+        return pa.table(
+            {
+                field.name: pa.array(values, type=_ARROW_TYPES[field.field_type])
+                for field, values in zip(self.schema, columns)
+            }
+        )
+
+    def to_dataframe(self, **_) -> pd.DataFrame:
+        return self.to_arrow().to_pandas(types_mapper=_PANDAS_TYPES.get)
+
+
+# --------------------------------------------------------------------------
+# Latency injection
+# --------------------------------------------------------------------------
+
+
+@dataclasses.dataclass
+class LatencyModel:
+    """Simulated service latency added to every call.
+
+    A job takes ``query_overhead`` (or ``load_overhead``) plus
+    ``seconds_per_gib`` per GiB processed; metadata calls take
+    ``api_overhead``. Each delay is multiplied by a lognormal jitter factor
+    with log-sigma ``jitter`` and by ``scale``. The delay is spent in
+    ``job.result()``, outside the backend lock, so concurrent jobs overlap
+    as they would against the service.
+    """
+
+    api_overhead: float = 0.0
+    query_overhead: float = 0.0
+    load_overhead: float = 0.0
+    seconds_per_gib: float = 0.0
+    jitter: float = 0.0
+    scale: float = 1.0
+    seed: Optional[int] = None
+    sleep: Callable[[float], None] = time.sleep
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def bigquery(cls, scale: float = 1.0, seed: Optional[int] = None) -> "LatencyModel":
+        """Rough figures for small interactive jobs on on-demand BigQuery.
+
+        ``scale`` shrinks every delay while keeping their ratios, e.g.
+        ``scale=0.01`` for unit tests.
+        """
+        return cls(
+            api_overhead=0.1,
+            query_overhead=0.6,
+            load_overhead=1.5,
+            seconds_per_gib=2.0,
+            jitter=0.35,
+            scale=scale,
+            seed=seed,
+        )
+
+    def delay(self, kind: str, bytes_processed: int = 0) -> float:
+        base = {
+            "api": self.api_overhead,
+            "query": self.query_overhead,
+            "load": self.load_overhead,
+        }[kind]
+        if kind != "api":
+            base += self.seconds_per_gib * bytes_processed / 2**30
+        if self.jitter and base:
+            with self._lock:
+                base *= math.exp(self._rng.gauss(-self.jitter**2 / 2, self.jitter))
+        return base * self.scale
+
+
+NO_LATENCY = LatencyModel()
+
+
+# --------------------------------------------------------------------------
+# Jobs
+# --------------------------------------------------------------------------
+
+
+class _Job:
+    job_type = ""
+
+    def __init__(self, client: "Client", error: Optional[Exception], latency: float):
+        self.job_id = f"job_{uuid.uuid4().hex}"
+        self.project = client.project
+        self.location = client.location
+        self.state = "DONE"
+        self.error_result = None if error is None else {"message": str(error)}
+        self.errors = None if error is None else [self.error_result]
+        self._error = error
+        self._latency = latency
+        self._sleep = client._latency.sleep
+        self._waited = False
+
+    def _wait(self):
+        if not self._waited:
+            self._waited = True
+            if self._latency > 0:
+                self._sleep(self._latency)
+        if self._error is not None:
+            raise self._error
+
+    def done(self) -> bool:
+        return True
+
+    def exception(self):
+        return self._error
+
+
+class LoadJob(_Job):
+    job_type = "load"
+
+    def __init__(self, client, destination: TableReference, output_rows: int, error, latency):
+        super().__init__(client, error, latency)
+        self.destination = destination
+        self.output_rows = output_rows
+
+    def result(self, timeout: Optional[float] = None) -> "LoadJob":
+        self._wait()
+        return self
+
+
+class QueryJob(_Job):
+    job_type = "query"
+
+    def __init__(self, client, query: str, dry_run: bool, outcome: "_Outcome", error, latency):
+        super().__init__(client, error, latency)
+        self.query = query
+        self.dry_run = dry_run
+        self.statement_type = outcome.statement_type
+        self.total_bytes_processed = outcome.bytes_processed
+        self.total_bytes_billed = (
+            0 if dry_run or not outcome.bytes_processed
+            else max(outcome.bytes_processed, MIN_BYTES_BILLED)
+        )
+        self.num_dml_affected_rows = outcome.affected_rows
+        self.cache_hit = False
+        self._rows = RowIterator(outcome.schema, outcome.rows)
+
+    @property
+    def schema(self) -> list[SchemaField]:
+        return self._rows.schema
+
+    def result(self, timeout: Optional[float] = None, max_results: Optional[int] = None) -> RowIterator:
+        self._wait()
+        if max_results is not None:
+            return RowIterator(self._rows.schema, self._rows._rows[:max_results])
+        return self._rows
+
+    def to_dataframe(self, **kwargs) -> pd.DataFrame:
+        return self.result().to_dataframe(**kwargs)
+
+    def to_arrow(self, **kwargs) -> pa.Table:
+        return self.result().to_arrow(**kwargs)
+
+    def to_api_repr(self) -> dict[str, Any]:
+        query_statistics = {
+            "statementType": self.statement_type,
+            "totalBytesProcessed": str(self.total_bytes_processed),
+            "totalBytesBilled": str(self.total_bytes_billed),
+        }
+        if self.num_dml_affected_rows is not None:
+            query_statistics["numDmlAffectedRows"] = str(self.num_dml_affected_rows)
+        return {
+            "jobReference": {
+                "projectId": self.project,
+                "jobId": self.job_id,
+                "location": self.location,
+            },
+            "configuration": {
+                "jobType": "QUERY",
+                "dryRun": self.dry_run,
+                "query": {"query": self.query, "useLegacySql": False},
+            },
+            "statistics": {
+                "totalBytesProcessed": str(self.total_bytes_processed),
+                "query": query_statistics,
+            },
+            "status": {"state": self.state, **({"errorResult": self.error_result} if self.errors else {})},
+        }
+
+
+# --------------------------------------------------------------------------
+# GoogleSQL -> SQLite translation
+# --------------------------------------------------------------------------
+
+# BigQuery type -> SQLite declared type. DATE, TIMESTAMP and BOOLEAN get
+# private declared types so registered converters turn them back into
+# date/datetime/bool values; they have NUMERIC affinity, which keeps ISO
+# strings as text.
+_SQLITE_TYPES = {
+    "STRING": "TEXT",
+    "INTEGER": "INTEGER",
+    "FLOAT": "REAL",
+    "BOOLEAN": "BQ_BOOL",
+    "DATE": "BQ_DATE",
+    "TIMESTAMP": "BQ_TIMESTAMP",
+    "BYTES": "BLOB",
+}
+_BIGQUERY_TYPES = {sqlite: bq for bq, sqlite in _SQLITE_TYPES.items()}
+_DDL_TYPES = {
+    **{bq: sqlite for bq, sqlite in _SQLITE_TYPES.items()},
+    **{alias: _SQLITE_TYPES[bq] for alias, bq in _TYPE_ALIASES.items()},
+}
+_CAST_TYPES = {
+    "STRING": "TEXT",
+    "INT64": "INTEGER",
+    "INTEGER": "INTEGER",
+    "FLOAT64": "REAL",
+    "NUMERIC": "REAL",
+    "BIGNUMERIC": "REAL",
+    "BOOL": "INTEGER",
+    "DATE": "TEXT",
+    "TIMESTAMP": "TEXT",
+    "DATETIME": "TEXT",
+}
+
+# BigQuery's logical sizes: 8 bytes per numeric/date value, 1 per bool,
+# 2 + UTF-8 length per string.
+_FIXED_BYTES = {"INTEGER": 8, "FLOAT": 8, "DATE": 8, "TIMESTAMP": 8, "BOOLEAN": 1}
+
+_DATE_PARTS = (
+    "MICROSECOND|MILLISECOND|SECOND|MINUTE|HOUR|DAYOFWEEK|DAY|DAYOFYEAR|"
+    "ISOWEEK|WEEK|MONTH|QUARTER|ISOYEAR|YEAR|DATE"
+)
+_TOKENS = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")
+    |(?P<ident>`[^`]*`)
+    |(?P<code>[^-'"`\#/]+|.)
+    """,
+    re.S | re.X,
+)
+_PLACEHOLDER = re.compile("\x00(\\d+)\x00")
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "0": "\0"}
+_DATE_PART_FUNCTIONS = re.compile(r"\b(DATE_TRUNC|DATE_DIFF|TIMESTAMP_TRUNC)\s*\(", re.I)
+_CODE_REWRITES = [
+    # `project.dataset.table` (after backtick quoting) -> "dataset"."table"
+    (re.compile(r'"[^"]+"\."([^"]+)"\."([^"]+)"'), r'"\1"."\2"'),
+    (
+        re.compile(r"\b(FROM|JOIN|INTO|UPDATE|TABLE|USING|MERGE)\s+[A-Za-z][\w-]*\.(\w+)\.(\w+)\b", re.I),
+        r'\1 "\2"."\3"',
+    ),
+    (re.compile(r"(?<!@)@(\w+)"), r":\1"),
+    (re.compile(r"\bUNNEST\s*\(\s*(:\w+)\s*\)", re.I), r"(SELECT value FROM json_each(\1))"),
+    (re.compile(r"\b(CURRENT_DATE|CURRENT_TIMESTAMP)\s*\(\s*\)", re.I), r"\1"),
+    (re.compile(r"\bSAFE_CAST\s*\(", re.I), "CAST("),
+    (
+        re.compile(r"\bAS\s+(" + "|".join(_CAST_TYPES) + r")\s*\)", re.I),
+        lambda m: f"AS {_CAST_TYPES[m.group(1).upper()]})",
+    ),
+    (
+        re.compile(r"\bEXTRACT\s*\(\s*(" + _DATE_PARTS + r")\s+FROM\s+", re.I),
+        lambda m: f"_BQ_EXTRACT('{m.group(1).upper()}', ",
+    ),
+    (
+        re.compile(r"\bINTERVAL\s+(-?\d+|:\w+)\s+(" + _DATE_PARTS + r")\b", re.I),
+        lambda m: f"{m.group(1)}, '{m.group(2).upper()}'",
+    ),
+]
+_STATEMENT_TYPES = [
+    (re.compile(r"(SELECT|WITH|\()\b", re.I), "SELECT"),
+    (re.compile(r"INSERT\b", re.I), "INSERT"),
+    (re.compile(r"UPDATE\b", re.I), "UPDATE"),
+    (re.compile(r"DELETE\b", re.I), "DELETE"),
+    (re.compile(r"MERGE\b", re.I), "MERGE"),
+    (re.compile(r"TRUNCATE\s+TABLE\b", re.I), "TRUNCATE_TABLE"),
+    (re.compile(r"CREATE\s+(OR\s+REPLACE\s+)?TABLE\b.*?\bAS\s+(SELECT|WITH)\b", re.I | re.S), "CREATE_TABLE_AS_SELECT"),
+    (re.compile(r"CREATE\s+(OR\s+REPLACE\s+)?TABLE\b", re.I), "CREATE_TABLE"),
+    (re.compile(r"DROP\s+TABLE\b", re.I), "DROP_TABLE"),
+    (re.compile(r"CREATE\s+SCHEMA\b", re.I), "CREATE_SCHEMA"),
+    (re.compile(r"DROP\s+SCHEMA\b", re.I), "DROP_SCHEMA"),
+    (re.compile(r"ALTER\s+TABLE\b", re.I), "ALTER_TABLE"),
+]
+_TABLE_NAME = r'(?:"\w+"\."\w+"|\w+\.\w+|"\w+"|\w+)'
+_MERGE = re.compile(
+    rf"""MERGE\s+(?:INTO\s+)?(?P<target>{_TABLE_NAME})(?:\s+(?:AS\s+)?(?!USING\b)(?P<t>\w+))?
+    \s+USING\s+(?P<source>{_TABLE_NAME}|\(.*?\))(?:\s+(?:AS\s+)?(?!ON\b)(?P<s>\w+))?
+    \s+ON\s+(?P<on>.+?)\s+(?P<clauses>WHEN\s.*)$""",
+    re.I | re.S | re.X,
+)
+_WHEN = re.compile(r"\bWHEN\s+(NOT\s+MATCHED(?:\s+BY\s+TARGET)?|MATCHED)\s+(AND\s+.+?\s+)?THEN\s+", re.I | re.S)
+
+
+def _literal(token: str) -> str:
+    """A GoogleSQL string literal as a SQLite one."""
+    body = re.sub(r"\\(.)", lambda m: _ESCAPES.get(m.group(1), m.group(1)), token[1:-1], flags=re.S)
+    return "'" + body.replace("'", "''") + "'"
+
+
+def _identifier(token: str) -> str:
+    return ".".join('"' + part + '"' for part in token[1:-1].split("."))
+
+
+def _top_level(sql: str, pattern: re.Pattern) -> Iterator[re.Match]:
+    """Matches of ``pattern`` outside parentheses."""
+    depth, position = 0, 0
+    for match in pattern.finditer(sql):
+        depth += sql.count("(", position, match.start()) - sql.count(")", position, match.start())
+        position = match.start()
+        if depth == 0:
+            yield match
+
+
+def _closing_paren(sql: str, start: int) -> int:
+    depth = 0
+    for i in range(start, len(sql)):
+        depth += {"(": 1, ")": -1}.get(sql[i], 0)
+        if depth == 0:
+            return i
+    raise BadRequest("Syntax error: unbalanced parentheses")
+
+
+def _quote_date_parts(sql: str) -> str:
+    """``DATE_TRUNC(d, MONTH)`` -> ``DATE_TRUNC(d, 'MONTH')``."""
+    for match in reversed(list(_DATE_PART_FUNCTIONS.finditer(sql))):
+        close = _closing_paren(sql, match.end() - 1)
+        args = sql[match.end():close]
+        commas = list(_top_level(args, re.compile(",")))
+        if not commas:
+            continue
+        part = args[commas[-1].end():].strip()
+        if re.fullmatch(_DATE_PARTS, part, re.I):
+            sql = sql[: match.end() + commas[-1].end()] + f" '{part.upper()}'" + sql[close:]
+    return sql
+
+
+_TYPED_LITERAL = re.compile("\\b(DATE|DATETIME|TIMESTAMP)\\s+\x00(\\d+)\x00", re.I)
+
+
+def _typed_literals(text: str, literals: list[str]) -> str:
+    """``DATE '2024-02-01'`` -> the ISO string the table stores for that type."""
+
+    def replace(match: re.Match) -> str:
+        kind, index = match.group(1).upper(), int(match.group(2))
+        value = literals[index][1:-1].replace("''", "'")
+        try:
+            if kind == "DATE":
+                value = datetime.date.fromisoformat(value).isoformat()
+            elif kind == "DATETIME":
+                value = datetime.datetime.fromisoformat(value).isoformat()
+            else:
+                value = _to_timestamp(value).isoformat()
+        except ValueError:
+            raise BadRequest(f"Invalid {kind} literal: {value}") from None
+        literals[index] = f"'{value}'"
+        return f"\x00{index}\x00"
+
+    return _TYPED_LITERAL.sub(replace, text)
+
+
+@dataclasses.dataclass
+class _Statement:
+    statement_type: str
+    # (SQLite statement, whether its rowcount counts as affected rows)
+    parts: list[tuple[str, bool]]
+    returns_rows: bool = False
+    hidden_columns: tuple = ()
+    schema_action: Optional[tuple] = None
+
+
+def translate(sql: str) -> list[_Statement]:
+    """Translates a GoogleSQL script into SQLite statements.
+
+    Raises:
+        BadRequest: For unsupported or malformed statements.
+    """
+    literals: list[str] = []
+    code = []
+    for match in _TOKENS.finditer(sql):
+        kind = match.lastgroup
+        if kind == "string":
+            literals.append(_literal(match.group()))
+            code.append(f"\x00{len(literals) - 1}\x00")
+        elif kind == "ident":
+            code.append(_identifier(match.group()))
+        elif kind == "comment":
+            code.append(" ")
+        elif match.group() == "/":
+            # GoogleSQL "/" always returns FLOAT64; SQLite truncates integers.
+            code.append(" * 1.0 / ")
+        else:
+            code.append(match.group())
+    text = _typed_literals("".join(code), literals)
+    for pattern, replacement in _CODE_REWRITES:
+        text = pattern.sub(replacement, text)
+    text = _quote_date_parts(text)
+
+    def restore(part: str) -> str:
+        return _PLACEHOLDER.sub(lambda m: literals[int(m.group(1))], part)
+
+    statements = []
+    start = 0
+    bounds = [m.start() for m in _top_level(text, re.compile(";"))] + [len(text)]
+    for end in bounds:
+        piece = text[start:end].strip()
+        start = end + 1
+        if not piece:
+            continue
+        statement = _translate_statement(piece)
+        statement.parts = [(restore(part), counted) for part, counted in statement.parts]
+        statements.append(statement)
+    if not statements:
+        raise BadRequest("Syntax error: empty query")
+    return statements
+
+
+def _translate_statement(sql: str) -> _Statement:
+    for pattern, statement_type in _STATEMENT_TYPES:
+        if pattern.match(sql):
+            break
+    else:
+        raise BadRequest(f"Unsupported statement: {sql.split(None, 1)[0]}")
+
+    if statement_type == "SELECT":
+        qualify = next(_top_level(sql, re.compile(r"\bQUALIFY\b", re.I)), None)
+        if qualify is None:
+            return _Statement("SELECT", [(sql, False)], returns_rows=True)
+        return _qualify(sql, qualify)
+    if statement_type == "MERGE":
+        return _merge(sql)
+    if statement_type in ("CREATE_SCHEMA", "DROP_SCHEMA"):
+        match = re.match(
+            r"(CREATE|DROP)\s+SCHEMA\s+(IF\s+(?:NOT\s+)?EXISTS\s+)?(?:\"?[\w-]+\"?\.)?\"?(\w+)\"?(\s+CASCADE)?",
+            sql,
+            re.I,
+        )
+        if not match:
+            raise BadRequest(f"Syntax error: {sql}")
+        action = (match.group(1).upper(), match.group(3), bool(match.group(2)), bool(match.group(4)))
+        return _Statement(statement_type, [], schema_action=action)
+    if statement_type == "TRUNCATE_TABLE":
+        return _Statement("TRUNCATE_TABLE", [(re.sub(r"^TRUNCATE\s+TABLE", "DELETE FROM", sql, flags=re.I), False)])
+    if statement_type in ("CREATE_TABLE", "CREATE_TABLE_AS_SELECT"):
+        parts = []
+        replace = re.match(rf"CREATE\s+OR\s+REPLACE\s+TABLE\s+({_TABLE_NAME})", sql, re.I)
+        if replace:
+            parts.append((f"DROP TABLE IF EXISTS {replace.group(1)}", False))
+            sql = re.sub(r"^CREATE\s+OR\s+REPLACE", "CREATE", sql, flags=re.I)
+        if statement_type == "CREATE_TABLE":
+            sql = re.sub(r"\)\s*(PARTITION\s+BY|CLUSTER\s+BY|OPTIONS)\b.*$", ")", sql, flags=re.I | re.S)
+            sql = re.sub(
+                r"([(,]\s*\"?\w+\"?\s+)(" + "|".join(_DDL_TYPES) + r")\b",
+                lambda m: m.group(1) + _DDL_TYPES[m.group(2).upper()],
+                sql,
+                flags=re.I,
+            )
+        parts.append((sql, False))
+        return _Statement(statement_type, parts)
+    counted = statement_type in ("INSERT", "UPDATE", "DELETE")
+    return _Statement(statement_type, [(sql, counted)])
+
+
+def _qualify(sql: str, qualify: re.Match) -> _Statement:
+    """``SELECT ... QUALIFY cond`` as a filtered subquery."""
+    head, rest = sql[: qualify.start()], sql[qualify.end():]
+    tail_match = next(_top_level(rest, re.compile(r"\b(ORDER\s+BY|LIMIT)\b", re.I)), None)
+    condition = rest[: tail_match.start()] if tail_match else rest
+    tail = rest[tail_match.start():] if tail_match else ""
+    from_match = next(_top_level(head, re.compile(r"\bFROM\b", re.I)), None)
+    if not re.match(r"SELECT\b", head, re.I) or from_match is None:
+        raise BadRequest("QUALIFY is only supported on a plain SELECT ... FROM")
+    inner = f'{head[: from_match.start()]}, ({condition}) AS "__qualify" {head[from_match.start():]}'
+    return _Statement(
+        "SELECT",
+        [(f'SELECT * FROM ({inner}) WHERE "__qualify" {tail}', False)],
+        returns_rows=True,
+        hidden_columns=("__qualify",),
+    )
+
+
+def _merge(sql: str) -> _Statement:
+    """MERGE as INSERT/UPDATE/DELETE statements with the same result.
+
+    Rows to insert are selected into a temporary table first, so the
+    WHEN MATCHED clauses and the NOT MATCHED check both see the original
+    target.
+    """
+    match = _MERGE.match(sql)
+    if not match:
+        raise BadRequest("Unsupported MERGE statement")
+    target, source, on = match.group("target"), match.group("source"), match.group("on")
+    t = match.group("t") or target.split(".")[-1].strip('"')
+    s = match.group("s") or source.split(".")[-1].strip('"')
+    clauses = match.group("clauses")
+    whens = list(_WHEN.finditer(clauses))
+    if not whens or whens[0].start() != 0:
+        raise BadRequest("Unsupported MERGE statement")
+
+    matched_exists = f"EXISTS (SELECT 1 FROM {source} AS {s} WHERE {on})"
+    not_matched = f"NOT EXISTS (SELECT 1 FROM {target} AS {t} WHERE {on})"
+    actions, inserts = [], []
+    for i, when in enumerate(whens):
+        if when.group(2):
+            raise BadRequest("MERGE clauses with AND conditions are not supported")
+        end = whens[i + 1].start() if i + 1 < len(whens) else len(clauses)
+        action = clauses[when.end():end].strip()
+        kind = when.group(1).upper().split()[0]
+        if kind == "MATCHED" and re.match(r"UPDATE\s+SET\b", action, re.I):
+            assignments = re.sub(r"^UPDATE\s+SET\s+", "", action, flags=re.I)
+            assignments = ", ".join(
+                re.sub(r"^\s*(?:\w+\.)?(\"?\w+\"?)\s*=", r"\1 =", item.strip())
+                for item in _split_top_level(assignments, ",")
+            )
+            actions.append(
+                (f"UPDATE {target} AS {t} SET {assignments} FROM {source} AS {s} WHERE {on}", True)
+            )
+        elif kind == "MATCHED" and re.fullmatch(r"DELETE", action, re.I):
+            actions.append((f"DELETE FROM {target} AS {t} WHERE {matched_exists}", True))
+        elif kind == "NOT" and re.fullmatch(r"INSERT\s+ROW", action, re.I):
+            inserts.append(("", f"SELECT {s}.* FROM {source} AS {s} WHERE {not_matched}"))
+        elif kind == "NOT":
+            insert = re.fullmatch(r"INSERT\s*(\(.*?\))\s*VALUES\s*\((.*)\)", action, re.I | re.S)
+            if not insert:
+                raise BadRequest(f"Unsupported MERGE action: {action}")
+            inserts.append((insert.group(1), f"SELECT {insert.group(2)} FROM {source} AS {s} WHERE {not_matched}"))
+        else:
+            raise BadRequest(f"Unsupported MERGE action: {action}")
+
+    if len(inserts) > 1:
+        raise BadRequest("MERGE supports one WHEN NOT MATCHED clause")
+    if not inserts:
+        return _Statement("MERGE", actions)
+    columns, select = inserts[0]
+    return _Statement(
+        "MERGE",
+        [
+            ("DROP TABLE IF EXISTS temp.__merge_insert", False),
+            (f"CREATE TEMP TABLE __merge_insert AS {select}", False),
+            *actions,
+            (f"INSERT INTO {target} {columns} SELECT * FROM temp.__merge_insert", True),
+            ("DROP TABLE temp.__merge_insert", False),
+        ],
+    )
+
+
+def _split_top_level(text: str, separator: str) -> list[str]:
+    pieces, start = [], 0
+    for match in _top_level(text, re.compile(re.escape(separator))):
+        pieces.append(text[start:match.start()])
+        start = match.end()
+    pieces.append(text[start:])
+    return pieces
+
+
+# --------------------------------------------------------------------------
+# GoogleSQL functions registered on the SQLite connection
+# --------------------------------------------------------------------------
+
+
+def _to_date(value) -> Optional[datetime.date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def _to_timestamp(value) -> Optional[datetime.datetime]:
+    if value is None:
+        return None
+    stamp = datetime.datetime.fromisoformat(str(value))
+    return stamp if stamp.tzinfo else stamp.replace(tzinfo=datetime.timezone.utc)
+
+
+def _add_months(day: datetime.date, months: int) -> datetime.date:
+    month = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month, 12)
+    for last in (31, 30, 29, 28):
+        try:
+            return day.replace(year=year, month=month + 1, day=min(day.day, last))
+        except ValueError:
+            continue
+    raise ValueError(day)
+
+
+def _date_add(value, amount, part, sign=1):
+    day = _to_date(value)
+    if day is None or amount is None:
+        return None
+    amount = int(amount) * sign
+    if part == "DAY":
+        day += datetime.timedelta(days=amount)
+    elif part == "WEEK":
+        day += datetime.timedelta(weeks=amount)
+    elif part in ("MONTH", "QUARTER", "YEAR"):
+        day = _add_months(day, amount * {"MONTH": 1, "QUARTER": 3, "YEAR": 12}[part])
+    else:
+        raise ValueError(f"Unsupported date part {part}")
+    return day.isoformat()
+
+
+def _date_trunc(value, part):
+    day = _to_date(value)
+    if day is None:
+        return None
+    if part == "DAY":
+        pass
+    elif part == "WEEK":
+        day -= datetime.timedelta(days=(day.weekday() + 1) % 7)
+    elif part == "ISOWEEK":
+        day -= datetime.timedelta(days=day.weekday())
+    elif part == "MONTH":
+        day = day.replace(day=1)
+    elif part == "QUARTER":
+        day = day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    elif part == "YEAR":
+        day = day.replace(month=1, day=1)
+    else:
+        raise ValueError(f"Unsupported date part {part}")
+    return day.isoformat()
+
+
+def _timestamp_trunc(value, part):
+    stamp = _to_timestamp(value)
+    if stamp is None:
+        return None
+    fields = {"SECOND": 6, "MINUTE": 5, "HOUR": 4}
+    if part in fields:
+        names = ("year", "month", "day", "hour", "minute", "second", "microsecond")
+        stamp = stamp.replace(**{name: 0 for name in names[fields[part]:]})
+        return stamp.isoformat()
+    day = datetime.date.fromisoformat(_date_trunc(stamp.date(), part))
+    return datetime.datetime.combine(day, datetime.time(), stamp.tzinfo).isoformat()
+
+
+def _date_diff(left, right, part):
+    a, b = _to_date(left), _to_date(right)
+    if a is None or b is None:
+        return None
+    if part == "DAY":
+        return (a - b).days
+    if part == "WEEK":
+        return (_to_date(_date_trunc(a, "WEEK")) - _to_date(_date_trunc(b, "WEEK"))).days // 7
+    months = (a.year - b.year) * 12 + a.month - b.month
+    if part == "MONTH":
+        return months
+    if part == "QUARTER":
+        return (a.year - b.year) * 4 + (a.month - 1) // 3 - (b.month - 1) // 3
+    if part == "YEAR":
+        return a.year - b.year
+    raise ValueError(f"Unsupported date part {part}")
+
+
+def _extract(part, value):
+    if value is None:
+        return None
+    text = str(value)
+    stamp = _to_timestamp(text) if len(text) > 10 else None
+    day = stamp.date() if stamp else _to_date(text)
+    if part == "DATE":
+        return day.isoformat()
+    if part in ("HOUR", "MINUTE", "SECOND", "MILLISECOND", "MICROSECOND"):
+        stamp = stamp or datetime.datetime.combine(day, datetime.time())
+        if part == "MILLISECOND":
+            return stamp.microsecond // 1000
+        return getattr(stamp, part.lower())
+    return {
+        "YEAR": lambda: day.year,
+        "MONTH": lambda: day.month,
+        "DAY": lambda: day.day,
+        "DAYOFWEEK": lambda: (day.weekday() + 1) % 7 + 1,
+        "DAYOFYEAR": lambda: day.timetuple().tm_yday,
+        "QUARTER": lambda: (day.month - 1) // 3 + 1,
+        "WEEK": lambda: int(day.strftime("%U")),
+        "ISOWEEK": lambda: day.isocalendar()[1],
+        "ISOYEAR": lambda: day.isocalendar()[0],
+    }[part]()
+
+
+def _nullsafe(function):
+    def wrapped(*args):
+        if any(arg is None for arg in args):
+            return None
+        return function(*args)
+
+    return wrapped
+
+
+def _log(value, base=math.e):
+    if value is None or base is None:
+        return None
+    return math.log(value, base)
+
+
+class _Moments:
+    """STDDEV/VARIANCE as an aggregate and window function."""
+
+    population = False
+    root = True
+
+    def __init__(self):
+        self.n, self.total, self.squares = 0, 0.0, 0.0
+
+    def step(self, value):
+        if value is not None:
+            self.n += 1
+            self.total += value
+            self.squares += value * value
+
+    def inverse(self, value):
+        if value is not None:
+            self.n -= 1
+            self.total -= value
+            self.squares -= value * value
+
+    def value(self):
+        dof = self.n if self.population else self.n - 1
+        if dof <= 0:
+            return None
+        variance = max(self.squares - self.total * self.total / self.n, 0.0) / dof
+        return math.sqrt(variance) if self.root else variance
+
+    finalize = value
+
+
+def _moments(population: bool, root: bool) -> type:
+    return type("_Moments", (_Moments,), {"population": population, "root": root})
+
+
+class _CountIf:
+    def __init__(self):
+        self.count = 0
+
+    def step(self, value):
+        self.count += bool(value)
+
+    def inverse(self, value):
+        self.count -= bool(value)
+
+    def value(self):
+        return self.count
+
+    finalize = value
+
+
+class _Corr:
+    def __init__(self):
+        self.n = 0
+        self.sums = [0.0] * 5  # x, y, xx, yy, xy
+
+    def _add(self, x, y, sign):
+        if x is not None and y is not None:
+            self.n += sign
+            for i, term in enumerate((x, y, x * x, y * y, x * y)):
+                self.sums[i] += sign * term
+
+    def step(self, x, y):
+        self._add(x, y, 1)
+
+    def inverse(self, x, y):
+        self._add(x, y, -1)
+
+    def value(self):
+        n = self.n
+        sx, sy, sxx, syy, sxy = self.sums
+        denominator = math.sqrt(max(n * sxx - sx * sx, 0.0) * max(n * syy - sy * sy, 0.0))
+        return (n * sxy - sx * sy) / denominator if n > 1 and denominator else None
+
+    finalize = value
+
+
+class _Collect:
+    """APPROX_COUNT_DISTINCT, ANY_VALUE, LOGICAL_AND and LOGICAL_OR."""
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+
+def _collector(reduce) -> type:
+    return type(
+        "_Collector",
+        (_Collect,),
+        {"finalize": lambda self: reduce(self.values) if self.values else None},
+    )
+
+
+_FUNCTIONS = {
+    "SAFE_DIVIDE": (2, lambda a, b: None if a is None or b is None or b == 0 else a / b),
+    "IF": (3, lambda condition, a, b: a if condition else b),
+    "DIV": (2, _nullsafe(lambda a, b: int(a / b))),
+    "LOG": (-1, _log),
+    "GREATEST": (-1, lambda *a: None if any(v is None for v in a) else max(a)),
+    "LEAST": (-1, lambda *a: None if any(v is None for v in a) else min(a)),
+    "CONCAT": (-1, lambda *a: None if any(v is None for v in a) else "".join(str(v) for v in a)),
+    "STARTS_WITH": (2, _nullsafe(lambda s, prefix: s.startswith(prefix))),
+    "ENDS_WITH": (2, _nullsafe(lambda s, suffix: s.endswith(suffix))),
+    "REGEXP_CONTAINS": (2, _nullsafe(lambda s, pattern: re.search(pattern, s) is not None)),
+    "DATE_TRUNC": (2, _date_trunc),
+    "TIMESTAMP_TRUNC": (2, _timestamp_trunc),
+    "DATE_ADD": (3, _date_add),
+    "DATE_SUB": (3, lambda value, amount, part: _date_add(value, amount, part, -1)),
+    "DATE_DIFF": (3, _date_diff),
+    "_BQ_EXTRACT": (2, _extract),
+    "FORMAT_DATE": (2, _nullsafe(lambda fmt, value: _to_date(value).strftime(fmt))),
+    "PARSE_DATE": (2, _nullsafe(lambda fmt, text: datetime.datetime.strptime(text, fmt).date().isoformat())),
+}
+_WINDOW_FUNCTIONS = {
+    "STDDEV": (1, _moments(population=False, root=True)),
+    "STDDEV_SAMP": (1, _moments(population=False, root=True)),
+    "STDDEV_POP": (1, _moments(population=True, root=True)),
+    "VARIANCE": (1, _moments(population=False, root=False)),
+    "VAR_SAMP": (1, _moments(population=False, root=False)),
+    "VAR_POP": (1, _moments(population=True, root=False)),
+    "COUNTIF": (1, _CountIf),
+    "CORR": (2, _Corr),
+}
+_AGGREGATES = {
+    "APPROX_COUNT_DISTINCT": (1, _collector(lambda values: len(set(values)))),
+    "ANY_VALUE": (1, _collector(lambda values: values[0])),
+    "LOGICAL_AND": (1, _collector(all)),
+    "LOGICAL_OR": (1, _collector(any)),
+}
+
+sqlite3.register_converter("BQ_DATE", lambda raw: datetime.date.fromisoformat(raw.decode()[:10]))
+sqlite3.register_converter("BQ_TIMESTAMP", lambda raw: _to_timestamp(raw.decode()))
+sqlite3.register_converter("BQ_BOOL", lambda raw: raw not in (b"0", b"0.0"))
+
+
+def _result_type(values: list) -> str:
+    kinds = {type(value) for value in values if value is not None}
+    if not kinds:
+        return "STRING"
+    if kinds == {bool}:
+        return "BOOLEAN"
+    if kinds == {int}:
+        return "INTEGER"
+    if kinds <= {int, float}:
+        return "FLOAT"
+    for python_type, field_type in (
+        (datetime.datetime, "TIMESTAMP"),
+        (datetime.date, "DATE"),
+        (bytes, "BYTES"),
+    ):
+        if kinds == {python_type}:
+            return field_type
+    return "STRING"
+
+
+def _bind(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    if hasattr(value, "__float__") and not isinstance(value, (int, float)):
+        return float(value)
+    return value
+
+
+def _parameters(parameters: list):
+    if not parameters:
+        return ()
+    values = [
+        json.dumps([_bind(v) for v in p.values])
+        if isinstance(p, ArrayQueryParameter)
+        else _bind(p.value)
+        for p in parameters
+    ]
+    if all(p.name is None for p in parameters):
+        return values
+    return {p.name: value for p, value in zip(parameters, values)}
+
+
+# --------------------------------------------------------------------------
+# Backend
+# --------------------------------------------------------------------------
+
+
+@dataclasses.dataclass
+class _Outcome:
+    statement_type: str = "SELECT"
+    schema: list = dataclasses.field(default_factory=list)
+    rows: list = dataclasses.field(default_factory=list)
+    bytes_processed: int = 0
+    affected_rows: Optional[int] = None
+
+
+@dataclasses.dataclass
+class JobRecord:
+    """One finished job, kept in ``FakeBigQueryBackend.jobs``."""
+
+    job_id: str
+    job_type: str
+    statement_type: Optional[str]
+    query: Optional[str]
+    bytes_processed: int
+    latency: float
+    dry_run: bool = False
+    error: Optional[str] = None
+
+
+_NAME = re.compile(r"\w+")
+
+
+class FakeBigQueryBackend:
+    """The shared store behind every fake ``Client``: one SQLite connection.
+
+    Each dataset is an attached in-memory database and each table a SQLite
+    table. Statements run under one lock; injected latency is spent outside
+    it.
+
+    Attributes:
+        latency: Default ``LatencyModel`` of clients using this backend.
+        jobs: The most recent ``JobRecord``s, newest last.
+        stats: Counts of queries, dry runs, loads and API calls, plus total
+            bytes processed and simulated seconds.
+    """
+
+    def __init__(self, latency: Optional[LatencyModel] = None):
+        self.latency = latency or NO_LATENCY
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            ":memory:",
+            check_same_thread=False,
+            isolation_level=None,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+        )
+        for name, (arity, function) in _FUNCTIONS.items():
+            self._conn.create_function(name, arity, function, deterministic=True)
+        for name, (arity, aggregate) in _WINDOW_FUNCTIONS.items():
+            self._conn.create_window_function(name, arity, aggregate)
+        for name, (arity, aggregate) in _AGGREGATES.items():
+            self._conn.create_aggregate(name, arity, aggregate)
+        self._datasets: dict[str, Dataset] = {}
+        self._table_metadata: dict[tuple[str, str], dict[str, Any]] = {}
+        self._generation = 0
+        self._column_bytes: dict[tuple[str, str, str], tuple[int, int]] = {}
+        self.jobs: collections.deque[JobRecord] = collections.deque(maxlen=MAX_JOB_HISTORY)
+        self.stats = collections.Counter()
+
+    # -- datasets and tables ------------------------------------------------
+
+    def create_dataset(self, dataset: Dataset, exists_ok: bool = False) -> Dataset:
+        dataset_id = dataset.dataset_id
+        if not _NAME.fullmatch(dataset_id):
+            raise BadRequest(f"Invalid dataset ID: {dataset_id}")
+        with self._lock:
+            if dataset_id in self._datasets:
+                if exists_ok:
+                    return self._datasets[dataset_id]
+                raise Conflict(f"Already Exists: Dataset {dataset.project}:{dataset_id}")
+            try:
+                self._conn.execute(f"ATTACH DATABASE ':memory:' AS \"{dataset_id}\"")
+            except sqlite3.OperationalError as e:
+                raise BadRequest(f"Cannot create dataset {dataset_id}: {e}") from e
+            self._datasets[dataset_id] = dataset
+            self._generation += 1
+        return dataset
+
+    def get_dataset(self, dataset_id: str, project: str) -> Dataset:
+        with self._lock:
+            if dataset_id not in self._datasets:
+                raise NotFound(f"Not found: Dataset {project}:{dataset_id}")
+            return self._datasets[dataset_id]
+
+    def list_datasets(self) -> list[Dataset]:
+        with self._lock:
+            return list(self._datasets.values())
+
+    def delete_dataset(self, dataset_id: str, project: str, delete_contents=False, not_found_ok=False):
+        with self._lock:
+            if dataset_id not in self._datasets:
+                if not_found_ok:
+                    return
+                raise NotFound(f"Not found: Dataset {project}:{dataset_id}")
+            if self._table_names(dataset_id) and not delete_contents:
+                raise BadRequest(f"Dataset {project}:{dataset_id} is still in use")
+            self._conn.execute(f'DETACH DATABASE "{dataset_id}"')
+            del self._datasets[dataset_id]
+            for key in [k for k in self._table_metadata if k[0] == dataset_id]:
+                del self._table_metadata[key]
+            self._generation += 1
+
+    def _table_names(self, dataset_id: str) -> list[str]:
+        return [
+            name
+            for (name,) in self._conn.execute(
+                f"SELECT name FROM \"{dataset_id}\".sqlite_master WHERE type = 'table' ORDER BY name"
+            )
+        ]
+
+    def _require_dataset(self, ref: TableReference):
+        if ref.dataset_id not in self._datasets:
+            raise NotFound(f"Not found: Dataset {ref.project}:{ref.dataset_id}")
+
+    def _schema(self, ref: TableReference) -> Optional[list[SchemaField]]:
+        self._require_dataset(ref)
+        columns = self._conn.execute(
+            f'PRAGMA "{ref.dataset_id}".table_info("{ref.table_id}")'
+        ).fetchall()
+        if not columns:
+            return None
+        return [
+            SchemaField(
+                name,
+                _BIGQUERY_TYPES.get(declared.upper(), _TYPE_ALIASES.get(declared.upper(), declared.upper() or "STRING")),
+                "REQUIRED" if notnull else "NULLABLE",
+            )
+            for _, name, declared, notnull, _, _ in columns
+        ]
+
+    def _create_table(self, ref: TableReference, schema: list[SchemaField]):
+        if not schema:
+            raise BadRequest(f"Table {ref} needs a schema")
+        columns = []
+        for field in schema:
+            field_type = _TYPE_ALIASES.get(field.field_type, field.field_type)
+            if field_type not in _SQLITE_TYPES:
+                raise BadRequest(f"Unsupported field type {field.field_type} for {field.name}")
+            not_null = " NOT NULL" if field.mode == "REQUIRED" else ""
+            columns.append(f'"{field.name}" {_SQLITE_TYPES[field_type]}{not_null}')
+        self._conn.execute(f'CREATE TABLE "{ref.dataset_id}"."{ref.table_id}" ({", ".join(columns)})')
+        self._generation += 1
+
+    def create_table(self, table: Table, exists_ok: bool = False) -> Table:
+        ref = table.reference
+        if not _NAME.fullmatch(ref.table_id):
+            raise BadRequest(f"Invalid table ID: {ref.table_id}")
+        with self._lock:
+            if self._schema(ref) is not None:
+                if exists_ok:
+                    return self.get_table(ref)
+                raise Conflict(f"Already Exists: Table {table.full_table_id}")
+            self._create_table(ref, table.schema)
+            self._table_metadata[(ref.dataset_id, ref.table_id)] = {
+                "description": table.description,
+                "labels": dict(table.labels),
+            }
+            return self.get_table(ref)
+
+    def get_table(self, ref: TableReference) -> Table:
+        with self._lock:
+            schema = self._schema(ref)
+            if schema is None:
+                raise NotFound(f"Not found: Table {ref.project}:{ref.dataset_id}.{ref.table_id}")
+            table = Table(ref, schema)
+            metadata = self._table_metadata.get((ref.dataset_id, ref.table_id), {})
+            table.description = metadata.get("description")
+            table.labels = dict(metadata.get("labels", {}))
+            (table.num_rows,) = self._conn.execute(
+                f'SELECT COUNT(*) FROM "{ref.dataset_id}"."{ref.table_id}"'
+            ).fetchone()
+            table.num_bytes = sum(
+                self._bytes(ref.dataset_id, ref.table_id, field.name) for field in schema
+            )
+            return table
+
+    def list_tables(self, dataset_id: str, project: str) -> list[Table]:
+        with self._lock:
+            self._require_dataset(TableReference(DatasetReference(project, dataset_id), "_"))
+            dataset = DatasetReference(project, dataset_id)
+            return [Table(dataset.table(name)) for name in self._table_names(dataset_id)]
+
+    def delete_table(self, ref: TableReference, not_found_ok: bool = False):
+        with self._lock:
+            if ref.dataset_id not in self._datasets or self._schema(ref) is None:
+                if not_found_ok:
+                    return
+                raise NotFound(f"Not found: Table {ref.project}:{ref.dataset_id}.{ref.table_id}")
+            self._conn.execute(f'DROP TABLE "{ref.dataset_id}"."{ref.table_id}"')
+            self._table_metadata.pop((ref.dataset_id, ref.table_id), None)
+            self._generation += 1
+
+    # -- sizes --------------------------------------------------------------
+
+    def _bytes(self, dataset_id: str, table_id: str, column: str) -> int:
+        """Logical bytes of one column, as BigQuery bills them."""
+        key = (dataset_id, table_id, column)
+        cached = self._column_bytes.get(key)
+        if cached and cached[0] == self._generation:
+            return cached[1]
+        field_type = next(
+            (f.field_type for f in self._schema(TableReference(DatasetReference("", dataset_id), table_id)) or [] if f.name == column),
+            "STRING",
+        )
+        if field_type in _FIXED_BYTES:
+            size_expression = f'COUNT("{column}") * {_FIXED_BYTES[field_type]}'
+        else:
+            size_expression = f'COALESCE(SUM(2 + LENGTH(CAST("{column}" AS BLOB))), 0)'
+        (size,) = self._conn.execute(
+            f'SELECT {size_expression} FROM "{dataset_id}"."{table_id}"'
+        ).fetchone()
+        self._column_bytes[key] = (self._generation, size)
+        return size
+
+    # -- loads --------------------------------------------------------------
+
+    def load(self, table: pa.Table, ref: TableReference, job_config: LoadJobConfig) -> int:
+        """Writes ``table`` into ``ref`` atomically; returns the row count."""
+        with self._lock:
+            self._require_dataset(ref)
+            existing = self._schema(ref)
+            schema = [SchemaField(f.name, f.field_type, f.mode) for f in job_config.schema or []]
+            disposition = job_config.write_disposition or WriteDisposition.WRITE_APPEND
+            if existing is None and job_config.create_disposition == CreateDisposition.CREATE_NEVER:
+                raise NotFound(f"Not found: Table {ref.project}:{ref.dataset_id}.{ref.table_id}")
+            if not schema:
+                schema = existing or _infer_schema(table.schema)
+            columns = [_load_column(table, field) for field in schema]
+
+            self._conn.execute("SAVEPOINT load")
+            try:
+                if existing is not None and disposition == WriteDisposition.WRITE_TRUNCATE:
+                    self._conn.execute(f'DROP TABLE "{ref.dataset_id}"."{ref.table_id}"')
+                    existing = None
+                if existing is None:
+                    self._create_table(ref, schema)
+                elif disposition == WriteDisposition.WRITE_EMPTY and self._conn.execute(
+                    f'SELECT 1 FROM "{ref.dataset_id}"."{ref.table_id}" LIMIT 1'
+                ).fetchone():
+                    raise Conflict(f"Already Exists: Table {ref} is not empty")
+                elif [f.name for f in existing] != [f.name for f in schema]:
+                    raise BadRequest(f"Provided schema does not match Table {ref}")
+                placeholders = ", ".join("?" * len(schema))
+                names = ", ".join(f'"{f.name}"' for f in schema)
+                self._conn.executemany(
+                    f'INSERT INTO "{ref.dataset_id}"."{ref.table_id}" ({names}) VALUES ({placeholders})',
+                    zip(*columns),
+                )
+            except sqlite3.IntegrityError as e:
+                self._conn.execute("ROLLBACK TO load")
+                raise BadRequest(f"Error while reading data, error message: {e}") from e
+            except Exception:
+                self._conn.execute("ROLLBACK TO load")
+                raise
+            finally:
+                self._conn.execute("RELEASE load")
+            self._generation += 1
+            return table.num_rows
+
+    # -- queries ------------------------------------------------------------
+
+    def run(self, sql: str, parameters: list, dry_run: bool = False) -> _Outcome:
+        statements = translate(sql)
+        bound = _parameters(parameters)
+        reads = set()
+
+        def authorize(action, table, column, database, _):
+            if action == sqlite3.SQLITE_READ and column and database not in ("main", "temp"):
+                reads.add((database, table, column))
+            return sqlite3.SQLITE_OK
+
+        outcome = _Outcome(
+            statement_type=statements[0].statement_type if len(statements) == 1 else "SCRIPT"
+        )
+        with self._lock:
+            try:
+                for statement in statements:
+                    if statement.schema_action:
+                        self._schema_action(statement.schema_action, dry_run)
+                        continue
+                    self._conn.set_authorizer(authorize)
+                    try:
+                        self._execute(statement, bound, dry_run, outcome)
+                    finally:
+                        self._conn.set_authorizer(None)
+            except sqlite3.Error as e:
+                raise _api_error(e) from e
+            outcome.bytes_processed = sum(self._bytes(*read) for read in sorted(reads))
+            if not dry_run and outcome.statement_type != "SELECT":
+                self._generation += 1
+        return outcome
+
+    def _execute(self, statement: _Statement, bound, dry_run: bool, outcome: _Outcome):
+        if statement.returns_rows:
+            sql = statement.parts[-1][0]
+            if dry_run:
+                self._conn.execute(f"EXPLAIN {sql}", bound)
+                return
+            cursor = self._conn.execute(sql, bound)
+            names = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+            keep = [i for i, name in enumerate(names) if name not in statement.hidden_columns]
+            if len(keep) < len(names):
+                rows = [tuple(row[i] for i in keep) for row in rows]
+                names = [names[i] for i in keep]
+            columns = list(zip(*rows)) if rows else [()] * len(names)
+            outcome.schema = [
+                SchemaField(name, _result_type(list(values)))
+                for name, values in zip(names, columns)
+            ]
+            outcome.rows = rows
+            return
+
+        # DML and DDL run in a savepoint: a failure (or a dry run) leaves
+        # every table as it was, as a BigQuery job would.
+        affected = 0
+        self._conn.execute("SAVEPOINT statement")
+        try:
+            for sql, counted in statement.parts:
+                cursor = self._conn.execute(sql, bound if ":" in sql or "?" in sql else ())
+                if counted:
+                    affected += max(cursor.rowcount, 0)
+            if dry_run:
+                self._conn.execute("ROLLBACK TO statement")
+        except Exception:
+            self._conn.execute("ROLLBACK TO statement")
+            raise
+        finally:
+            self._conn.execute("RELEASE statement")
+        if statement.statement_type in ("INSERT", "UPDATE", "DELETE", "MERGE"):
+            outcome.affected_rows = (outcome.affected_rows or 0) + affected
+
+    def _schema_action(self, action: tuple, dry_run: bool):
+        verb, dataset_id, if_exists, cascade = action
+        if dry_run:
+            return
+        if verb == "CREATE":
+            self.create_dataset(Dataset(DatasetReference(DEFAULT_PROJECT, dataset_id)), exists_ok=if_exists)
+        else:
+            self.delete_dataset(dataset_id, DEFAULT_PROJECT, delete_contents=cascade, not_found_ok=if_exists)
+
+    def record(self, record: JobRecord):
+        self.jobs.append(record)
+        self.stats["bytes_processed"] += record.bytes_processed
+        self.stats["simulated_seconds"] += record.latency
+        self.stats["dry_runs" if record.dry_run else f"{record.job_type}_jobs"] += 1
+
+
+def _api_error(error: sqlite3.Error) -> Exception:
+    message = str(error)
+    missing = re.match(r"no such (table|column): (.+)", message)
+    if missing:
+        return NotFound(f"Not found: {missing.group(1).capitalize()} {missing.group(2)}")
+    return BadRequest(f"Syntax error: {message}" if isinstance(error, sqlite3.OperationalError) else message)
+
+
+def _infer_schema(schema: pa.Schema) -> list[SchemaField]:
+    fields = []
+    for field in schema:
+        arrow_type = field.type
+        if pa.types.is_dictionary(arrow_type):
+            arrow_type = arrow_type.value_type
+        if pa.types.is_integer(arrow_type):
+            field_type = "INTEGER"
+        elif pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type):
+            field_type = "FLOAT"
+        elif pa.types.is_boolean(arrow_type):
+            field_type = "BOOLEAN"
+        elif pa.types.is_date(arrow_type):
+            field_type = "DATE"
+        elif pa.types.is_timestamp(arrow_type):
+            field_type = "TIMESTAMP"
+        elif pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+            field_type = "BYTES"
+        else:
+            field_type = "STRING"
+        fields.append(SchemaField(field.name, field_type))
+    return fields
+
+
+def _load_column(table: pa.Table, field: SchemaField) -> list:
+    """One column of a load, converted to the field's type, as Python values."""
+    field_type = _TYPE_ALIASES.get(field.field_type, field.field_type)
+    if field.name not in table.column_names:
+        return [None] * table.num_rows
+    column = table.column(field.name)
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    try:
+        if field_type == "DATE":
+            if not pa.types.is_date(column.type):
+                column = pc.cast(column, pa.timestamp("us")) if pa.types.is_string(column.type) else column
+                column = pc.cast(column, pa.date32())
+            return pc.cast(column, pa.string()).to_pylist()
+        if field_type == "TIMESTAMP":
+            if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+                column = pc.cast(column, pa.timestamp("us"))
+            return [None if v is None else v.isoformat() for v in column.to_pylist()]
+        if field_type == "STRING":
+            if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type) or pa.types.is_null(column.type)):
+                raise BadRequest(f"Field {field.name} has type {column.type}, expected STRING")
+            return column.to_pylist()
+        if field_type == "INTEGER" and pa.types.is_floating(column.type):
+            column = pc.cast(column, pa.int64())  # safe cast: fails on fractions
+        return pc.cast(column, _ARROW_TYPES[field_type]).to_pylist()
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+        raise BadRequest(f"Error while reading data, error message: field {field.name}: {e}") from e
+
+
+def _read_file(file_obj, job_config: LoadJobConfig) -> pa.Table:
+    source_format = job_config.source_format or SourceFormat.CSV
+    try:
+        if source_format == SourceFormat.PARQUET:
+            return pq.read_table(file_obj)
+        if source_format == SourceFormat.NEWLINE_DELIMITED_JSON:
+            return pa_json.read_json(file_obj)
+        if source_format != SourceFormat.CSV:
+            raise BadRequest(f"Unsupported source format {source_format}")
+        schema = job_config.schema
+        skip = job_config.skip_leading_rows or 0
+        if schema:
+            read_options = pa_csv.ReadOptions(skip_rows=skip, column_names=[f.name for f in schema])
+            column_types = {
+                f.name: pa.string() for f in schema
+                if _TYPE_ALIASES.get(f.field_type, f.field_type) in ("STRING", "DATE", "TIMESTAMP")
+            }
+        else:
+            read_options = pa_csv.ReadOptions(skip_rows=max(skip - 1, 0))
+            column_types = {}
+        return pa_csv.read_csv(
+            file_obj,
+            read_options=read_options,
+            convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+        )
+    except pa.ArrowInvalid as e:
+        raise BadRequest(f"Error while reading data, error message: {e}") from e
+
+
+# --------------------------------------------------------------------------
+# Client
+# --------------------------------------------------------------------------
+
+_default_backend: Optional[FakeBigQueryBackend] = None
+_default_lock = threading.Lock()
+
+
+def default_backend() -> FakeBigQueryBackend:
+    """The process-wide backend used by clients created without one."""
+    global _default_backend
+    with _default_lock:
+        if _default_backend is None:
+            _default_backend = FakeBigQueryBackend()
+        return _default_backend
+
+
+class Client:
+    """Drop-in for ``google.cloud.bigquery.Client`` on a ``FakeBigQueryBackend``.
+
+    Args:
+        project: Default project of dataset and table references.
+        location: Reported on jobs; otherwise ignored.
+        latency: Overrides the backend's ``LatencyModel`` for this client.
+        backend: Defaults to the process-wide ``default_backend()``.
+
+    Credentials, client info and other arguments of the real client are
+    accepted and ignored.
+    """
+
+    def __init__(
+        self,
+        project: Optional[str] = None,
+        credentials=None,
+        location: Optional[str] = None,
+        latency: Optional[LatencyModel] = None,
+        backend: Optional[FakeBigQueryBackend] = None,
+        **_,
+    ):
+        self.project = project or DEFAULT_PROJECT
+        self.location = location or "US"
+        self._backend = backend or default_backend()
+        self._latency = latency or self._backend.latency
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    # -- references ---------------------------------------------------------
+
+    def dataset(self, dataset_id: str, project: Optional[str] = None) -> DatasetReference:
+        return DatasetReference(project or self.project, dataset_id)
+
+    def _dataset_ref(self, dataset) -> DatasetReference:
+        if isinstance(dataset, str):
+            return DatasetReference.from_string(dataset, self.project)
+        if isinstance(dataset, Dataset):
+            return dataset.reference
+        return dataset
+
+    def _table_ref(self, table) -> TableReference:
+        if isinstance(table, str):
+            return TableReference.from_string(table, self.project)
+        if isinstance(table, Table):
+            return table.reference
+        return table
+
+    def _api_call(self):
+        self._backend.stats["api_calls"] += 1
+        delay = self._latency.delay("api")
+        if delay > 0:
+            self._latency.sleep(delay)
+
+    # -- datasets and tables ------------------------------------------------
+
+    def create_dataset(self, dataset, exists_ok: bool = False, **_) -> Dataset:
+        self._api_call()
+        if not isinstance(dataset, Dataset):
+            dataset = Dataset(self._dataset_ref(dataset))
+        return self._backend.create_dataset(dataset, exists_ok=exists_ok)
+
+    def get_dataset(self, dataset_ref, **_) -> Dataset:
+        self._api_call()
+        ref = self._dataset_ref(dataset_ref)
+        return self._backend.get_dataset(ref.dataset_id, ref.project)
+
+    def list_datasets(self, project: Optional[str] = None, **_) -> Iterator[Dataset]:
+        self._api_call()
+        return iter(self._backend.list_datasets())
+
+    def delete_dataset(self, dataset, delete_contents: bool = False, not_found_ok: bool = False, **_):
+        self._api_call()
+        ref = self._dataset_ref(dataset)
+        self._backend.delete_dataset(ref.dataset_id, ref.project, delete_contents, not_found_ok)
+
+    def create_table(self, table, exists_ok: bool = False, **_) -> Table:
+        self._api_call()
+        if not isinstance(table, Table):
+            table = Table(self._table_ref(table))
+        return self._backend.create_table(table, exists_ok=exists_ok)
+
+    def get_table(self, table, **_) -> Table:
+        self._api_call()
+        return self._backend.get_table(self._table_ref(table))
+
+    def list_tables(self, dataset, **_) -> Iterator[Table]:
+        self._api_call()
+        ref = self._dataset_ref(dataset)
+        return iter(self._backend.list_tables(ref.dataset_id, ref.project))
+
+    def delete_table(self, table, not_found_ok: bool = False, **_):
+        self._api_call()
+        self._backend.delete_table(self._table_ref(table), not_found_ok=not_found_ok)
+
+    def insert_rows_json(self, table, json_rows: list[dict], **_) -> list:
+        """Streaming insert; returns per-row errors like the real client."""
+        self._api_call()
+        ref = self._table_ref(table)
+        schema = self._backend.get_table(ref).schema
+        arrays = pa.table({f.name: pa.array([row.get(f.name) for row in json_rows]) for f in schema})
+        try:
+            self._backend.load(arrays, ref, LoadJobConfig(write_disposition=WriteDisposition.WRITE_APPEND))
+        except BadRequest as e:
+            return [{"index": i, "errors": [{"message": str(e)}]} for i in range(len(json_rows))]
+        return []
+
+    # -- jobs ---------------------------------------------------------------
+
+    def _load(self, table: pa.Table, destination, job_config: Optional[LoadJobConfig]) -> LoadJob:
+        ref = self._table_ref(destination)
+        error, rows = None, 0
+        try:
+            rows = self._backend.load(table, ref, job_config or LoadJobConfig())
+        except (BadRequest, NotFound, Conflict) as e:
+            error = e
+        latency = self._latency.delay("load", table.nbytes)
+        job = LoadJob(self, ref, rows, error, latency)
+        self._backend.record(JobRecord(job.job_id, "load", None, None, table.nbytes, latency, error=job.errors and str(error)))
+        return job
+
+    def load_table_from_dataframe(self, dataframe: pd.DataFrame, destination, job_config=None, **_) -> LoadJob:
+        return self._load(pa.Table.from_pandas(dataframe, preserve_index=False), destination, job_config)
+
+    def load_table_from_file(self, file_obj, destination, job_config=None, **_) -> LoadJob:
+        job_config = job_config or LoadJobConfig(source_format=SourceFormat.CSV)
+        if isinstance(file_obj, (bytes, bytearray)):
+            file_obj = io.BytesIO(file_obj)
+        return self._load(_read_file(file_obj, job_config), destination, job_config)
+
+    def query(self, query: str, job_config: Optional[QueryJobConfig] = None, **_) -> QueryJob:
+        """Runs ``query``. Dry-run errors raise here, other errors on ``result()``."""
+        job_config = job_config or QueryJobConfig()
+        dry_run = bool(job_config.dry_run)
+        error = None
+        try:
+            outcome = self._backend.run(query, job_config.query_parameters, dry_run=dry_run)
+            limit = job_config.maximum_bytes_billed
+            if limit is not None and not dry_run and outcome.bytes_processed > int(limit):
+                raise BadRequest(
+                    f"Query exceeded limit for bytes billed: {limit}. "
+                    f"{max(outcome.bytes_processed, MIN_BYTES_BILLED)} or higher required."
+                )
+        except (BadRequest, NotFound, Conflict) as e:
+            if dry_run:
+                raise
+            error, outcome = e, _Outcome()
+        kind = "api" if dry_run else "query"
+        latency = self._latency.delay(kind, outcome.bytes_processed)
+        job = QueryJob(self, query, dry_run, outcome, error, latency)
+        self._backend.record(
+            JobRecord(job.job_id, "query", outcome.statement_type, query,
+                      outcome.bytes_processed, latency, dry_run, error and str(error))
+        )
+        if dry_run:
+            job._wait()
+        return job
+
+    def query_and_wait(self, query: str, job_config: Optional[QueryJobConfig] = None,
+                       max_results: Optional[int] = None, **kwargs) -> RowIterator:
+        return self.query(query, job_config=job_config, **kwargs).result(max_results=max_results)
+
+
+# --------------------------------------------------------------------------
+# Installing the fake as google.cloud.bigquery
+# --------------------------------------------------------------------------
+
+
+@contextlib.contextmanager
+def install(
+    backend: Optional[FakeBigQueryBackend] = None,
+    latency: Optional[LatencyModel] = None,
+):
+    """Makes ``from google.cloud import bigquery`` return this module.
+
+    A fresh backend (or ``backend``) becomes the process-wide default while
+    the context is active, so every ``bigquery.Client()`` created inside it
+    shares the same empty project. The previous modules and backend are
+    restored on exit.
+
+    Yields:
+        The active ``FakeBigQueryBackend``.
+    """
+    global _default_backend
+    backend = backend or FakeBigQueryBackend(latency=latency)
+    if latency is not None:
+        backend.latency = latency
+    this = sys.modules[__name__]
+    google = sys.modules.get("google") or __import__("google")
+    saved_modules = {name: sys.modules.get(name) for name in ("google.cloud", "google.cloud.bigquery")}
+    cloud = saved_modules["google.cloud"]
+    if cloud is None:
+        try:
+            import google.cloud as cloud  # noqa: F811 (namespace package, if installed)
+        except ImportError:
+            cloud = types.ModuleType("google.cloud")
+            cloud.__path__ = []
+    saved_attributes = (getattr(google, "cloud", None), getattr(cloud, "bigquery", None))
+    with _default_lock:
+        saved_backend, _default_backend = _default_backend, backend
+    sys.modules["google.cloud"] = cloud
+    sys.modules["google.cloud.bigquery"] = this
+    google.cloud = cloud
+    cloud.bigquery = this
+    try:
+        yield backend
+    finally:
+        with _default_lock:
+            _default_backend = saved_backend
+        for name, module in saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        google_cloud, cloud_bigquery = saved_attributes
+        for owner, name, value in ((google, "cloud", google_cloud), (cloud, "bigquery", cloud_bigquery)):
+            if value is None:
+                with contextlib.suppress(AttributeError):
+                    delattr(owner, name)
+            else:
+                setattr(owner, name, value)
@@ -0,0 +1,686 @@
+"""Local instrumentation for agent runs: metrics registry, exporters and flame summaries.
+
+``AdkApp(enable_tracing=True)`` only produces traces once an agent is deployed.
+``InstrumentationPlugin`` is an ADK plugin that wraps every agent, model call
+and tool call of a run, including sub-agents called through ``AgentTool``,
+which inherit their parent runner's plugins. It records:
+
+* durations, token counts and payload sizes into a ``MetricsRegistry``,
+  which can be scraped as Prometheus text or mirrored into OpenTelemetry
+  instruments;
+* a span tree per run, rendered by ``format_flame`` as an indented
+  flame-style summary. Self time is shown next to total time, so model
+  latency, ``google_search``/BigQuery tools and coordinator overhead are
+  easy to tell apart.
+
+Usage:
+
+    runner = InMemoryRunner(agent=root_agent, plugins=instrumentation_plugins())
+    ...
+    print(format_flame(default_plugin().last_run()))
+    print(default_registry().to_prometheus())
+
+``instrumentation_plugins()`` returns an empty list unless
+``ADK_INSTRUMENTATION`` is set, so runs that are not instrumented pay nothing.
+The agent packages pass it to the ``App`` that ``adk web`` / ``adk run``
+serve, ``BatchRunner`` passes it to its runner and ``deployment.py`` to
+``AdkApp``; other runners must pass ``plugins=instrumentation_plugins()``
+themselves.
+A plugin created with ``enabled=False`` returns from every callback straight
+away.
+"""
+
+import bisect
+import collections
+import contextvars
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import Any, Optional
+
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+from shared_libraries.compaction import CHARS_PER_TOKEN, content_chars
+
+logger = logging.getLogger(__name__)
+
+# Seconds. Spans model latencies from cached answers to slow grounded calls.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Characters.
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+@dataclasses.dataclass
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, Prometheus style."""
+
+    bounds: tuple[float, ...]
+    counts: list[int]
+    sum: float = 0.0
+    count: int = 0
+
+    @classmethod
+    def with_bounds(cls, bounds: Iterable[float]) -> "Histogram":
+        bounds = tuple(bounds)
+        return cls(bounds=bounds, counts=[0] * (len(bounds) + 1))
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class MetricsRegistry:
+    """Thread-safe in-process counters and histograms keyed by name and labels.
+
+    Sinks (see ``OpenTelemetrySink``) receive every update as it happens.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, Histogram]] = {}
+        self._help: dict[str, str] = {}
+        self._sinks: list[Any] = []
+
+    def __getstate__(self):
+        # Agent Engine pickles the app together with its plugins.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink) -> None:
+        self._sinks.append(sink)
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        for sink in self._sinks:
+            sink.inc(name, value, labels)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Iterable[float] = DURATION_BUCKETS,
+        **labels,
+    ) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram.with_bounds(buckets)
+            histogram.observe(value)
+        for sink in self._sinks:
+            sink.observe(name, value, labels)
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self._histograms.get(name, {}).get(_label_key(labels))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_prometheus(self) -> str:
+        """Renders all series in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, "counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, "histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.bounds, histogram.counts):
+                        cumulative += count
+                        labels = _format_labels(key + (("le", _format_number(bound)),))
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(key + (("le", "+Inf"),))
+                    lines.append(f"{name}_bucket{labels} {histogram.count}")
+                    lines.append(
+                        f"{name}_sum{_format_labels(key)} {_format_number(histogram.sum)}"
+                    )
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: list[str], name: str, kind: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for k, v in key
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class OpenTelemetrySink:
+    """Mirrors registry updates into OpenTelemetry counters and histograms.
+
+    Args:
+        meter: Meter to create instruments on. Defaults to the global meter
+            provider's meter for this module, so whatever exporter the process
+            configured (OTLP, Cloud Monitoring, ...) receives the metrics.
+    """
+
+    def __init__(self, meter=None):
+        if meter is None:
+            try:
+                from opentelemetry import metrics
+            except ImportError as e:
+                raise ImportError(
+                    "OpenTelemetrySink requires the 'opentelemetry-api' package"
+                ) from e
+            meter = metrics.get_meter(__name__)
+        self._meter = meter
+        self._instruments: dict[str, Any] = {}
+
+    def __getstate__(self):
+        # Instruments are rebuilt on the global meter of the unpickling process.
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def inc(self, name: str, value: float, labels: dict[str, Any]) -> None:
+        counter = self._instruments.get(name)
+        if counter is None:
+            counter = self._instruments[name] = self._meter.create_counter(name)
+        counter.add(value, attributes=labels)
+
+    def observe(self, name: str, value: float, labels: dict[str, Any]) -> None:
+        histogram = self._instruments.get(name)
+        if histogram is None:
+            histogram = self._instruments[name] = self._meter.create_histogram(name)
+        histogram.record(value, attributes=labels)
+
+
+@dataclasses.dataclass
+class Span:
+    """One timed stage of a run: the run itself, an agent, a model or a tool call."""
+
+    kind: str
+    name: str
+    start: float
+    end: Optional[float] = None
+    attributes: dict[str, Any] = dataclasses.field(default_factory=dict)
+    children: list["Span"] = dataclasses.field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else self.start) - self.start
+
+    @property
+    def self_time(self) -> float:
+        """Time not covered by children (clamped, since children may overlap)."""
+        return max(self.duration - sum(c.duration for c in self.children), 0.0)
+
+    def walk(self, depth: int = 0):
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def totals_by_kind(self) -> dict[str, float]:
+        """Self time summed per span kind ("run", "agent", "model", "tool")."""
+        totals: dict[str, float] = collections.defaultdict(float)
+        for _, span in self.walk():
+            totals[span.kind] += span.self_time
+        return dict(totals)
+
+
+def format_flame(root: Span, min_fraction: float = 0.0) -> str:
+    """Indented flame-style summary of a run, slowest stages easy to spot.
+
+    Args:
+        root: Span returned by ``InstrumentationPlugin.last_run``.
+        min_fraction: Hide spans shorter than this fraction of the run.
+    """
+    total = root.duration or 1e-9
+    rows = []
+    for depth, span in root.walk():
+        if depth and span.duration < min_fraction * total:
+            continue
+        label = "  " * depth + f"{span.kind} {span.name}"
+        if span.attributes.get("error"):
+            label += " [error]"
+        share = span.duration / total
+        bar = "█" * max(1, round(share * 20))
+        rows.append((label, span.duration, span.self_time, share, bar))
+    width = max(len(row[0]) for row in rows)
+    lines = [f"{'stage'.ljust(width)}  {'total':>9}  {'self':>9}  {'share':>6}"]
+    for label, duration, self_time, share, bar in rows:
+        lines.append(
+            f"{label.ljust(width)}  {duration * 1000:7.1f}ms  {self_time * 1000:7.1f}ms"
+            f"  {share:6.1%}  {bar}"
+        )
+    kinds = root.totals_by_kind()
+    lines.append(
+        "self time by kind: "
+        + ", ".join(
+            f"{kind} {seconds * 1000:.1f}ms"
+            for kind, seconds in sorted(kinds.items(), key=lambda kv: -kv[1])
+        )
+    )
+    return "\n".join(lines)
+
+
+def format_collapsed(root: Span) -> str:
+    """Collapsed stacks (``a;b;c <microseconds>``) for flamegraph.pl/speedscope."""
+    lines = []
+
+    def visit(span: Span, stack: str) -> None:
+        frame = f"{stack};{span.kind}:{span.name}" if stack else f"{span.kind}:{span.name}"
+        micros = round(span.self_time * 1e6)
+        if micros:
+            lines.append(f"{frame} {micros}")
+        for child in span.children:
+            visit(child, frame)
+
+    visit(root, "")
+    return "\n".join(lines)
+
+
+# Tool span currently executing in this task. Sub-agents called through
+# AgentTool start their own run inside the tool call, and use it as parent.
+_active_tool: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "instrumentation_active_tool", default=None
+)
+
+
+def _payload_chars(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value)
+    return len(json.dumps(value, default=str))
+
+
+def _model_name(callback_context: CallbackContext) -> str:
+    agent = callback_context._invocation_context.agent
+    model = getattr(agent, "canonical_model", None) or getattr(agent, "model", "")
+    return getattr(model, "model", None) or str(model) or "unknown"
+
+
+class InstrumentationPlugin(BasePlugin):
+    """ADK plugin timing every run, agent, model call and tool call.
+
+    Args:
+        registry: Registry receiving the metrics. Defaults to a fresh one.
+        enabled: When False every callback returns immediately.
+        keep_runs: Number of finished top-level runs kept for summaries.
+        clock: Monotonic clock, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        registry: Optional[MetricsRegistry] = None,
+        enabled: bool = True,
+        keep_runs: int = 32,
+        clock: Callable[[], float] = time.perf_counter,
+        name: str = "instrumentation",
+    ):
+        super().__init__(name=name)
+        self.registry = registry or MetricsRegistry()
+        self.enabled = enabled
+        self.runs: collections.deque[Span] = collections.deque(maxlen=keep_runs)
+        self._clock = clock
+        self._open: dict[tuple, Span] = {}
+        self._describe_metrics()
+
+    def last_run(self) -> Optional[Span]:
+        return self.runs[-1] if self.runs else None
+
+    def _describe_metrics(self) -> None:
+        for name, help_text in (
+            ("adk_run_duration_seconds", "Wall time of a top-level runner invocation."),
+            ("adk_agent_duration_seconds", "Wall time of one agent run."),
+            ("adk_model_duration_seconds", "Latency of one model call."),
+            ("adk_model_time_to_first_token_seconds", "Streaming time to first chunk."),
+            ("adk_model_calls_total", "Model calls by outcome."),
+            ("adk_model_tokens_total", "Prompt and completion tokens."),
+            ("adk_model_request_chars", "Characters sent to the model per call."),
+            ("adk_model_response_chars", "Characters returned by the model per call."),
+            ("adk_tool_duration_seconds", "Latency of one tool call."),
+            ("adk_tool_calls_total", "Tool calls by outcome."),
+            ("adk_tool_args_chars", "Characters of tool arguments per call."),
+            ("adk_tool_result_chars", "Characters of tool results per call."),
+        ):
+            self.registry.describe(name, help_text)
+
+    def _start(self, key: tuple, span: Span, parent: Optional[Span]) -> Span:
+        self._open[key] = span
+        if parent is not None:
+            parent.children.append(span)
+        return span
+
+    def _finish(self, key: tuple) -> Optional[Span]:
+        span = self._open.pop(key, None)
+        if span is not None:
+            span.end = self._clock()
+        return span
+
+    # Runs -----------------------------------------------------------------
+
+    async def before_run_callback(
+        self, *, invocation_context: InvocationContext
+    ) -> Optional[types.Content]:
+        if not self.enabled:
+            return None
+        parent = _active_tool.get()
+        self._start(
+            ("run", invocation_context.invocation_id),
+            Span("run", invocation_context.app_name, self._clock()),
+            parent,
+        )
+        return None
+
+    async def after_run_callback(
+        self, *, invocation_context: InvocationContext
+    ) -> None:
+        if not self.enabled:
+            return None
+        span = self._finish(("run", invocation_context.invocation_id))
+        if span is None:
+            return None
+        # Dangling spans belong to stages that never reported back (cancelled
+        # by a deadline, for example); close them so the tree stays readable.
+        invocation_id = invocation_context.invocation_id
+        for key in [k for k in self._open if k[1] == invocation_id]:
+            self._finish(key).attributes["unfinished"] = True
+        if _active_tool.get() is None:
+            self.registry.observe(
+                "adk_run_duration_seconds", span.duration, app=span.name
+            )
+            self.runs.append(span)
+        return None
+
+    # Agents ---------------------------------------------------------------
+
+    async def before_agent_callback(
+        self, *, agent: BaseAgent, callback_context: CallbackContext
+    ) -> Optional[types.Content]:
+        if not self.enabled:
+            return None
+        invocation_id = callback_context.invocation_id
+        parent = None
+        if agent.parent_agent is not None:
+            parent = self._open.get(("agent", invocation_id, agent.parent_agent.name))
+        if parent is None:
+            parent = self._open.get(("run", invocation_id))
+        self._start(
+            ("agent", invocation_id, agent.name),
+            Span("agent", agent.name, self._clock()),
+            parent,
+        )
+        return None
+
+    async def after_agent_callback(
+        self, *, agent: BaseAgent, callback_context: CallbackContext
+    ) -> Optional[types.Content]:
+        if not self.enabled:
+            return None
+        span = self._finish(("agent", callback_context.invocation_id, agent.name))
+        if span is not None:
+            self.registry.observe(
+                "adk_agent_duration_seconds", span.duration, agent=agent.name
+            )
+        return None
+
+    # Model calls ----------------------------------------------------------
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        if not self.enabled:
+            return None
+        invocation_id = callback_context.invocation_id
+        agent_name = callback_context.agent_name
+        request_chars = content_chars(llm_request.contents)
+        instruction = llm_request.config.system_instruction if llm_request.config else None
+        if isinstance(instruction, str):
+            request_chars += len(instruction)
+        self._start(
+            ("model", invocation_id, agent_name),
+            Span(
+                "model",
+                llm_request.model or _model_name(callback_context),
+                self._clock(),
+                attributes={"request_chars": request_chars},
+            ),
+            self._open.get(("agent", invocation_id, agent_name)),
+        )
+        return None
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        if not self.enabled:
+            return None
+        key = ("model", callback_context.invocation_id, callback_context.agent_name)
+        span = self._open.get(key)
+        if span is None:
+            return None
+        labels = {"agent": callback_context.agent_name, "model": span.name}
+        if llm_response.partial:
+            if "ttft" not in span.attributes:
+                span.attributes["ttft"] = self._clock() - span.start
+                self.registry.observe(
+                    "adk_model_time_to_first_token_seconds",
+                    span.attributes["ttft"],
+                    **labels,
+                )
+            return None
+        self._finish(key)
+        response_chars = content_chars([llm_response.content] if llm_response.content else [])
+        usage = llm_response.usage_metadata
+        prompt_tokens = (usage and usage.prompt_token_count) or (
+            span.attributes["request_chars"] // CHARS_PER_TOKEN
+        )
+        completion_tokens = (usage and usage.candidates_token_count) or (
+            response_chars // CHARS_PER_TOKEN
+        )
+        span.attributes.update(
+            response_chars=response_chars,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        status = "error" if llm_response.error_code else "ok"
+        self.registry.observe("adk_model_duration_seconds", span.duration, **labels)
+        self.registry.inc("adk_model_calls_total", status=status, **labels)
+        self.registry.inc("adk_model_tokens_total", prompt_tokens, kind="prompt", **labels)
+        self.registry.inc(
+            "adk_model_tokens_total", completion_tokens, kind="completion", **labels
+        )
+        self.registry.observe(
+            "adk_model_request_chars",
+            span.attributes["request_chars"],
+            buckets=SIZE_BUCKETS,
+            **labels,
+        )
+        self.registry.observe(
+            "adk_model_response_chars", response_chars, buckets=SIZE_BUCKETS, **labels
+        )
+        return None
+
+    async def on_model_error_callback(
+        self,
+        *,
+        callback_context: CallbackContext,
+        llm_request: LlmRequest,
+        error: Exception,
+    ) -> Optional[LlmResponse]:
+        if not self.enabled:
+            return None
+        span = self._finish(
+            ("model", callback_context.invocation_id, callback_context.agent_name)
+        )
+        if span is not None:
+            span.attributes["error"] = type(error).__name__
+            labels = {"agent": callback_context.agent_name, "model": span.name}
+            self.registry.observe("adk_model_duration_seconds", span.duration, **labels)
+            self.registry.inc("adk_model_calls_total", status="error", **labels)
+        return None
+
+    # Tool calls -----------------------------------------------------------
+
+    def _tool_key(self, tool: BaseTool, tool_context: ToolContext) -> tuple:
+        return (
+            "tool",
+            tool_context.invocation_id,
+            tool_context.function_call_id or tool.name,
+        )
+
+    async def before_tool_callback(
+        self, *, tool: BaseTool, tool_args: dict[str, Any], tool_context: ToolContext
+    ) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        span = self._start(
+            self._tool_key(tool, tool_context),
+            Span(
+                "tool",
+                tool.name,
+                self._clock(),
+                attributes={"args_chars": _payload_chars(tool_args)},
+            ),
+            self._open.get(
+                ("agent", tool_context.invocation_id, tool_context.agent_name)
+            ),
+        )
+        span.attributes["_token"] = _active_tool.set(span)
+        return None
+
+    def _end_tool(
+        self, tool: BaseTool, tool_context: ToolContext, status: str, result: Any = None
+    ) -> Optional[Span]:
+        span = self._finish(self._tool_key(tool, tool_context))
+        if span is None:
+            return None
+        token = span.attributes.pop("_token", None)
+        if token is not None:
+            try:
+                _active_tool.reset(token)
+            except ValueError:
+                # Finished from a different task than it started in.
+                pass
+        labels = {"agent": tool_context.agent_name, "tool": tool.name}
+        self.registry.observe("adk_tool_duration_seconds", span.duration, **labels)
+        self.registry.inc("adk_tool_calls_total", status=status, **labels)
+        self.registry.observe(
+            "adk_tool_args_chars",
+            span.attributes["args_chars"],
+            buckets=SIZE_BUCKETS,
+            **labels,
+        )
+        if status == "ok":
+            span.attributes["result_chars"] = _payload_chars(result)
+            self.registry.observe(
+                "adk_tool_result_chars",
+                span.attributes["result_chars"],
+                buckets=SIZE_BUCKETS,
+                **labels,
+            )
+        return span
+
+    async def after_tool_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        result: dict,
+    ) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        self._end_tool(tool, tool_context, "ok", result)
+        return None
+
+    async def on_tool_error_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        error: Exception,
+    ) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        span = self._end_tool(tool, tool_context, "error")
+        if span is not None:
+            span.attributes["error"] = type(error).__name__
+        return None
+
+
+_default_registry: Optional[MetricsRegistry] = None
+_default_plugin: Optional[InstrumentationPlugin] = None
+
+
+def default_registry() -> MetricsRegistry:
+    """Process-wide registry used by ``instrumentation_plugins``."""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = MetricsRegistry()
+        if os.getenv("ADK_INSTRUMENTATION_OTEL", "").lower() in ("1", "true", "yes"):
+            _default_registry.add_sink(OpenTelemetrySink())
+    return _default_registry
+
+
+def default_plugin() -> InstrumentationPlugin:
+    global _default_plugin
+    if _default_plugin is None:
+        _default_plugin = InstrumentationPlugin(registry=default_registry())
+    return _default_plugin
+
+
+def instrumentation_plugins() -> list[BasePlugin]:
+    """Plugins to pass to a ``Runner``; empty unless ``ADK_INSTRUMENTATION`` is set."""
+    if os.getenv("ADK_INSTRUMENTATION", "").lower() in ("1", "true", "yes"):
+        return [default_plugin()]
+    return []
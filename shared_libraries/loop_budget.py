@@ -0,0 +1,424 @@
+"""Per-run budgets and loop detection for tool-calling agents.
+
+Nothing used to stop an agent that kept calling tools: the BigQuery
+analyst could retry the same failing SQL indefinitely and a research
+sub-agent could search turn after turn. The callbacks here give every run
+of an agent (one invocation of one agent) a ``Budget`` and end it gracefully
+when the budget runs out:
+
+* ``budget_before_model`` counts model turns and checks the wall-clock and
+  token limits. The last allowed turn, or the first turn after a limit
+  was hit, is a wrap-up turn: function calling is switched off and the
+  model is told to answer with what it has. If the wall clock is already
+  spent, or the wrap-up turn was used, the callback returns the best
+  partial answer itself and the model is not called again.
+* ``budget_after_model`` adds up tokens and remembers the latest text. A
+  wrap-up response that still asks for a tool is replaced with the partial
+  answer, so a model that ignores the instruction still stops.
+* ``budget_before_tool`` refuses tool calls past ``max_tool_calls`` and
+  identical calls (same tool, same normalized arguments) past
+  ``max_identical_calls``. A refused call returns an error to the model
+  instead of running, and the next model turn is the wrap-up turn.
+* ``budget_after_tool`` keeps short summaries of the latest tool results,
+  which make up the partial answer when the model could not write one.
+
+The partial answer says which limit was hit, followed by the latest model
+text and the tool results gathered so far. Counters are kept in
+``LoopBudgetStats`` and mirrored into the instrumentation registry when
+``ADK_INSTRUMENTATION`` is set.
+
+Put ``budget_before_model`` first among an agent's before-model callbacks,
+so a run past its budget is ended before caches or the router see the
+call, and ``budget_after_tool`` before callbacks that rewrite tool
+results. ``LOOP_BUDGET=0`` turns enforcement off. ``LOOP_BUDGETS`` (JSON)
+overrides budgets per agent, e.g.
+``{"bq_data_analyst_agent": {"max_tool_calls": 20}}``.
+"""
+
+import collections
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+from .replay import tool_key
+
+logger = logging.getLogger(__name__)
+
+# Reasons a run stops early.
+TOOL_CALLS = "tool_calls"
+MODEL_TURNS = "model_turns"
+WALL_CLOCK = "wall_clock"
+TOKENS = "tokens"
+REPEATED_CALLS = "repeated_calls"
+
+WRAP_UP_INSTRUCTION = (
+    "You have reached the limit of tool calls and time for this request. Do not call "
+    "any more tools. Answer now with the information you already have, and say "
+    "briefly what you could not finish."
+)
+
+_SUMMARY_CHARS = 600
+_RESULTS_KEPT = 5
+
+
+@dataclasses.dataclass
+class Budget:
+    """Limits of one run of an agent; None means no limit.
+
+    Attributes:
+        max_tool_calls: Tool calls executed in the run.
+        max_model_turns: Model calls in the run, the wrap-up turn included.
+        max_seconds: Wall-clock seconds since the first model call.
+        max_tokens: Prompt plus completion tokens over all model calls.
+        max_identical_calls: Times one tool may run with the same arguments.
+    """
+
+    max_tool_calls: Optional[int] = 20
+    max_model_turns: Optional[int] = 25
+    max_seconds: Optional[float] = 300.0
+    max_tokens: Optional[int] = 500_000
+    max_identical_calls: Optional[int] = 2
+
+
+# A data question rarely needs more than a handful of queries; research
+# workers answer one aspect of a topic and run under a fan-out deadline.
+DEFAULT_BUDGETS = {
+    "bq_data_analyst_agent": Budget(
+        max_tool_calls=12, max_model_turns=16, max_seconds=180, max_tokens=300_000
+    ),
+    "research_sub_agent_1": Budget(
+        max_tool_calls=6, max_model_turns=6, max_seconds=90, max_tokens=150_000
+    ),
+    "research_sub_agent_2": Budget(
+        max_tool_calls=6, max_model_turns=6, max_seconds=90, max_tokens=150_000
+    ),
+}
+
+
+@dataclasses.dataclass
+class LoopBudgetStats:
+    """Counters over all runs seen by one ``LoopGuard``."""
+
+    runs: int = 0
+    model_turns: int = 0
+    tool_calls: int = 0
+    tokens: int = 0
+    blocked_calls: int = 0
+    repeated_calls: int = 0
+    partial_answers: int = 0
+    exceeded: collections.Counter = dataclasses.field(default_factory=collections.Counter)
+
+    def as_dict(self) -> dict[str, Any]:
+        data = dataclasses.asdict(self)
+        data["exceeded"] = {f"{agent}:{reason}": n for (agent, reason), n in sorted(self.exceeded.items())}
+        return data
+
+
+@dataclasses.dataclass
+class _Run:
+    start: float
+    turns: int = 0
+    tool_calls: int = 0
+    tokens: int = 0
+    calls: collections.Counter = dataclasses.field(default_factory=collections.Counter)
+    results: dict[str, tuple[str, str]] = dataclasses.field(default_factory=dict)
+    last_text: str = ""
+    reason: Optional[str] = None
+    wrapped_up: bool = False
+
+
+def _summary(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return text if len(text) <= _SUMMARY_CHARS else text[:_SUMMARY_CHARS] + "..."
+
+
+def _text(llm_response: LlmResponse) -> str:
+    if not llm_response.content or not llm_response.content.parts:
+        return ""
+    return "".join(p.text for p in llm_response.content.parts if p.text and not p.thought).strip()
+
+
+def _has_function_call(llm_response: LlmResponse) -> bool:
+    parts = llm_response.content.parts if llm_response.content else None
+    return any(p.function_call for p in parts or [])
+
+
+class LoopGuard:
+    """Enforces a ``Budget`` per run and ends runs with a partial answer.
+
+    Args:
+        budgets: Agent name to ``Budget``; other agents get ``default``.
+        default: Budget of agents without one of their own.
+        enabled: When False, runs are counted but never stopped.
+        registry: Optional instrumentation ``MetricsRegistry`` to mirror into.
+        max_runs: Runs tracked at once; the oldest are forgotten first.
+        clock: Monotonic clock, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[dict[str, Budget]] = None,
+        default: Optional[Budget] = None,
+        enabled: bool = True,
+        registry=None,
+        max_runs: int = 1024,
+        clock=time.monotonic,
+    ):
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self.default = default or Budget()
+        self.enabled = enabled
+        self.registry = registry
+        self.max_runs = max_runs
+        self.stats = LoopBudgetStats()
+        self._clock = clock
+        self._runs: collections.OrderedDict[tuple[str, str], _Run] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.describe("adk_loop_budget_exceeded_total", "Runs that hit a budget, by reason.")
+            registry.describe("adk_loop_blocked_tool_calls_total", "Tool calls refused by a budget.")
+            registry.describe("adk_loop_partial_answers_total", "Runs ended with a partial answer.")
+
+    def budget(self, agent_name: str) -> Budget:
+        return self.budgets.get(agent_name, self.default)
+
+    def _run(self, context: CallbackContext, create: bool = True) -> Optional[_Run]:
+        key = (context.invocation_id, context.agent_name)
+        with self._lock:
+            run = self._runs.get(key)
+            if run is None and create:
+                run = self._runs[key] = _Run(start=self._clock())
+                self.stats.runs += 1
+                while len(self._runs) > self.max_runs:
+                    self._runs.popitem(last=False)
+            return run
+
+    def _exceed(self, agent_name: str, run: _Run, reason: str) -> None:
+        """Starts the wrap-up of ``run``; only the first reason counts."""
+        if run.reason is not None:
+            return
+        run.reason = reason
+        logger.info("%s: %s budget exhausted, wrapping up", agent_name, reason)
+        with self._lock:
+            self.stats.exceeded[(agent_name, reason)] += 1
+        if self.registry is not None:
+            self.registry.inc("adk_loop_budget_exceeded_total", agent=agent_name, reason=reason)
+
+    def _over(self, budget: Budget, run: _Run) -> Optional[str]:
+        if budget.max_seconds is not None and self._clock() - run.start >= budget.max_seconds:
+            return WALL_CLOCK
+        if budget.max_tokens is not None and run.tokens >= budget.max_tokens:
+            return TOKENS
+        return None
+
+    def partial_answer(self, agent_name: str, run: _Run) -> str:
+        """The best answer available without another model call."""
+        budget = self.budget(agent_name)
+        why = {
+            TOOL_CALLS: f"it needed more than {budget.max_tool_calls} tool calls",
+            MODEL_TURNS: f"it needed more than {budget.max_model_turns} model turns",
+            WALL_CLOCK: f"it ran for more than {budget.max_seconds:g} seconds"
+            if budget.max_seconds is not None else "it ran out of time",
+            TOKENS: f"it used more than {budget.max_tokens} tokens",
+            REPEATED_CALLS: "the same tool call kept being repeated",
+        }.get(run.reason, "it ran out of budget")
+        lines = [f"I stopped working on this request before finishing because {why}."]
+        if run.last_text:
+            lines += ["", run.last_text]
+        if run.results:
+            lines += ["", "Results gathered so far:"]
+            lines += [f"- {name}: {summary}" for name, summary in run.results.values()]
+        elif not run.last_text:
+            lines += ["", "No results were gathered before the limit was reached."]
+        return "\n".join(lines)
+
+    def _terminate(self, agent_name: str, run: _Run) -> LlmResponse:
+        with self._lock:
+            self.stats.partial_answers += 1
+        if self.registry is not None:
+            self.registry.inc("adk_loop_partial_answers_total", agent=agent_name)
+        return LlmResponse(
+            content=types.Content(
+                role="model", parts=[types.Part(text=self.partial_answer(agent_name, run))]
+            ),
+            custom_metadata={"loop_budget": run.reason},
+        )
+
+    def before_model(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        agent_name = callback_context.agent_name
+        budget = self.budget(agent_name)
+        run = self._run(callback_context)
+        reason = self._over(budget, run)
+        if reason is None and budget.max_model_turns is not None and run.turns + 1 >= budget.max_model_turns:
+            reason = MODEL_TURNS
+        with self._lock:
+            self.stats.model_turns += 1
+        if reason is not None and self.enabled:
+            self._exceed(agent_name, run, reason)
+        run.turns += 1
+        if run.reason is None or not self.enabled:
+            return None
+        if run.wrapped_up or run.reason == WALL_CLOCK:
+            return self._terminate(agent_name, run)
+        run.wrapped_up = True
+        llm_request.config.tool_config = types.ToolConfig(
+            function_calling_config=types.FunctionCallingConfig(mode=types.FunctionCallingConfigMode.NONE)
+        )
+        llm_request.append_instructions([WRAP_UP_INSTRUCTION])
+        return None
+
+    def after_model(
+        self, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        if llm_response.partial:
+            return None
+        run = self._run(callback_context, create=False)
+        if run is None:
+            return None
+        usage = llm_response.usage_metadata
+        tokens = 0
+        if usage is not None:
+            tokens = usage.total_token_count or (
+                (usage.prompt_token_count or 0) + (usage.candidates_token_count or 0)
+            )
+        run.tokens += tokens
+        with self._lock:
+            self.stats.tokens += tokens
+        text = _text(llm_response)
+        if text:
+            run.last_text = text
+        if run.wrapped_up and self.enabled and _has_function_call(llm_response):
+            return self._terminate(callback_context.agent_name, run)
+        return None
+
+    def _refuse(self, agent_name: str, tool: BaseTool, reason: str, message: str) -> dict:
+        with self._lock:
+            self.stats.blocked_calls += 1
+            self.stats.repeated_calls += reason == REPEATED_CALLS
+        if self.registry is not None:
+            self.registry.inc(
+                "adk_loop_blocked_tool_calls_total", agent=agent_name, tool=tool.name, reason=reason
+            )
+        return {"status": "ERROR", "error_details": message, "loop_budget": reason}
+
+    def before_tool(
+        self, tool: BaseTool, args: dict[str, Any], tool_context: ToolContext
+    ) -> Optional[dict]:
+        agent_name = tool_context.agent_name
+        budget = self.budget(agent_name)
+        run = self._run(tool_context)
+        key = tool_key(tool.name, args)
+        if self.enabled:
+            reason = run.reason or self._over(budget, run)
+            if reason is None and budget.max_tool_calls is not None and run.tool_calls >= budget.max_tool_calls:
+                reason = TOOL_CALLS
+            if reason is None and (
+                budget.max_identical_calls is not None and run.calls[key] >= budget.max_identical_calls
+            ):
+                reason = REPEATED_CALLS
+                previous = run.results.get(key)
+                message = (
+                    f"This exact {tool.name} call already ran {run.calls[key]} times"
+                    + (f" and returned: {previous[1]}" if previous else "")
+                    + ". Repeating it will not change the result; answer with what you have."
+                )
+            else:
+                message = "Tool budget for this request is exhausted; answer with what you have."
+            if reason is not None:
+                self._exceed(agent_name, run, reason)
+                return self._refuse(agent_name, tool, reason, message)
+        run.calls[key] += 1
+        run.tool_calls += 1
+        with self._lock:
+            self.stats.tool_calls += 1
+        return None
+
+    def after_tool(
+        self,
+        tool: BaseTool,
+        args: dict[str, Any],
+        tool_context: ToolContext,
+        tool_response: Any,
+    ) -> Optional[dict]:
+        if isinstance(tool_response, dict) and "loop_budget" in tool_response:
+            return None
+        run = self._run(tool_context, create=False)
+        if run is None:
+            return None
+        key = tool_key(tool.name, args)
+        run.results.pop(key, None)
+        run.results[key] = (tool.name, _summary(tool_response))
+        while len(run.results) > _RESULTS_KEPT:
+            run.results.pop(next(iter(run.results)))
+        return None
+
+
+def _budgets_from_env() -> dict[str, Budget]:
+    budgets = dict(DEFAULT_BUDGETS)
+    overrides = json.loads(os.getenv("LOOP_BUDGETS", "") or "{}")
+    for agent_name, fields in overrides.items():
+        base = budgets.get(agent_name, Budget())
+        budgets[agent_name] = dataclasses.replace(base, **fields)
+    return budgets
+
+
+_default_guard: Optional[LoopGuard] = None
+_default_guard_lock = threading.Lock()
+
+
+def default_guard() -> LoopGuard:
+    """Process-wide guard configured from the environment.
+
+    LOOP_BUDGET (default on) and LOOP_BUDGETS (JSON budget overrides per
+    agent).
+    """
+    global _default_guard
+    with _default_guard_lock:
+        if _default_guard is None:
+            registry = None
+            if os.getenv("ADK_INSTRUMENTATION", "").lower() in ("1", "true", "yes"):
+                from .instrumentation import default_registry
+
+                registry = default_registry()
+            _default_guard = LoopGuard(
+                budgets=_budgets_from_env(),
+                enabled=os.getenv("LOOP_BUDGET", "1").lower() not in ("0", "false", "no"),
+                registry=registry,
+            )
+        return _default_guard
+
+
+def budget_before_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    return default_guard().before_model(callback_context, llm_request)
+
+
+def budget_after_model(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> Optional[LlmResponse]:
+    return default_guard().after_model(callback_context, llm_response)
+
+
+def budget_before_tool(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext
+) -> Optional[dict]:
+    return default_guard().before_tool(tool, args, tool_context)
+
+
+def budget_after_tool(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, tool_response: Any
+) -> Optional[dict]:
+    return default_guard().after_tool(tool, args, tool_context, tool_response)
@@ -0,0 +1,494 @@
+"""Per-user long-term memory for the teaching assistant.
+
+Without memory, a returning student re-explains their goals and the
+assistant searches again for material it found in an earlier session.
+``VectorMemoryService`` keeps two kinds of memories per ``(app, user)``:
+
+* a summary of each session (the student's goals and questions and the
+  topics covered), replaced as the session grows;
+* the search findings of each session: grounded answers with their sources.
+
+Memories are embedded (``HashingEmbedder`` offline, or a Gemini embedding
+model) and stored in one ``VectorIndex`` per user: an approximate
+nearest-neighbour index over a NumPy matrix. Inserts are incremental, and
+``path`` persists memories in SQLite; an index is rebuilt from it when its
+user first needs it.
+
+The service is an ADK ``BaseMemoryService``, so runners can use it with
+``load_memory``. The teaching assistant uses it directly instead:
+``recall_memory`` adds the student's most relevant memories to each model
+request, and ``remember_after_agent`` stores the session after every turn.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Sequence
+from typing import Any, Optional
+
+import numpy as np
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.memory.base_memory_service import BaseMemoryService, SearchMemoryResponse
+from google.adk.memory.memory_entry import MemoryEntry
+from google.adk.models.llm_request import LlmRequest
+from google.adk.sessions import Session
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+from shared_libraries.search_cache import personalize_request
+from shared_libraries.sql_template_cache import GenaiEmbedder, HashingEmbedder
+
+logger = logging.getLogger(__name__)
+
+SUMMARY = "summary"
+FINDING = "finding"
+
+
+class VectorIndex:
+    """Approximate top-k inner-product search over unit vectors.
+
+    Up to ``train_after`` vectors the index is one float32 matrix and every
+    search is exact: one matrix-vector product. Beyond that it is an inverted
+    file: spherical k-means splits the vectors into about ``sqrt(n)`` lists,
+    each stored as its own contiguous matrix, every insert joins the list of
+    its nearest centroid, and a search scores only the ``n_probe`` lists whose
+    centroids are nearest to the query. The lists are retrained once the
+    index has grown ``retrain_growth`` times since the last training, which
+    keeps them balanced at a cost amortized over the inserts.
+
+    Args:
+        dimensions: Vector length.
+        train_after: Size at which searches switch from exact to lists.
+        n_probe: Lists scanned per search; more is slower and more exact.
+        retrain_growth: Growth factor that triggers retraining.
+        seed: Seed of the k-means initialization.
+    """
+
+    def __init__(
+        self,
+        dimensions: int,
+        train_after: int = 20_000,
+        n_probe: int = 24,
+        retrain_growth: float = 4.0,
+        seed: int = 0,
+    ):
+        self.dimensions = dimensions
+        self.train_after = train_after
+        self.n_probe = n_probe
+        self.retrain_growth = retrain_growth
+        self._rng = np.random.default_rng(seed)
+        self._count = 0
+        self._alive = np.zeros(1024, dtype=bool)
+        # Flat storage until the first training, then one block per list.
+        self._flat = _Block(dimensions)
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_at = 0
+        self._lists: list[_Block] = []
+
+    def __len__(self) -> int:
+        return int(self._alive[: self._count].sum())
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Inserts one vector or a batch (rows); returns their row numbers."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        rows = np.arange(self._count, self._count + len(vectors))
+        self._count += len(vectors)
+        if self._count > len(self._alive):
+            alive = np.zeros(max(self._count, 2 * len(self._alive)), dtype=bool)
+            alive[: len(self._alive)] = self._alive
+            self._alive = alive
+        self._alive[rows] = True
+        if self._centroids is None:
+            self._flat.append(vectors, rows)
+            if self._count >= self.train_after:
+                self._train()
+        elif self._count >= self._trained_at * self.retrain_growth:
+            self._flat.append(vectors, rows)
+            self._train()
+        else:
+            self._assign(vectors, rows)
+        return rows
+
+    def remove(self, row: int) -> None:
+        """Hides a row from searches; its vector is dropped at the next training."""
+        self._alive[row] = False
+
+    def _train(self, iterations: int = 8) -> None:
+        blocks = [self._flat, *self._lists]
+        vectors = np.concatenate([b.vectors[: b.size] for b in blocks])
+        rows = np.concatenate([b.rows[: b.size] for b in blocks])
+        keep = self._alive[rows]
+        vectors, rows = vectors[keep], rows[keep]
+        n_lists = int(min(4096, max(16, np.sqrt(len(rows)))))
+        sample = vectors[self._rng.choice(len(rows), size=min(len(rows), 64 * n_lists), replace=False)]
+        centroids = sample[self._rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty lists keep their centroid.
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self._centroids = centroids.astype(np.float32)
+        self._trained_at = self._count
+        self._flat = _Block(self.dimensions)
+        self._lists = [_Block(self.dimensions) for _ in range(n_lists)]
+        self._assign(vectors, rows)
+
+    def _assign(self, vectors: np.ndarray, rows: np.ndarray) -> None:
+        for begin in range(0, len(rows), 65_536):
+            batch, batch_rows = vectors[begin : begin + 65_536], rows[begin : begin + 65_536]
+            labels = np.argmax(batch @ self._centroids.T, axis=1)
+            if len(labels) == 1:
+                self._lists[int(labels[0])].append(batch, batch_rows)
+                continue
+            order = np.argsort(labels, kind="stable")
+            labels, batch, batch_rows = labels[order], batch[order], batch_rows[order]
+            bounds = np.flatnonzero(np.diff(labels)) + 1
+            for start, stop in zip([0, *bounds], [*bounds, len(labels)]):
+                self._lists[int(labels[start])].append(batch[start:stop], batch_rows[start:stop])
+
+    def search(self, query: np.ndarray, k: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) of the ``k`` best matches of ``query``, best first."""
+        query = np.asarray(query, dtype=np.float32)
+        if self._centroids is None:
+            blocks = [self._flat]
+        else:
+            probe = min(self.n_probe, len(self._lists))
+            nearest = np.argpartition(-(self._centroids @ query), probe - 1)[:probe]
+            blocks = [self._lists[int(label)] for label in nearest]
+        rows = np.concatenate([b.rows[: b.size] for b in blocks])
+        scores = np.concatenate([b.vectors[: b.size] @ query for b in blocks])
+        alive = self._alive[rows]
+        rows, scores = rows[alive], scores[alive]
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return rows[order], scores[order]
+
+
+class _Block:
+    """Growable float32 matrix with the row number of each vector."""
+
+    def __init__(self, dimensions: int):
+        self.vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.size = 0
+
+    def append(self, vectors: np.ndarray, rows: np.ndarray) -> None:
+        needed = self.size + len(vectors)
+        if needed > len(self.vectors):
+            capacity = max(needed, 2 * len(self.vectors), 16)
+            grown = np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)
+            grown[: self.size] = self.vectors[: self.size]
+            grown_rows = np.zeros(capacity, dtype=np.int64)
+            grown_rows[: self.size] = self.rows[: self.size]
+            self.vectors, self.rows = grown, grown_rows
+        self.vectors[self.size : needed] = vectors
+        self.rows[self.size : needed] = rows
+        self.size = needed
+
+
+@dataclasses.dataclass
+class Memory:
+    """One stored memory.
+
+    Attributes:
+        id: Unique per user; a session summary is ``<session id>:summary``.
+        kind: ``summary`` or ``finding``.
+        timestamp: Seconds since the epoch of the session event.
+    """
+
+    id: str
+    kind: str
+    text: str
+    session_id: str
+    author: str = ""
+    timestamp: float = 0.0
+    metadata: dict = dataclasses.field(default_factory=dict)
+
+
+def _text(content: Optional[types.Content]) -> str:
+    if not content or not content.parts:
+        return ""
+    return " ".join(p.text for p in content.parts if p.text and not p.thought).strip()
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 3].rstrip() + "..."
+
+
+def session_memories(session: Session, max_chars: int = 800) -> list[Memory]:
+    """The summary and the search findings of ``session``."""
+    questions, topics, findings = [], [], []
+    for event in session.events:
+        text = _text(event.content)
+        if not text or event.partial:
+            continue
+        if event.author == "user":
+            questions.append(text)
+            continue
+        topics.append(text.split(". ")[0])
+        grounding = event.grounding_metadata
+        if grounding and grounding.grounding_chunks:
+            sources = [
+                f"{chunk.web.title or chunk.web.uri} ({chunk.web.uri})"
+                for chunk in grounding.grounding_chunks if chunk.web and chunk.web.uri
+            ]
+            findings.append(Memory(
+                id=f"{session.id}:{event.id}",
+                kind=FINDING,
+                text=_clip(text, max_chars) + (" Sources: " + "; ".join(sources[:5]) if sources else ""),
+                session_id=session.id,
+                author=event.author,
+                timestamp=event.timestamp,
+                metadata={"sources": sources, "queries": list(grounding.web_search_queries or [])},
+            ))
+    if not questions:
+        return findings
+    summary = "Student asked: " + " | ".join(questions)
+    if topics:
+        summary = _clip(summary, max_chars // 2) + " Covered: " + " | ".join(topics)
+    summary = Memory(
+        id=f"{session.id}:{SUMMARY}",
+        kind=SUMMARY,
+        text=_clip(summary, max_chars),
+        session_id=session.id,
+        author="user",
+        timestamp=session.last_update_time,
+    )
+    return [summary, *findings]
+
+
+class _UserMemories:
+    def __init__(self, index: VectorIndex):
+        self.index = index
+        self.memories: dict[int, Memory] = {}
+        self.rows: dict[str, int] = {}
+
+
+class VectorMemoryService(BaseMemoryService):
+    """Memories per user in a vector index, optionally persisted in SQLite.
+
+    Args:
+        embedder: Text to unit vector; ``HashingEmbedder(256)`` by default.
+        path: SQLite file; None keeps memories in memory only.
+        top_k: Memories returned per search.
+        min_score: Minimum cosine similarity of a returned memory.
+        index_options: ``VectorIndex`` keyword arguments.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Callable[[str], np.ndarray]] = None,
+        path: Optional[str] = None,
+        top_k: int = 5,
+        min_score: float = 0.2,
+        index_options: Optional[dict[str, Any]] = None,
+    ):
+        self.embedder = embedder or HashingEmbedder(256)
+        self.path = path
+        self.top_k = top_k
+        self.min_score = min_score
+        self.index_options = index_options or {}
+        self._users: dict[tuple[str, str], _UserMemories] = {}
+        self._lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS memories (app_name TEXT, user_id TEXT, id TEXT,"
+                " kind TEXT, session_id TEXT, author TEXT, text TEXT, metadata TEXT,"
+                " timestamp REAL, vector BLOB, PRIMARY KEY (app_name, user_id, id))"
+            )
+            self._db.commit()
+
+    def _embed(self, text: str) -> np.ndarray:
+        return np.asarray(self.embedder(text), dtype=np.float32)
+
+    def _user(self, app_name: str, user_id: str) -> _UserMemories:
+        key = (app_name, user_id)
+        user = self._users.get(key)
+        if user is not None:
+            return user
+        rows = []
+        if self._db is not None:
+            rows = self._db.execute(
+                "SELECT id, kind, session_id, author, text, metadata, timestamp, vector"
+                " FROM memories WHERE app_name = ? AND user_id = ? ORDER BY rowid",
+                (app_name, user_id),
+            ).fetchall()
+        vectors = [np.frombuffer(row[7], dtype=np.float32) for row in rows]
+        dimensions = len(vectors[0]) if vectors else len(self._embed("dimensions"))
+        user = _UserMemories(VectorIndex(dimensions, **self.index_options))
+        if rows:
+            for row_number, row in zip(user.index.add(np.stack(vectors)), rows):
+                memory = Memory(row[0], row[1], row[4], row[2], row[3], row[6], json.loads(row[5]))
+                user.memories[int(row_number)] = memory
+                user.rows[memory.id] = int(row_number)
+        self._users[key] = user
+        return user
+
+    def remember(self, app_name: str, user_id: str, memories: Sequence[Memory]) -> int:
+        """Stores new memories; a known id replaces a summary and skips a finding.
+
+        Returns:
+            int: Memories written.
+        """
+        with self._lock:
+            user = self._user(app_name, user_id)
+            fresh = []
+            for memory in memories:
+                row = user.rows.get(memory.id)
+                if row is not None:
+                    if memory.kind != SUMMARY or user.memories[row].text == memory.text:
+                        continue
+                    user.index.remove(row)
+                    del user.memories[row]
+                fresh.append(memory)
+            if not fresh:
+                return 0
+            vectors = np.stack([self._embed(memory.text) for memory in fresh])
+            for row, memory in zip(user.index.add(vectors), fresh):
+                user.memories[int(row)] = memory
+                user.rows[memory.id] = int(row)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO memories VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (app_name, user_id, m.id, m.kind, m.session_id, m.author, m.text,
+                         json.dumps(m.metadata), m.timestamp, v.tobytes())
+                        for m, v in zip(fresh, vectors)
+                    ],
+                )
+                self._db.commit()
+            return len(fresh)
+
+    def recall(
+        self, app_name: str, user_id: str, query: str, k: Optional[int] = None,
+        exclude_session: Optional[str] = None,
+    ) -> list[tuple[Memory, float]]:
+        """(memory, score) pairs most similar to ``query``, best first."""
+        k = k or self.top_k
+        with self._lock:
+            user = self._user(app_name, user_id)
+            if not user.memories:
+                return []
+            # Extra candidates make up for the excluded session's memories.
+            rows, scores = user.index.search(self._embed(query), k + 4 if exclude_session else k)
+            found = []
+            for row, score in zip(rows, scores):
+                memory = user.memories[int(row)]
+                if score < self.min_score or memory.session_id == exclude_session:
+                    continue
+                found.append((memory, float(score)))
+            return found[:k]
+
+    async def add_session_to_memory(self, session: Session) -> None:
+        await asyncio.to_thread(
+            self.remember, session.app_name, session.user_id, session_memories(session)
+        )
+
+    async def search_memory(self, *, app_name: str, user_id: str, query: str) -> SearchMemoryResponse:
+        found = await asyncio.to_thread(self.recall, app_name, user_id, query)
+        return SearchMemoryResponse(memories=[
+            MemoryEntry(
+                content=types.Content(role="user", parts=[types.Part(text=memory.text)]),
+                author=memory.author,
+                timestamp=_iso(memory.timestamp),
+            )
+            for memory, _ in found
+        ])
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+_default_service: Optional[VectorMemoryService] = None
+_default_service_lock = threading.Lock()
+
+
+def default_memory_service() -> VectorMemoryService:
+    """Process-wide memory service configured from the environment.
+
+    MEMORY_DB (SQLite file; unset keeps memories in memory only),
+    MEMORY_EMBEDDING_MODEL (unset: offline hashing embeddings),
+    MEMORY_TOP_K (default 5) and MEMORY_MIN_SCORE (default 0.2).
+    """
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            model = os.getenv("MEMORY_EMBEDDING_MODEL")
+            _default_service = VectorMemoryService(
+                embedder=GenaiEmbedder(model) if model else None,
+                path=os.getenv("MEMORY_DB"),
+                top_k=int(os.getenv("MEMORY_TOP_K", "5")),
+                min_score=float(os.getenv("MEMORY_MIN_SCORE", "0.2")),
+            )
+        return _default_service
+
+
+class RecallMemoryTool(BaseTool):
+    """Adds the user's most relevant earlier memories to every model request.
+
+    Like ADK's ``PreloadMemoryTool`` it declares no function, so it can sit
+    next to ``google_search``; it searches the memory service directly, so it
+    needs no memory service on the runner.
+
+    Args:
+        service: None uses ``default_memory_service()``.
+    """
+
+    def __init__(self, service: Optional[VectorMemoryService] = None):
+        super().__init__(name="recall_memory", description="recall_memory")
+        self.service = service
+
+    async def process_llm_request(self, *, tool_context: ToolContext, llm_request: LlmRequest) -> None:
+        # The cached answer of a personalised request must stay with its user.
+        personalize_request(tool_context, "")
+        query = _text(tool_context.user_content)
+        if not query:
+            return
+        session = tool_context._invocation_context.session
+        service = self.service or default_memory_service()
+        start = time.perf_counter()
+        found = await asyncio.to_thread(
+            service.recall, session.app_name, session.user_id, query, exclude_session=session.id
+        )
+        logger.debug("Recalled %d memories in %.1f ms", len(found), (time.perf_counter() - start) * 1000)
+        if not found:
+            return
+        lines = [
+            f"- [{_iso(memory.timestamp)[:10]} {memory.kind}] {memory.text}" for memory, _ in found
+        ]
+        block = (
+            "Memories from this student's earlier sessions, most relevant first. Build on "
+            "them instead of asking the student to repeat their goals, and search again "
+            "only for what they do not cover:\n" + "\n".join(lines)
+        )
+        llm_request.append_instructions([block])
+        personalize_request(tool_context, block)
+
+
+recall_memory = RecallMemoryTool()
+
+
+async def remember_after_agent(callback_context: CallbackContext) -> Optional[types.Content]:
+    """``after_agent_callback``: stores the session's summary and new findings."""
+    session = callback_context._invocation_context.session
+    try:
+        await default_memory_service().add_session_to_memory(session)
+    except Exception:
+        logger.warning("Could not store memories of session %s", session.id, exc_info=True)
+    return None
@@ -0,0 +1,494 @@
+"""Per-call model routing between lite, flash and heavier Gemini models.
+
+Every agent used to run every call on ``gemini-2.5-flash``: the
+coordinator's "hello" and its final synthesis of four analyst reports
+cost the same model. ``route_before_model`` is a ``before_model_callback``
+that picks a tier per call and rewrites ``llm_request.model``, which the
+Gemini client sends as the model name:
+
+* A complexity score in [0, 1] is computed from the prompt size, the
+  length of the latest user message, analysis keywords, small talk, and
+  whether tool or sub-agent results are being synthesized.
+* Each agent has a ``RoutePolicy``: the tier for ordinary calls, an
+  optional cheaper tier below ``simple_below`` and an optional heavier tier
+  above ``complex_above``. Agents without a policy keep their own model.
+* Latency and cost budgets step the choice down to cheaper tiers while
+  the estimate exceeds them. The latency budget also shrinks to what is
+  left of an enclosing fan-out deadline (see ``parallel.py``). Latency
+  estimates start from each tier's prior and follow observed calls.
+* ``route_after_model`` records latency, tokens and cost per agent and tier
+  in ``RouterStats``, and mirrors them into the instrumentation registry
+  when ``ADK_INSTRUMENTATION`` is set. Each call's decision is kept per
+  agent run (hedged attempts of one worker are separate runs), and
+  ``route_on_model_error`` counts failed calls. Decisions of runs that end
+  without either callback are dropped with the run.
+
+Put ``route_before_model`` last among an agent's before-model callbacks,
+so cache hits and history compaction happen first. ``MODEL_ROUTING=0``
+keeps every agent on its own model while still recording telemetry.
+``MODEL_ROUTES`` (JSON) overrides policies per agent, e.g.
+``{"risk_analyst_agent": {"complex": "pro"}}``.
+"""
+
+import collections
+import dataclasses
+import json
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+from typing import Any, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from .compaction import CHARS_PER_TOKEN, content_chars
+from .parallel import fan_out_deadline
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class ModelTier:
+    """A model with its price and latency prior.
+
+    Attributes:
+        model: Model name sent to the API.
+        input_usd_per_mtok: Price per million prompt tokens.
+        output_usd_per_mtok: Price per million completion tokens.
+        latency_seconds: Expected latency of a typical call, before any
+            call has been observed.
+    """
+
+    model: str
+    input_usd_per_mtok: float
+    output_usd_per_mtok: float
+    latency_seconds: float
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (
+            prompt_tokens * self.input_usd_per_mtok
+            + completion_tokens * self.output_usd_per_mtok
+        ) / 1e6
+
+
+# Cheapest first; budgets step down this order.
+DEFAULT_TIERS = {
+    "lite": ModelTier("gemini-2.5-flash-lite", 0.10, 0.40, 1.0),
+    "flash": ModelTier("gemini-2.5-flash", 0.30, 2.50, 3.0),
+    "pro": ModelTier("gemini-2.5-pro", 1.25, 10.00, 8.0),
+}
+
+
+@dataclasses.dataclass
+class RoutePolicy:
+    """How one agent chooses its tier.
+
+    Attributes:
+        default: Tier for ordinary calls.
+        simple: Tier for calls scoring below ``simple_below``; None keeps
+            ``default``.
+        complex: Tier for calls scoring at or above ``complex_above``; None
+            keeps ``default``.
+        max_latency_seconds: Per-call latency budget.
+        max_cost_usd: Per-call cost budget.
+    """
+
+    default: str = "flash"
+    simple: Optional[str] = None
+    complex: Optional[str] = None
+    simple_below: float = 0.2
+    complex_above: float = 0.75
+    max_latency_seconds: Optional[float] = None
+    max_cost_usd: Optional[float] = None
+
+
+# Intake turns and short replies go to lite; analysis stays on flash.
+DEFAULT_POLICIES = {
+    "financial_coordinator": RoutePolicy(default="flash", simple="lite"),
+    "data_analyst_agent": RoutePolicy(default="flash"),
+    "trading_analyst_agent": RoutePolicy(default="flash"),
+    "execution_analyst_agent": RoutePolicy(default="flash"),
+    "risk_analyst_agent": RoutePolicy(default="flash"),
+    "teaching_assistant_agent_model_2_5": RoutePolicy(default="flash", simple="lite"),
+    "bq_data_analyst_agent": RoutePolicy(default="flash"),
+    "teacher_agent": RoutePolicy(default="flash", simple="lite"),
+    "teaching_student_agent": RoutePolicy(default="flash", simple="lite"),
+    "research_sub_agent_1": RoutePolicy(default="flash"),
+    "research_sub_agent_2": RoutePolicy(default="flash"),
+}
+
+_ANALYSIS_WORDS = frozenset(
+    "analyze analyse analysis compare comparison strategy strategies risk risks "
+    "backtest optimize optimise evaluate explain why forecast portfolio correlation "
+    "volatility recommend recommendation tradeoffs scenario scenarios research "
+    "report plan drawdown hedge allocation".split()
+)
+_SMALL_TALK = re.compile(
+    r"^\s*(hi|hello|hey|thanks|thank you|ok|okay|yes|no|sure|great|cool|bye|"
+    r"good (morning|afternoon|evening))\b",
+    re.I,
+)
+_WORD = re.compile(r"[a-z]+")
+# Prompt size at which the size signal saturates.
+_LARGE_PROMPT_TOKENS = 6000
+_DEFAULT_COMPLETION_TOKENS = 400
+
+
+@dataclasses.dataclass
+class RouteDecision:
+    tier: str
+    model: str
+    score: float
+    reasons: list[str]
+    prompt_tokens: int
+    start: float = 0.0
+
+
+def _last_user_text(llm_request: LlmRequest) -> str:
+    for content in reversed(llm_request.contents or []):
+        if content.role == "user":
+            texts = [part.text for part in content.parts or [] if part.text]
+            if texts:
+                return " ".join(texts)
+    return ""
+
+
+def complexity(llm_request: LlmRequest) -> tuple[float, list[str], int]:
+    """Complexity score of a request, the signals behind it and its prompt tokens."""
+    contents = llm_request.contents or []
+    prompt_tokens = content_chars(contents) // CHARS_PER_TOKEN
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    if isinstance(instruction, str):
+        prompt_tokens += len(instruction) // CHARS_PER_TOKEN
+
+    text = _last_user_text(llm_request)
+    words = _WORD.findall(text.lower())
+    keywords = sum(word in _ANALYSIS_WORDS for word in words)
+    synthesizing = bool(contents) and any(
+        part.function_response for part in contents[-1].parts or []
+    )
+
+    history_tokens = content_chars(contents) // CHARS_PER_TOKEN
+    score = (
+        0.25 * min(history_tokens / _LARGE_PROMPT_TOKENS, 1.0)
+        + 0.35 * min(len(words) / 25, 1.0)
+        + 0.3 * min(keywords / 2, 1.0)
+        + (0.3 if synthesizing else 0.0)
+    )
+    reasons = []
+    if synthesizing:
+        reasons.append("tool_results")
+    if keywords:
+        reasons.append("analysis_request")
+    if history_tokens >= _LARGE_PROMPT_TOKENS:
+        reasons.append("large_prompt")
+    if not synthesizing and len(words) < 8 and (_SMALL_TALK.match(text) or not keywords):
+        score *= 0.3
+        reasons.append("small_talk" if _SMALL_TALK.match(text) else "short_turn")
+    return min(score, 1.0), reasons, prompt_tokens
+
+
+@dataclasses.dataclass
+class TierStats:
+    """Telemetry for one agent on one tier."""
+
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    durations: collections.deque = dataclasses.field(
+        default_factory=lambda: collections.deque(maxlen=1000)
+    )
+
+    def as_dict(self) -> dict[str, Any]:
+        ordered = sorted(self.durations)
+
+        def percentile(q):
+            return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 4) if ordered else 0.0
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "mean_seconds": round(self.seconds / self.calls, 4) if self.calls else 0.0,
+            "p50_seconds": percentile(0.5),
+            "p95_seconds": percentile(0.95),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+@dataclasses.dataclass
+class RouterStats:
+    """Per-agent, per-tier telemetry and routing reasons."""
+
+    tiers: dict[tuple[str, str], TierStats] = dataclasses.field(default_factory=dict)
+    reasons: collections.Counter = dataclasses.field(default_factory=collections.Counter)
+
+    @property
+    def cost_usd(self) -> float:
+        return sum(stats.cost_usd for stats in self.tiers.values())
+
+    def as_dict(self) -> dict[str, Any]:
+        agents: dict[str, dict[str, Any]] = {}
+        for (agent, tier), stats in sorted(self.tiers.items()):
+            agents.setdefault(agent, {})[tier] = stats.as_dict()
+        return {
+            "agents": agents,
+            "reasons": dict(self.reasons),
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+class ModelRouter:
+    """Chooses a model tier per call and records what each call cost.
+
+    Args:
+        tiers: Tier name to ``ModelTier``, cheapest first.
+        policies: Agent name to ``RoutePolicy``; other agents are not routed.
+        enabled: When False, calls keep the agent's model (telemetry only).
+        registry: Optional instrumentation ``MetricsRegistry`` to mirror into.
+        latency_smoothing: Weight of the newest observation in the latency
+            estimate of a tier.
+        clock: Monotonic clock, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        tiers: Optional[dict[str, ModelTier]] = None,
+        policies: Optional[dict[str, RoutePolicy]] = None,
+        enabled: bool = True,
+        registry=None,
+        latency_smoothing: float = 0.2,
+        clock=time.perf_counter,
+    ):
+        self.tiers = dict(tiers or DEFAULT_TIERS)
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.enabled = enabled
+        self.registry = registry
+        self.latency_smoothing = latency_smoothing
+        self.stats = RouterStats()
+        self._clock = clock
+        self._latency = {name: tier.latency_seconds for name, tier in self.tiers.items()}
+        self._completion_tokens: dict[str, float] = {}
+        # (id of the agent run's invocation context, agent) -> decision of
+        # the call in flight.
+        self._pending: dict[tuple[int, str], RouteDecision] = {}
+        self._tracked_runs: set[int] = set()
+        self._finished_runs: collections.deque[int] = collections.deque()
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.describe("adk_route_calls_total", "Routed model calls by tier.")
+            registry.describe("adk_route_duration_seconds", "Latency of routed model calls.")
+            registry.describe("adk_route_cost_usd_total", "Estimated cost of routed model calls.")
+
+    def _tier_of(self, model: str) -> Optional[str]:
+        for name, tier in self.tiers.items():
+            if tier.model == model:
+                return name
+        return None
+
+    def estimate(self, agent_name: str, tier: str, prompt_tokens: int) -> tuple[float, float]:
+        """Expected (seconds, USD) of a call of ``agent_name`` on ``tier``."""
+        completion = self._completion_tokens.get(agent_name, _DEFAULT_COMPLETION_TOKENS)
+        return self._latency[tier], self.tiers[tier].cost(prompt_tokens, int(completion))
+
+    def choose(
+        self,
+        agent_name: str,
+        llm_request: LlmRequest,
+        state: Optional[Mapping[str, Any]] = None,
+        invocation_id: Optional[str] = None,
+    ) -> RouteDecision:
+        """The tier for this call; unrouted agents keep the request's model."""
+        policy = self.policies.get(agent_name)
+        score, reasons, prompt_tokens = complexity(llm_request)
+        if policy is None or not self.enabled:
+            tier = self._tier_of(llm_request.model or "") or "unrouted"
+            return RouteDecision(tier, llm_request.model or "", score, ["not_routed"], prompt_tokens)
+
+        tier = policy.default
+        if policy.simple and score < policy.simple_below:
+            tier = policy.simple
+        elif policy.complex and score >= policy.complex_above:
+            tier = policy.complex
+
+        latency_budget = policy.max_latency_seconds
+        deadline = fan_out_deadline(state or {}, invocation_id)
+        if deadline is not None:
+            remaining = max(deadline - time.time(), 0.0)
+            if latency_budget is None or remaining < latency_budget:
+                latency_budget = remaining
+                if remaining < self._latency[tier]:
+                    reasons.append("deadline")
+        names = list(self.tiers)
+        index = names.index(tier)
+        while index > 0:
+            seconds, cost = self.estimate(agent_name, names[index], prompt_tokens)
+            over_latency = latency_budget is not None and seconds > latency_budget
+            over_cost = policy.max_cost_usd is not None and cost > policy.max_cost_usd
+            if not (over_latency or over_cost):
+                break
+            reasons.append("latency_budget" if over_latency else "cost_budget")
+            index -= 1
+        tier = names[index]
+        return RouteDecision(tier, self.tiers[tier].model, score, reasons, prompt_tokens)
+
+    def before_model(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        agent_name = callback_context.agent_name
+        decision = self.choose(
+            agent_name, llm_request, callback_context.state, callback_context.invocation_id
+        )
+        if decision.model and decision.model != llm_request.model and "not_routed" not in decision.reasons:
+            logger.debug(
+                "%s: %s -> %s (score %.2f, %s)",
+                agent_name, llm_request.model, decision.model, decision.score, decision.reasons,
+            )
+            llm_request.model = decision.model
+        decision.start = self._clock()
+        key = self._call_key(callback_context)
+        with self._lock:
+            self._pending[key] = decision
+            self.stats.reasons.update(f"{agent_name}:{reason}" for reason in decision.reasons)
+        return None
+
+    def after_model(
+        self, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        if llm_response.partial:
+            return None
+        key = self._call_key(callback_context)
+        with self._lock:
+            decision = self._pending.pop(key, None)
+        if decision is None:
+            return None
+        seconds = self._clock() - decision.start
+        usage = llm_response.usage_metadata
+        prompt_tokens = (usage and usage.prompt_token_count) or decision.prompt_tokens
+        completion_tokens = (usage and usage.candidates_token_count) or (
+            content_chars([llm_response.content] if llm_response.content else []) // CHARS_PER_TOKEN
+        )
+        tier = self.tiers.get(decision.tier)
+        cost = tier.cost(prompt_tokens, completion_tokens) if tier else 0.0
+        agent_name = callback_context.agent_name
+        with self._lock:
+            stats = self.stats.tiers.setdefault((agent_name, decision.tier), TierStats())
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.durations.append(seconds)
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.cost_usd += cost
+            if tier is not None:
+                alpha = self.latency_smoothing
+                self._latency[decision.tier] = (1 - alpha) * self._latency[decision.tier] + alpha * seconds
+                previous = self._completion_tokens.get(agent_name, completion_tokens)
+                self._completion_tokens[agent_name] = (1 - alpha) * previous + alpha * completion_tokens
+        if self.registry is not None:
+            labels = {"agent": agent_name, "tier": decision.tier, "model": decision.model}
+            self.registry.inc("adk_route_calls_total", **labels)
+            self.registry.observe("adk_route_duration_seconds", seconds, **labels)
+            self.registry.inc("adk_route_cost_usd_total", cost, **labels)
+        return None
+
+    def on_model_error(
+        self, callback_context: CallbackContext, llm_request: LlmRequest, error: Exception
+    ) -> Optional[LlmResponse]:
+        """Counts the failed call; its latency is not a sample of the tier."""
+        key = self._call_key(callback_context)
+        with self._lock:
+            decision = self._pending.pop(key, None)
+            if decision is not None:
+                key = (callback_context.agent_name, decision.tier)
+                self.stats.tiers.setdefault(key, TierStats()).errors += 1
+        return None
+
+    def _call_key(self, callback_context: CallbackContext) -> tuple[int, str]:
+        # invocation_id is shared by concurrent (hedged) runs of one agent;
+        # the invocation context object is not.
+        context = callback_context._invocation_context
+        run = id(context)
+        with self._lock:
+            while self._finished_runs:
+                finished = self._finished_runs.popleft()
+                self._tracked_runs.discard(finished)
+                for key in [key for key in self._pending if key[0] == finished]:
+                    del self._pending[key]
+            if run not in self._tracked_runs:
+                self._tracked_runs.add(run)
+                # Runs that errored or were cancelled are dropped on the next
+                # call; finalizers can fire mid-GC, so they only queue the id.
+                weakref.finalize(context, self._finished_runs.append, run)
+        return run, callback_context.agent_name
+
+
+def _policies_from_env() -> dict[str, RoutePolicy]:
+    policies = dict(DEFAULT_POLICIES)
+    overrides = json.loads(os.getenv("MODEL_ROUTES", "") or "{}")
+    for agent_name, fields in overrides.items():
+        base = policies.get(agent_name, RoutePolicy())
+        policies[agent_name] = dataclasses.replace(base, **fields)
+    return policies
+
+
+def _tiers_from_env() -> dict[str, ModelTier]:
+    tiers = {}
+    for name, tier in DEFAULT_TIERS.items():
+        model = os.getenv(f"MODEL_TIER_{name.upper()}")
+        tiers[name] = dataclasses.replace(tier, model=model) if model else tier
+    return tiers
+
+
+_default_router: Optional[ModelRouter] = None
+_default_router_lock = threading.Lock()
+
+
+def default_router() -> ModelRouter:
+    """Process-wide router configured from the environment.
+
+    MODEL_ROUTING (default on), MODEL_ROUTES (JSON policy overrides per
+    agent) and MODEL_TIER_LITE / MODEL_TIER_FLASH / MODEL_TIER_PRO (model
+    names of the tiers).
+    """
+    global _default_router
+    with _default_router_lock:
+        if _default_router is None:
+            registry = None
+            if os.getenv("ADK_INSTRUMENTATION", "").lower() in ("1", "true", "yes"):
+                from .instrumentation import default_registry
+
+                registry = default_registry()
+            _default_router = ModelRouter(
+                tiers=_tiers_from_env(),
+                policies=_policies_from_env(),
+                enabled=os.getenv("MODEL_ROUTING", "1").lower() not in ("0", "false", "no"),
+                registry=registry,
+            )
+        return _default_router
+
+
+def route_before_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    return default_router().before_model(callback_context, llm_request)
+
+
+def route_after_model(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> Optional[LlmResponse]:
+    return default_router().after_model(callback_context, llm_response)
+
+
+def route_on_model_error(
+    callback_context: CallbackContext, llm_request: LlmRequest, error: Exception
+) -> Optional[LlmResponse]:
+    return default_router().on_model_error(callback_context, llm_request, error)
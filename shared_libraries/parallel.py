@@ -0,0 +1,358 @@
+"""Deadline-bounded fan-out with hedged attempts for parallel research workers.
+
+A plain ``ParallelAgent`` waits for its slowest sub-agent, so one slow
+Google Search call decides the latency of the whole research step. The
+``FanOut`` engine below runs every worker under a shared deadline, starts a
+duplicate ("hedged") attempt for workers that are still silent after a
+delay, and cancels whatever is left once the deadline expires. The caller
+gets the events of the workers that finished plus a report describing who
+completed, who was hedged and who timed out, so the next agent can compile
+its answer from partial results instead of waiting.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import logging
+import time
+from collections.abc import AsyncGenerator, Callable, Mapping
+from typing import Any, ClassVar, Optional
+
+from google.adk.agents import ParallelAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.parallel_agent import _create_branch_ctx_for_sub_agent
+from google.adk.agents.parallel_agent_config import ParallelAgentConfig
+from google.adk.events import Event, EventActions
+
+from .rate_limiter import Priority, priority_scope, schedule_models
+
+logger = logging.getLogger(__name__)
+
+# Session state key holding the absolute (epoch seconds) deadline of the
+# enclosing fan-out. Nested fan-outs and tools read it to size their own work.
+DEADLINE_STATE_KEY = "fan_out_deadline_at"
+# Invocation that set the deadline. A run aborted mid fan-out (client
+# disconnect) never clears it, so readers ignore deadlines of other invocations.
+DEADLINE_INVOCATION_STATE_KEY = "fan_out_deadline_invocation"
+
+
+def fan_out_deadline(
+    state: Mapping[str, Any], invocation_id: Optional[str] = None
+) -> Optional[float]:
+    """The enclosing fan-out deadline, or None if it belongs to another invocation."""
+    deadline = state.get(DEADLINE_STATE_KEY)
+    if deadline is None:
+        return None
+    owner = state.get(DEADLINE_INVOCATION_STATE_KEY)
+    if owner is None:
+        # Unowned deadlines (set by hand or before owners were recorded) only
+        # count while they are in the future.
+        return deadline if deadline > time.time() else None
+    if invocation_id is not None and owner != invocation_id:
+        return None
+    return deadline
+
+Worker = Callable[[int], AsyncGenerator[Any, None]]
+
+
+async def _in_background(agen: AsyncGenerator[Any, None]) -> AsyncGenerator[Any, None]:
+    """Iterates ``agen`` with background priority for scheduled model calls."""
+    with priority_scope(Priority.BACKGROUND):
+        async with contextlib.aclosing(agen) as items:
+            async for item in items:
+                yield item
+
+
+@dataclasses.dataclass
+class FanOutPolicy:
+    """Latency policy applied to every worker of a fan-out.
+
+    Attributes:
+        deadline_seconds: Budget for the whole fan-out. Workers still running
+            when it expires are cancelled and reported as timed out. ``None``
+            waits for every worker.
+        hedge_after_seconds: Delay after which a duplicate attempt is started
+            for every worker that has not produced anything yet. ``None``
+            disables hedging.
+        max_hedges: Maximum number of duplicate attempts per worker.
+    """
+
+    deadline_seconds: Optional[float] = None
+    hedge_after_seconds: Optional[float] = None
+    max_hedges: int = 1
+
+
+@dataclasses.dataclass
+class FanOutReport:
+    """Outcome of one fan-out, suitable for storing in session state."""
+
+    completed: list[str] = dataclasses.field(default_factory=list)
+    timed_out: list[str] = dataclasses.field(default_factory=list)
+    failed: dict[str, str] = dataclasses.field(default_factory=dict)
+    hedged: list[str] = dataclasses.field(default_factory=list)
+    winning_attempt: dict[str, int] = dataclasses.field(default_factory=dict)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.timed_out or self.failed)
+
+    def as_state(self) -> dict[str, Any]:
+        state = dataclasses.asdict(self)
+        state["elapsed_seconds"] = round(self.elapsed_seconds, 3)
+        state["partial"] = self.partial
+        return state
+
+
+class _Done:
+    """Queue marker put by an attempt once its generator is exhausted."""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+class FanOut:
+    """Runs named workers concurrently under a ``FanOutPolicy``.
+
+    Each worker is a factory taking the attempt number (0 for the primary,
+    1.. for hedges) and returning an async generator. The first attempt of a
+    worker to yield an item claims the worker: its siblings are cancelled and
+    only its items are forwarded, so hedging never duplicates output. Items
+    are forwarded one at a time and an attempt only resumes after the caller
+    has consumed its previous item, mirroring ``ParallelAgent``.
+
+    Worker errors do not abort the fan-out; they are recorded in the report
+    once every attempt of that worker has failed.
+    """
+
+    def __init__(self, workers: Mapping[str, Worker], policy: FanOutPolicy):
+        self._workers = dict(workers)
+        self._policy = policy
+        self.report = FanOutReport()
+
+    async def run(self) -> AsyncGenerator[tuple[str, Any], None]:
+        policy = self._policy
+        queue: asyncio.Queue = asyncio.Queue()
+        attempts: dict[str, list[asyncio.Task]] = {name: [] for name in self._workers}
+        claimed: dict[str, int] = {}
+        finished: set[str] = set()
+        failures: dict[str, int] = {}
+        start = time.monotonic()
+        deadline = (
+            start + policy.deadline_seconds
+            if policy.deadline_seconds is not None
+            else None
+        )
+        next_hedge = (
+            start + policy.hedge_after_seconds
+            if policy.hedge_after_seconds is not None and policy.max_hedges > 0
+            else None
+        )
+
+        async def drive(name: str, attempt: int) -> None:
+            error = None
+            try:
+                async with contextlib.aclosing(self._workers[name](attempt)) as agen:
+                    async for item in agen:
+                        resume = asyncio.Event()
+                        await queue.put((name, attempt, item, resume))
+                        await resume.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # reported through the queue
+                error = e
+            await queue.put((name, attempt, _Done(error), None))
+
+        def launch(name: str) -> None:
+            attempt = len(attempts[name])
+            attempts[name].append(asyncio.create_task(drive(name, attempt)))
+
+        def cancel_siblings(name: str, keep: int) -> None:
+            for attempt, task in enumerate(attempts[name]):
+                if attempt != keep and not task.done():
+                    task.cancel()
+
+        for name in self._workers:
+            launch(name)
+
+        try:
+            while len(finished) < len(self._workers):
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                if next_hedge is not None and now >= next_hedge:
+                    for name in self._workers:
+                        if (
+                            name not in claimed
+                            and name not in finished
+                            and len(attempts[name]) <= policy.max_hedges
+                        ):
+                            launch(name)
+                            if name not in self.report.hedged:
+                                self.report.hedged.append(name)
+                    hedges_left = any(
+                        name not in claimed
+                        and name not in finished
+                        and len(attempts[name]) <= policy.max_hedges
+                        for name in self._workers
+                    )
+                    next_hedge = (
+                        now + policy.hedge_after_seconds if hedges_left else None
+                    )
+                timers = [t for t in (deadline, next_hedge) if t is not None]
+                wake = min(timers) if timers else None
+                try:
+                    name, attempt, item, resume = await asyncio.wait_for(
+                        queue.get(),
+                        timeout=None if wake is None else max(0.0, wake - now),
+                    )
+                except TimeoutError:
+                    continue
+
+                if name in finished or claimed.get(name, attempt) != attempt:
+                    # A losing attempt racing with the winner; drop it.
+                    if resume is not None:
+                        resume.set()
+                    continue
+
+                if isinstance(item, _Done):
+                    if item.error is None:
+                        claimed[name] = attempt
+                        finished.add(name)
+                        self.report.completed.append(name)
+                        self.report.winning_attempt[name] = attempt
+                        cancel_siblings(name, attempt)
+                    else:
+                        failures[name] = failures.get(name, 0) + 1
+                        if name in claimed or failures[name] == len(attempts[name]):
+                            finished.add(name)
+                            self.report.failed[name] = repr(item.error)
+                            logger.warning("Worker %s failed: %r", name, item.error)
+                    continue
+
+                if name not in claimed:
+                    claimed[name] = attempt
+                    cancel_siblings(name, attempt)
+                yield name, item
+                resume.set()
+        finally:
+            pending = [t for tasks in attempts.values() for t in tasks if not t.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            self.report.timed_out = [
+                name for name in self._workers if name not in finished
+            ]
+            self.report.elapsed_seconds = time.monotonic() - start
+
+
+class DeadlineParallelAgentConfig(ParallelAgentConfig):
+    """YAML config for ``DeadlineParallelAgent``."""
+
+    agent_class: str = "shared_libraries.parallel.DeadlineParallelAgent"
+    deadline_seconds: Optional[float] = None
+    hedge_after_seconds: Optional[float] = None
+    max_hedges: int = 1
+    status_key: str = "research_worker_status"
+
+
+class DeadlineParallelAgent(ParallelAgent):
+    """ParallelAgent that stops waiting for stragglers at a deadline.
+
+    Sub-agents run on their own branches exactly as in ``ParallelAgent``.
+    Workers that stay silent for ``hedge_after_seconds`` get a duplicate
+    attempt on the same branch, and workers still running at
+    ``deadline_seconds`` are cancelled. The absolute deadline is written to
+    ``fan_out_deadline_at`` before the workers start, with the invocation
+    that owns it (nested fan-outs keep the tighter of the two; deadlines
+    left behind by an aborted invocation are ignored), and the ``FanOutReport`` is written to
+    ``status_key`` afterwards so the parent agent knows which findings are
+    missing. Worker model calls go through the process-wide rate-limit
+    scheduler at background priority, behind interactive turns.
+    """
+
+    config_type: ClassVar[type[ParallelAgentConfig]] = DeadlineParallelAgentConfig
+
+    deadline_seconds: Optional[float] = None
+    hedge_after_seconds: Optional[float] = None
+    max_hedges: int = 1
+    status_key: str = "research_worker_status"
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        if not self.sub_agents:
+            return
+
+        deadline_at = None
+        if self.deadline_seconds is not None:
+            deadline_at = time.time() + self.deadline_seconds
+        inherited = fan_out_deadline(ctx.session.state, ctx.invocation_id)
+        inherited_owner = (
+            None if inherited is None else ctx.session.state.get(DEADLINE_INVOCATION_STATE_KEY)
+        )
+        if inherited is not None and (deadline_at is None or inherited < deadline_at):
+            deadline_at = inherited
+        if deadline_at is not None:
+            yield self._state_event(ctx, {
+                DEADLINE_STATE_KEY: deadline_at,
+                DEADLINE_INVOCATION_STATE_KEY: ctx.invocation_id,
+            })
+
+        workers = {}
+        for sub_agent in self.sub_agents:
+            schedule_models(sub_agent)
+            sub_agent_ctx = _create_branch_ctx_for_sub_agent(self, sub_agent, ctx)
+            workers[sub_agent.name] = (
+                lambda attempt, agent=sub_agent, agent_ctx=sub_agent_ctx: (
+                    _in_background(agent.run_async(agent_ctx.model_copy()))
+                )
+            )
+        policy = FanOutPolicy(
+            deadline_seconds=(
+                None if deadline_at is None else max(0.0, deadline_at - time.time())
+            ),
+            hedge_after_seconds=self.hedge_after_seconds,
+            max_hedges=self.max_hedges,
+        )
+        fan_out = FanOut(workers, policy)
+        async with contextlib.aclosing(fan_out.run()) as agen:
+            async for _, event in agen:
+                yield event
+
+        if fan_out.report.partial:
+            logger.warning(
+                "%s proceeding with partial results: timed out %s, failed %s",
+                self.name,
+                fan_out.report.timed_out,
+                list(fan_out.report.failed),
+            )
+        state_delta = {self.status_key: fan_out.report.as_state()}
+        if deadline_at is not None:
+            # Put back what the enclosing fan-out set (nothing at top level), so
+            # later siblings and turns do not run under this fan-out's deadline.
+            state_delta[DEADLINE_STATE_KEY] = inherited
+            state_delta[DEADLINE_INVOCATION_STATE_KEY] = inherited_owner
+        yield self._state_event(ctx, state_delta)
+
+    def _state_event(self, ctx: InvocationContext, state_delta: dict) -> Event:
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta=state_delta),
+        )
+
+    @classmethod
+    def _parse_config(
+        cls,
+        config: DeadlineParallelAgentConfig,
+        config_abs_path: str,
+        kwargs: dict[str, Any],
+    ) -> dict[str, Any]:
+        for field in ("deadline_seconds", "hedge_after_seconds", "max_hedges", "status_key"):
+            value = getattr(config, field, None)
+            if value is not None:
+                kwargs[field] = value
+        return kwargs
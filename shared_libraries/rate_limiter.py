@@ -0,0 +1,510 @@
+"""Process-wide, rate-limit-aware scheduling of model calls.
+
+Under peak load the financial advisor and the research fan-outs hit the
+Vertex AI quota together, and every agent used to send (and retry) its
+calls on its own, turning one 429 into a burst of them. Model calls now go
+through one ``RateLimitScheduler`` per process:
+
+* Each model (the name in ``llm_request.model``, so routed tiers get their
+  own lane) has a token bucket sized from its requests-per-minute quota and
+  a concurrency limit.
+* Waiting calls are admitted by priority class, then in arrival order:
+  interactive user turns before background research workers.
+* The concurrency limit adapts AIMD-style: it grows by one per window of
+  successful calls and halves on a 429, at most once per backoff window.
+* A 429 pauses the whole lane for a jittered, exponentially growing backoff
+  and empties its bucket, so calls resume gradually instead of all retrying
+  at once. Throttled calls are retried through the queue, up to
+  ``max_attempts``.
+
+``ScheduledLlm`` wraps an agent's model; ``schedule_models(root_agent)``
+wraps every model of an agent tree, including agents behind ``AgentTool``.
+``DeadlineParallelAgent`` schedules its research workers at background
+priority. Other outbound calls can use ``RateLimitScheduler.call``.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import dataclasses
+import enum
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from typing import Any, Optional, TypeVar
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(enum.IntEnum):
+    """Admission classes; lower values are admitted first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "model_call_priority", default=Priority.INTERACTIVE
+)
+
+
+def _as_priority(value: "Priority | str | int") -> Priority:
+    if isinstance(value, str):
+        return Priority[value.upper()]
+    return Priority(value)
+
+
+@contextlib.contextmanager
+def priority_scope(priority: "Priority | str"):
+    """Scheduled calls made inside the block (and tasks it starts) use ``priority``."""
+    token = _priority.set(_as_priority(priority))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True for 429 / RESOURCE_EXHAUSTED errors of google-genai and google-api-core."""
+    if getattr(error, "code", None) == 429 or getattr(error, "status", None) == "RESOURCE_EXHAUSTED":
+        return True
+    return type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+@dataclasses.dataclass
+class ModelLimits:
+    """Quota of one model.
+
+    Attributes:
+        requests_per_minute: Token bucket rate; None leaves the rate to the
+            adaptive concurrency limit alone.
+        max_concurrency: Upper (and starting) concurrency limit.
+        min_concurrency: The limit never drops below this.
+        burst_seconds: Bucket capacity, in seconds of quota.
+    """
+
+    requests_per_minute: Optional[float] = None
+    max_concurrency: int = 16
+    min_concurrency: int = 1
+    burst_seconds: float = 1.0
+
+
+class TokenBucket:
+    """Requests-per-second token bucket."""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self._updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available; 0 if one is."""
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def drain(self) -> None:
+        self.tokens = min(self.tokens, 0.0)
+
+
+@dataclasses.dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    loop: asyncio.AbstractEventLoop = dataclasses.field(compare=False)
+    future: Optional[asyncio.Future] = dataclasses.field(default=None, compare=False)
+
+
+@dataclasses.dataclass
+class _Lane:
+    limits: ModelLimits
+    bucket: Optional[TokenBucket]
+    limit: float
+    in_flight: int = 0
+    paused_until: float = 0.0
+    streak: int = 0
+    waiters: list = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class SchedulerStats:
+    """Counters for one ``RateLimitScheduler``."""
+
+    admitted: int = 0
+    throttled: int = 0
+    backoffs: int = 0
+    retries: int = 0
+    failed: int = 0
+    peak_in_flight: int = 0
+    wait_seconds: dict[str, float] = dataclasses.field(default_factory=dict)
+    waits: dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def as_dict(self) -> dict[str, Any]:
+        stats = dataclasses.asdict(self)
+        stats["mean_wait_seconds"] = {
+            name: round(self.wait_seconds[name] / count, 4) for name, count in self.waits.items()
+        }
+        del stats["wait_seconds"], stats["waits"]
+        return stats
+
+
+class Permit:
+    """Admission of one call; release it exactly once when the call ends."""
+
+    def __init__(self, scheduler: "RateLimitScheduler", model: str):
+        self._scheduler = scheduler
+        self._model = model
+        self._released = False
+
+    def release(self, throttled: bool = False) -> None:
+        if not self._released:
+            self._released = True
+            self._scheduler._release(self._model, throttled)
+
+
+class RateLimitScheduler:
+    """Admits calls per model by priority, token bucket and adaptive concurrency.
+
+    Args:
+        limits: Model name to ``ModelLimits``.
+        default_limits: Limits of models not in ``limits``.
+        max_attempts: Attempts per call in ``call`` and ``ScheduledLlm``,
+            including the first.
+        backoff_seconds: First lane pause after a 429; doubles per
+            consecutive backoff.
+        max_backoff_seconds: Longest lane pause.
+        decrease_factor: Concurrency limit multiplier on a 429.
+        registry: Optional instrumentation ``MetricsRegistry`` to mirror into.
+        clock: Monotonic clock, injectable for tests.
+        rng: Random source for backoff jitter.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[dict[str, ModelLimits]] = None,
+        default_limits: Optional[ModelLimits] = None,
+        max_attempts: int = 5,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 30.0,
+        decrease_factor: float = 0.5,
+        registry=None,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        self.limits = dict(limits or {})
+        self.default_limits = default_limits or ModelLimits()
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.decrease_factor = decrease_factor
+        self.registry = registry
+        self.stats = SchedulerStats()
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._lanes: dict[str, _Lane] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.describe("adk_scheduler_wait_seconds", "Queueing delay before a model call.")
+            registry.describe("adk_scheduler_throttled_total", "Model calls rejected with 429.")
+
+    def _lane(self, model: str) -> _Lane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            limits = self.limits.get(model, self.default_limits)
+            bucket = None
+            if limits.requests_per_minute:
+                rate = limits.requests_per_minute / 60
+                bucket = TokenBucket(rate, rate * limits.burst_seconds, self._clock())
+            lane = self._lanes[model] = _Lane(limits, bucket, float(limits.max_concurrency))
+        return lane
+
+    def concurrency_limit(self, model: str) -> int:
+        """Current adaptive concurrency limit of ``model``."""
+        with self._lock:
+            lane = self._lane(model)
+            return max(int(lane.limit), lane.limits.min_concurrency)
+
+    def backoff(self, streak: int) -> float:
+        """Jittered pause after the ``streak``-th consecutive backoff."""
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (streak - 1))
+        return delay / 2 + self._rng.uniform(0, delay / 2)
+
+    def _wake(self, lane: _Lane) -> None:
+        if lane.waiters:
+            future = lane.waiters[0].future
+            if future is not None and not future.done():
+                lane.waiters[0].loop.call_soon_threadsafe(_resolve, future)
+
+    def _try_admit(self, lane: _Lane, waiter: _Waiter) -> Optional[float]:
+        """0 if admitted; else seconds to wait, or None to wait for a wake-up."""
+        now = self._clock()
+        if lane.waiters[0] is not waiter:
+            return None
+        if now < lane.paused_until:
+            return lane.paused_until - now
+        if lane.in_flight >= max(int(lane.limit), lane.limits.min_concurrency):
+            return None
+        if lane.bucket is not None:
+            wait = lane.bucket.wait_time(now)
+            if wait > 0:
+                return wait
+            lane.bucket.take()
+        heapq.heappop(lane.waiters)
+        lane.in_flight += 1
+        self.stats.admitted += 1
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, lane.in_flight)
+        self._wake(lane)
+        return 0.0
+
+    async def acquire(self, model: str, priority: "Priority | str | None" = None) -> Permit:
+        """Waits until a call to ``model`` may start."""
+        priority = _priority.get() if priority is None else _as_priority(priority)
+        loop = asyncio.get_running_loop()
+        start = self._clock()
+        with self._lock:
+            lane = self._lane(model)
+            waiter = _Waiter(priority, next(self._sequence), loop)
+            heapq.heappush(lane.waiters, waiter)
+        try:
+            while True:
+                with self._lock:
+                    delay = self._try_admit(lane, waiter)
+                    if delay == 0:
+                        break
+                    waiter.future = future = loop.create_future()
+                try:
+                    await asyncio.wait_for(future, delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                if waiter in lane.waiters:
+                    lane.waiters.remove(waiter)
+                    heapq.heapify(lane.waiters)
+                self._wake(lane)
+            raise
+        waited = self._clock() - start
+        name = priority.name.lower()
+        with self._lock:
+            self.stats.wait_seconds[name] = self.stats.wait_seconds.get(name, 0.0) + waited
+            self.stats.waits[name] = self.stats.waits.get(name, 0) + 1
+        if self.registry is not None:
+            self.registry.observe("adk_scheduler_wait_seconds", waited, model=model, priority=name)
+        return Permit(self, model)
+
+    def _release(self, model: str, throttled: bool) -> None:
+        with self._lock:
+            lane = self._lanes[model]
+            lane.in_flight -= 1
+            now = self._clock()
+            if throttled:
+                self.stats.throttled += 1
+                # Calls already in flight when the quota ran out fail too;
+                # only the first 429 of a backoff window cuts the limit.
+                if now >= lane.paused_until:
+                    lane.streak += 1
+                    lane.limit = max(float(lane.limits.min_concurrency), lane.limit * self.decrease_factor)
+                    lane.paused_until = now + self.backoff(lane.streak)
+                    self.stats.backoffs += 1
+                    if lane.bucket is not None:
+                        lane.bucket.drain()
+                    logger.debug(
+                        "%s throttled: limit %.1f, paused %.2fs",
+                        model, lane.limit, lane.paused_until - now,
+                    )
+            else:
+                lane.streak = 0
+                lane.limit = min(float(lane.limits.max_concurrency), lane.limit + 1 / lane.limit)
+            self._wake(lane)
+        if throttled and self.registry is not None:
+            self.registry.inc("adk_scheduler_throttled_total", model=model)
+
+    def _note_retry(self, failed: bool) -> None:
+        with self._lock:
+            if failed:
+                self.stats.failed += 1
+            else:
+                self.stats.retries += 1
+
+    async def call(
+        self,
+        model: str,
+        fn: Callable[[], Awaitable[T]],
+        priority: "Priority | str | None" = None,
+    ) -> T:
+        """Runs ``fn()`` under the limits of ``model``, retrying 429s."""
+        for attempt in range(1, self.max_attempts + 1):
+            permit = await self.acquire(model, priority)
+            try:
+                return await fn()
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                permit.release(throttled=throttled)
+                if not throttled or attempt == self.max_attempts:
+                    self._note_retry(failed=True)
+                    raise
+                self._note_retry(failed=False)
+            finally:
+                permit.release()
+        raise AssertionError("unreachable")
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _limits_from_env() -> dict[str, ModelLimits]:
+    limits = json.loads(os.getenv("MODEL_RATE_LIMITS", "") or "{}")
+    return {model: ModelLimits(**fields) for model, fields in limits.items()}
+
+
+_default_scheduler: Optional[RateLimitScheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+
+def default_scheduler() -> RateLimitScheduler:
+    """Process-wide scheduler configured from the environment.
+
+    MODEL_RATE_LIMITS (JSON, model name to ``ModelLimits`` fields, e.g.
+    ``{"gemini-2.5-flash": {"requests_per_minute": 500}}``),
+    MODEL_SCHEDULER_MAX_ATTEMPTS (default 5) and
+    MODEL_SCHEDULER_BACKOFF_SECONDS (default 1).
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            registry = None
+            if os.getenv("ADK_INSTRUMENTATION", "").lower() in ("1", "true", "yes"):
+                from .instrumentation import default_registry
+
+                registry = default_registry()
+            _default_scheduler = RateLimitScheduler(
+                limits=_limits_from_env(),
+                max_attempts=int(os.getenv("MODEL_SCHEDULER_MAX_ATTEMPTS", "5")),
+                backoff_seconds=float(os.getenv("MODEL_SCHEDULER_BACKOFF_SECONDS", "1")),
+                registry=registry,
+            )
+        return _default_scheduler
+
+
+class ScheduledLlm(BaseLlm):
+    """Model wrapper that admits every call through the rate-limit scheduler.
+
+    Calls are keyed by ``llm_request.model``. A 429 raised before the first
+    response is retried through the queue; errors after a partial response
+    are raised as they are.
+
+    ADK runs the tools of a response, including whole ``AgentTool``
+    sub-agent runs, while this generator is suspended on it. Final
+    (non-partial) responses are therefore held until the stream ends and
+    only yielded once the permit is released; otherwise a coordinator would
+    keep its slot while its sub-agent queues for one on the same model.
+
+    Attributes:
+        llm: The wrapped model; None resolves ``model`` through the registry.
+        priority: Admission class; None uses the enclosing ``priority_scope``.
+        scheduler: None uses ``default_scheduler()``.
+    """
+
+    llm: Optional[BaseLlm] = None
+    priority: Optional[Priority] = None
+    scheduler: Optional[RateLimitScheduler] = None
+    _resolved: Optional[BaseLlm] = PrivateAttr(default=None)
+
+    def _inner(self) -> BaseLlm:
+        if self.llm is not None:
+            return self.llm
+        if self._resolved is None:
+            from google.adk.models.registry import LLMRegistry
+
+            self._resolved = LLMRegistry.new_llm(self.model)
+        return self._resolved
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        scheduler = self.scheduler or default_scheduler()
+        model = llm_request.model or self.model
+        for attempt in range(1, scheduler.max_attempts + 1):
+            permit = await scheduler.acquire(model, self.priority)
+            responded = False
+            held: list[LlmResponse] = []
+            try:
+                async with contextlib.aclosing(
+                    self._inner().generate_content_async(llm_request, stream=stream)
+                ) as responses:
+                    async for response in responses:
+                        if response.partial and not held:
+                            responded = True
+                            yield response
+                        else:
+                            held.append(response)
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                permit.release(throttled=throttled)
+                if not throttled or responded or attempt == scheduler.max_attempts:
+                    scheduler._note_retry(failed=True)
+                    raise
+                scheduler._note_retry(failed=False)
+                continue
+            finally:
+                permit.release()
+            for response in held:
+                yield response
+            return
+
+    def connect(self, llm_request: LlmRequest):
+        return self._inner().connect(llm_request)
+
+
+def schedule_models(agent, priority: "Priority | str | None" = None):
+    """Wraps the models of ``agent`` and every agent below it in ``ScheduledLlm``.
+
+    Sub-agents and agents behind ``AgentTool`` are included; agents that
+    inherit their parent's model and already wrapped models are left alone.
+    ``MODEL_SCHEDULER=0`` turns this into a no-op. Returns ``agent``.
+    """
+    if os.getenv("MODEL_SCHEDULER", "1").lower() in ("0", "false", "no"):
+        return agent
+    from google.adk.agents import LlmAgent
+    from google.adk.tools.agent_tool import AgentTool
+
+    priority = None if priority is None else _as_priority(priority)
+    seen = set()
+
+    def visit(node) -> None:
+        if id(node) in seen:
+            return
+        seen.add(id(node))
+        if isinstance(node, LlmAgent) and node.model and not isinstance(node.model, ScheduledLlm):
+            if isinstance(node.model, BaseLlm):
+                node.model = ScheduledLlm(model=node.model.model, llm=node.model, priority=priority)
+            else:
+                node.model = ScheduledLlm(model=node.model, priority=priority)
+        for sub_agent in node.sub_agents:
+            visit(sub_agent)
+        for tool in getattr(node, "tools", None) or []:
+            if isinstance(tool, AgentTool):
+                visit(tool.agent)
+
+    visit(agent)
+    return agent
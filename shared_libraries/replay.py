@@ -0,0 +1,352 @@
+"""Record model and tool calls once, then replay them at memory speed.
+
+Agent tests and performance comparisons otherwise need live models,
+BigQuery and search, which makes them slow and non-deterministic.
+``replay_agent(root_agent)`` puts a record/replay layer on the model and
+tool boundary of an agent tree:
+
+* Every model is wrapped in ``ReplayLlm``, keyed by a hash of the request
+  the model actually receives (after routing, caches and compaction).
+  Call ids, thought signatures, timestamps and UUIDs are normalized away.
+* Tool calls are answered by a ``before_tool_callback`` keyed by the tool
+  name and arguments. The state the tool wrote is replayed with its result,
+  and the agent's own ``after_tool_callback``s still run on it.
+* Recordings live in memory and are appended to one gzipped JSONL file
+  (``REPLAY_PATH``). Repeated identical requests replay in recorded order.
+
+``REPLAY_MODE`` selects the behaviour: ``off`` (default, no wrapping),
+``record`` (call everything live and record it), ``replay`` (serve
+recordings, call and record anything missing) or ``strict`` (serve
+recordings and raise ``ReplayMissError`` on anything missing).
+"""
+
+import collections
+import contextlib
+import dataclasses
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from collections.abc import AsyncGenerator
+from typing import Any, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+REPLAY_MODES = ("off", "record", "replay", "strict")
+
+# Request fields that differ between otherwise identical calls.
+_VOLATILE_KEYS = frozenset({"id", "thought_signature", "http_options", "labels"})
+_SCRUB = (
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?"), "<time>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I), "<uuid>"),
+)
+_SPACE = re.compile(r"\s+")
+
+
+class ReplayMissError(LookupError):
+    """A strict replay found no recording for a model or tool call."""
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if k not in _VOLATILE_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        for pattern, replacement in _SCRUB:
+            value = pattern.sub(replacement, value)
+        return _SPACE.sub(" ", value).strip()
+    return value
+
+
+def _digest(kind: str, data: Any) -> str:
+    canonical = json.dumps(_normalize(data), sort_keys=True, default=str)
+    return f"{kind}:{hashlib.sha256(canonical.encode()).hexdigest()[:32]}"
+
+
+def request_key(llm_request: LlmRequest) -> str:
+    """Store key of a model request."""
+    return _digest("model", {
+        "model": llm_request.model,
+        "contents": [c.model_dump(mode="json", exclude_none=True) for c in llm_request.contents],
+        "config": llm_request.config.model_dump(mode="json", exclude_none=True)
+        if llm_request.config else None,
+    })
+
+
+def tool_key(tool_name: str, args: dict) -> str:
+    """Store key of a tool call."""
+    return _digest("tool", {"tool": tool_name, "args": args})
+
+
+@dataclasses.dataclass
+class ReplayStats:
+    """Counters for one ``ReplayStore``."""
+
+    model_hits: int = 0
+    model_misses: int = 0
+    tool_hits: int = 0
+    tool_misses: int = 0
+    recorded: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.model_hits + self.tool_hits
+        lookups = hits + self.model_misses + self.tool_misses
+        return hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        data = dataclasses.asdict(self)
+        data["hit_rate"] = self.hit_rate
+        return data
+
+
+class ReplayStore:
+    """Recordings of one test suite or benchmark.
+
+    Args:
+        path: Gzipped JSONL file the recordings are loaded from and appended
+            to; None keeps them in memory only. One process writes at a time.
+        mode: ``record``, ``replay`` or ``strict``.
+    """
+
+    def __init__(self, path: Optional[str] = None, mode: str = "replay"):
+        if mode not in REPLAY_MODES or mode == "off":
+            raise ValueError(f"replay mode must be record, replay or strict, not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.stats = ReplayStats()
+        self._entries: dict[str, list] = {}
+        self._occurrences: collections.Counter = collections.Counter()
+        self._lock = threading.Lock()
+        self._file = None
+        # Live tool calls waiting for their result: call id -> (key, occurrence).
+        self._pending_calls: dict[str, tuple[str, int]] = {}
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    self._put(record["k"], record["n"], record["v"])
+        except (EOFError, gzip.BadGzipFile, zlib.error, ValueError) as e:
+            # A recorder killed mid-write leaves a torn last record.
+            logger.warning("Stopped reading %s at a damaged record: %s", self.path, e)
+
+    def _put(self, key: str, seq: int, payload: Any) -> None:
+        entries = self._entries.setdefault(key, [])
+        entries.extend([None] * (seq + 1 - len(entries)))
+        entries[seq] = payload
+
+    def __len__(self) -> int:
+        return sum(1 for entries in self._entries.values() for e in entries if e is not None)
+
+    def rewind(self) -> None:
+        """Replays repeated requests from their first recording again."""
+        with self._lock:
+            self._occurrences.clear()
+
+    def take(self, key: str) -> tuple[int, Any]:
+        """(occurrence of ``key`` in this run, its recording or None).
+
+        Raises:
+            ReplayMissError: Strict mode and ``key`` was never recorded.
+        """
+        kind = key.split(":", 1)[0]
+        with self._lock:
+            seq = self._occurrences[key]
+            self._occurrences[key] += 1
+            payload = None
+            if self.mode != "record":
+                entries = [e for e in self._entries.get(key, [])[: seq + 1] if e is not None]
+                payload = entries[-1] if entries else None
+            if payload is None:
+                setattr(self.stats, f"{kind}_misses", getattr(self.stats, f"{kind}_misses") + 1)
+            else:
+                setattr(self.stats, f"{kind}_hits", getattr(self.stats, f"{kind}_hits") + 1)
+        if payload is None and self.mode == "strict":
+            raise ReplayMissError(f"no recording for {key} (occurrence {seq})")
+        return seq, payload
+
+    def record(self, key: str, seq: int, payload: Any) -> None:
+        with self._lock:
+            self._put(key, seq, payload)
+            self.stats.recorded += 1
+            if not self.path:
+                return
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+            self._file.write(json.dumps({"k": key, "n": seq, "v": payload}, default=str) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def before_tool(self, tool, args: dict, tool_context) -> Optional[Any]:
+        """``before_tool_callback``: answers recorded tool calls."""
+        if tool.is_long_running:
+            return None
+        key = tool_key(tool.name, args)
+        seq, payload = self.take(key)
+        if payload is None:
+            with self._lock:
+                self._pending_calls[tool_context.function_call_id] = (key, seq)
+            return None
+        for name, value in payload["state_delta"].items():
+            tool_context.state[name] = value
+        for name, value in payload["actions"].items():
+            setattr(tool_context.actions, name, value)
+        return payload["result"]
+
+    def after_tool(self, tool, args: dict, tool_context, tool_response) -> None:
+        """``after_tool_callback``: records live tool results."""
+        with self._lock:
+            pending = self._pending_calls.pop(tool_context.function_call_id, None)
+        if pending is None:
+            return None
+        actions = tool_context.actions
+        payload = {
+            "result": tool_response,
+            "state_delta": dict(actions.state_delta),
+            "actions": {
+                name: getattr(actions, name)
+                for name in ("skip_summarization", "escalate", "transfer_to_agent")
+                if getattr(actions, name, None)
+            },
+        }
+        self.record(*pending, payload)
+        return None
+
+
+_default_store: Optional[ReplayStore] = None
+_default_store_lock = threading.Lock()
+
+
+def replay_mode() -> str:
+    mode = os.getenv("REPLAY_MODE", "off").lower()
+    if mode not in REPLAY_MODES:
+        raise ValueError(f"REPLAY_MODE must be one of {', '.join(REPLAY_MODES)}, not {mode!r}")
+    return mode
+
+
+def default_store() -> ReplayStore:
+    """Process-wide store from REPLAY_MODE and REPLAY_PATH (default ``adk_replay.jsonl.gz``)."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            mode = replay_mode()
+            _default_store = ReplayStore(
+                os.getenv("REPLAY_PATH", "adk_replay.jsonl.gz"),
+                mode="replay" if mode == "off" else mode,
+            )
+        return _default_store
+
+
+class ReplayLlm(BaseLlm):
+    """Model wrapper that serves recorded responses and records live ones.
+
+    Attributes:
+        llm: The wrapped model; None resolves ``model`` through the registry.
+        store: None uses ``default_store()``.
+    """
+
+    llm: Optional[BaseLlm] = None
+    store: Optional[ReplayStore] = None
+    _resolved: Optional[BaseLlm] = PrivateAttr(default=None)
+
+    def _inner(self) -> BaseLlm:
+        if self.llm is not None:
+            return self.llm
+        if self._resolved is None:
+            from google.adk.models.registry import LLMRegistry
+
+            self._resolved = LLMRegistry.new_llm(self.model)
+        return self._resolved
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        store = self.store if self.store is not None else default_store()
+        key = request_key(llm_request)
+        seq, payload = store.take(key)
+        if payload is not None:
+            for data in payload:
+                response = LlmResponse.model_validate_json(json.dumps(data))
+                # Recorded chunks of a streamed call are only replayed to streams.
+                if stream or not response.partial:
+                    yield response
+            return
+
+        recorded = []
+        async with contextlib.aclosing(
+            self._inner().generate_content_async(llm_request, stream=stream)
+        ) as responses:
+            async for response in responses:
+                recorded.append(json.loads(response.model_dump_json(exclude_none=True)))
+                yield response
+        store.record(key, seq, recorded)
+
+    def connect(self, llm_request: LlmRequest):
+        return self._inner().connect(llm_request)
+
+
+def _callbacks(existing, first) -> list:
+    if existing is None:
+        return [first]
+    existing = existing if isinstance(existing, list) else [existing]
+    return [first, *(c for c in existing if c != first)]
+
+
+def replay_agent(agent, store: Optional[ReplayStore] = None):
+    """Puts ``agent`` and every agent below it behind the record/replay layer.
+
+    Models are wrapped in ``ReplayLlm`` (outside any ``ScheduledLlm``, so
+    replayed calls skip the quota scheduler) and the store's tool callbacks
+    go first in each agent's tool callback lists. Sub-agents and agents
+    behind ``AgentTool`` are included. ``REPLAY_MODE=off`` (the default)
+    turns this into a no-op unless a ``store`` is given. Returns ``agent``.
+    """
+    if store is None:
+        if replay_mode() == "off":
+            return agent
+        store = default_store()
+    from google.adk.agents import LlmAgent
+    from google.adk.tools.agent_tool import AgentTool
+
+    seen = set()
+
+    def visit(node) -> None:
+        if id(node) in seen:
+            return
+        seen.add(id(node))
+        if isinstance(node, LlmAgent):
+            if node.model and not isinstance(node.model, ReplayLlm):
+                if isinstance(node.model, BaseLlm):
+                    node.model = ReplayLlm(model=node.model.model, llm=node.model, store=store)
+                else:
+                    node.model = ReplayLlm(model=node.model, store=store)
+            node.before_tool_callback = _callbacks(node.before_tool_callback, store.before_tool)
+            node.after_tool_callback = _callbacks(node.after_tool_callback, store.after_tool)
+        for sub_agent in node.sub_agents:
+            visit(sub_agent)
+        for tool in getattr(node, "tools", None) or []:
+            if isinstance(tool, AgentTool):
+                visit(tool.agent)
+
+    visit(agent)
+    return agent
@@ -0,0 +1,516 @@
+"""Shared, deduplicated cache for Google Search-backed agents.
+
+The teaching assistant, the financial data analyst and the YAML research
+sub-agents all ground their answers with ``google_search``, and the parallel
+research workers regularly ask for the same topic at the same time. This
+module keeps one process-wide cache for all of them:
+
+* queries are normalized (case, punctuation, stop words) so near-identical
+  phrasings share an entry;
+* entries live in an in-process LRU with a TTL, optionally backed by a local
+  SQLite file so they survive restarts and are shared between workers;
+* concurrent lookups of the same key wait for the first caller instead of
+  searching again (in-flight deduplication), except a hedged attempt of a
+  fan-out worker, which must not wait on the call it is hedging;
+* hit/miss counters are kept in ``SearchCache.stats``.
+
+``google_search`` is executed inside Gemini, so its raw results never reach
+our code. For agents using it, ``cache_search_before_model`` and
+``cache_search_after_model`` cache the grounded model response instead, keyed
+by the agent's instruction and the normalized user query. Agents with a
+programmable backend can use ``make_search_tool`` to cache raw results.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import weakref
+from collections.abc import Awaitable, Callable
+from typing import Any, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from .parallel import fan_out_deadline
+
+logger = logging.getLogger(__name__)
+
+# Only filler: question words and prepositions change what is being asked.
+_STOP_WORDS = frozenset("a an the please i me show tell".split())
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a search query.
+
+    "What is the latest AAPL news?" and "what is latest AAPL news, please"
+    both become "what is latest aapl news". Question words, prepositions and
+    word order are kept: "Why is AAPL down" and "When is AAPL down", or
+    "AAPL better than MSFT" and "MSFT better than AAPL", ask different
+    questions.
+    """
+    text = unicodedata.normalize("NFKC", query).casefold()
+    words = _NON_WORD.sub(" ", text).split()
+    kept = [w for w in words if w not in _STOP_WORDS] or words
+    return " ".join(kept)
+
+
+@dataclasses.dataclass
+class CacheStats:
+    """Counters for one ``SearchCache``."""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    dedup_joins: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.memory_hits + self.disk_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups answered without a new search."""
+        if not self.lookups:
+            return 0.0
+        return (self.memory_hits + self.disk_hits + self.dedup_joins) / self.lookups
+
+    def as_dict(self) -> dict[str, Any]:
+        stats = dataclasses.asdict(self)
+        stats["lookups"] = self.lookups
+        stats["hit_rate"] = round(self.hit_rate, 4)
+        return stats
+
+
+class SqliteSearchStore:
+    """Disk tier of the cache: one JSON value per key with an expiry time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, now: float) -> Optional[tuple[Any, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._conn.commit()
+
+    def purge_expired(self, now: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM search_cache WHERE expires_at <= ?", (now,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class SearchCache:
+    """LRU + TTL cache with an optional SQLite tier and in-flight dedup.
+
+    Values must be JSON serializable when a disk store is configured.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1024,
+        store: Optional[SqliteSearchStore] = None,
+        inflight_timeout: float = 30,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.store = store
+        self.inflight_timeout = inflight_timeout
+        self.stats = CacheStats()
+        self._clock = clock
+        self._entries: collections.OrderedDict[str, tuple[Any, float]] = (
+            collections.OrderedDict()
+        )
+        self._inflight: dict[str, tuple[asyncio.Future, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str, namespace: str = "") -> str:
+        normalized = normalize_query(query)
+        return hashlib.sha256(f"{namespace}\x00{normalized}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value for ``key`` and records a hit or miss."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.stats.memory_hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.stats.expirations += 1
+        if self.store is not None:
+            stored = self.store.get(key, now)
+            if stored is not None:
+                with self._lock:
+                    self._remember(key, *stored)
+                    self.stats.disk_hits += 1
+                return stored[0]
+        with self._lock:
+            self.stats.misses += 1
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        expires_at = self._clock() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, value, expires_at)
+        if self.store is not None:
+            self.store.put(key, value, expires_at)
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def claim(self, key: str) -> Optional[asyncio.Future]:
+        """Registers the caller as the one fetching ``key``.
+
+        Returns None if the caller now owns the fetch and must later call
+        ``resolve``, otherwise the future of the caller already fetching it.
+        If the claiming task ends (error, cancellation) without resolving,
+        the claim is released and its waiters get None at once.
+        """
+        now = self._clock()
+        with self._lock:
+            pending, claimed_at = self._inflight.get(key, (None, 0.0))
+            # A claim older than the timeout belongs to a fetch that died
+            # without resolving; take it over instead of waiting on it.
+            if (
+                pending is not None
+                and not pending.done()
+                and now - claimed_at < self.inflight_timeout
+            ):
+                self.stats.dedup_joins += 1
+                return pending
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = (future, now)
+        task = asyncio.current_task()
+        if task is not None:
+            release = functools.partial(self._abandon, key, future)
+            task.add_done_callback(release)
+            future.add_done_callback(lambda _: task.remove_done_callback(release))
+        return None
+
+    def release(self, key: str) -> None:
+        """Gives up the caller's claim on ``key`` without a result."""
+        self.resolve(key, None)
+
+    def _abandon(self, key: str, future: asyncio.Future, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._inflight.get(key, (None, 0.0))[0] is future:
+                del self._inflight[key]
+        _set_result(future, None)
+
+    def resolve(self, key: str, value: Optional[Any]) -> None:
+        """Publishes the owner's result; ``None`` means nothing to share."""
+        if value is not None:
+            self.put(key, value)
+        with self._lock:
+            pending, _ = self._inflight.pop(key, (None, 0.0))
+        if pending is not None and not pending.done():
+            pending.get_loop().call_soon_threadsafe(_set_result, pending, value)
+
+    async def wait(
+        self, pending: asyncio.Future, timeout: Optional[float] = None
+    ) -> Optional[Any]:
+        """Waits for another caller's fetch; None if it failed or timed out.
+
+        ``timeout`` shortens ``inflight_timeout`` for callers with a deadline.
+        """
+        if timeout is None or timeout > self.inflight_timeout:
+            timeout = self.inflight_timeout
+        try:
+            return await asyncio.wait_for(asyncio.shield(pending), timeout=timeout)
+        except TimeoutError:
+            return None
+
+    async def get_or_fetch(
+        self,
+        query: str,
+        fetch: Callable[[str], Awaitable[Any]],
+        namespace: str = "",
+    ) -> Any:
+        """Returns cached results for ``query``, fetching them at most once."""
+        key = self.key(query, namespace)
+        value = self.get(key)
+        if value is not None:
+            return value
+        pending = self.claim(key)
+        if pending is not None:
+            value = await self.wait(pending)
+            if value is not None:
+                return value
+            return await fetch(query)
+        value = None
+        try:
+            value = await fetch(query)
+            return value
+        finally:
+            self.resolve(key, value)
+
+
+def _set_result(future: asyncio.Future, value: Any) -> None:
+    if not future.done():
+        future.set_result(value)
+
+
+class FakeSearchBackend:
+    """Deterministic offline search backend for tests and local runs."""
+
+    def __init__(self, latency_seconds: float = 0.0, results_per_query: int = 3):
+        self.latency_seconds = latency_seconds
+        self.results_per_query = results_per_query
+        self.calls: list[str] = []
+
+    async def search(self, query: str) -> list[dict[str, str]]:
+        self.calls.append(query)
+        await asyncio.sleep(self.latency_seconds)
+        digest = hashlib.md5(normalize_query(query).encode()).hexdigest()[:8]
+        return [
+            {
+                "title": f"Result {i + 1} for {query}",
+                "url": f"https://example.com/{digest}/{i + 1}",
+                "snippet": f"Offline snippet {i + 1} about {query}.",
+            }
+            for i in range(self.results_per_query)
+        ]
+
+
+def make_search_tool(
+    backend_search: Callable[[str], Awaitable[list[dict[str, str]]]],
+    cache: Optional["SearchCache"] = None,
+):
+    """Builds a cached ``search_web`` function tool over a search backend."""
+
+    async def search_web(query: str) -> dict:
+        """Searches the web and returns the top results for the query.
+
+        Args:
+            query: The search query.
+
+        Returns:
+            A dict with the list of results (title, url, snippet).
+        """
+        results = await (cache or default_cache()).get_or_fetch(
+            query, backend_search, namespace="search_web"
+        )
+        return {"status": "success", "results": results}
+
+    return search_web
+
+
+_default_cache: Optional[SearchCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> SearchCache:
+    """Process-wide cache configured from the environment.
+
+    SEARCH_CACHE_TTL_SECONDS (default 3600), SEARCH_CACHE_MAX_ENTRIES
+    (default 1024) and SEARCH_CACHE_DB (path of the SQLite tier; unset keeps
+    the cache in memory only).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            db_path = os.getenv("SEARCH_CACHE_DB")
+            _default_cache = SearchCache(
+                ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "3600")),
+                max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024")),
+                store=SqliteSearchStore(db_path) if db_path else None,
+            )
+        return _default_cache
+
+
+# --- Callbacks for agents grounded with the built-in google_search tool ---
+
+# id of an agent run's invocation context -> (invocation_id, agent_name, cache
+# key, whether the run claimed the key). A hedged attempt of a fan-out worker
+# shares the invocation and agent name of the primary but runs on its own
+# context, so ownership is per attempt. Entries of runs that never reach
+# ``cache_search_after_model`` go away with their context.
+_owned_keys: dict[int, tuple[str, str, str, bool]] = {}
+
+
+def _attempt(callback_context: CallbackContext) -> int:
+    context = callback_context._invocation_context
+    attempt = id(context)
+    if attempt not in _tracked_attempts:
+        _tracked_attempts.add(attempt)
+        weakref.finalize(context, _forget_attempt, attempt)
+    return attempt
+
+
+_tracked_attempts: set[int] = set()
+
+
+# id of an agent run's invocation context -> per-user text added to its next
+# model request (recalled memories); see ``personalize_request``.
+_request_context: dict[int, str] = {}
+
+
+def _forget_attempt(attempt: int) -> None:
+    _tracked_attempts.discard(attempt)
+    _owned_keys.pop(attempt, None)
+    _request_context.pop(attempt, None)
+
+
+def personalize_request(context: CallbackContext, text: str) -> None:
+    """Scopes the cached answer of the run's next model call to ``text``.
+
+    Request processors that add per-user content to the prompt, such as
+    recalled memories, call this so one user's personalised answer is never
+    served to another. An empty ``text`` clears it.
+    """
+    attempt = _attempt(context)
+    if text:
+        _request_context[attempt] = text
+    else:
+        _request_context.pop(attempt, None)
+
+
+def _claimed_by_sibling(attempt: int, invocation_id: str, agent_name: str, key: str) -> bool:
+    """Whether another attempt of the same worker run already claimed ``key``."""
+    return any(
+        other != attempt and entry == (invocation_id, agent_name, key, True)
+        for other, entry in list(_owned_keys.items())
+    )
+
+
+def _request_key(callback_context: CallbackContext, llm_request: LlmRequest) -> str:
+    agent = callback_context._invocation_context.agent
+    instruction = getattr(agent, "instruction", None)
+    namespace = instruction if isinstance(instruction, str) else agent.name
+    personal = _request_context.get(_attempt(callback_context))
+    if personal:
+        namespace = f"{namespace}\x00{personal}"
+    user_text = " ".join(
+        part.text
+        for content in llm_request.contents
+        if content.role == "user"
+        for part in content.parts or []
+        if part.text
+    )
+    return SearchCache.key(user_text, namespace=namespace)
+
+
+async def cache_search_before_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """Answers a search-grounded model call from the shared cache if possible.
+
+    Agents with the same instruction share entries, so the parallel research
+    workers reuse each other's grounded answers for the same topic.
+    """
+    cache = default_cache()
+    key = _request_key(callback_context, llm_request)
+    attempt = _attempt(callback_context)
+    invocation_id, agent_name = callback_context.invocation_id, callback_context.agent_name
+    cached = cache.get(key)
+    owner = False
+    # A hedged attempt must not wait on the stalled call it is hedging.
+    if cached is None and not _claimed_by_sibling(attempt, invocation_id, agent_name, key):
+        pending = cache.claim(key)
+        if pending is not None:
+            # Inside a fan-out, wait at most half of what is left of its
+            # deadline so there is still time to call the model ourselves.
+            timeout = None
+            deadline = fan_out_deadline(callback_context.state, invocation_id)
+            if deadline is not None:
+                timeout = max(deadline - time.time(), 0.0) / 2
+            cached = await cache.wait(pending, timeout)
+        else:
+            owner = True
+    if cached is not None:
+        return LlmResponse.model_validate(cached)
+    _owned_keys[attempt] = (invocation_id, agent_name, key, owner)
+    return None
+
+
+def cache_search_after_model(
+    callback_context: CallbackContext, llm_response: LlmResponse
+) -> Optional[LlmResponse]:
+    """Stores a completed, grounded model response under the request's key."""
+    if llm_response.partial:
+        return None
+    entry = _owned_keys.pop(_attempt(callback_context), None)
+    if entry is None:
+        return None
+    _, _, key, owner = entry
+    content = llm_response.content
+    cacheable = (
+        llm_response.error_code is None
+        and llm_response.grounding_metadata is not None
+        and content is not None
+        and not any(part.function_call for part in content.parts or [])
+    )
+    value = llm_response.model_dump(mode="json", exclude_none=True) if cacheable else None
+    # Attempts without the claim (hedges, waiters that gave up) still share a
+    # good answer; only the owner reports a failed one.
+    if owner or value is not None:
+        default_cache().resolve(key, value)
+    return None
+
+
+def cache_search_on_model_error(
+    callback_context: CallbackContext, llm_request: LlmRequest, error: Exception
+) -> Optional[LlmResponse]:
+    """Releases the request's claim when the model call fails.
+
+    Same-topic requests waiting on the claim fall back to their own model
+    call at once. Agent-level ``on_model_error_callback`` needs ADK 1.19 or
+    later; without it, and for cancelled calls (a fan-out deadline), the
+    claim is released when the task ends.
+    """
+    entry = _owned_keys.pop(_attempt(callback_context), None)
+    if entry is not None and entry[3]:
+        default_cache().release(entry[2])
+    return None
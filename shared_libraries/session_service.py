@@ -0,0 +1,759 @@
+"""Persistent, pooled session services for local and production runners.
+
+``InMemorySessionService`` loses every session on restart and cannot be
+shared between worker processes. The services below keep sessions in a
+local store instead:
+
+* ``SqliteSessionService``: one SQLite file in WAL mode, a small pool of
+  connections used from worker threads, sessions indexed by
+  ``(app_name, user_id, update_time)`` and events by session.
+* ``RedisSessionService``: the same model on any Redis-compatible server
+  (Redis, Valkey, KeyDB...), through a ``redis.asyncio`` connection pool.
+  Requires the optional ``redis`` package.
+
+Both buffer appended events and write them in batches (one transaction or
+pipeline per flush), and both expire sessions ``ttl_seconds`` after their
+last update. Reads flush pending writes first, so a process always sees its
+own events. State keys follow the ADK scoping rules: ``app:`` and ``user:``
+keys are stored once per app / user and merged into every session on load,
+``temp:`` keys are never persisted.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import json
+import logging
+import queue
+import sqlite3
+import time
+import uuid
+from typing import Any, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.adk.sessions.state import State
+from google.adk.sessions.base_session_service import (
+    BaseSessionService,
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class _PendingWrite:
+    app_name: str
+    user_id: str
+    session_id: str
+    event_json: str
+    timestamp: float
+    session_delta: dict[str, Any]
+    app_delta: dict[str, Any]
+    user_delta: dict[str, Any]
+
+
+def _split_state(state: dict[str, Any]) -> tuple[dict, dict, dict]:
+    """Splits a state (delta) into app, user and session scopes."""
+    app, user, session = {}, {}, {}
+    for key, value in state.items():
+        if key.startswith(State.APP_PREFIX):
+            app[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+def _merge_state(app: dict, user: dict, session: dict) -> dict[str, Any]:
+    merged = dict(session)
+    merged.update({State.APP_PREFIX + k: v for k, v in app.items()})
+    merged.update({State.USER_PREFIX + k: v for k, v in user.items()})
+    return merged
+
+
+def _select_events(events: list[Event], config: Optional[GetSessionConfig]):
+    if config is None:
+        return events
+    if config.after_timestamp is not None:
+        events = [e for e in events if e.timestamp >= config.after_timestamp]
+    if config.num_recent_events is not None:
+        events = events[-config.num_recent_events :] if config.num_recent_events else []
+    return events
+
+
+class _BufferedSessionService(BaseSessionService):
+    """Write batching and state scoping shared by the persistent services."""
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        batch_size: int = 128,
+        flush_interval: float = 0.05,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: list[_PendingWrite] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_timer: Optional[asyncio.Task] = None
+
+    def _expires_at(self, update_time: float) -> Optional[float]:
+        return None if self.ttl_seconds is None else update_time + self.ttl_seconds
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session, event)
+        if event.partial:
+            return event
+        session.last_update_time = event.timestamp
+        delta = event.actions.state_delta if event.actions else {}
+        app_delta, user_delta, session_delta = _split_state(delta or {})
+        self._pending.append(
+            _PendingWrite(
+                app_name=session.app_name,
+                user_id=session.user_id,
+                session_id=session.id,
+                event_json=event.model_dump_json(exclude_none=True),
+                timestamp=event.timestamp,
+                session_delta=session_delta,
+                app_delta=app_delta,
+                user_delta=user_delta,
+            )
+        )
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_timer is None or self._flush_timer.done():
+            self._flush_timer = asyncio.create_task(self._flush_later())
+        return event
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception:
+            # Nobody awaits the timer task; the batch stays pending for the
+            # next flush.
+            logger.exception("Background session flush failed")
+
+    async def flush(self) -> None:
+        """Writes all buffered events in one batch.
+
+        A failed write puts the batch back in front of the buffer (the write
+        is one transaction) and re-raises.
+        """
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                await self._write_batch(batch)
+            except BaseException:
+                self._pending[:0] = batch
+                raise
+
+    async def close(self) -> None:
+        if self._flush_timer is not None and not self._flush_timer.done():
+            self._flush_timer.cancel()
+        await self.flush()
+
+    async def _write_batch(self, batch: list[_PendingWrite]) -> None:
+        raise NotImplementedError
+
+
+class SqliteSessionService(_BufferedSessionService):
+    """Session service backed by a local SQLite file in WAL mode.
+
+    Args:
+        db_path: SQLite file shared by every process using the service.
+        pool_size: Number of pooled connections (readers run concurrently in
+            WAL mode; SQLite serializes writers).
+        ttl_seconds: Sessions idle for longer than this are expired.
+        batch_size: Buffered events that trigger an immediate flush.
+        flush_interval: Maximum time an event stays buffered.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        pool_size: int = 4,
+        ttl_seconds: Optional[float] = None,
+        batch_size: int = 128,
+        flush_interval: float = 0.05,
+    ):
+        super().__init__(ttl_seconds, batch_size, flush_interval)
+        self.db_path = db_path
+        self._pool: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        with self._connection() as conn:
+            conn.executescript(_SQLITE_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextlib.contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    async def _run(self, fn, *args):
+        def call():
+            with self._connection() as conn:
+                return fn(conn, *args)
+
+        return await asyncio.to_thread(call)
+
+    @contextlib.contextmanager
+    def _transaction(self, conn: sqlite3.Connection):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        app_delta, user_delta, session_state = _split_state(state or {})
+        now = time.time()
+
+        def create(conn):
+            with self._transaction(conn):
+                try:
+                    conn.execute(
+                        "INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            app_name,
+                            user_id,
+                            session_id,
+                            json.dumps(session_state),
+                            now,
+                            now,
+                            self._expires_at(now),
+                        ),
+                    )
+                except sqlite3.IntegrityError:
+                    raise ValueError(f"Session {session_id} already exists.") from None
+                app = self._update_scoped(conn, "app_states", (app_name,), app_delta)
+                user = self._update_scoped(
+                    conn, "user_states", (app_name, user_id), user_delta
+                )
+            return app, user
+
+        app, user = await self._run(create)
+        return Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=_merge_state(app, user, session_state),
+            last_update_time=now,
+        )
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        await self.flush()
+        now = time.time()
+
+        def load(conn):
+            row = conn.execute(
+                "SELECT state, update_time, expires_at FROM sessions"
+                " WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] is not None and row[2] <= now:
+                with self._transaction(conn):
+                    self._delete(conn, app_name, user_id, session_id)
+                return None
+            query = (
+                "SELECT data FROM events"
+                " WHERE app_name = ? AND user_id = ? AND session_id = ?"
+            )
+            params: list[Any] = [app_name, user_id, session_id]
+            if config and config.after_timestamp is not None:
+                query += " AND timestamp >= ?"
+                params.append(config.after_timestamp)
+            if config and config.num_recent_events is not None:
+                query += " ORDER BY seq DESC LIMIT ?"
+                params.append(config.num_recent_events)
+                events = [r[0] for r in conn.execute(query, params)][::-1]
+            else:
+                events = [r[0] for r in conn.execute(query + " ORDER BY seq", params)]
+            return row, events, self._scoped_states(conn, app_name, user_id)
+
+        loaded = await self._run(load)
+        if loaded is None:
+            return None
+        (state, update_time, _), events, (app, user) = loaded
+        return Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=_merge_state(app, user, json.loads(state)),
+            events=[Event.model_validate_json(data) for data in events],
+            last_update_time=update_time,
+        )
+
+    async def list_sessions(
+        self, *, app_name: str, user_id: Optional[str] = None
+    ) -> ListSessionsResponse:
+        await self.flush()
+        now = time.time()
+
+        def select(conn):
+            query = (
+                "SELECT user_id, id, state, update_time FROM sessions"
+                " WHERE app_name = ? AND (expires_at IS NULL OR expires_at > ?)"
+            )
+            params: list[Any] = [app_name, now]
+            if user_id is not None:
+                query += " AND user_id = ?"
+                params.append(user_id)
+            rows = conn.execute(query + " ORDER BY update_time", params).fetchall()
+            states = {
+                uid: self._scoped_states(conn, app_name, uid)
+                for uid in {row[0] for row in rows}
+            }
+            return rows, states
+
+        rows, states = await self._run(select)
+        return ListSessionsResponse(
+            sessions=[
+                Session(
+                    id=sid,
+                    app_name=app_name,
+                    user_id=uid,
+                    state=_merge_state(*states[uid], json.loads(state)),
+                    last_update_time=update_time,
+                )
+                for uid, sid, state, update_time in rows
+            ]
+        )
+
+    async def delete_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        await self.flush()
+
+        def delete(conn):
+            with self._transaction(conn):
+                self._delete(conn, app_name, user_id, session_id)
+
+        await self._run(delete)
+
+    async def purge_expired(self) -> int:
+        """Deletes every expired session and its events; returns the count."""
+        await self.flush()
+        now = time.time()
+
+        def purge(conn):
+            with self._transaction(conn):
+                conn.execute(
+                    "DELETE FROM events WHERE (app_name, user_id, session_id) IN"
+                    " (SELECT app_name, user_id, id FROM sessions WHERE expires_at <= ?)",
+                    (now,),
+                )
+                return conn.execute(
+                    "DELETE FROM sessions WHERE expires_at <= ?", (now,)
+                ).rowcount
+
+        return await self._run(purge)
+
+    async def _write_batch(self, batch: list[_PendingWrite]) -> None:
+        def write(conn):
+            with self._transaction(conn):
+                conn.executemany(
+                    "INSERT INTO events (app_name, user_id, session_id, timestamp, data)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (w.app_name, w.user_id, w.session_id, w.timestamp, w.event_json)
+                        for w in batch
+                    ],
+                )
+                touched = []
+                for (app_name, user_id, session_id), writes in _by_session(batch).items():
+                    update_time = max(w.timestamp for w in writes)
+                    touched.append(
+                        (
+                            update_time,
+                            self._expires_at(update_time),
+                            app_name,
+                            user_id,
+                            session_id,
+                        )
+                    )
+                    delta = _merged(w.session_delta for w in writes)
+                    if delta:
+                        row = conn.execute(
+                            "SELECT state FROM sessions"
+                            " WHERE app_name = ? AND user_id = ? AND id = ?",
+                            (app_name, user_id, session_id),
+                        ).fetchone()
+                        state = json.loads(row[0]) if row else {}
+                        state.update(delta)
+                        conn.execute(
+                            "UPDATE sessions SET state = ?"
+                            " WHERE app_name = ? AND user_id = ? AND id = ?",
+                            (json.dumps(state), app_name, user_id, session_id),
+                        )
+                    app_delta = _merged(w.app_delta for w in writes)
+                    if app_delta:
+                        self._update_scoped(conn, "app_states", (app_name,), app_delta)
+                    user_delta = _merged(w.user_delta for w in writes)
+                    if user_delta:
+                        self._update_scoped(
+                            conn, "user_states", (app_name, user_id), user_delta
+                        )
+                conn.executemany(
+                    "UPDATE sessions SET update_time = ?, expires_at = ?"
+                    " WHERE app_name = ? AND user_id = ? AND id = ?",
+                    touched,
+                )
+
+        await self._run(write)
+
+    @staticmethod
+    def _update_scoped(conn, table: str, key: tuple, delta: dict) -> dict:
+        where = " AND ".join(
+            f"{column} = ?" for column in ("app_name", "user_id")[: len(key)]
+        )
+        row = conn.execute(f"SELECT state FROM {table} WHERE {where}", key).fetchone()
+        state = json.loads(row[0]) if row else {}
+        if delta:
+            state.update(delta)
+            placeholders = ", ".join("?" * (len(key) + 1))
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})",
+                (*key, json.dumps(state)),
+            )
+        return state
+
+    @staticmethod
+    def _scoped_states(conn, app_name: str, user_id: str) -> tuple[dict, dict]:
+        app = conn.execute(
+            "SELECT state FROM app_states WHERE app_name = ?", (app_name,)
+        ).fetchone()
+        user = conn.execute(
+            "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?",
+            (app_name, user_id),
+        ).fetchone()
+        return (json.loads(app[0]) if app else {}), (json.loads(user[0]) if user else {})
+
+    @staticmethod
+    def _delete(conn, app_name: str, user_id: str, session_id: str) -> None:
+        conn.execute(
+            "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+            (app_name, user_id, session_id),
+        )
+        conn.execute(
+            "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+            (app_name, user_id, session_id),
+        )
+
+    async def close(self) -> None:
+        await super().close()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE INDEX IF NOT EXISTS sessions_by_user
+    ON sessions (app_name, user_id, update_time);
+CREATE INDEX IF NOT EXISTS sessions_by_expiry ON sessions (expires_at);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_session
+    ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+
+def _by_session(batch: list[_PendingWrite]) -> dict[tuple, list[_PendingWrite]]:
+    grouped: dict[tuple, list[_PendingWrite]] = {}
+    for write in batch:
+        grouped.setdefault((write.app_name, write.user_id, write.session_id), []).append(
+            write
+        )
+    return grouped
+
+
+def _merged(deltas) -> dict[str, Any]:
+    merged: dict[str, Any] = {}
+    for delta in deltas:
+        merged.update(delta)
+    return merged
+
+
+class RedisSessionService(_BufferedSessionService):
+    """Session service on a Redis-compatible server.
+
+    State is stored as hashes of JSON values so state deltas are plain
+    ``HSET`` commands, events as lists, and each user's sessions in a sorted
+    set scored by update time. Every flush is one pipeline.
+
+    Args:
+        url: Server URL, e.g. ``redis://localhost:6379/0``.
+        client: An existing ``redis.asyncio`` client (overrides ``url``).
+        pool_size: Maximum connections in the client's pool.
+        key_prefix: Namespace for every key written by the service.
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        client=None,
+        pool_size: int = 16,
+        key_prefix: str = "adk",
+        ttl_seconds: Optional[float] = None,
+        batch_size: int = 128,
+        flush_interval: float = 0.05,
+    ):
+        super().__init__(ttl_seconds, batch_size, flush_interval)
+        if client is None:
+            import redis.asyncio as redis  # optional dependency
+
+            client = redis.Redis(
+                connection_pool=redis.ConnectionPool.from_url(
+                    url, max_connections=pool_size, decode_responses=True
+                )
+            )
+        self._redis = client
+        self._prefix = key_prefix
+
+    def _keys(self, app_name: str, user_id: str, session_id: str) -> dict[str, str]:
+        base = f"{self._prefix}:{app_name}:{user_id}:{session_id}"
+        return {
+            "meta": f"{base}:meta",
+            "state": f"{base}:state",
+            "events": f"{base}:events",
+        }
+
+    def _app_key(self, app_name: str) -> str:
+        return f"{self._prefix}:{app_name}:app_state"
+
+    def _user_key(self, app_name: str, user_id: str) -> str:
+        return f"{self._prefix}:{app_name}:{user_id}:user_state"
+
+    def _index_key(self, app_name: str, user_id: str) -> str:
+        return f"{self._prefix}:{app_name}:{user_id}:sessions"
+
+    def _users_key(self, app_name: str) -> str:
+        return f"{self._prefix}:{app_name}:users"
+
+    def _touch(self, pipe, keys: dict[str, str]) -> None:
+        if self.ttl_seconds is not None:
+            for key in keys.values():
+                pipe.expire(key, int(self.ttl_seconds) + 1)
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        keys = self._keys(app_name, user_id, session_id)
+        app_delta, user_delta, session_state = _split_state(state or {})
+        now = time.time()
+        created = await self._redis.hsetnx(keys["meta"], "create_time", now)
+        if not created:
+            raise ValueError(f"Session {session_id} already exists.")
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(keys["meta"], "update_time", now)
+            if session_state:
+                pipe.hset(keys["state"], mapping=_dumps_values(session_state))
+            if app_delta:
+                pipe.hset(self._app_key(app_name), mapping=_dumps_values(app_delta))
+            if user_delta:
+                pipe.hset(
+                    self._user_key(app_name, user_id), mapping=_dumps_values(user_delta)
+                )
+            pipe.zadd(self._index_key(app_name, user_id), {session_id: now})
+            pipe.sadd(self._users_key(app_name), user_id)
+            self._touch(pipe, keys)
+            await pipe.execute()
+        app, user = await self._scoped_states(app_name, user_id)
+        return Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=_merge_state(app, user, session_state),
+            last_update_time=now,
+        )
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        await self.flush()
+        keys = self._keys(app_name, user_id, session_id)
+        start = 0
+        if config and config.num_recent_events and config.after_timestamp is None:
+            start = -config.num_recent_events
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hget(keys["meta"], "update_time")
+            pipe.hgetall(keys["state"])
+            pipe.lrange(keys["events"], start, -1)
+            pipe.hgetall(self._app_key(app_name))
+            pipe.hgetall(self._user_key(app_name, user_id))
+            update_time, state, events, app, user = await pipe.execute()
+        if update_time is None:
+            return None
+        return Session(
+            id=session_id,
+            app_name=app_name,
+            user_id=user_id,
+            state=_merge_state(_loads_values(app), _loads_values(user), _loads_values(state)),
+            events=_select_events(
+                [Event.model_validate_json(data) for data in events], config
+            ),
+            last_update_time=float(update_time),
+        )
+
+    async def list_sessions(
+        self, *, app_name: str, user_id: Optional[str] = None
+    ) -> ListSessionsResponse:
+        await self.flush()
+        user_ids = (
+            [user_id]
+            if user_id is not None
+            else sorted(map(_text, await self._redis.smembers(self._users_key(app_name))))
+        )
+        sessions = []
+        for uid in user_ids:
+            index = self._index_key(app_name, uid)
+            if self.ttl_seconds is not None:
+                await self._redis.zremrangebyscore(
+                    index, "-inf", time.time() - self.ttl_seconds
+                )
+            app, user = await self._scoped_states(app_name, uid)
+            entries = [
+                (_text(sid), score)
+                for sid, score in await self._redis.zrange(index, 0, -1, withscores=True)
+            ]
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for sid, _ in entries:
+                    pipe.hgetall(self._keys(app_name, uid, sid)["state"])
+                states = await pipe.execute()
+            sessions += [
+                Session(
+                    id=sid,
+                    app_name=app_name,
+                    user_id=uid,
+                    state=_merge_state(app, user, _loads_values(state)),
+                    last_update_time=score,
+                )
+                for (sid, score), state in zip(entries, states)
+            ]
+        sessions.sort(key=lambda s: s.last_update_time)
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        await self.flush()
+        keys = self._keys(app_name, user_id, session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(*keys.values())
+            pipe.zrem(self._index_key(app_name, user_id), session_id)
+            await pipe.execute()
+
+    async def _write_batch(self, batch: list[_PendingWrite]) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for (app_name, user_id, session_id), writes in _by_session(batch).items():
+                keys = self._keys(app_name, user_id, session_id)
+                update_time = max(w.timestamp for w in writes)
+                pipe.rpush(keys["events"], *(w.event_json for w in writes))
+                pipe.hset(keys["meta"], "update_time", update_time)
+                pipe.zadd(self._index_key(app_name, user_id), {session_id: update_time})
+                for key, delta in (
+                    (keys["state"], _merged(w.session_delta for w in writes)),
+                    (self._app_key(app_name), _merged(w.app_delta for w in writes)),
+                    (
+                        self._user_key(app_name, user_id),
+                        _merged(w.user_delta for w in writes),
+                    ),
+                ):
+                    if delta:
+                        pipe.hset(key, mapping=_dumps_values(delta))
+                self._touch(pipe, keys)
+            await pipe.execute()
+
+    async def _scoped_states(self, app_name: str, user_id: str) -> tuple[dict, dict]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._app_key(app_name))
+            pipe.hgetall(self._user_key(app_name, user_id))
+            app, user = await pipe.execute()
+        return _loads_values(app), _loads_values(user)
+
+    async def close(self) -> None:
+        await super().close()
+        await self._redis.aclose()
+
+
+def _dumps_values(state: dict[str, Any]) -> dict[str, str]:
+    return {key: json.dumps(value) for key, value in state.items()}
+
+
+def _loads_values(state: dict) -> dict[str, Any]:
+    return {_text(key): json.loads(value) for key, value in (state or {}).items()}
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,589 @@
+"""Question-pattern cache of parameterized SQL for the BigQuery analyst.
+
+Analysts ask the same shapes of question over and over ("monthly average
+close for AAPL", then for MSFT; "top 5 symbols by volume", then by market
+cap). Without a cache, ``bq_analyst`` spends a full model turn re-planning
+and re-writing the SQL each time. This module learns SQL templates from
+successful runs and replays them:
+
+* Slot extraction: ticker symbols, sectors, metric phrases (mapped to
+  column names), dates, years and numbers are found in the question. The
+  question with its slots replaced by placeholders is its *shape*, e.g.
+  "monthly average slot_metric for slot_symbol". Only case, punctuation
+  and filler words ("the", "please") are normalized away; word order and
+  question words are kept.
+* Learning: when an invocation ran exactly one successful ``execute_sql``
+  call, every slot value found in the SQL is replaced by a placeholder.
+  Slots that do not appear in the SQL become fixed: the template only
+  serves questions with the same value for them. A template is served once
+  ``min_support`` runs of its shape produced the same SQL as the template
+  would have; a run that disagrees replaces it.
+* Matching: candidates are the learned shapes with the same slot types and
+  exactly the same operator words in the same order (comparators, min/max,
+  top/bottom, ordering and aggregation words, and question words such as
+  "which" or "how many"), since "close above" and "close below" embed
+  almost alike but need different SQL. Among those,
+  the shape embedding (cosine) picks the closest; above ``min_similarity``
+  the template is filled with the new slot values. Slot values only ever
+  come from vocabularies or strict patterns, so filling cannot inject SQL.
+* Serving: ``template_before_model`` answers the analyst's first model call
+  of a turn with the filled ``execute_sql`` call, so the tool runs right
+  away and only the final answer needs the model. Low confidence, unknown
+  shapes and failed template queries fall back to the model.
+
+Embeddings default to ``HashingEmbedder``, an offline bag of words and
+character trigrams. ``GenaiEmbedder`` uses a Gemini embedding model instead
+(``SQL_TEMPLATE_EMBEDDING_MODEL``); lower ``min_similarity`` accordingly.
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class SlotVocabulary:
+    """Phrases that fill one kind of slot.
+
+    Args:
+        name: Slot name, e.g. ``symbol``.
+        values: Phrase (matched on word boundaries) to the value it stands
+            for in SQL. Keys are lower case unless ``case_sensitive``.
+        kind: ``string`` for values inside SQL string literals,
+            ``identifier`` for column names.
+        case_sensitive: Match phrases exactly, e.g. tickers such as SNOW or
+            SPOT that are also English words.
+    """
+
+    name: str
+    values: dict[str, str]
+    kind: str = "string"
+    case_sensitive: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class Slot:
+    name: str
+    value: str
+    kind: str
+    start: int
+    end: int
+
+
+# Words that change the SQL without being slots: a template only serves
+# questions with exactly these words in the same order.
+OPERATOR_WORDS = frozenset(
+    "above below over under greater less more fewer higher lower exceeding exceeded "
+    "between before after since until equal equals exactly not without except excluding "
+    "max maximum min minimum highest lowest largest smallest biggest most least "
+    "top bottom best worst first last earliest latest oldest newest "
+    "ascending descending increase increased decrease decreased gain gained loss lost "
+    "up down rise rose fall fell drop dropped "
+    "average avg mean median sum total count distinct "
+    "daily weekly monthly quarterly yearly annual "
+    # "which day" / "when" / "how many days" select different columns.
+    "what which when where who whose why how many much".split()
+)
+
+# Dropped from shapes; every other word, question words included, is kept.
+_FILLER_WORDS = frozenset("a an the please".split())
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+# Built-in slots; checked after the vocabularies, first match wins.
+_PATTERNS = [
+    ("date", re.compile(r"\b\d{4}-\d{2}-\d{2}\b"), "string"),
+    ("year", re.compile(r"\b(?:19|20)\d{2}\b"), "number"),
+    ("number", re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])"), "number"),
+]
+
+DAILY_PRICES_SYMBOLS = (
+    "AAPL GOOGL MSFT TSLA AMZN META NVDA NFLX AMD INTC CRM ORCL ADBE PYPL UBER "
+    "LYFT ZOOM SHOP SQ ROKU TWTR SNAP PINS SPOT ZM DOCU OKTA SNOW PLTR COIN"
+).split()
+
+# Slots of the hist_stock_market.daily_prices table.
+DAILY_PRICES_SLOTS = (
+    SlotVocabulary(
+        "symbol", {symbol: symbol for symbol in DAILY_PRICES_SYMBOLS}, case_sensitive=True
+    ),
+    SlotVocabulary(
+        "sector",
+        {s.lower(): s for s in ("Technology", "Automotive", "E-commerce", "Entertainment")},
+    ),
+    SlotVocabulary(
+        "metric",
+        {
+            "open": "open_price",
+            "open price": "open_price",
+            "opening price": "open_price",
+            "high": "high_price",
+            "high price": "high_price",
+            "low": "low_price",
+            "low price": "low_price",
+            "close": "close_price",
+            "close price": "close_price",
+            "closing price": "close_price",
+            "volume": "volume",
+            "trading volume": "volume",
+            "market cap": "market_cap",
+            "market capitalization": "market_cap",
+            "pe ratio": "pe_ratio",
+            "p/e ratio": "pe_ratio",
+            "dividend yield": "dividend_yield",
+        },
+        kind="identifier",
+    ),
+)
+
+
+class SlotExtractor:
+    """Finds slot values in a question and computes its shape."""
+
+    def __init__(self, vocabularies=DAILY_PRICES_SLOTS):
+        self.vocabularies = list(vocabularies)
+        self._patterns = []
+        for vocabulary in self.vocabularies:
+            # Longest phrases first, so "close price" wins over "close".
+            phrases = sorted(vocabulary.values, key=len, reverse=True)
+            alternatives = "|".join(re.escape(p) for p in phrases)
+            flags = 0 if vocabulary.case_sensitive else re.I
+            pattern = re.compile(rf"(?<![\w/-])(?:{alternatives})(?![\w/-])", flags)
+            self._patterns.append((vocabulary, pattern))
+
+    def extract(self, question: str) -> list[Slot]:
+        taken = np.zeros(len(question) + 1, dtype=bool)
+        slots = []
+
+        def add(name, value, kind, match):
+            if not taken[match.start():match.end()].any():
+                taken[match.start():match.end()] = True
+                slots.append(Slot(name, value, kind, match.start(), match.end()))
+
+        for vocabulary, pattern in self._patterns:
+            for match in pattern.finditer(question):
+                phrase = match.group() if vocabulary.case_sensitive else match.group().lower()
+                add(vocabulary.name, vocabulary.values[phrase], vocabulary.kind, match)
+        for name, pattern, kind in _PATTERNS:
+            for match in pattern.finditer(question):
+                add(name, match.group(), kind, match)
+        return sorted(slots, key=lambda slot: slot.start)
+
+    @staticmethod
+    def shape(question: str, slots: list[Slot]) -> str:
+        """The question with slots replaced by ``slot_<name>``, normalized."""
+        pieces, position = [], 0
+        for slot in slots:
+            pieces.append(question[position:slot.start])
+            pieces.append(f" slot_{slot.name} ")
+            position = slot.end
+        pieces.append(question[position:])
+        text = unicodedata.normalize("NFKC", "".join(pieces)).casefold()
+        return " ".join(w for w in _NON_WORD.sub(" ", text).split() if w not in _FILLER_WORDS)
+
+    @staticmethod
+    def operators(shape: str) -> tuple[str, ...]:
+        """The operator words of a shape, in order."""
+        return tuple(word for word in shape.split() if word in OPERATOR_WORDS)
+
+
+class HashingEmbedder:
+    """Offline embedding: hashed words and character trigrams, L2-normalized."""
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> list[str]:
+        features = []
+        for word in text.split():
+            features.append(f"w:{word}")
+            padded = f"^{word}$"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            # Whole words weigh more than trigrams.
+            vector[index] += 3.0 if feature.startswith("w:") else 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class GenaiEmbedder:
+    """Embeddings from a Gemini embedding model through ``google.genai``."""
+
+    def __init__(self, model: str = "text-embedding-004", client=None):
+        from google import genai
+
+        self.model = model
+        self._client = client or genai.Client()
+
+    def __call__(self, text: str) -> np.ndarray:
+        response = self._client.models.embed_content(model=self.model, contents=[text])
+        vector = np.asarray(response.embeddings[0].values, dtype=float)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def _normalize_sql(sql: str) -> str:
+    return " ".join(sql.split()).rstrip(";").strip()
+
+
+def _placeholder(index: int) -> str:
+    return f"__slot{index}__"
+
+
+def _occurrences(slot: Slot) -> re.Pattern:
+    value = re.escape(slot.value)
+    if slot.kind == "string":
+        return re.compile(rf"(?<=['\"]){value}(?=['\"])")
+    if slot.kind == "identifier":
+        return re.compile(rf"(?<![\w'\"]){value}(?![\w'\"])")
+    return re.compile(rf"(?<![\w.'\"-]){value}(?![\w.'\"-])")
+
+
+@dataclasses.dataclass
+class SqlTemplate:
+    """A learned, parameterized tool call for one question shape."""
+
+    shape: str
+    slot_names: list[str]
+    # Tool arguments with slot values in the SQL replaced by __slotN__.
+    args: dict[str, Any]
+    # Slot index -> value the question must have (slots not used in the SQL).
+    fixed: dict[int, str]
+    support: int = 1
+    served: int = 0
+
+    def fill(self, slots: list[Slot], sql_arg: str) -> Optional[dict[str, Any]]:
+        if [slot.name for slot in slots] != self.slot_names:
+            return None
+        if any(slots[int(i)].value != value for i, value in self.fixed.items()):
+            return None
+        sql = self.args[sql_arg]
+        for i, slot in enumerate(slots):
+            sql = sql.replace(_placeholder(i), slot.value)
+        return {**self.args, sql_arg: sql}
+
+
+@dataclasses.dataclass
+class TemplateMatch:
+    template: SqlTemplate
+    args: dict[str, Any]
+    confidence: float
+
+
+@dataclasses.dataclass
+class TemplateStats:
+    """Counters for one ``SqlTemplateCache``."""
+
+    lookups: int = 0
+    served: int = 0
+    low_confidence: int = 0
+    unmatched: int = 0
+    learned: int = 0
+    confirmed: int = 0
+    replaced: int = 0
+    invalidated: int = 0
+    model_calls_saved: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        stats = dataclasses.asdict(self)
+        stats["hit_rate"] = round(self.served / self.lookups, 4) if self.lookups else 0.0
+        return stats
+
+
+class SqlTemplateCache:
+    """Learned SQL templates matched by shape embedding and slot types.
+
+    Args:
+        extractor: Finds slots in questions (``daily_prices`` slots by default).
+        embedder: Text to unit vector; ``HashingEmbedder()`` by default.
+        min_similarity: Cosine similarity needed to serve a template.
+        min_support: Agreeing runs needed before a template is served.
+        tool_name: Name of the SQL tool whose calls are learned and replayed.
+        sql_arg: The tool argument holding the SQL.
+        path: Optional JSON file the templates are persisted to.
+    """
+
+    def __init__(
+        self,
+        extractor: Optional[SlotExtractor] = None,
+        embedder: Optional[Callable[[str], np.ndarray]] = None,
+        min_similarity: float = 0.9,
+        min_support: int = 2,
+        tool_name: str = "execute_sql",
+        sql_arg: str = "query",
+        path: Optional[str] = None,
+    ):
+        self.extractor = extractor or SlotExtractor()
+        self.embedder = embedder or HashingEmbedder()
+        self.min_similarity = min_similarity
+        self.min_support = min_support
+        self.tool_name = tool_name
+        self.sql_arg = sql_arg
+        self.path = path
+        self.stats = TemplateStats()
+        self.templates: dict[tuple[str, tuple[str, ...]], SqlTemplate] = {}
+        self._vectors: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _embed(self, shape: str) -> np.ndarray:
+        vector = self._vectors.get(shape)
+        if vector is None:
+            vector = self._vectors[shape] = np.asarray(self.embedder(shape), dtype=float)
+        return vector
+
+    def build_template(self, question: str, args: dict[str, Any]) -> Optional[SqlTemplate]:
+        """Parameterizes a successful tool call by the question's slots.
+
+        Returns None when two slots share a value, since the SQL cannot say
+        which one it used.
+        """
+        slots = self.extractor.extract(question)
+        values = [slot.value for slot in slots]
+        if len(set(values)) < len(values):
+            return None
+        sql = args[self.sql_arg]
+        fixed = {}
+        # Longer values first, so "2024-01-05" is not split by the number 5.
+        for i in sorted(range(len(slots)), key=lambda i: -len(slots[i].value)):
+            sql, count = _occurrences(slots[i]).subn(_placeholder(i), sql)
+            if not count:
+                fixed[i] = slots[i].value
+        return SqlTemplate(
+            shape=self.extractor.shape(question, slots),
+            slot_names=[slot.name for slot in slots],
+            args={**args, self.sql_arg: sql},
+            fixed=fixed,
+        )
+
+    def observe(self, question: str, args: dict[str, Any]) -> Optional[SqlTemplate]:
+        """Learns from one successful run of the SQL tool for ``question``."""
+        template = self.build_template(question, args)
+        if template is None:
+            return None
+        key = (template.shape, tuple(template.slot_names))
+        slots = self.extractor.extract(question)
+        with self._lock:
+            known = self.templates.get(key)
+            filled = known.fill(slots, self.sql_arg) if known else None
+            if known is not None and filled is not None and (
+                _normalize_sql(filled[self.sql_arg]) == _normalize_sql(args[self.sql_arg])
+            ):
+                known.support += 1
+                self.stats.confirmed += 1
+                template = known
+            else:
+                if known is not None:
+                    self.stats.replaced += 1
+                self.templates[key] = template
+                self.stats.learned += 1
+        self._embed(template.shape)
+        self._save()
+        return template
+
+    def match(self, question: str) -> Optional[TemplateMatch]:
+        """The best servable template for ``question``, or None."""
+        slots = self.extractor.extract(question)
+        shape = self.extractor.shape(question, slots)
+        names = tuple(slot.name for slot in slots)
+        operators = self.extractor.operators(shape)
+        with self._lock:
+            self.stats.lookups += 1
+            candidates = [
+                t for (_, slot_names), t in self.templates.items()
+                if slot_names == names and t.support >= self.min_support
+                and self.extractor.operators(t.shape) == operators
+            ]
+        best, confidence = None, -1.0
+        if candidates:
+            query = self._embed(shape)
+            for template in candidates:
+                similarity = float(np.dot(query, self._embed(template.shape)))
+                if similarity > confidence and template.fill(slots, self.sql_arg) is not None:
+                    best, confidence = template, similarity
+        with self._lock:
+            if best is None:
+                self.stats.unmatched += 1
+                return None
+            if confidence < self.min_similarity:
+                self.stats.low_confidence += 1
+                return None
+            self.stats.served += 1
+            best.served += 1
+        return TemplateMatch(best, best.fill(slots, self.sql_arg), confidence)
+
+    def invalidate(self, template: SqlTemplate) -> None:
+        with self._lock:
+            key = (template.shape, tuple(template.slot_names))
+            if self.templates.get(key) is template:
+                del self.templates[key]
+                self.stats.invalidated += 1
+        self._save()
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = [dataclasses.asdict(t) for t in self.templates.values()]
+        partial = f"{self.path}.{os.getpid()}.tmp"
+        with open(partial, "w") as f:
+            json.dump(data, f)
+        os.replace(partial, self.path)
+
+    def _load(self) -> None:
+        with open(self.path) as f:
+            for data in json.load(f):
+                data["fixed"] = {int(i): v for i, v in data["fixed"].items()}
+                template = SqlTemplate(**data)
+                self.templates[(template.shape, tuple(template.slot_names))] = template
+
+    # --- ADK callbacks ---------------------------------------------------
+
+    def before_model(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        """Replaces the SQL-writing model call with a cached tool call."""
+        contents = llm_request.contents
+        if not contents or contents[-1].role != "user":
+            return None
+        if any(part.function_response for part in contents[-1].parts or []):
+            return None  # a later model call of the turn
+        question = _text(contents[-1])
+        if not question:
+            return None
+        found = self.match(question)
+        if found is None:
+            return None
+        state = _turn(callback_context)
+        state["served"] = found.template
+        logger.debug("Serving SQL template %r (confidence %.2f)", found.template.shape, found.confidence)
+        return LlmResponse(
+            content=types.Content(
+                role="model",
+                parts=[types.Part(function_call=types.FunctionCall(name=self.tool_name, args=found.args))],
+            )
+        )
+
+    def after_tool(
+        self,
+        tool: BaseTool,
+        args: dict[str, Any],
+        tool_context: ToolContext,
+        tool_response: Any,
+    ) -> Optional[dict]:
+        """Records successful SQL for learning; drops templates that failed."""
+        if tool.name != self.tool_name:
+            return None
+        state = _turn(tool_context)
+        ok = isinstance(tool_response, dict) and str(tool_response.get("status", "")).lower() == "success"
+        served = state.pop("served", None)
+        if served is not None:
+            if ok:
+                with self._lock:
+                    self.stats.model_calls_saved += 1
+            else:
+                self.invalidate(served)
+            state["calls"] = state.get("calls", 0) + 1
+            return None
+        state["calls"] = state.get("calls", 0) + 1
+        if ok:
+            state["learn"] = dict(args)
+        return None
+
+    def after_agent(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        """Learns from the turn if it ran exactly one successful SQL call."""
+        state = _turns.pop(_turn_key(callback_context), {})
+        question = _text(callback_context.user_content)
+        if question and state.get("calls") == 1 and "learn" in state:
+            self.observe(question, state["learn"])
+        return None
+
+
+# (invocation_id, agent_name) -> per-turn bookkeeping of the callbacks.
+# Runs that error or are cancelled never reach ``after_agent``, so only the
+# most recent turns are kept.
+_turns: OrderedDict[tuple[str, str], dict[str, Any]] = OrderedDict()
+MAX_OPEN_TURNS = 1024
+
+
+def _turn_key(context) -> tuple[str, str]:
+    return context.invocation_id, context.agent_name
+
+
+def _turn(context) -> dict[str, Any]:
+    key = _turn_key(context)
+    state = _turns.get(key)
+    if state is None:
+        state = _turns[key] = {}
+        if len(_turns) > MAX_OPEN_TURNS:
+            _turns.popitem(last=False)
+    return state
+
+
+def _text(content: Optional[types.Content]) -> str:
+    if content is None:
+        return ""
+    return " ".join(part.text for part in content.parts or [] if part.text).strip()
+
+
+_default_cache: Optional[SqlTemplateCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> SqlTemplateCache:
+    """Process-wide template cache configured from the environment.
+
+    SQL_TEMPLATE_MIN_SIMILARITY (default 0.9), SQL_TEMPLATE_MIN_SUPPORT
+    (default 2), SQL_TEMPLATE_EMBEDDING_MODEL (unset: offline hashing
+    embeddings) and SQL_TEMPLATE_CACHE_PATH (JSON file; unset keeps the
+    templates in memory only).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            model = os.getenv("SQL_TEMPLATE_EMBEDDING_MODEL")
+            _default_cache = SqlTemplateCache(
+                embedder=GenaiEmbedder(model) if model else None,
+                min_similarity=float(os.getenv("SQL_TEMPLATE_MIN_SIMILARITY", "0.9")),
+                min_support=int(os.getenv("SQL_TEMPLATE_MIN_SUPPORT", "2")),
+                path=os.getenv("SQL_TEMPLATE_CACHE_PATH"),
+            )
+        return _default_cache
+
+
+def template_before_model(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    return default_cache().before_model(callback_context, llm_request)
+
+
+def template_after_tool(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, tool_response: Any
+) -> Optional[dict]:
+    return default_cache().after_tool(tool, args, tool_context, tool_response)
+
+
+def template_after_agent(callback_context: CallbackContext) -> Optional[types.Content]:
+    return default_cache().after_agent(callback_context)
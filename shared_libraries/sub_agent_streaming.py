@@ -0,0 +1,218 @@
+"""Forward the text of ``AgentTool`` sub-agents to the client as it is generated.
+
+``AgentTool`` runs its agent to completion and hands the coordinator only
+the final text, so a client streaming the financial advisor sees nothing
+until the (long) risk report is done and the coordinator has re-emitted it.
+``StreamingCoordinator`` is an ``LlmAgent`` that, on streaming (SSE) runs,
+forwards the sub-agents' tokens while they are produced:
+
+* The models of the agents behind its ``AgentTool``s are wrapped in
+  ``ForwardingLlm``. Inside a streaming run, that wrapper calls the model in
+  streaming mode, pushes every text chunk to the run's sink and still
+  returns the one aggregated response, so the nested run, the tool result
+  and the sub-agent's ``output_key`` are exactly what they were.
+* The coordinator yields the chunks as partial events authored by the
+  sub-agent, with ``custom_metadata["sub_agent"]`` naming it. Partial events
+  are not stored in the session.
+
+Its own events stay in lockstep with the runner, as with any agent. Runs
+without streaming behave like a plain ``LlmAgent``.
+"""
+
+import asyncio
+import contextvars
+import dataclasses
+import logging
+from collections.abc import AsyncGenerator
+from typing import Optional
+
+from google.adk.agents import LlmAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.run_config import StreamingMode
+from google.adk.events import Event
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+# custom_metadata key naming the sub-agent of a forwarded chunk.
+SUB_AGENT_METADATA_KEY = "sub_agent"
+
+
+@dataclasses.dataclass
+class SubAgentChunk:
+    agent_name: str
+    text: str
+
+
+class _Sink:
+    """Receives chunks from any task or loop for one streaming run."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+
+    def put(self, item) -> None:
+        try:
+            same_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            same_loop = False
+        if same_loop:
+            self.queue.put_nowait(item)
+        else:
+            self._loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+
+_sink: contextvars.ContextVar[Optional[_Sink]] = contextvars.ContextVar(
+    "sub_agent_stream_sink", default=None
+)
+
+
+def _text(response: LlmResponse) -> str:
+    if not response.content or not response.content.parts:
+        return ""
+    return "".join(part.text for part in response.content.parts if part.text and not part.thought)
+
+
+class ForwardingLlm(BaseLlm):
+    """Model wrapper that streams text chunks to the enclosing run's sink.
+
+    Attributes:
+        llm: The wrapped model; None resolves ``model`` through the registry.
+        agent_name: Sub-agent the chunks are tagged with.
+    """
+
+    llm: Optional[BaseLlm] = None
+    agent_name: str
+    _resolved: Optional[BaseLlm] = PrivateAttr(default=None)
+
+    def _inner(self) -> BaseLlm:
+        if self.llm is not None:
+            return self.llm
+        if self._resolved is None:
+            from google.adk.models.registry import LLMRegistry
+
+            self._resolved = LLMRegistry.new_llm(self.model)
+        return self._resolved
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        sink = _sink.get()
+        if sink is None or stream:
+            async for response in self._inner().generate_content_async(llm_request, stream=stream):
+                yield response
+            return
+
+        streamed = []
+        last_partial = None
+        complete = False
+        async for response in self._inner().generate_content_async(llm_request, stream=True):
+            if response.partial:
+                text = _text(response)
+                if text:
+                    streamed.append(text)
+                    sink.put(SubAgentChunk(self.agent_name, text))
+                last_partial = response
+                continue
+            complete = True
+            yield response
+        if not complete and streamed:
+            # Streams that end on a partial chunk get the aggregate the
+            # non-streaming call would have returned.
+            yield LlmResponse(
+                content=types.Content(role="model", parts=[types.Part(text="".join(streamed))]),
+                usage_metadata=last_partial.usage_metadata if last_partial else None,
+            )
+
+    def connect(self, llm_request: LlmRequest):
+        return self._inner().connect(llm_request)
+
+
+class StreamingCoordinator(LlmAgent):
+    """``LlmAgent`` that streams the text of its ``AgentTool`` sub-agents.
+
+    Attributes:
+        stream_sub_agents: Set False to behave like a plain ``LlmAgent``.
+    """
+
+    stream_sub_agents: bool = True
+
+    def model_post_init(self, __context) -> None:
+        super().model_post_init(__context)
+        for tool in self.tools:
+            if isinstance(tool, AgentTool) and isinstance(tool.agent, LlmAgent):
+                agent = tool.agent
+                if agent.model and not isinstance(agent.model, ForwardingLlm):
+                    inner = agent.model if isinstance(agent.model, BaseLlm) else None
+                    agent.model = ForwardingLlm(
+                        model=inner.model if inner else agent.model, llm=inner, agent_name=agent.name
+                    )
+
+    def _forwarding(self, ctx: InvocationContext) -> bool:
+        run_config = ctx.run_config
+        return (
+            self.stream_sub_agents
+            and run_config is not None
+            and run_config.streaming_mode == StreamingMode.SSE
+        )
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        if not self._forwarding(ctx):
+            async for event in super()._run_async_impl(ctx):
+                yield event
+            return
+
+        sink = _Sink()
+        done = object()
+
+        async def pump() -> None:
+            try:
+                async for event in LlmAgent._run_async_impl(self, ctx):
+                    # Wait until the runner has handled the event, as it
+                    # would if it iterated this agent directly.
+                    handled = asyncio.get_running_loop().create_future()
+                    sink.put((event, handled))
+                    await handled
+            except Exception as e:
+                sink.put(e)
+            else:
+                sink.put(done)
+
+        token = _sink.set(sink)
+        try:
+            task = asyncio.create_task(pump())
+        finally:
+            _sink.reset(token)
+        try:
+            while True:
+                item = await sink.queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if isinstance(item, SubAgentChunk):
+                    yield Event(
+                        invocation_id=ctx.invocation_id,
+                        author=item.agent_name,
+                        branch=ctx.branch,
+                        partial=True,
+                        content=types.Content(role="model", parts=[types.Part(text=item.text)]),
+                        custom_metadata={SUB_AGENT_METADATA_KEY: item.agent_name},
+                    )
+                    continue
+                event, handled = item
+                yield event
+                if not handled.done():
+                    handled.set_result(None)
+        finally:
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
@@ -0,0 +1,241 @@
+"""Compact encoding of tabular tool results.
+
+Tools hand the model tables as JSON lists of row objects, which repeats
+every column name on every row. Twelve ``daily_prices`` columns with
+15-digit floats and ISO timestamps make most of the input tokens of a
+BigQuery answer. ``compact_tool_result`` is an ``after_tool_callback`` that
+rewrites every table in a tool response (a list of at least two flat
+objects, at any depth) as:
+
+* CSV with the header once, in an ``{"encoding": "csv", ...}`` object;
+* floats rounded to ``significant_digits``, timestamps trimmed to seconds
+  (midnight timestamps to dates);
+* columns holding one value on every row moved to ``constant``;
+* above ``max_rows`` rows, only the first and last rows plus a per-column
+  summary (min/max/mean, or distinct count and most common values)
+  computed over all rows.
+
+Responses without tables are left untouched, so the callback can be put on
+any agent. ``default_encoder().stats`` reports the characters saved.
+"""
+
+import collections
+import csv
+import dataclasses
+import io
+import json
+import math
+import os
+import re
+import threading
+from typing import Any, Optional
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+
+_TIMESTAMP = re.compile(
+    r"^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:\.\d+)?(?:Z|[+-]00:?00| UTC)?$"
+)
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?$")
+_SCALARS = (str, int, float, bool, type(None))
+# Nested objects deeper than this are left as they are.
+_MAX_DEPTH = 6
+
+
+def format_number(value: float, significant_digits: int) -> str:
+    """Shortest rounded form: 185.23, 0.0123, 2.51235e12."""
+    if math.isnan(value) or math.isinf(value):
+        return ""
+    text = f"{value:.{significant_digits}g}"
+    if "e" in text:
+        mantissa, exponent = text.split("e")
+        text = f"{mantissa}e{int(exponent)}"
+    return text
+
+
+def _cell(value: Any, significant_digits: int) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return format_number(value, significant_digits)
+    if isinstance(value, str):
+        match = _TIMESTAMP.match(value)
+        if match:
+            return match[1] if match[2] == "00:00:00" else f"{match[1]} {match[2]}"
+    return str(value)
+
+
+def _flatten(row: dict, prefix: str = "") -> Optional[dict]:
+    """One level of nesting becomes dotted columns; None if not flat."""
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict) and not prefix:
+            nested = _flatten(value, f"{key}.")
+            if nested is None:
+                return None
+            flat.update(nested)
+        elif isinstance(value, _SCALARS):
+            flat[f"{prefix}{key}"] = value
+        else:
+            return None
+    return flat
+
+
+def _summary(values: list, significant_digits: int) -> dict[str, Any]:
+    present = [v for v in values if v is not None]
+    summary: dict[str, Any] = {}
+    if len(present) < len(values):
+        summary["nulls"] = len(values) - len(present)
+    numbers = [v for v in present if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    if numbers and len(numbers) == len(present):
+        summary["min"] = _cell(min(numbers), significant_digits)
+        summary["max"] = _cell(max(numbers), significant_digits)
+        summary["mean"] = format_number(sum(numbers) / len(numbers), significant_digits)
+    else:
+        cells = [_cell(v, significant_digits) for v in present]
+        counts = collections.Counter(cells)
+        summary["distinct"] = len(counts)
+        if cells and all(_DATE.match(cell) for cell in cells):
+            summary["min"], summary["max"] = min(cells), max(cells)
+        else:
+            summary["top"] = [value for value, _ in counts.most_common(3)]
+    return summary
+
+
+@dataclasses.dataclass
+class EncodingStats:
+    """Counters for one ``TableEncoder``."""
+
+    tables: int = 0
+    rows: int = 0
+    summarized: int = 0
+    chars_before: int = 0
+    chars_after: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        stats = dataclasses.asdict(self)
+        stats["saved_fraction"] = (
+            round(1 - self.chars_after / self.chars_before, 4) if self.chars_before else 0.0
+        )
+        return stats
+
+
+class TableEncoder:
+    """Encodes lists of row objects as compact CSV tables.
+
+    Args:
+        significant_digits: Digits kept for floats.
+        max_rows: Tables with more rows are summarized.
+        head_rows: Leading rows kept when summarizing.
+        tail_rows: Trailing rows kept when summarizing.
+        min_rows: Smaller lists are left as JSON.
+    """
+
+    def __init__(
+        self,
+        significant_digits: int = 6,
+        max_rows: int = 50,
+        head_rows: int = 10,
+        tail_rows: int = 5,
+        min_rows: int = 2,
+    ):
+        self.significant_digits = significant_digits
+        self.max_rows = max_rows
+        self.head_rows = head_rows
+        self.tail_rows = tail_rows
+        self.min_rows = min_rows
+        self.stats = EncodingStats()
+        self._lock = threading.Lock()
+
+    def encode_table(self, rows: list[dict]) -> Optional[dict[str, Any]]:
+        """The compact form of ``rows``, or None if they are not a flat table."""
+        if len(rows) < self.min_rows or not all(isinstance(row, dict) for row in rows):
+            return None
+        flat = [_flatten(row) for row in rows]
+        if any(row is None for row in flat):
+            return None
+        columns = list(dict.fromkeys(key for row in flat for key in row))
+        values = {column: [row.get(column) for row in flat] for column in columns}
+
+        encoded: dict[str, Any] = {"encoding": "csv", "row_count": len(rows)}
+        constant = {}
+        for column in columns:
+            first = values[column][0]
+            if all(value == first and type(value) is type(first) for value in values[column]):
+                constant[column] = first if first is None else _cell(first, self.significant_digits)
+        if constant and len(constant) < len(columns):
+            encoded["constant"] = constant
+            columns = [column for column in columns if column not in constant]
+
+        kept = range(len(flat))
+        if len(flat) > self.max_rows:
+            kept = [*range(self.head_rows), *range(len(flat) - self.tail_rows, len(flat))]
+            encoded["omitted_rows"] = len(flat) - len(kept)
+            encoded["summary"] = {
+                column: _summary(values[column], self.significant_digits) for column in columns
+            }
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        for i in kept:
+            writer.writerow(_cell(values[column][i], self.significant_digits) for column in columns)
+        encoded["csv"] = buffer.getvalue().rstrip("\n")
+
+        before = len(json.dumps(rows, default=str))
+        after = len(json.dumps(encoded))
+        with self._lock:
+            self.stats.tables += 1
+            self.stats.rows += len(rows)
+            self.stats.summarized += "summary" in encoded
+            self.stats.chars_before += before
+            self.stats.chars_after += after
+        return encoded
+
+    def compact(self, value: Any, depth: int = 0) -> Any:
+        """``value`` with every table inside it encoded; the same object if none."""
+        if depth > _MAX_DEPTH:
+            return value
+        if isinstance(value, list):
+            encoded = self.encode_table(value)
+            if encoded is not None:
+                return encoded
+            items = [self.compact(item, depth + 1) for item in value]
+            changed = any(new is not old for new, old in zip(items, value))
+            return items if changed else value
+        if isinstance(value, dict):
+            items = {key: self.compact(item, depth + 1) for key, item in value.items()}
+            changed = any(items[key] is not item for key, item in value.items())
+            return items if changed else value
+        return value
+
+
+_default_encoder: Optional[TableEncoder] = None
+_default_encoder_lock = threading.Lock()
+
+
+def default_encoder() -> TableEncoder:
+    """Process-wide encoder configured from the environment.
+
+    TOOL_RESULT_SIGNIFICANT_DIGITS (default 6) and TOOL_RESULT_MAX_ROWS
+    (default 50).
+    """
+    global _default_encoder
+    with _default_encoder_lock:
+        if _default_encoder is None:
+            _default_encoder = TableEncoder(
+                significant_digits=int(os.getenv("TOOL_RESULT_SIGNIFICANT_DIGITS", "6")),
+                max_rows=int(os.getenv("TOOL_RESULT_MAX_ROWS", "50")),
+            )
+        return _default_encoder
+
+
+def compact_tool_result(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, tool_response: Any
+) -> Optional[dict]:
+    """``after_tool_callback`` replacing tables in the response with CSV."""
+    compacted = default_encoder().compact(tool_response)
+    if compacted is tool_response or not isinstance(compacted, dict):
+        return None
+    return compacted
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the batch runner.
+
+A stub advisor model answers each ticker after a fixed latency, so
+concurrency, crash/resume and the output formats can be checked offline.
+The Vertex batch path runs against in-memory stand-ins for the genai and
+storage clients.
+
+    python -m pytest shared_libraries/test_batch_runner.py
+    python -m shared_libraries.test_batch_runner --benchmark
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import types as pytypes
+
+import pyarrow.parquet as pq
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools import google_search
+from google.genai import types
+
+from shared_libraries.batch_runner import (
+    BatchItem,
+    BatchRunner,
+    JsonlSink,
+    ParquetSink,
+    VertexBatchRunner,
+    open_sink,
+    parse_prediction,
+    read_items,
+    vertex_request,
+)
+from shared_libraries.memory_service import RecallMemoryTool
+
+TICKERS = [f"T{i:03d}" for i in range(30)]
+
+
+class _Crash(BaseException):
+    """Stands in for the process dying mid-batch."""
+
+
+class _AdvisorLlm(BaseLlm):
+    """Stub advisor: one answer per ticker; can fail some tickers or crash."""
+
+    latency: float = 0.01
+    calls: list = []
+    fail: set = set()
+    crash_after: int = 0
+    in_flight: int = 0
+    peak: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        ticker = llm_request.contents[-1].parts[0].text
+        self.calls.append(ticker)
+        if self.crash_after and len(self.calls) > self.crash_after:
+            raise _Crash()
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        if ticker in self.fail:
+            raise RuntimeError(f"no data for {ticker}")
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=f"Hold {ticker}.")]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=100, candidates_token_count=5
+            ),
+        )
+
+
+def _agent(**kwargs):
+    model = _AdvisorLlm(model="stub", calls=[], **kwargs)
+    agent = LlmAgent(name="financial_coordinator", model=model, output_key="advice")
+    return agent, model
+
+
+def _write_input(path, tickers=TICKERS):
+    with open(path, "w") as f:
+        for ticker in tickers:
+            f.write(json.dumps({"id": ticker, "message": ticker}) + "\n")
+
+
+def _run(agent, sink, input_path, concurrency=4):
+    try:
+        return asyncio.run(BatchRunner(agent, sink, concurrency).run(read_items(input_path)))
+    finally:
+        sink.close()
+
+
+def _lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_read_items():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "in.jsonl")
+        with open(path, "w") as f:
+            f.write('{"id": 7, "message": "AAPL", "user_id": "desk"}\n\n')
+            f.write('{"message": "Plan for learning SQL", "state": {"level": "beginner"}}\n')
+        first, second = read_items(path)
+        assert first == BatchItem("7", "AAPL", "desk", {})
+        assert len(second.id) == 16 and second.state == {"level": "beginner"}
+        with open(path, "a") as f:
+            f.write('{"prompt": "no message"}\n')
+        try:
+            list(read_items(path))
+            assert False, "expected ValueError"
+        except ValueError as e:
+            assert "in.jsonl:4" in str(e)
+
+
+def test_bounded_concurrency_and_results():
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_input(os.path.join(tmp, "in.jsonl"))
+        agent, model = _agent(latency=0.05)
+        stats = _run(agent, JsonlSink(os.path.join(tmp, "out.jsonl")), os.path.join(tmp, "in.jsonl"))
+        assert model.peak == 4
+        assert stats.succeeded == 30 and stats.failed == 0 and stats.prompt_tokens == 3000
+        results = _lines(os.path.join(tmp, "out.jsonl"))
+        assert sorted(r["id"] for r in results) == TICKERS
+        aapl = next(r for r in results if r["id"] == "T007")
+        assert aapl["response"] == "Hold T007." and aapl["outputs"] == {"advice": "Hold T007."}
+
+
+def test_resume_after_crash_skips_completed():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output = os.path.join(tmp, "in.jsonl"), os.path.join(tmp, "out.jsonl")
+        _write_input(input_path)
+        agent, model = _agent(crash_after=12, fail={"T003"})
+        try:
+            _run(agent, JsonlSink(output), input_path)
+            assert False, "expected the crash"
+        except _Crash:
+            pass
+        with open(output, "a") as f:
+            f.write('{"id": "T02')  # torn write of the dying process
+        done = {r["id"] for r in _read_complete(output) if r["status"] == "ok"}
+        assert 0 < len(done) <= 12 and "T003" not in done
+
+        agent, model = _agent()
+        stats = _run(agent, JsonlSink(output), input_path)
+        assert sorted(model.calls) == sorted(set(TICKERS) - done)
+        assert stats.skipped == len(done)
+        ok = [r["id"] for r in _lines(output) if r["status"] == "ok"]
+        assert sorted(ok) == TICKERS
+
+
+def _read_complete(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.endswith("\n")]
+
+
+def test_failed_items_run_again():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output = os.path.join(tmp, "in.jsonl"), os.path.join(tmp, "out.jsonl")
+        _write_input(input_path, TICKERS[:5] + ["T001"])
+        agent, _ = _agent(fail={"T002"})
+        stats = _run(agent, JsonlSink(output), input_path)
+        assert (stats.succeeded, stats.failed, stats.skipped) == (4, 1, 1)
+        errors = [r["error"] for r in _lines(output) if r["status"] == "error"]
+        assert errors == ["RuntimeError: no data for T002"]
+        agent, model = _agent()
+        _run(agent, JsonlSink(output), input_path)
+        assert model.calls == ["T002"]
+
+
+def test_parquet_parts_survive_crash():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output = os.path.join(tmp, "in.jsonl"), os.path.join(tmp, "out.parquet")
+        _write_input(input_path)
+        agent, _ = _agent(crash_after=20)
+        sink = open_sink(output, rows_per_file=8)
+        assert isinstance(sink, ParquetSink)
+        try:
+            asyncio.run(BatchRunner(agent, sink, 4).run(read_items(input_path)))
+            assert False, "expected the crash"
+        except _Crash:
+            pass  # no close(): the journal holds the rows after the last part
+        done = set(ParquetSink(output, rows_per_file=8).completed)
+        assert len(done) >= 12
+
+        agent, model = _agent()
+        _run(agent, ParquetSink(output, rows_per_file=8), input_path)
+        assert sorted(model.calls) == sorted(set(TICKERS) - done)
+        assert not os.path.exists(os.path.join(output, "_pending.jsonl"))
+        table = pq.read_table(output).to_pylist()
+        assert sorted(r["id"] for r in table) == TICKERS
+        assert json.loads(table[0]["outputs"])["advice"].startswith("Hold")
+
+
+class _FakeBlob:
+    def __init__(self, store, name):
+        self.store, self.name = store, name
+
+    def upload_from_string(self, data, content_type=None):
+        self.store[self.name] = data
+
+    def download_as_text(self):
+        return self.store[self.name]
+
+
+class _FakeStorage:
+    def __init__(self):
+        self.blobs = {}
+
+    def bucket(self, name):
+        return pytypes.SimpleNamespace(blob=lambda path: _FakeBlob(self.blobs, f"{name}/{path}"))
+
+    def list_blobs(self, bucket, prefix):
+        return [
+            pytypes.SimpleNamespace(name=key.split("/", 1)[1], download_as_text=lambda key=key: self.blobs[key])
+            for key in self.blobs if key.startswith(f"{bucket}/{prefix}")
+        ]
+
+
+class _FakeBatches:
+    """Vertex batch jobs that succeed after ``polls`` status checks."""
+
+    def __init__(self, storage, polls=2):
+        self.storage, self.polls, self.created, self.gets = storage, polls, [], 0
+
+    def create(self, model, src, config):
+        self.created.append((model, src, config))
+        return pytypes.SimpleNamespace(name=f"batchPredictionJobs/{len(self.created)}")
+
+    def get(self, name):
+        self.gets += 1
+        model, src, config = self.created[int(name.rsplit("/", 1)[1]) - 1]
+        if self.gets < self.polls:
+            return pytypes.SimpleNamespace(state=types.JobState.JOB_STATE_RUNNING)
+        lines = self.storage.blobs[src[5:]].splitlines()
+        predictions = []
+        for line in lines:
+            request = json.loads(line)["request"]
+            topic = request["contents"][0]["parts"][0]["text"]
+            response = {
+                "candidates": [{"content": {"parts": [{"text": f"Plan: {topic}"}]}}],
+                "usageMetadata": {"promptTokenCount": 50, "candidatesTokenCount": 20},
+            }
+            predictions.append(json.dumps({"request": request, "response": response, "status": ""}))
+        self.storage.blobs[f"{config.dest[5:]}/prediction-model-1/predictions.jsonl"] = "\n".join(predictions)
+        return pytypes.SimpleNamespace(
+            state=types.JobState.JOB_STATE_SUCCEEDED, dest=pytypes.SimpleNamespace(gcs_uri=config.dest)
+        )
+
+
+def test_vertex_batch_requests():
+    teacher = LlmAgent(
+        name="teaching_assistant", model="gemini-2.5-flash", tools=[google_search],
+        instruction="Plan lessons for a {level} student.",
+        generate_content_config=types.GenerateContentConfig(temperature=0.2),
+    )
+    line = vertex_request(teacher, BatchItem("a", "SQL", state={"level": "beginner"}), "item-000000")
+    request = line["request"]
+    assert request["systemInstruction"]["parts"][0]["text"] == "Plan lessons for a beginner student."
+    assert request["tools"] == [{"googleSearch": {}}] and request["generationConfig"] == {"temperature": 0.2}
+    key, result = parse_prediction({"request": request, "response": {}, "status": "quota exceeded"})
+
+    # The live teaching assistant also recalls memories; batch requests go without them.
+    teacher.tools = [google_search, RecallMemoryTool()]
+    VertexBatchRunner(teacher, pytypes.SimpleNamespace(path="x"), "gs://b/p")
+    assert vertex_request(teacher, BatchItem("a", "SQL"), "k")["request"]["tools"] == [{"googleSearch": {}}]
+    assert key == "item-000000" and result.status == "error" and result.error == "quota exceeded"
+
+    agent, _ = _agent()
+    agent.tools = [_write_input]
+    try:
+        VertexBatchRunner(agent, pytypes.SimpleNamespace(path="x"), "gs://b/p")
+        assert False, "expected ValueError"
+    except ValueError as e:
+        assert "calls tool _write_input" in str(e)
+
+
+def test_vertex_batch_resumes_submitted_job():
+    teacher = LlmAgent(
+        name="teaching_assistant", model="gemini-2.5-flash", tools=[google_search],
+        instruction="Plan lessons.",
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output = os.path.join(tmp, "in.jsonl"), os.path.join(tmp, "out.jsonl")
+        _write_input(input_path, ["SQL", "Python", "Statistics"])
+        with open(output, "w") as f:
+            f.write(json.dumps({"id": "SQL", "status": "ok"}) + "\n")
+        storage = _FakeStorage()
+        batches = _FakeBatches(storage, polls=3)
+        client = pytypes.SimpleNamespace(batches=batches)
+
+        async def interrupted_run():
+            runner = VertexBatchRunner(
+                teacher, JsonlSink(output), "gs://bucket/batches", poll_seconds=0.01,
+                client=client, storage_client=storage,
+            )
+            await asyncio.wait_for(runner.run(read_items(input_path)), 0.015)
+
+        try:
+            asyncio.run(interrupted_run())
+            assert False, "expected the job to still be running"
+        except (asyncio.TimeoutError, TimeoutError):
+            pass
+        assert len(batches.created) == 1 and os.path.exists(output + ".vertex-job.json")
+        model, src, _ = batches.created[0]
+        assert model == "gemini-2.5-flash" and len(storage.blobs[src[5:]].splitlines()) == 2
+
+        sink = JsonlSink(output)
+        runner = VertexBatchRunner(
+            teacher, sink, "gs://bucket/batches", poll_seconds=0.01, client=client, storage_client=storage
+        )
+        stats = asyncio.run(runner.run(read_items(input_path)))
+        sink.close()
+        assert len(batches.created) == 1 and stats.succeeded == 2
+        assert not os.path.exists(output + ".vertex-job.json")
+        results = {r["id"]: r for r in _lines(output)}
+        assert results["Python"]["response"] == "Plan: Python" and results["Python"]["prompt_tokens"] == 50
+
+
+def test_vertex_batch_resume_submits_new_items():
+    teacher = LlmAgent(
+        name="teaching_assistant", model="gemini-2.5-flash", tools=[google_search],
+        instruction="Plan lessons.",
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output = os.path.join(tmp, "in.jsonl"), os.path.join(tmp, "out.jsonl")
+        _write_input(input_path, ["SQL", "Python"])
+        storage = _FakeStorage()
+        batches = _FakeBatches(storage, polls=3)
+        client = pytypes.SimpleNamespace(batches=batches)
+
+        def runner(sink):
+            return VertexBatchRunner(
+                teacher, sink, "gs://bucket/batches", poll_seconds=0.01,
+                client=client, storage_client=storage,
+            )
+
+        async def interrupted_run():
+            await asyncio.wait_for(runner(JsonlSink(output)).run(read_items(input_path)), 0.015)
+
+        try:
+            asyncio.run(interrupted_run())
+            assert False, "expected the job to still be running"
+        except (asyncio.TimeoutError, TimeoutError):
+            pass
+
+        # Items added after the job was submitted go out in a second job.
+        _write_input(input_path, ["SQL", "Python", "Statistics"])
+        sink = JsonlSink(output)
+        stats = asyncio.run(runner(sink).run(read_items(input_path)))
+        sink.close()
+        assert len(batches.created) == 2 and stats.succeeded == 3
+        assert len(storage.blobs[batches.created[1][1][5:]].splitlines()) == 1
+        assert not os.path.exists(output + ".vertex-job.json")
+        results = {r["id"]: r for r in _lines(output)}
+        assert results["Statistics"]["response"] == "Plan: Statistics"
+        assert results["SQL"]["response"] == "Plan: SQL"
+
+
+def benchmark(items=200, latency=0.05):
+    """Items/sec of a batch one at a time vs with concurrency, and resume cost."""
+    rates = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "in.jsonl")
+        # The first ADK run pays one-off setup; keep it out of the timings.
+        _write_input(input_path, ["warm-up"])
+        _run(_agent()[0], JsonlSink(os.path.join(tmp, "warm-up.jsonl")), input_path)
+        _write_input(input_path, [f"T{i:04d}" for i in range(items)])
+        for concurrency in (1, 16):
+            agent, _ = _agent(latency=latency)
+            output = os.path.join(tmp, f"out-{concurrency}.jsonl")
+            stats = _run(agent, JsonlSink(output), input_path, concurrency)
+            rates[concurrency] = stats.as_dict()["items_per_second"]
+            print(f"   - concurrency {concurrency:>2}: {rates[concurrency]:.0f} items/s")
+        agent, model = _agent(latency=latency)
+        start = time.perf_counter()
+        _run(agent, JsonlSink(output), input_path, 16)
+        print(f"   - resuming a finished batch: {len(model.calls)} model calls, "
+              f"{time.perf_counter() - start:.3f}s")
+    print(f"   - {rates[16] / rates[1]:.1f}x throughput")
+    return rates[16] / rates[1]
+
+
+def test_benchmark_small():
+    assert benchmark(items=48) > 3
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing the batch runner...\n")
+
+    tests = [
+        ("Read Items", test_read_items),
+        ("Bounded Concurrency", test_bounded_concurrency_and_results),
+        ("Resume After Crash", test_resume_after_crash_skips_completed),
+        ("Failed Items Run Again", test_failed_items_run_again),
+        ("Parquet Output", test_parquet_parts_survive_crash),
+        ("Vertex Batch Requests", test_vertex_batch_requests),
+        ("Vertex Batch Resume", test_vertex_batch_resumes_submitted_job),
+        ("Vertex Batch New Items", test_vertex_batch_resume_submits_new_items),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (200 items, 50 ms stub model)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the concurrent multi-query BigQuery tool.
+
+Queries run against the in-process BigQuery stand-in with simulated job
+latency; the agent test uses a stub analyst model.
+
+    python -m pytest shared_libraries/test_bq_batch_query.py
+    python -m shared_libraries.test_bq_batch_query --benchmark
+"""
+
+import asyncio
+import math
+import os
+import sys
+import time
+
+import pandas as pd
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from shared_libraries import bq_batch_query, fake_bigquery
+from shared_libraries.bq_batch_query import BatchQueryRunner, execute_sql_batch
+from shared_libraries.fake_bigquery import Client, LatencyModel
+
+GENERATOR_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bq_test_data_generation"
+)
+sys.path.append(GENERATOR_DIR)
+
+import generate_market_data as gmd  # noqa: E402
+
+FIXTURE_CSV = os.path.join(GENERATOR_DIR, "stock_market_data_10000_rows.csv")
+PROJECT = "test-project"
+TABLE = f"`{PROJECT}.hist_stock_market.daily_prices`"
+
+# The "Market Summary" question of test_bq_analyst_with_data.py, one query per figure.
+MARKET_SUMMARY = [
+    f"SELECT COUNT(*) AS records FROM {TABLE}",
+    f"SELECT MIN(date) AS first_date, MAX(date) AS last_date FROM {TABLE}",
+    f"SELECT COUNT(DISTINCT symbol) AS symbols FROM {TABLE}",
+    f"SELECT MIN(close_price) AS min_close, MAX(close_price) AS max_close, "
+    f"AVG(close_price) AS avg_close, STDDEV(close_price) AS std_close FROM {TABLE}",
+]
+
+
+def _load_fixture():
+    gmd.upload_to_bigquery(
+        pd.read_csv(FIXTURE_CSV), gmd.create_bigquery_dataset_and_table(PROJECT), PROJECT
+    )
+
+
+def test_batch_matches_single_queries():
+    with fake_bigquery.install():
+        _load_fixture()
+        runner = BatchQueryRunner(max_rows=5)
+        queries = MARKET_SUMMARY + [
+            f"SELECT symbol FROM {TABLE} GROUP BY symbol ORDER BY symbol",
+            " ".join(MARKET_SUMMARY[0].split()) + "  ",  # same query, other whitespace
+        ]
+        response = asyncio.run(runner.run(PROJECT, queries))
+        assert response["status"] == "SUCCESS"
+        assert [r["query"] for r in response["results"]] == queries
+
+        client = Client(project=PROJECT)
+        for result, query in zip(response["results"], MARKET_SUMMARY):
+            expected = [dict(row.items()) for row in client.query_and_wait(query)]
+            assert result["rows"] == [
+                {k: v if isinstance(v, (int, float)) else str(v) for k, v in row.items()}
+                for row in expected
+            ]
+        assert response["results"][0]["rows"] == [{"records": 10000}]
+        assert response["results"][1]["rows"][0]["first_date"] == "2023-09-07"
+        symbols = response["results"][4]
+        assert len(symbols["rows"]) == 5 and symbols["result_is_likely_truncated"]
+        assert runner.stats.queries == 5 and runner.stats.deduplicated == 1
+
+
+def test_read_only_and_partial_failures():
+    with fake_bigquery.install():
+        _load_fixture()
+        runner = BatchQueryRunner(max_queries=3)
+        response = asyncio.run(runner.run(PROJECT, [
+            MARKET_SUMMARY[0],
+            f"DELETE FROM {TABLE} WHERE TRUE",
+            f"SELECT no_such_column FROM {TABLE}",
+        ]))
+        assert response["status"] == "PARTIAL"
+        ok, delete, missing = response["results"]
+        assert ok["status"] == "SUCCESS"
+        assert delete["error_details"] == "Read-only mode only supports SELECT statements."
+        assert missing["status"] == "ERROR" and "no_such_column" in missing["error_details"]
+        assert Client(project=PROJECT).get_table(f"{PROJECT}.hist_stock_market.daily_prices").num_rows == 10000
+        assert runner.stats.failed == 2
+
+        assert asyncio.run(runner.run(PROJECT, MARKET_SUMMARY))["status"] == "ERROR"  # too many
+        assert asyncio.run(runner.run(PROJECT, []))["status"] == "ERROR"
+
+
+def test_bounded_concurrency():
+    latency = LatencyModel(query_overhead=0.05)
+    with fake_bigquery.install(latency=latency):
+        _load_fixture()
+        runner = BatchQueryRunner(max_concurrency=3, read_only=False)
+        queries = [f"SELECT {i} AS n, COUNT(*) AS c FROM {TABLE}" for i in range(8)]
+        start = time.perf_counter()
+        response = asyncio.run(runner.run(PROJECT, queries))
+        elapsed = time.perf_counter() - start
+        assert [r["rows"][0]["n"] for r in response["results"]] == list(range(8))
+        assert runner.stats.peak_in_flight == 3
+        # Three waves of at most three jobs each.
+        assert math.ceil(8 / 3) * 0.05 <= elapsed < 8 * 0.05, elapsed
+
+
+class _SummaryLlm(BaseLlm):
+    """Stub analyst that needs the four Market Summary figures to answer."""
+
+    calls: int = 0
+    latency: float = 0.0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        names = llm_request.tools_dict
+        answered = [
+            p.function_response.response
+            for c in llm_request.contents for p in c.parts or [] if p.function_response
+        ]
+        if "execute_sql_batch" in names and not answered:
+            call = types.FunctionCall(
+                name="execute_sql_batch", args={"project_id": PROJECT, "queries": MARKET_SUMMARY}
+            )
+        elif "execute_sql" in names and len(answered) < len(MARKET_SUMMARY):
+            call = types.FunctionCall(
+                name="execute_sql", args={"project_id": PROJECT, "query": MARKET_SUMMARY[len(answered)]}
+            )
+        else:
+            if "execute_sql_batch" in names:
+                answered = answered[0]["results"]
+            rows = [row for response in answered for row in response["rows"]]
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=str(rows))]))
+            return
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+
+
+async def execute_sql(project_id: str, query: str) -> dict:
+    """Run one GoogleSQL SELECT query, through the same runner as the batch tool.
+
+    Args:
+        project_id: The GCP project id in which the query is executed.
+        query: The GoogleSQL SELECT query.
+
+    Returns:
+        dict: "status" and "rows", or "error_details".
+    """
+    response = await bq_batch_query.default_runner().run(project_id, [query])
+    result = response["results"][0]
+    result.pop("query")
+    return result
+
+
+def ask_market_summary(batch: bool, model_latency: float = 0.0, latency=None):
+    """Answer the Market Summary question; returns (answer, model calls, seconds)."""
+    model = _SummaryLlm(model="fake-analyst", latency=model_latency)
+    tool = execute_sql_batch if batch else execute_sql
+    agent = LlmAgent(name="bq_data_analyst_agent", model=model, tools=[tool])
+
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="analyst")
+        session = await runner.session_service.create_session(app_name="analyst", user_id="analyst")
+        texts = []
+        start = time.perf_counter()
+        async for event in runner.run_async(
+            user_id="analyst",
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text="Give me a market summary")]),
+        ):
+            if event.content and event.content.parts:
+                texts.extend(p.text for p in event.content.parts if p.text)
+        return texts, time.perf_counter() - start
+
+    with fake_bigquery.install(latency=latency):
+        _load_fixture()
+        bq_batch_query._default_runner = BatchQueryRunner()
+        try:
+            texts, seconds = asyncio.run(run())
+        finally:
+            bq_batch_query._default_runner.shutdown()
+            bq_batch_query._default_runner = None
+    return texts, model.calls, seconds
+
+
+def test_one_round_trip_for_market_summary():
+    sequential, sequential_calls, _ = ask_market_summary(batch=False)
+    batched, batched_calls, _ = ask_market_summary(batch=True)
+    assert batched == sequential and "'records': 10000" in batched[0]
+    assert sequential_calls == len(MARKET_SUMMARY) + 1
+    assert batched_calls == 2
+
+
+def benchmark(model_latency=0.8, scale=1.0):
+    """Market Summary answer time, sequential execute_sql calls vs one batch."""
+    results = {}
+    for batch in (False, True):
+        _, calls, seconds = ask_market_summary(
+            batch, model_latency, LatencyModel.bigquery(scale=scale, seed=7)
+        )
+        results[batch] = seconds
+        print(f"   - {'batched' if batch else 'sequential'}: {calls} model calls, {seconds:.2f}s")
+    print(f"   - speedup: {results[False] / results[True]:.1f}x")
+    return results[False] / results[True]
+
+
+def test_benchmark_small():
+    assert benchmark(model_latency=0.04, scale=0.05) > 2
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing concurrent BigQuery batch queries...\n")
+
+    tests = [
+        ("Batch Results", test_batch_matches_single_queries),
+        ("Read-only and Failures", test_read_only_and_partial_failures),
+        ("Bounded Concurrency", test_bounded_concurrency),
+        ("Market Summary Round Trips", test_one_round_trip_for_market_summary),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (Market Summary, 0.8s model turns, on-demand job latency)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
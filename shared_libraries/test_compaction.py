@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Tests for history compaction in long financial advisory sessions.
+
+A scripted 30-turn session drives a coordinator that calls four AgentTool
+sub-agents in rotation, each returning a long report, and records the
+estimated tokens the coordinator's model receives on every turn with and
+without compaction.
+"""
+
+import asyncio
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+
+from shared_libraries.compaction import (
+    HistoryCompactor,
+    estimate_tokens,
+    include_state_inputs,
+    summarize_report,
+)
+
+TURNS = 30
+BUDGET = 6000
+SUB_AGENTS = [
+    ("data_analyst_agent", "market_data_analysis_output", ()),
+    (
+        "trading_analyst_agent",
+        "proposed_trading_strategies_output",
+        ("market_data_analysis_output",),
+    ),
+    (
+        "execution_analyst_agent",
+        "execution_plan_output",
+        ("proposed_trading_strategies_output",),
+    ),
+    (
+        "risk_analyst_agent",
+        "final_risk_assessment_output",
+        ("proposed_trading_strategies_output", "execution_plan_output"),
+    ),
+]
+
+
+def _report(title):
+    sections = "\n".join(
+        f"**{i}. Section {i}:**\n" + f"Detailed {title} finding {i}. " * 40
+        for i in range(1, 6)
+    )
+    return f"# {title}\n\n{sections}"
+
+
+class _ReportLlm(BaseLlm):
+    """Sub-agent model: returns a long report and records its instructions."""
+
+    seen_instructions: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.seen_instructions.append(str(llm_request.config.system_instruction))
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=_report(self.model))])
+        )
+
+
+class _CoordinatorLlm(BaseLlm):
+    """Coordinator model: calls the next sub-agent, then acknowledges."""
+
+    tokens_per_call: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.tokens_per_call.append(estimate_tokens(llm_request.contents))
+        last = llm_request.contents[-1].parts[0]
+        if last.function_response:
+            part = types.Part(text="Here is the result. What would you like next?")
+        else:
+            turn = int(last.text.split()[-1])
+            name = SUB_AGENTS[turn % len(SUB_AGENTS)][0]
+            part = types.Part(
+                function_call=types.FunctionCall(
+                    name=name, args={"request": f"Continue the plan (turn {turn})"}
+                )
+            )
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def _build_coordinator(compactor):
+    tools = [
+        AgentTool(
+            agent=LlmAgent(
+                name=name,
+                model=_ReportLlm(model=name, seen_instructions=[]),
+                output_key=output_key,
+                before_model_callback=include_state_inputs(*inputs) if inputs else None,
+            )
+        )
+        for name, output_key, inputs in SUB_AGENTS
+    ]
+    model = _CoordinatorLlm(model="coordinator", tokens_per_call=[])
+    coordinator = LlmAgent(
+        name="financial_coordinator",
+        model=model,
+        tools=tools,
+        before_model_callback=compactor,
+    )
+    return coordinator, model, tools
+
+
+def _run_session(compactor):
+    coordinator, model, tools = _build_coordinator(compactor)
+
+    async def run():
+        runner = InMemoryRunner(agent=coordinator, app_name="advisor")
+        session = await runner.session_service.create_session(
+            app_name="advisor", user_id="investor"
+        )
+        for turn in range(TURNS):
+            message = types.Content(
+                role="user", parts=[types.Part(text=f"Next step please, turn {turn}")]
+            )
+            async for _ in runner.run_async(
+                user_id="investor", session_id=session.id, new_message=message
+            ):
+                pass
+        return await runner.session_service.get_session(
+            app_name="advisor", user_id="investor", session_id=session.id
+        )
+
+    session = asyncio.run(run())
+    # Tokens of the first model call of each turn (the one after the user message).
+    per_turn = model.tokens_per_call[::2]
+    return per_turn, session, tools
+
+
+def test_tokens_per_turn_over_30_turn_session():
+    baseline, _, _ = _run_session(compactor=None)
+    compactor = HistoryCompactor(
+        output_keys={name: key for name, key, _ in SUB_AGENTS}, token_budget=BUDGET
+    )
+    compacted, session, _ = _run_session(compactor)
+
+    print("   turn | baseline tokens | compacted tokens")
+    for turn in (0, 4, 9, 14, 19, 24, 29):
+        print(f"   {turn + 1:4d} | {baseline[turn]:15d} | {compacted[turn]:16d}")
+    print(f"   total: {sum(baseline)} -> {sum(compacted)} tokens "
+          f"({1 - sum(compacted) / sum(baseline):.0%} saved)")
+
+    assert len(baseline) == len(compacted) == TURNS
+    # Each of the four reports is counted once, however often it is stubbed.
+    stats = compactor.stats
+    assert stats.reports_compacted == len(SUB_AGENTS)
+    assert stats.requests == 2 * TURNS and len(stats.recent) == stats.requests
+    assert stats.tokens_after == sum(after for _, after in stats.recent)
+    assert stats.as_dict()["saved_ratio"] > 0.5
+    assert max(compacted) <= BUDGET
+    assert baseline[-1] > 4 * compacted[-1]
+    assert sum(compacted) < 0.5 * sum(baseline)
+    # Full reports are still available to downstream agents.
+    for _, key, _ in SUB_AGENTS:
+        assert session.state[key].startswith("# ")
+
+
+def test_downstream_agents_read_inputs_from_state():
+    compactor = HistoryCompactor(
+        output_keys={name: key for name, key, _ in SUB_AGENTS}, token_budget=BUDGET
+    )
+    _, _, tools = _run_session(compactor)
+    risk_instructions = tools[3].agent.model.seen_instructions
+    assert risk_instructions
+    assert "### proposed_trading_strategies_output" in risk_instructions[-1]
+    assert "### execution_plan_output" in risk_instructions[-1]
+    assert "# trading_analyst_agent" in risk_instructions[-1]
+
+
+def test_recent_report_kept_and_old_report_referenced():
+    report = _report("data_analyst_agent")
+    contents = [
+        types.Content(role="user", parts=[types.Part(text="Analyze AAPL")]),
+        types.Content(
+            role="model",
+            parts=[types.Part(function_call=types.FunctionCall(name="data_analyst_agent"))],
+        ),
+        types.Content(
+            role="user",
+            parts=[
+                types.Part(
+                    function_response=types.FunctionResponse(
+                        name="data_analyst_agent", response={"result": report}
+                    )
+                )
+            ],
+        ),
+        types.Content(role="model", parts=[types.Part(text="Done.")]),
+    ]
+    compactor = HistoryCompactor(
+        output_keys={"data_analyst_agent": "market_data_analysis_output"},
+        token_budget=100_000,
+    )
+    assert compactor.compact(contents) == contents
+
+    follow_up = contents + [
+        types.Content(role="user", parts=[types.Part(text="Now strategies")])
+    ]
+    compacted = compactor.compact(follow_up)
+    response = compacted[2].parts[0].function_response.response
+    assert response["state_key"] == "market_data_analysis_output"
+    assert response["summary"] == summarize_report(report)
+    # The session's own content objects are never modified.
+    assert contents[2].parts[0].function_response.response == {"result": report}
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing history compaction...\n")
+
+    tests = [
+        ("30-turn Token Measurement", test_tokens_per_turn_over_30_turn_session),
+        ("Downstream State Inputs", test_downstream_agents_read_inputs_from_state),
+        ("Report References", test_recent_report_kept_and_old_report_referenced),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
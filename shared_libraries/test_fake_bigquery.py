@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process BigQuery stand-in.
+
+The data generator's BigQuery functions and the price store's BigQuery
+source run unchanged against the fake, with no GCP project.
+
+    python -m pytest shared_libraries/test_fake_bigquery.py
+    python -m shared_libraries.test_fake_bigquery --benchmark
+"""
+
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from shared_libraries import fake_bigquery
+from shared_libraries.fake_bigquery import (
+    ArrayQueryParameter,
+    BadRequest,
+    Client,
+    Conflict,
+    LatencyModel,
+    LoadJobConfig,
+    NotFound,
+    QueryJobConfig,
+    ScalarQueryParameter,
+    SchemaField,
+)
+
+GENERATOR_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bq_test_data_generation"
+)
+sys.path.append(GENERATOR_DIR)
+
+import generate_market_data as gmd  # noqa: E402
+
+FIXTURE_CSV = os.path.join(GENERATOR_DIR, "stock_market_data_10000_rows.csv")
+PROJECT = "test-project"
+TABLE_ID = f"{PROJECT}.hist_stock_market.daily_prices"
+
+
+def _load_fixture():
+    """Create and fill daily_prices the way generate_market_data.main() does."""
+    df = pd.read_csv(FIXTURE_CSV)
+    assert gmd.create_bigquery_dataset_and_table(PROJECT) == TABLE_ID
+    gmd.upload_to_bigquery(df, TABLE_ID, PROJECT)
+    return df
+
+
+def test_generator_upload_and_queries():
+    with fake_bigquery.install() as backend:
+        df = _load_fixture()
+        # A second run finds the dataset and table.
+        gmd.create_bigquery_dataset_and_table(PROJECT)
+
+        client = Client(project=PROJECT)
+        table = client.get_table(TABLE_ID)
+        assert table.num_rows == len(df)
+        assert [(f.name, f.field_type, f.mode) for f in table.schema] == gmd.SCHEMA_FIELDS
+        assert table.description.startswith("Daily stock price data")
+
+        averages = client.query(
+            f"SELECT symbol, AVG(close_price) AS avg_price FROM `{TABLE_ID}` "
+            "GROUP BY symbol ORDER BY avg_price DESC"
+        ).to_dataframe()
+        expected = df.groupby("symbol")["close_price"].mean().sort_values(ascending=False)
+        assert list(averages["symbol"]) == list(expected.index)
+        assert np.allclose(averages["avg_price"], expected.to_numpy())
+
+        # The sample query printed by the generator.
+        monthly = list(client.query(
+            f"SELECT DATE_TRUNC(date, MONTH) as month, AVG(close_price) as avg_price "
+            f"FROM `{TABLE_ID}` WHERE symbol = 'AAPL' GROUP BY month ORDER BY month"
+        ).result())
+        months = pd.to_datetime(df.loc[df["symbol"] == "AAPL", "date"]).dt.strftime("%Y-%m-01")
+        assert [row.month for row in monthly] == sorted(months.unique())
+
+        rows = list(client.query_and_wait(
+            f"SELECT * FROM `{TABLE_ID}` WHERE symbol = @symbol ORDER BY date LIMIT 3",
+            job_config=QueryJobConfig(query_parameters=[ScalarQueryParameter("symbol", "STRING", "MSFT")]),
+        ))
+        first = df[df["symbol"] == "MSFT"].sort_values("date").iloc[0]
+        assert rows[0]["date"].isoformat() == first["date"]
+        assert rows[0].close_price == first["close_price"] and rows[0][1] == "MSFT"
+        assert dict(rows[0].items())["volume"] == first["volume"]
+        assert backend.stats["load_jobs"] == 1 and backend.stats["query_jobs"] == 3
+
+
+def test_incremental_refresh_with_merge():
+    with fake_bigquery.install():
+        df = _load_fixture()
+        client = Client(project=PROJECT)
+
+        last_rows = gmd.last_rows_from_bigquery(TABLE_ID, PROJECT)
+        from_csv = gmd.last_rows_from_csv(FIXTURE_CSV)
+        merged = last_rows.merge(from_csv, on="symbol", suffixes=("", "_csv"))
+        assert len(last_rows) == len(merged) == 30
+        assert (merged["date"].map(str) == merged["date_csv"]).all()
+        assert np.allclose(merged["close_price"], merged["close_price_csv"])
+
+        end_date = (pd.Timestamp(from_csv["date"].max()) + pd.offsets.BDay(5)).strftime("%Y-%m-%d")
+        new_rows = gmd.generate_incremental_data(last_rows, end_date=end_date, seed=1)
+        gmd.merge_into_bigquery(new_rows, TABLE_ID, PROJECT)
+        # Re-running the same refresh updates rows instead of duplicating them.
+        gmd.merge_into_bigquery(new_rows.assign(close_price=new_rows["close_price"] + 1), TABLE_ID, PROJECT)
+
+        counts = client.query(
+            f"SELECT COUNT(*) AS n, COUNT(DISTINCT CONCAT(symbol, CAST(date AS STRING))) AS distinct_keys "
+            f"FROM `{TABLE_ID}`"
+        ).result()
+        (row,) = list(counts)
+        assert row.n == row.distinct_keys == len(df) + len(new_rows)
+        (last,) = client.query_and_wait(
+            f"SELECT close_price FROM `{TABLE_ID}` WHERE symbol = 'AAPL' AND date = @day",
+            job_config=QueryJobConfig(query_parameters=[ScalarQueryParameter("day", "DATE", end_date)]),
+        )
+        expected = new_rows[(new_rows["symbol"] == "AAPL") & (new_rows["date"] == end_date)]
+        assert np.isclose(last.close_price, expected["close_price"].iloc[0] + 1)
+        assert [t.table_id for t in client.list_tables("hist_stock_market")] == ["daily_prices"]
+
+        gmd.upload_to_bigquery(new_rows, TABLE_ID, PROJECT, write_disposition="WRITE_APPEND")
+        assert client.get_table(TABLE_ID).num_rows == len(df) + 2 * len(new_rows)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prices.csv")
+            new_rows.to_csv(path, index=False)
+            gmd.upload_csv_to_bigquery(path, TABLE_ID, PROJECT)
+        assert client.get_table(TABLE_ID).num_rows == len(new_rows)
+
+
+def test_loads_and_dry_runs():
+    with fake_bigquery.install():
+        df = _load_fixture()
+        client = Client(project=PROJECT)
+        table = client.get_table(TABLE_ID)
+
+        def dry_run(sql):
+            job = client.query(sql, job_config=QueryJobConfig(dry_run=True))
+            assert job.to_api_repr()["configuration"]["dryRun"] is True
+            return job
+
+        # BigQuery sizes: 8 bytes per FLOAT, 2 + length per STRING.
+        assert dry_run(f"SELECT close_price FROM `{TABLE_ID}`").total_bytes_processed == 8 * len(df)
+        symbol_bytes = int((df["symbol"].str.len() + 2).sum())
+        assert dry_run(
+            f"SELECT symbol, MAX(close_price) FROM `{TABLE_ID}` GROUP BY symbol"
+        ).total_bytes_processed == symbol_bytes + 8 * len(df)
+        assert dry_run(f"SELECT * FROM `{TABLE_ID}`").total_bytes_processed == table.num_bytes
+        assert dry_run(f"DELETE FROM `{TABLE_ID}` WHERE volume < 0").statement_type == "DELETE"
+        assert client.get_table(TABLE_ID).num_rows == len(df)
+
+        for sql, error in (
+            ("SELECT * FROM `test-project.hist_stock_market.missing`", NotFound),
+            (f"SELECT nonsense FROM `{TABLE_ID}`", NotFound),
+            (f"SELEC * FROM `{TABLE_ID}`", BadRequest),
+        ):
+            try:
+                dry_run(sql)
+                assert False, f"expected {error.__name__}"
+            except error:
+                pass
+            job = client.query(sql)  # real jobs fail on result()
+            try:
+                job.result()
+                assert False, f"expected {error.__name__}"
+            except error:
+                pass
+
+        try:
+            client.query(
+                f"SELECT * FROM `{TABLE_ID}`",
+                job_config=QueryJobConfig(maximum_bytes_billed=1000),
+            ).result()
+            assert False, "expected BadRequest"
+        except BadRequest as e:
+            assert "bytes billed" in str(e)
+
+        # Failed loads leave the table untouched.
+        bad = df.head(5).assign(symbol=[None, "A", "B", "C", "D"])
+        job = client.load_table_from_dataframe(bad, TABLE_ID, job_config=LoadJobConfig())
+        try:
+            job.result()
+            assert False, "expected BadRequest"
+        except BadRequest:
+            pass
+        empty = LoadJobConfig(write_disposition="WRITE_EMPTY")
+        try:
+            client.load_table_from_dataframe(df.head(5), TABLE_ID, job_config=empty).result()
+            assert False, "expected Conflict"
+        except Conflict:
+            pass
+        assert client.get_table(TABLE_ID).num_rows == len(df)
+
+        # Parquet load with schema autodetection.
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pandas(df.head(100), preserve_index=False), buffer)
+        buffer.seek(0)
+        parquet = LoadJobConfig(source_format="PARQUET")
+        job = client.load_table_from_file(buffer, "hist_stock_market.from_parquet", job_config=parquet)
+        assert job.result().output_rows == 100
+        schema = client.get_table("hist_stock_market.from_parquet").schema
+        assert SchemaField("volume", "INTEGER") in schema and SchemaField("date", "STRING") in schema
+
+        try:
+            client.create_dataset("hist_stock_market")
+            assert False, "expected Conflict"
+        except Conflict:
+            pass
+        client.delete_table("hist_stock_market.from_parquet")
+        client.delete_table("hist_stock_market.from_parquet", not_found_ok=True)
+
+
+def test_googlesql_functions():
+    with fake_bigquery.install():
+        df = _load_fixture()
+        client = Client(project=PROJECT)
+        aapl = df[df["symbol"] == "AAPL"].sort_values("date").reset_index(drop=True)
+
+        rolling = client.query(
+            f"""
+            SELECT date, STDDEV(close_price) OVER (
+                ORDER BY date ROWS BETWEEN 19 PRECEDING AND CURRENT ROW) AS vol,
+              SAFE_DIVIDE(close_price, 0) AS undefined_ratio,
+              IF(close_price > open_price, 'up', 'down') AS direction,
+              EXTRACT(DAYOFWEEK FROM date) AS weekday
+            FROM `{TABLE_ID}` WHERE symbol = "AAPL" ORDER BY date
+            """
+        ).to_dataframe()
+        expected = aapl["close_price"].rolling(20, min_periods=2).std()
+        assert np.allclose(rolling["vol"].astype(float), expected, equal_nan=True)
+        assert rolling["undefined_ratio"].isna().all()
+        up = aapl["close_price"] > aapl["open_price"]
+        assert (rolling["direction"] == np.where(up, "up", "down")).all()
+        assert (rolling["weekday"] == (pd.to_datetime(aapl["date"]).dt.dayofweek + 1) % 7 + 1).all()
+
+        by_sector = client.query_and_wait(
+            f"""
+            SELECT sector, COUNTIF(close_price > open_price) AS up_days,
+              APPROX_COUNT_DISTINCT(symbol) AS symbols
+            FROM `{TABLE_ID}` WHERE symbol IN UNNEST(@symbols)
+            GROUP BY sector ORDER BY sector
+            """,
+            job_config=QueryJobConfig(query_parameters=[
+                ArrayQueryParameter("symbols", "STRING", ["AAPL", "MSFT", "JPM", "XOM"]),
+            ]),
+        )
+        subset = df[df["symbol"].isin(["AAPL", "MSFT", "JPM", "XOM"])]
+        grouped = subset.groupby("sector")
+        for row in by_sector:
+            group = grouped.get_group(row.sector)
+            assert row.up_days == (group["close_price"] > group["open_price"]).sum()
+            assert row.symbols == group["symbol"].nunique()
+
+        (window,) = client.query_and_wait(
+            f"SELECT DATE_DIFF(MAX(date), MIN(date), DAY) AS days, "
+            f"DATE_ADD(MIN(date), INTERVAL 1 MONTH) AS next_month FROM `{TABLE_ID}`"
+        )
+        first, last = pd.Timestamp(df["date"].min()), pd.Timestamp(df["date"].max())
+        assert window.days == (last - first).days
+        assert window.next_month == (first + pd.DateOffset(months=1)).strftime("%Y-%m-%d")
+
+
+def test_float_division_and_typed_literals():
+    with fake_bigquery.install():
+        df = _load_fixture()
+        client = Client(project=PROJECT)
+        (row,) = client.query_and_wait(
+            f"SELECT 7 / 2 AS half, SUM(volume) / COUNT(*) AS mean_volume, "
+            f"'a/b' AS text FROM `{TABLE_ID}`  -- 1/2 in a comment"
+        )
+        assert row.half == 3.5 and row.text == "a/b"
+        assert np.isclose(row.mean_volume, df["volume"].mean())
+
+        (recent,) = client.query_and_wait(
+            f"SELECT DATE_SUB(DATE '2024-02-01', INTERVAL 30 DAY) AS start, COUNT(*) AS n "
+            f"FROM `{TABLE_ID}` WHERE date >= DATE_SUB(DATE '2024-02-01', INTERVAL 30 DAY) "
+            f"AND date < DATE '2024-02-01' AND created_at < TIMESTAMP '2100-01-01 00:00:00'"
+        )
+        dates = pd.to_datetime(df["date"])
+        assert recent.start == "2024-01-02"
+        assert recent.n == ((dates >= "2024-01-02") & (dates < "2024-02-01")).sum()
+        try:
+            client.query_and_wait("SELECT DATE '2024-13-01'")
+            assert False, "expected BadRequest"
+        except BadRequest as e:
+            assert "Invalid DATE literal" in str(e)
+
+
+def test_latency_injection():
+    slept = []
+    latency = LatencyModel(api_overhead=0.1, query_overhead=0.5, load_overhead=2.0,
+                           seconds_per_gib=4.0, sleep=slept.append)
+    with fake_bigquery.install(latency=latency) as backend:
+        _load_fixture()
+        client = Client(project=PROJECT)
+        slept.clear()
+        job = client.query(f"SELECT close_price FROM `{TABLE_ID}`")
+        assert slept == []  # the delay is spent waiting for the job
+        job.result()
+        job.result()
+        assert len(slept) == 1
+        assert np.isclose(slept[0], 0.5 + 4.0 * 80000 / 2**30)
+        client.get_table(TABLE_ID)
+        assert slept[-1] == 0.1
+        assert np.isclose(backend.stats["simulated_seconds"], sum(
+            record.latency for record in backend.jobs
+        ))
+
+    # Delays overlap across threads, like concurrent jobs on the service.
+    jittered = LatencyModel.bigquery(scale=0.1, seed=3)
+    with fake_bigquery.install(latency=jittered):
+        _load_fixture()
+        client = Client(project=PROJECT)
+
+        def query():
+            client.query(f"SELECT COUNT(*) FROM `{TABLE_ID}`").result()
+
+        threads = [threading.Thread(target=query) for _ in range(8)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        assert elapsed < 8 * 0.06 * 0.7, elapsed
+
+
+def test_price_store_bigquery_source():
+    from financial_advisor_agent.tools.price_data import PriceStore
+
+    with fake_bigquery.install(), tempfile.TemporaryDirectory() as tmp:
+        _load_fixture()
+        from_table = PriceStore(table_id=TABLE_ID)
+        from_csv = PriceStore(FIXTURE_CSV, cache_dir=tmp)
+        assert from_table.symbols == from_csv.symbols
+        for symbol in ("AAPL", "COIN"):
+            a, b = from_table.history(symbol), from_csv.history(symbol)
+            assert (a.dates == b.dates).all()
+            assert np.array_equal(a.close, b.close) and np.array_equal(a.volume, b.volume)
+
+
+def benchmark(rows=200000, queries=200):
+    """Load and query throughput of the fake itself (no injected latency)."""
+    frame = gmd.generate_trading_day_data(rows, end_date="2025-09-05", seed=1)
+    rows = len(frame)
+    with fake_bigquery.install():
+        gmd.create_bigquery_dataset_and_table(PROJECT)
+        start = time.perf_counter()
+        gmd.upload_to_bigquery(frame, TABLE_ID, PROJECT)
+        load = time.perf_counter() - start
+
+        client = Client(project=PROJECT)
+        symbols = sorted(frame["symbol"].unique())
+        start = time.perf_counter()
+        for i in range(queries):
+            client.query_and_wait(
+                f"SELECT date, close_price FROM `{TABLE_ID}` WHERE symbol = @symbol "
+                "ORDER BY date DESC LIMIT 20",
+                job_config=QueryJobConfig(query_parameters=[
+                    ScalarQueryParameter("symbol", "STRING", symbols[i % len(symbols)]),
+                ]),
+            )
+        per_query = (time.perf_counter() - start) / queries
+    print(f"   - load: {rows / load:,.0f} rows/s ({rows:,} rows); "
+          f"point query: {per_query * 1000:.1f} ms")
+    return rows / load, per_query
+
+
+def test_benchmark_small():
+    rows_per_second, per_query = benchmark(rows=20000, queries=20)
+    assert rows_per_second > 10000 and per_query < 0.5
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing the local BigQuery stand-in...\n")
+
+    tests = [
+        ("Generator Upload", test_generator_upload_and_queries),
+        ("Incremental MERGE", test_incremental_refresh_with_merge),
+        ("Loads and Dry Runs", test_loads_and_dry_runs),
+        ("GoogleSQL Functions", test_googlesql_functions),
+        ("Float Division and Typed Literals", test_float_division_and_typed_literals),
+        ("Latency Injection", test_latency_injection),
+        ("Price Store Source", test_price_store_bigquery_source),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (200,000 rows)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
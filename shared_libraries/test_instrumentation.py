@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Tests for run instrumentation: per-stage timings, metrics export and flame summaries.
+
+A fake financial advisory run (coordinator -> data analyst sub-agent ->
+search and BigQuery tools) is executed offline with scripted models.
+"""
+
+import asyncio
+import os
+import pickle
+import tempfile
+import time
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+
+from shared_libraries import instrumentation
+from shared_libraries.batch_runner import BatchRunner, JsonlSink
+from shared_libraries.instrumentation import (
+    InstrumentationPlugin,
+    MetricsRegistry,
+    OpenTelemetrySink,
+    format_collapsed,
+    format_flame,
+)
+
+SEARCH_SECONDS = 0.06
+BIGQUERY_SECONDS = 0.03
+MODEL_SECONDS = 0.01
+
+
+async def search_web(query: str) -> dict:
+    """Fake google_search."""
+    await asyncio.sleep(SEARCH_SECONDS)
+    return {"results": [f"{query} headline {i}" for i in range(5)]}
+
+
+async def query_daily_prices(ticker: str) -> dict:
+    """Fake BigQuery lookup."""
+    await asyncio.sleep(BIGQUERY_SECONDS)
+    return {"rows": [{"ticker": ticker, "close": 100 + i} for i in range(20)]}
+
+
+class _ScriptedLlm(BaseLlm):
+    """Calls each of ``calls`` in turn, then answers with text."""
+
+    calls: list = []
+    usage: bool = False
+
+    async def generate_content_async(self, llm_request, stream=False):
+        await asyncio.sleep(MODEL_SECONDS)
+        done = sum(
+            1
+            for content in llm_request.contents
+            for part in content.parts or []
+            if part.function_response
+        )
+        if done < len(self.calls):
+            name, args = self.calls[done]
+            part = types.Part(function_call=types.FunctionCall(name=name, args=args))
+        else:
+            part = types.Part(text=f"{self.model} report " * 50)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=1000, candidates_token_count=200
+            )
+            if self.usage
+            else None,
+        )
+
+
+def _advisor():
+    data_analyst = LlmAgent(
+        name="data_analyst_agent",
+        model=_ScriptedLlm(
+            model="analyst-model",
+            calls=[("search_web", {"query": "AAPL"}), ("query_daily_prices", {"ticker": "AAPL"})],
+        ),
+        tools=[search_web, query_daily_prices],
+        output_key="market_data_analysis_output",
+    )
+    return LlmAgent(
+        name="financial_coordinator",
+        model=_ScriptedLlm(
+            model="coordinator-model",
+            calls=[("data_analyst_agent", {"request": "Analyze AAPL"})],
+            usage=True,
+        ),
+        tools=[AgentTool(agent=data_analyst)],
+    )
+
+
+def _run(plugins, runs=1):
+    async def run():
+        runner = InMemoryRunner(agent=_advisor(), app_name="advisor", plugins=plugins)
+        for _ in range(runs):
+            session = await runner.session_service.create_session(
+                app_name="advisor", user_id="investor"
+            )
+            async for _ in runner.run_async(
+                user_id="investor",
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text="AAPL?")]),
+            ):
+                pass
+
+    asyncio.run(run())
+
+
+def test_flame_summary_of_advisory_run():
+    plugin = InstrumentationPlugin()
+    _run([plugin])
+    root = plugin.last_run()
+    print(format_flame(root))
+
+    stages = [(depth, span.kind, span.name) for depth, span in root.walk()]
+    assert stages == [
+        (0, "run", "advisor"),
+        (1, "agent", "financial_coordinator"),
+        (2, "model", "coordinator-model"),
+        (2, "tool", "data_analyst_agent"),
+        (3, "run", "advisor"),
+        (4, "agent", "data_analyst_agent"),
+        (5, "model", "analyst-model"),
+        (5, "tool", "search_web"),
+        (5, "model", "analyst-model"),
+        (5, "tool", "query_daily_prices"),
+        (5, "model", "analyst-model"),
+        (2, "model", "coordinator-model"),
+    ]
+    spans = {span.name: span for _, span in root.walk() if span.kind == "tool"}
+    assert spans["search_web"].duration >= SEARCH_SECONDS
+    assert spans["query_daily_prices"].duration >= BIGQUERY_SECONDS
+    kinds = root.totals_by_kind()
+    assert kinds["tool"] >= SEARCH_SECONDS + BIGQUERY_SECONDS
+    assert kinds["model"] >= 5 * MODEL_SECONDS
+    assert abs(sum(kinds.values()) - root.duration) < 1e-6
+    assert len(plugin.runs) == 1  # the AgentTool run is nested, not a new run
+
+    collapsed = format_collapsed(root).splitlines()
+    assert any(
+        line.startswith(
+            "run:advisor;agent:financial_coordinator;tool:data_analyst_agent;"
+            "run:advisor;agent:data_analyst_agent;tool:search_web "
+        )
+        for line in collapsed
+    )
+
+
+def test_metrics_and_prometheus_export():
+    registry = MetricsRegistry()
+    _run([InstrumentationPlugin(registry=registry)], runs=2)
+
+    coordinator = {"agent": "financial_coordinator", "model": "coordinator-model"}
+    analyst = {"agent": "data_analyst_agent", "model": "analyst-model"}
+    # Usage metadata when the model reports it, estimates otherwise.
+    assert registry.counter("adk_model_tokens_total", kind="prompt", **coordinator) == 4000
+    assert registry.counter("adk_model_tokens_total", kind="completion", **coordinator) == 800
+    assert registry.counter("adk_model_tokens_total", kind="completion", **analyst) > 0
+    assert registry.counter("adk_model_calls_total", status="ok", **analyst) == 6
+    tool = {"agent": "data_analyst_agent", "tool": "search_web"}
+    assert registry.counter("adk_tool_calls_total", status="ok", **tool) == 2
+    assert registry.histogram("adk_tool_duration_seconds", **tool).mean >= SEARCH_SECONDS
+    assert registry.histogram("adk_tool_result_chars", **tool).sum > 0
+    assert registry.histogram("adk_run_duration_seconds", app="advisor").count == 2
+
+    text = registry.to_prometheus()
+    assert "# TYPE adk_tool_duration_seconds histogram" in text
+    assert (
+        'adk_tool_calls_total{agent="data_analyst_agent",status="ok",tool="search_web"} 2'
+        in text
+    )
+    assert (
+        'adk_tool_duration_seconds_bucket{agent="data_analyst_agent",'
+        'tool="search_web",le="+Inf"} 2' in text
+    )
+
+
+def test_opentelemetry_sink():
+    try:
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    except ImportError:
+        print("   - opentelemetry-sdk not installed, skipping")
+        return
+    reader = InMemoryMetricReader()
+    meter = MeterProvider(metric_readers=[reader]).get_meter("test")
+    registry = MetricsRegistry()
+    registry.add_sink(OpenTelemetrySink(meter))
+    _run([InstrumentationPlugin(registry=registry)])
+
+    exported = {
+        metric.name: metric
+        for resource in reader.get_metrics_data().resource_metrics
+        for scope in resource.scope_metrics
+        for metric in scope.metrics
+    }
+    assert "adk_model_duration_seconds" in exported
+    points = exported["adk_tool_calls_total"].data.data_points
+    assert {p.attributes["tool"] for p in points} == {
+        "data_analyst_agent",
+        "search_web",
+        "query_daily_prices",
+    }
+
+
+def test_tool_errors_are_recorded():
+    async def flaky_search(query: str) -> dict:
+        """Fails like an exhausted search quota."""
+        raise RuntimeError("quota exceeded")
+
+    agent = LlmAgent(
+        name="data_analyst_agent",
+        model=_ScriptedLlm(model="m", calls=[("flaky_search", {"query": "AAPL"})]),
+        tools=[flaky_search],
+    )
+    plugin = InstrumentationPlugin()
+
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="advisor", plugins=[plugin])
+        session = await runner.session_service.create_session(
+            app_name="advisor", user_id="u"
+        )
+        try:
+            async for _ in runner.run_async(
+                user_id="u",
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text="hi")]),
+            ):
+                pass
+        except RuntimeError:
+            pass
+
+    asyncio.run(run())
+    labels = {"agent": "data_analyst_agent", "tool": "flaky_search"}
+    assert plugin.registry.counter("adk_tool_calls_total", status="error", **labels) == 1
+    assert plugin.registry.histogram("adk_tool_result_chars", **labels) is None
+
+
+def test_entry_points_pick_up_the_env_flag():
+    import financial_advisor_agent.agent as advisor
+
+    assert advisor.app.plugins == []
+    os.environ["ADK_INSTRUMENTATION"] = "1"
+    try:
+        plugin = instrumentation.default_plugin()
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = JsonlSink(os.path.join(tmp, "results.jsonl"))
+            runner = BatchRunner(_advisor(), sink)
+            sink.close()
+        assert runner.runner.plugin_manager.get_plugin(plugin.name) is plugin
+    finally:
+        os.environ.pop("ADK_INSTRUMENTATION")
+
+    # Agent Engine pickles the deployed app together with its plugins.
+    copy = pickle.loads(pickle.dumps(InstrumentationPlugin()))
+    _run([copy])
+    assert copy.last_run() is not None
+    assert copy.registry.counter("adk_tool_calls_total", status="ok",
+                                 agent="data_analyst_agent", tool="search_web") == 1
+
+
+def test_disabled_plugin_is_cheap():
+    plugin = InstrumentationPlugin(enabled=False)
+    request = LlmRequest(
+        contents=[types.Content(role="user", parts=[types.Part(text="x" * 10_000)])]
+    )
+
+    async def hammer(n):
+        start = time.perf_counter()
+        for _ in range(n):
+            await plugin.before_model_callback(callback_context=None, llm_request=request)
+            await plugin.after_model_callback(callback_context=None, llm_response=None)
+        return (time.perf_counter() - start) / (2 * n)
+
+    per_callback = asyncio.run(hammer(20_000))
+    print(f"   - disabled callback: {per_callback * 1e6:.2f} us")
+    _run([plugin])
+    assert plugin.last_run() is None
+    assert plugin.registry.to_prometheus().strip().splitlines() == []
+    assert per_callback < 20e-6
+
+    start = time.perf_counter()
+    _run([], runs=20)
+    bare = time.perf_counter() - start
+    start = time.perf_counter()
+    _run([InstrumentationPlugin()], runs=20)
+    instrumented = time.perf_counter() - start
+    print(f"   - 20 runs: {bare * 1000:.0f} ms bare, {instrumented * 1000:.0f} ms instrumented")
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing run instrumentation...\n")
+
+    tests = [
+        ("Flame Summary", test_flame_summary_of_advisory_run),
+        ("Prometheus Export", test_metrics_and_prometheus_export),
+        ("OpenTelemetry Sink", test_opentelemetry_sink),
+        ("Tool Errors", test_tool_errors_are_recorded),
+        ("Entry Point Wiring", test_entry_points_pick_up_the_env_flag),
+        ("Disabled Overhead", test_disabled_plugin_is_cheap),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for per-run loop budgets.
+
+A stub analyst keeps calling a SQL tool: either retrying the same failing
+query, or a new query every turn. Each budget must end the run with an
+answer, whether the model obeys the wrap-up instruction or keeps calling.
+
+    python -m pytest shared_libraries/test_loop_budget.py
+    python -m shared_libraries.test_loop_budget --benchmark
+"""
+
+import asyncio
+import os
+import sys
+import time
+import warnings
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from shared_libraries import loop_budget
+from shared_libraries.loop_budget import (
+    MODEL_TURNS,
+    REPEATED_CALLS,
+    TOKENS,
+    TOOL_CALLS,
+    WALL_CLOCK,
+    WRAP_UP_INSTRUCTION,
+    Budget,
+    LoopGuard,
+)
+
+AGENT = "bq_data_analyst_agent"
+
+
+class _LoopingLlm(BaseLlm):
+    """Stub analyst that calls ``run_sql`` every turn.
+
+    ``same_query`` retries one query; otherwise each turn asks a new one.
+    With ``obey`` it answers in text once function calling is switched off;
+    it gives up by itself after ``stop_after`` calls.
+    """
+
+    same_query: bool = True
+    obey: bool = False
+    stop_after: int = 1000
+    tokens_per_call: int = 0
+    latency: float = 0.0
+    calls: int = 0
+    system_instructions: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        self.system_instructions.append(llm_request.config.system_instruction or "")
+        await asyncio.sleep(self.latency)
+        tool_config = llm_request.config.tool_config
+        calling_off = tool_config is not None and tool_config.function_calling_config.mode == "NONE"
+        if self.calls > self.stop_after or (self.obey and calling_off):
+            part = types.Part(text=f"Answer after {self.calls} calls: volume is up 12%.")
+        else:
+            query = "SELECT AVG(volume) FROM prices" if self.same_query else f"SELECT {self.calls}"
+            part = types.Part(function_call=types.FunctionCall(name="run_sql", args={"query": query}))
+        usage = types.GenerateContentResponseUsageMetadata(total_token_count=self.tokens_per_call)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=usage if self.tokens_per_call else None,
+        )
+
+
+_queries = []
+_clock = [0.0]
+_tool_seconds = [0.0]
+
+
+def run_sql(query: str) -> dict:
+    """Runs a query.
+
+    Args:
+        query: BigQuery SQL.
+
+    Returns:
+        dict: status and rows or error_details.
+    """
+    _queries.append(query)
+    _clock[0] += _tool_seconds[0]
+    if query.startswith("SELECT AVG"):
+        return {"status": "ERROR", "error_details": "Unrecognized name: volume at [1:12]"}
+    return {"status": "SUCCESS", "rows": [{"n": len(_queries)}]}
+
+
+def _run(guard, model, question="How did trading volume change?"):
+    """Runs one question through a stub analyst guarded by ``guard``; returns the answer."""
+    _queries.clear()
+    agent = LlmAgent(
+        name=AGENT, model=model, instruction="Answer with BigQuery.", tools=[run_sql],
+        before_model_callback=guard.before_model, after_model_callback=guard.after_model,
+        before_tool_callback=guard.before_tool, after_tool_callback=guard.after_tool,
+    )
+
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="budget")
+        session = await runner.session_service.create_session(app_name="budget", user_id="u")
+        answer = None
+        async for event in runner.run_async(
+            user_id="u", session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=question)]),
+        ):
+            if event.is_final_response() and event.content and event.content.parts:
+                answer = event.content.parts[0].text
+        return answer
+
+    return asyncio.run(run())
+
+
+def _guard(**limits):
+    _clock[0] = 0.0
+    _tool_seconds[0] = 0.0
+    budget = Budget(**{**dict(max_tool_calls=None, max_model_turns=None, max_seconds=None,
+                              max_tokens=None, max_identical_calls=None), **limits})
+    return LoopGuard(budgets={AGENT: budget}, clock=lambda: _clock[0])
+
+
+def test_repeated_identical_calls_end_with_partial_answer():
+    guard = _guard(max_identical_calls=2)
+    model = _LoopingLlm(model="stub", system_instructions=[])
+    answer = _run(guard, model)
+    # Two executions, a refused third call, then a wrap-up turn the model ignores.
+    assert len(_queries) == 2 and model.calls == 4
+    assert answer.startswith("I stopped working on this request")
+    assert "same tool call kept being repeated" in answer
+    assert "Unrecognized name: volume" in answer
+    assert guard.stats.repeated_calls == 1 and guard.stats.partial_answers == 1
+    assert guard.stats.exceeded == {(AGENT, REPEATED_CALLS): 1}
+
+
+def test_tool_budget_wrap_up_turn_lets_the_model_answer():
+    guard = _guard(max_tool_calls=3)
+    model = _LoopingLlm(model="stub", same_query=False, obey=True, system_instructions=[])
+    answer = _run(guard, model)
+    assert _queries == ["SELECT 1", "SELECT 2", "SELECT 3"]
+    assert answer == "Answer after 5 calls: volume is up 12%."
+    assert WRAP_UP_INSTRUCTION in model.system_instructions[-1]
+    assert WRAP_UP_INSTRUCTION not in model.system_instructions[-2]
+    assert guard.stats.exceeded == {(AGENT, TOOL_CALLS): 1} and guard.stats.partial_answers == 0
+
+
+def test_model_turn_and_token_budgets():
+    guard = _guard(max_model_turns=3)
+    model = _LoopingLlm(model="stub", same_query=False, system_instructions=[])
+    answer = _run(guard, model)
+    # The third turn is the wrap-up; its function call is replaced.
+    assert model.calls == 3 and len(_queries) == 2
+    assert "more than 3 model turns" in answer and '"n": 2' in answer
+    assert guard.stats.exceeded == {(AGENT, MODEL_TURNS): 1}
+
+    guard = _guard(max_tokens=2_500)
+    model = _LoopingLlm(model="stub", same_query=False, tokens_per_call=1_000, system_instructions=[])
+    answer = _run(guard, model)
+    assert model.calls == 4 and guard.stats.tokens == 4_000
+    assert "more than 2500 tokens" in answer
+    assert guard.stats.exceeded == {(AGENT, TOKENS): 1}
+
+
+def test_wall_clock_ends_without_another_model_call():
+    guard = _guard(max_seconds=10)
+    _tool_seconds[0] = 6.0
+    model = _LoopingLlm(model="stub", same_query=False, system_instructions=[])
+    answer = _run(guard, model)
+    assert model.calls == 2 and len(_queries) == 2
+    assert "more than 10 seconds" in answer and '"n": 1' in answer and '"n": 2' in answer
+    assert guard.stats.exceeded == {(AGENT, WALL_CLOCK): 1}
+
+
+def test_runs_are_budgeted_separately():
+    guard = _guard(max_tool_calls=2)
+    model = _LoopingLlm(model="stub", same_query=False, obey=True, system_instructions=[])
+    _run(guard, model)
+    model.calls = 0
+    _run(guard, model)
+    assert len(_queries) == 2 and guard.stats.runs == 2
+    assert guard.stats.exceeded == {(AGENT, TOOL_CALLS): 2}
+
+
+def test_disabled_guard_only_counts():
+    guard = _guard(max_identical_calls=2, max_model_turns=3)
+    guard.enabled = False
+    model = _LoopingLlm(model="stub", stop_after=6, system_instructions=[])
+    answer = _run(guard, model)
+    assert len(_queries) == 6 and answer.startswith("Answer after 7 calls")
+    assert guard.stats.model_turns == 7 and guard.stats.tool_calls == 6
+    assert guard.stats.blocked_calls == 0 and not guard.stats.exceeded
+
+
+def test_budgets_from_env_and_research_wiring():
+    os.environ["LOOP_BUDGETS"] = '{"bq_data_analyst_agent": {"max_tool_calls": 30}}'
+    loop_budget._default_guard = None
+    try:
+        budget = loop_budget.default_guard().budget(AGENT)
+        assert budget.max_tool_calls == 30 and budget.max_model_turns == 16
+        assert loop_budget.default_guard().budget("other").max_tool_calls == Budget().max_tool_calls
+    finally:
+        os.environ.pop("LOOP_BUDGETS")
+        loop_budget._default_guard = None
+
+    from google.adk.agents import config_agent_utils
+
+    path = os.path.join(os.path.dirname(__file__), "..", "my_vizteaching_assistant", "research_sub_agent_1.yaml")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        agent = config_agent_utils.from_config(path)
+    assert agent.before_model_callback[0] is loop_budget.budget_before_model
+    assert agent.after_model_callback[-1] is loop_budget.budget_after_model
+
+
+def benchmark(questions=10, latency=0.05):
+    """Wall time and model calls of a retry-looping analyst with and without budgets."""
+    results = {}
+    for label, enabled in (("unguarded", False), ("budgeted", True)):
+        guard = LoopGuard()
+        guard.enabled = enabled
+        start = time.perf_counter()
+        calls = 0
+        for _ in range(questions):
+            # Unguarded, the stub gives up after 30 retries (ADK would allow 500).
+            model = _LoopingLlm(model="stub", stop_after=30, latency=latency, system_instructions=[])
+            _run(guard, model)
+            calls += model.calls
+        results[label] = (time.perf_counter() - start, calls)
+        print(f"   - {label}: {results[label][0]:.2f}s, {calls / questions:.0f} model calls per question")
+    speedup = results["unguarded"][0] / results["budgeted"][0]
+    print(f"   - {speedup:.1f}x less time per looping question")
+    return speedup
+
+
+def test_benchmark_small():
+    assert benchmark(questions=2, latency=0.02) > 3
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing loop budgets...\n")
+
+    tests = [
+        ("Repeated Identical Calls", test_repeated_identical_calls_end_with_partial_answer),
+        ("Tool Budget Wrap-up", test_tool_budget_wrap_up_turn_lets_the_model_answer),
+        ("Model Turn and Token Budgets", test_model_turn_and_token_budgets),
+        ("Wall Clock", test_wall_clock_ends_without_another_model_call),
+        ("Separate Runs", test_runs_are_budgeted_separately),
+        ("Disabled Guard", test_disabled_guard_only_counts),
+        ("Env Budgets and Research Wiring", test_budgets_from_env_and_research_wiring),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (10 questions, stub analyst retrying one failing query, 50 ms per call)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the per-user memory service.
+
+The index is checked against exact search on clustered random vectors; the
+service and the teaching assistant wiring run offline with hashing
+embeddings and a stub model that answers with grounding metadata.
+
+    python -m pytest shared_libraries/test_memory_service.py
+    python -m shared_libraries.test_memory_service --benchmark
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from google.adk.agents import LlmAgent
+from google.adk.events import Event
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.adk.sessions import Session
+from google.genai import types
+
+from shared_libraries import memory_service, search_cache
+from shared_libraries.memory_service import (
+    FINDING,
+    SUMMARY,
+    RecallMemoryTool,
+    VectorIndex,
+    VectorMemoryService,
+    remember_after_agent,
+    session_memories,
+)
+
+
+def _clustered(n, dimensions=64, clusters=200, noise=0.08, seed=0):
+    """Unit vectors around ``clusters`` topics; the topics depend only on the dimensions."""
+    centers = np.random.default_rng(dimensions).standard_normal((clusters, dimensions))
+    centers = (centers / np.linalg.norm(centers, axis=1, keepdims=True)).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    vectors = centers[rng.integers(0, clusters, n)]
+    vectors += noise * rng.standard_normal((n, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _queries(data, n, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = data[rng.integers(0, len(data), n)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def _recall(index, data, queries, k=10):
+    hits = 0
+    for query in queries:
+        exact = np.argsort(-(data @ query))[:k]
+        rows, _ = index.search(query, k)
+        hits += len(set(exact.tolist()) & set(rows.tolist()))
+    return hits / (k * len(queries))
+
+
+def _grounded(author, text, title, uri):
+    return Event(
+        author=author,
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        grounding_metadata=types.GroundingMetadata(
+            grounding_chunks=[types.GroundingChunk(web=types.GroundingChunkWeb(title=title, uri=uri))],
+            web_search_queries=[text.split(".")[0]],
+        ),
+    )
+
+
+def _user(text):
+    return Event(author="user", content=types.Content(role="user", parts=[types.Part(text=text)]))
+
+
+def _session(session_id, user_id, *events):
+    return Session(
+        id=session_id, app_name="teacher", user_id=user_id, events=list(events),
+        last_update_time=1760000000.0,
+    )
+
+
+SQL_SESSION = (
+    _user("I want to learn SQL for data analysis in 8 weeks, I know Excel already"),
+    _grounded(
+        "teacher",
+        "SQL plan. Week 1 covers SELECT and WHERE, week 2 joins, week 3 GROUP BY aggregation.",
+        "SQL Tutorial", "https://www.w3schools.com/sql/",
+    ),
+)
+GUITAR_SESSION = (
+    _user("Teach me guitar chords for beginners"),
+    _grounded("teacher", "Guitar basics. Start with the open chords C, G, D and E minor.",
+              "Beginner chords", "https://www.justinguitar.com/"),
+)
+
+
+def test_index_exact_then_approximate():
+    data = _clustered(16_000)
+    index = VectorIndex(64, train_after=4_000, n_probe=12)
+    index.add(data[:3_000])
+    assert index._centroids is None
+    assert _recall(index, data[:3_000], _queries(data[:3_000], 20)) == 1.0
+
+    # Inserts one at a time cross the training threshold and a retraining.
+    for vector in data[3_000:6_000]:
+        index.add(vector)
+    index.add(data[6_000:])
+    assert index._centroids is not None and index._trained_at == 16_000
+    assert len(index) == 16_000
+    assert _recall(index, data, _queries(data, 50)) >= 0.9
+
+    rows, _ = index.search(data[42], 1)
+    assert rows[0] == 42
+    index.remove(42)
+    assert 42 not in index.search(data[42], 10)[0]
+
+
+def test_session_memories():
+    memories = session_memories(_session("s1", "ana", *SQL_SESSION))
+    summary, finding = memories
+    assert summary.id == "s1:summary" and summary.kind == SUMMARY
+    assert summary.text.startswith("Student asked: I want to learn SQL") and "Covered: SQL plan" in summary.text
+    assert finding.kind == FINDING and "Sources: SQL Tutorial (https://www.w3schools.com/sql/)" in finding.text
+    assert finding.metadata["queries"] == ["SQL plan"]
+
+
+def test_per_user_recall_and_persistence():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "memory.db")
+        service = VectorMemoryService(path=path)
+        asyncio.run(service.add_session_to_memory(_session("s1", "ana", *SQL_SESSION)))
+        asyncio.run(service.add_session_to_memory(_session("s2", "ana", *GUITAR_SESSION)))
+        asyncio.run(service.add_session_to_memory(_session("s3", "ben", *GUITAR_SESSION)))
+
+        found = service.recall("teacher", "ana", "what was my SQL plan for joins?")
+        assert {memory.kind for memory, _ in found[:2]} == {SUMMARY, FINDING}
+        assert all(memory.session_id == "s1" for memory, _ in found[:2])
+        assert service.recall("teacher", "ben", "SQL joins GROUP BY plan") == []
+        others = service.recall("teacher", "ana", "SQL plan", exclude_session="s1")
+        assert all(memory.session_id == "s2" for memory, _ in others)
+
+        # Re-adding a grown session replaces its summary and skips known findings.
+        grown = _session("s1", "ana", *SQL_SESSION, _user("Add window functions to week 4"))
+        assert service.remember("teacher", "ana", session_memories(grown)) == 1
+        assert len(service._user("teacher", "ana").index) == 4
+
+        reloaded = VectorMemoryService(path=path)
+        response = asyncio.run(reloaded.search_memory(
+            app_name="teacher", user_id="ana", query="window functions in my SQL plan"
+        ))
+        assert "window functions" in response.memories[0].content.parts[0].text
+        assert response.memories[0].timestamp.startswith("2025-10-09")
+
+
+class _TeacherLlm(BaseLlm):
+    """Stub teacher: answers with a grounded plan and keeps its system prompts."""
+
+    instructions: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.instructions.append(llm_request.config.system_instruction or "")
+        question = llm_request.contents[-1].parts[0].text
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=f"Plan for: {question}.")]),
+            grounding_metadata=types.GroundingMetadata(grounding_chunks=[
+                types.GroundingChunk(web=types.GroundingChunkWeb(title="Docs", uri="https://docs.example"))
+            ]),
+        )
+
+
+def test_teaching_assistant_recalls_earlier_sessions():
+    service = VectorMemoryService()
+    model = _TeacherLlm(model="stub", instructions=[])
+    agent = LlmAgent(
+        name="teaching_assistant", model=model, instruction="Help students learn.",
+        tools=[RecallMemoryTool(service)], after_agent_callback=remember_after_agent,
+    )
+
+    async def ask(question):
+        runner = InMemoryRunner(agent=agent, app_name="teacher")
+        session = await runner.session_service.create_session(app_name="teacher", user_id="ana")
+        async for _ in runner.run_async(
+            user_id="ana", session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=question)]),
+        ):
+            pass
+
+    memory_service._default_service = service
+    try:
+        asyncio.run(ask("I want to learn SQL for data analysis in 8 weeks"))
+        asyncio.run(ask("Where was I in my SQL for data analysis plan?"))
+    finally:
+        memory_service._default_service = None
+    assert "earlier sessions" not in model.instructions[0]
+    assert "earlier sessions" in model.instructions[1]
+    assert "I want to learn SQL for data analysis in 8 weeks" in model.instructions[1]
+    assert "Sources: Docs (https://docs.example)" in model.instructions[1]
+
+
+def test_personalised_answers_are_not_cached_across_users():
+    """A cached answer built on one student's memories is not served to another."""
+    service = VectorMemoryService()
+    asyncio.run(service.add_session_to_memory(_session("s1", "ana", *SQL_SESSION)))
+    model = _TeacherLlm(model="stub", instructions=[])
+    agent = LlmAgent(
+        name="teaching_assistant", model=model, instruction="Help students learn.",
+        tools=[RecallMemoryTool(service)],
+        before_model_callback=search_cache.cache_search_before_model,
+        after_model_callback=search_cache.cache_search_after_model,
+    )
+
+    async def ask(user_id, question):
+        runner = InMemoryRunner(agent=agent, app_name="teacher")
+        session = await runner.session_service.create_session(app_name="teacher", user_id=user_id)
+        async for _ in runner.run_async(
+            user_id=user_id, session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=question)]),
+        ):
+            pass
+
+    search_cache._default_cache = search_cache.SearchCache()
+    try:
+        question = "What should I study next in my SQL plan?"
+        asyncio.run(ask("ana", question))
+        asyncio.run(ask("ben", question))
+        asyncio.run(ask("cal", question))
+    finally:
+        search_cache._default_cache = None
+    # Ana's personalised answer is cached for Ana only; Ben and Cal share one.
+    assert len(model.instructions) == 2
+    assert "earlier sessions" in model.instructions[0]
+    assert "earlier sessions" not in model.instructions[1]
+
+
+def benchmark(n=1_000_000, dimensions=128, queries=200):
+    """Insert rate, search latency and recall@10 of one index holding ``n`` memories."""
+    data = np.zeros((n, dimensions), dtype=np.float32)
+    index = VectorIndex(dimensions)
+    start = time.perf_counter()
+    for begin in range(0, n, 100_000):
+        batch = _clustered(min(100_000, n - begin), dimensions, clusters=2000, seed=begin)
+        data[begin : begin + len(batch)] = batch
+        index.add(batch)
+    build = time.perf_counter() - start
+    probes = _queries(data, queries)
+    latencies = []
+    for query in probes:
+        start = time.perf_counter()
+        index.search(query, 10)
+        latencies.append(time.perf_counter() - start)
+    exact = []
+    for query in probes[:20]:
+        start = time.perf_counter()
+        np.argpartition(-(data @ query), 10)[:10]
+        exact.append(time.perf_counter() - start)
+    recall = _recall(index, data, probes[:50])
+    start = time.perf_counter()
+    for query in probes:
+        index.add(query)
+    insert = (time.perf_counter() - start) / len(probes)
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    print(f"   - {n:,} memories x {dimensions} dims: built in {build:.1f}s, "
+          f"{insert * 1e6:.0f} us per incremental insert")
+    print(f"   - top-10 search: p50 {p50:.2f} ms, p95 {p95:.2f} ms, recall@10 {recall:.2f}")
+    print(f"   - exact search: {np.median(exact) * 1000:.1f} ms")
+    return p50, recall
+
+
+def test_benchmark_small():
+    p50, recall = benchmark(n=100_000, dimensions=64, queries=50)
+    assert p50 < 20 and recall >= 0.9
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing the memory service...\n")
+
+    tests = [
+        ("Index Exact then Approximate", test_index_exact_then_approximate),
+        ("Session Memories", test_session_memories),
+        ("Per-user Recall and Persistence", test_per_user_recall_and_persistence),
+        ("Teaching Assistant Recall", test_teaching_assistant_recalls_earlier_sessions),
+        ("Personalised Answers Not Shared", test_personalised_answers_are_not_cached_across_users),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (1M memories in one index, 128-dim clustered vectors)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for per-call model routing.
+
+A stub model answers with a latency and token usage that depend on the
+model name the router put in the request, so routed and unrouted sessions
+can be compared offline.
+
+    python -m pytest shared_libraries/test_model_router.py
+    python -m shared_libraries.test_model_router --benchmark
+"""
+
+import asyncio
+import dataclasses
+import os
+import sys
+import time
+import types as pytypes
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from shared_libraries import model_router
+from shared_libraries.instrumentation import MetricsRegistry
+from shared_libraries.model_router import (
+    DEFAULT_TIERS,
+    ModelRouter,
+    RoutePolicy,
+    complexity,
+    route_after_model,
+    route_before_model,
+)
+from shared_libraries.parallel import DEADLINE_INVOCATION_STATE_KEY, DEADLINE_STATE_KEY
+
+# Seconds per call of each model in the stub, before the benchmark's scale.
+STUB_LATENCY = {tier.model: tier.latency_seconds / 100 for tier in DEFAULT_TIERS.values()}
+
+ANALYSIS = "Analyze AAPL and propose trading strategies with a risk comparison"
+SESSION = [
+    "hi",
+    ANALYSIS,
+    "thanks!",
+    "What does the P/E ratio mean for this stock and how should I think about "
+    "valuation over the next year given the recent earnings?",
+    "ok",
+]
+
+
+def _request(*texts, tool_result=None, model="gemini-2.5-flash"):
+    contents = [types.Content(role="user", parts=[types.Part(text=t)]) for t in texts]
+    if tool_result is not None:
+        contents.append(types.Content(role="user", parts=[types.Part(
+            function_response=types.FunctionResponse(name="analyze_market", response=tool_result)
+        )]))
+    return LlmRequest(model=model, contents=contents)
+
+
+class _Run:
+    """Stands in for an agent run's invocation context."""
+
+
+def _context(agent_name, state=None, run=None):
+    return pytypes.SimpleNamespace(
+        agent_name=agent_name, invocation_id="inv", state=state or {},
+        _invocation_context=run or _Run(),
+    )
+
+
+class _TieredLlm(BaseLlm):
+    """Stub coordinator: analysis turns call a tool, everything else is answered."""
+
+    models: list = []
+    scale: float = 1.0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.models.append(llm_request.model)
+        await asyncio.sleep(STUB_LATENCY[llm_request.model] * self.scale)
+        last = llm_request.contents[-1]
+        text = " ".join(p.text for p in last.parts if p.text)
+        if last.parts[0].function_response:
+            part = types.Part(text="Report: " + "trend up, moderate risk. " * 40)
+        elif any(word in text.lower() for word in ("analyze", "ratio")):
+            part = types.Part(function_call=types.FunctionCall(
+                name="analyze_market", args={"ticker": "AAPL"}
+            ))
+        else:
+            part = types.Part(text="Happy to help with your investments.")
+        prompt_tokens = sum(len(str(c)) for c in llm_request.contents) // 4
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=len(str(part)) // 4,
+            ),
+        )
+
+
+def analyze_market(ticker: str) -> dict:
+    """Market analysis of a ticker.
+
+    Args:
+        ticker: The ticker symbol.
+
+    Returns:
+        dict: status and report.
+    """
+    return {"status": "success", "report": f"{ticker} closes: " + "185.2, 186.4, 184.9, " * 200}
+
+
+def run_session(router, messages=SESSION, scale=1.0):
+    """Runs ``messages`` against a routed coordinator; returns (models, seconds)."""
+    model = _TieredLlm(model="gemini-2.5-flash", models=[], scale=scale)
+    agent = LlmAgent(
+        name="financial_coordinator",
+        model=model,
+        tools=[analyze_market],
+        before_model_callback=route_before_model,
+        after_model_callback=route_after_model,
+    )
+
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="router")
+        session = await runner.session_service.create_session(app_name="router", user_id="u")
+        for message in messages:
+            async for _ in runner.run_async(
+                user_id="u",
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text=message)]),
+            ):
+                pass
+
+    model_router._default_router = router
+    start = time.perf_counter()
+    try:
+        asyncio.run(run())
+    finally:
+        model_router._default_router = None
+    return model.models, time.perf_counter() - start
+
+
+def test_complexity_signals():
+    assert complexity(_request("hi"))[1] == ["small_talk"]
+    assert complexity(_request("AAPL"))[1] == ["short_turn"]
+    simple = complexity(_request("hi"))[0]
+    analysis, reasons, _ = complexity(_request(ANALYSIS))
+    assert reasons == ["analysis_request"] and analysis > 0.2 > simple
+    synthesis, reasons, tokens = complexity(_request(ANALYSIS, tool_result=analyze_market("AAPL")))
+    assert reasons == ["tool_results", "analysis_request"] and synthesis > analysis
+    assert tokens > 1000
+    large = complexity(_request("Explain the risk report", *["x" * 4000] * 7))
+    assert "large_prompt" in large[1]
+
+
+def test_coordinator_routes_per_turn():
+    router = ModelRouter()
+    models, _ = run_session(router, SESSION[:3])
+    # hi -> lite; analysis and its synthesis -> flash; thanks -> lite.
+    assert models == [
+        "gemini-2.5-flash-lite", "gemini-2.5-flash", "gemini-2.5-flash", "gemini-2.5-flash-lite"
+    ]
+    stats = router.stats.as_dict()["agents"]["financial_coordinator"]
+    assert stats["lite"]["calls"] == 2 and stats["flash"]["calls"] == 2
+    assert stats["flash"]["cost_usd"] > stats["lite"]["cost_usd"] > 0
+    assert router.stats.reasons["financial_coordinator:small_talk"] == 2
+
+
+def test_budgets_step_down():
+    policy = RoutePolicy(default="flash", simple="lite", complex="pro", complex_above=0.7)
+    heavy = _request(*["y" * 4000] * 7, ANALYSIS + " why" * 30, tool_result={"r": 1})
+    assert ModelRouter(policies={"a": policy}).choose("a", heavy).tier == "pro"
+
+    slow = dataclasses.replace(policy, max_latency_seconds=5.0)
+    decision = ModelRouter(policies={"a": slow}).choose("a", heavy)
+    assert decision.tier == "flash" and "latency_budget" in decision.reasons
+
+    cheap = dataclasses.replace(policy, max_cost_usd=0.001)
+    decision = ModelRouter(policies={"a": cheap}).choose("a", heavy)
+    assert decision.tier == "lite" and "cost_budget" in decision.reasons
+
+    state = {DEADLINE_STATE_KEY: time.time() + 2.0}
+    decision = ModelRouter(policies={"a": policy}).choose("a", heavy, state)
+    assert decision.tier == "lite" and "deadline" in decision.reasons
+    # Deadlines left behind by another (aborted) invocation are ignored.
+    stale = {**state, DEADLINE_INVOCATION_STATE_KEY: "aborted"}
+    decision = ModelRouter(policies={"a": policy}).choose("a", heavy, stale, "current")
+    assert decision.tier == "pro" and "deadline" not in decision.reasons
+
+    # Unrouted agents and disabled routing keep the request's model.
+    assert ModelRouter(policies={}).choose("a", heavy).model == "gemini-2.5-flash"
+    disabled = ModelRouter(policies={"a": policy}, enabled=False).choose("a", heavy)
+    assert disabled.tier == "flash" and disabled.reasons == ["not_routed"]
+
+
+def test_observed_latency_moves_the_estimate():
+    now = [0.0]
+    router = ModelRouter(
+        policies={"a": RoutePolicy(max_latency_seconds=4.0)}, latency_smoothing=0.5,
+        clock=lambda: now[0],
+    )
+    models = []
+    for _ in range(3):
+        context, request = _context("a"), _request(ANALYSIS)
+        router.before_model(context, request)
+        models.append(request.model)
+        now[0] += 9.0 if request.model == "gemini-2.5-flash" else 1.0
+        router.after_model(context, LlmResponse(content=types.Content(role="model", parts=[
+            types.Part(text="done")
+        ])))
+    # flash took 9s against a 3s prior: its estimate (6s) now exceeds the budget.
+    assert models == ["gemini-2.5-flash", "gemini-2.5-flash-lite", "gemini-2.5-flash-lite"]
+    assert router.estimate("a", "flash", 100)[0] == 6.0
+    assert router.stats.reasons["a:latency_budget"] == 2
+    stats = router.stats.tiers[("a", "flash")].as_dict()
+    assert stats["calls"] == 1 and stats["p95_seconds"] == 9.0
+    assert stats["completion_tokens"] > 0 and stats["cost_usd"] > 0
+
+
+def test_hedged_attempts_and_errors_keep_their_own_decisions():
+    now = [0.0]
+    router = ModelRouter(policies={"a": RoutePolicy()}, clock=lambda: now[0])
+    done = LlmResponse(content=types.Content(role="model", parts=[types.Part(text="done")]))
+    # Two attempts of one worker in the same invocation, overlapping.
+    first, hedge = _Run(), _Run()
+    router.before_model(_context("a", run=first), _request(ANALYSIS))
+    now[0] += 1.0
+    router.before_model(_context("a", run=hedge), _request(ANALYSIS))
+    now[0] += 2.0
+    router.after_model(_context("a", run=first), done)
+    router.after_model(_context("a", run=hedge), done)
+    stats = router.stats.tiers[("a", "flash")]
+    assert stats.calls == 2 and sorted(stats.durations) == [2.0, 3.0]
+
+    failed = _Run()
+    router.before_model(_context("a", run=failed), _request(ANALYSIS))
+    router.on_model_error(_context("a", run=failed), _request(ANALYSIS), RuntimeError("500"))
+    assert stats.errors == 1 and stats.calls == 2 and not router._pending
+
+    # A run that ends without either callback takes its decision with it.
+    cancelled = _Run()
+    router.before_model(_context("a", run=cancelled), _request(ANALYSIS))
+    del cancelled
+    router.before_model(_context("a", run=first), _request(ANALYSIS))
+    assert list(router._pending) == [(id(first), "a")]
+
+
+def test_env_config_and_registry():
+    env = {
+        "MODEL_ROUTES": '{"risk_analyst_agent": {"complex": "pro"}, "my_agent": {"simple": "lite"}}',
+        "MODEL_TIER_LITE": "gemini-2.0-flash-lite",
+        "MODEL_ROUTING": "0",
+    }
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    model_router._default_router = None
+    try:
+        router = model_router.default_router()
+        assert not router.enabled
+        assert router.tiers["lite"].model == "gemini-2.0-flash-lite"
+        assert router.policies["risk_analyst_agent"].complex == "pro"
+        assert router.policies["my_agent"] == RoutePolicy(simple="lite")
+        assert router.policies["financial_coordinator"].simple == "lite"
+    finally:
+        model_router._default_router = None
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    registry = MetricsRegistry()
+    router = ModelRouter(registry=registry)
+    run_session(router, SESSION[:1])
+    labels = {"agent": "financial_coordinator", "tier": "lite", "model": "gemini-2.5-flash-lite"}
+    assert registry.counter("adk_route_calls_total", **labels) == 1
+    assert registry.counter("adk_route_cost_usd_total", **labels) > 0
+    assert registry.histogram("adk_route_duration_seconds", **labels).count == 1
+
+
+def benchmark(scale=5.0, repeat=1):
+    """Cost and latency of a coordinator session, flash everywhere vs routed."""
+    results = {}
+    for enabled in (False, True):
+        router = ModelRouter(enabled=enabled)
+        _, seconds = run_session(router, SESSION * repeat, scale=scale)
+        results[enabled] = (router.stats.cost_usd, seconds)
+        calls = {
+            tier: stats.calls for (_, tier), stats in sorted(router.stats.tiers.items())
+        }
+        print(f"   - {'routed' if enabled else 'flash only'}: {calls}, "
+              f"${router.stats.cost_usd * 1000:.3f} per 1k sessions, {seconds:.2f}s")
+    (cost_off, seconds_off), (cost_on, seconds_on) = results[False], results[True]
+    print(f"   - cost {1 - cost_on / cost_off:.0%} lower, latency {1 - seconds_on / seconds_off:.0%} lower")
+    return cost_on / cost_off, seconds_on / seconds_off
+
+
+def test_benchmark_small():
+    cost, seconds = benchmark(scale=2.0)
+    assert cost < 0.9 and seconds < 0.9
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing model routing...\n")
+
+    tests = [
+        ("Complexity Signals", test_complexity_signals),
+        ("Coordinator Routing", test_coordinator_routes_per_turn),
+        ("Budgets", test_budgets_step_down),
+        ("Observed Latency", test_observed_latency_moves_the_estimate),
+        ("Hedged Attempts and Errors", test_hedged_attempts_and_errors_keep_their_own_decisions),
+        ("Environment and Registry", test_env_config_and_registry),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (5-turn coordinator session, stub latency = tier prior / 20)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
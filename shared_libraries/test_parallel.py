@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Simulation tests for the deadline/hedging fan-out used by the research coordinator.
+
+Fake research workers draw their latency from a heavy-tailed (Pareto)
+distribution, like Google Search-backed sub-agents do in practice. The
+simulation compares the p99 latency of a plain "wait for everyone" fan-out
+against the hedged, deadline-bounded one.
+"""
+
+import asyncio
+import random
+import time
+
+from google.adk.agents import LlmAgent, SequentialAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from shared_libraries.parallel import (
+    DEADLINE_STATE_KEY,
+    DeadlineParallelAgent,
+    FanOut,
+    FanOutPolicy,
+    fan_out_deadline,
+)
+
+WORKERS = ["research_sub_agent_1", "research_sub_agent_2"]
+TRIALS = 400
+BATCH = 10
+
+
+def _pareto_latency(rng, scale=0.004, alpha=1.3, cap=1.5):
+    """Heavy-tailed latency in seconds (most calls fast, a few very slow)."""
+    return min(scale * rng.paretovariate(alpha), cap)
+
+
+def _make_workers(rng):
+    def factory(name):
+        async def worker(attempt):
+            await asyncio.sleep(_pareto_latency(rng))
+            yield f"{name} findings (attempt {attempt})"
+
+        return worker
+
+    return {name: factory(name) for name in WORKERS}
+
+
+async def _run_trial(policy, rng):
+    fan_out = FanOut(_make_workers(rng), policy)
+    results = [item async for item in fan_out.run()]
+    return fan_out.report, results
+
+
+def _p99(values):
+    ordered = sorted(values)
+    return ordered[int(0.99 * (len(ordered) - 1))]
+
+
+async def _simulate(policy, seed):
+    rng = random.Random(seed)
+    trials = []
+    # Small concurrent batches keep event-loop overhead out of the measurement.
+    for _ in range(TRIALS // BATCH):
+        trials += await asyncio.gather(*(_run_trial(policy, rng) for _ in range(BATCH)))
+    latencies = [report.elapsed_seconds for report, _ in trials]
+    delivered = sum(len(results) for _, results in trials)
+    return latencies, delivered / (TRIALS * len(WORKERS)), trials
+
+
+def test_hedging_and_deadline_cut_p99():
+    """Hedged, deadline-bounded fan-outs have a much lower p99 than waiting."""
+    baseline, baseline_ratio, _ = asyncio.run(_simulate(FanOutPolicy(), seed=7))
+    hedged, hedged_ratio, trials = asyncio.run(
+        _simulate(
+            FanOutPolicy(deadline_seconds=0.08, hedge_after_seconds=0.02), seed=7
+        )
+    )
+
+    print(f"   - baseline p99: {_p99(baseline) * 1000:.1f} ms, "
+          f"results delivered: {baseline_ratio:.1%}")
+    print(f"   - hedged p99:   {_p99(hedged) * 1000:.1f} ms, "
+          f"results delivered: {hedged_ratio:.1%}")
+
+    assert baseline_ratio == 1.0
+    assert _p99(hedged) < 0.5 * _p99(baseline)
+    assert _p99(hedged) < 0.08 + 0.03
+    assert hedged_ratio >= 0.97
+    assert any(report.hedged for report, _ in trials)
+
+
+def test_deadline_returns_partial_results():
+    """A worker that never answers is cancelled and reported as timed out."""
+
+    async def fast(attempt):
+        yield "fast findings"
+
+    async def stuck(attempt):
+        await asyncio.sleep(30)
+        yield "never"
+
+    async def run():
+        fan_out = FanOut({"fast": fast, "stuck": stuck}, FanOutPolicy(deadline_seconds=0.05))
+        results = [item async for item in fan_out.run()]
+        return fan_out.report, results
+
+    start = time.monotonic()
+    report, results = asyncio.run(run())
+    assert time.monotonic() - start < 1.0
+    assert results == [("fast", "fast findings")]
+    assert report.completed == ["fast"]
+    assert report.timed_out == ["stuck"]
+    assert report.partial
+
+
+def test_hedge_wins_and_output_is_not_duplicated():
+    """The first attempt to answer claims the worker; the other is cancelled."""
+    cancelled = []
+
+    async def slow_primary(attempt):
+        try:
+            await asyncio.sleep(0.5 if attempt == 0 else 0.01)
+            yield f"attempt {attempt}"
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+
+    async def run():
+        fan_out = FanOut({"w": slow_primary}, FanOutPolicy(hedge_after_seconds=0.02))
+        results = [item async for item in fan_out.run()]
+        return fan_out.report, results
+
+    report, results = asyncio.run(run())
+    assert results == [("w", "attempt 1")]
+    assert report.winning_attempt == {"w": 1}
+    assert report.hedged == ["w"]
+    assert cancelled == [0]
+
+
+def test_failed_worker_does_not_abort_fan_out():
+    async def broken(attempt):
+        raise RuntimeError("search backend down")
+        yield
+
+    async def ok(attempt):
+        yield "ok"
+
+    async def run():
+        fan_out = FanOut({"broken": broken, "ok": ok}, FanOutPolicy())
+        results = [item async for item in fan_out.run()]
+        return fan_out.report, results
+
+    report, results = asyncio.run(run())
+    assert results == [("ok", "ok")]
+    assert "broken" in report.failed
+    assert report.timed_out == []
+
+
+class _SleepyLlm(BaseLlm):
+    """Fake model answering after a fixed delay."""
+
+    delay: float = 0.0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        await asyncio.sleep(self.delay)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=self.model)])
+        )
+
+
+def test_deadline_parallel_agent_with_runner():
+    """End to end through the ADK runner: the slow researcher is dropped."""
+    coordinator = DeadlineParallelAgent(
+        name="research_coordinator",
+        deadline_seconds=0.3,
+        sub_agents=[
+            LlmAgent(name="fast_researcher", model=_SleepyLlm(model="fast findings")),
+            LlmAgent(
+                name="slow_researcher",
+                model=_SleepyLlm(model="slow findings", delay=30),
+            ),
+        ],
+    )
+
+    async def run():
+        runner = InMemoryRunner(agent=coordinator, app_name="research")
+        session = await runner.session_service.create_session(
+            app_name="research", user_id="student"
+        )
+        texts = []
+        async for event in runner.run_async(
+            user_id="student",
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text="topic")]),
+        ):
+            if event.content and event.content.parts:
+                texts.extend(p.text for p in event.content.parts if p.text)
+        session = await runner.session_service.get_session(
+            app_name="research", user_id="student", session_id=session.id
+        )
+        return texts, session.state
+
+    start = time.monotonic()
+    texts, state = asyncio.run(run())
+    assert time.monotonic() - start < 5
+    assert texts == ["fast findings"]
+    status = state["research_worker_status"]
+    assert status["completed"] == ["fast_researcher"]
+    assert status["timed_out"] == ["slow_researcher"]
+    assert status["partial"] is True
+
+
+def test_aborted_run_does_not_leak_its_deadline():
+    """A client disconnect mid fan-out leaves the deadline in state; the next turn ignores it."""
+    coordinator = DeadlineParallelAgent(
+        name="research_coordinator",
+        deadline_seconds=0.3,
+        sub_agents=[
+            LlmAgent(name="first_researcher", model=_SleepyLlm(model="first findings", delay=0.01)),
+            LlmAgent(name="second_researcher", model=_SleepyLlm(model="second findings", delay=0.01)),
+        ],
+    )
+
+    async def run():
+        runner = InMemoryRunner(agent=coordinator, app_name="research")
+        session = await runner.session_service.create_session(
+            app_name="research", user_id="student"
+        )
+
+        def turn():
+            return runner.run_async(
+                user_id="student",
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text="topic")]),
+            )
+
+        aborted = turn()
+        await aborted.__anext__()
+        await aborted.aclose()
+        left = await runner.session_service.get_session(
+            app_name="research", user_id="student", session_id=session.id
+        )
+        await asyncio.sleep(0.4)
+        texts = []
+        async for event in turn():
+            if event.content and event.content.parts:
+                texts.extend(p.text for p in event.content.parts if p.text)
+        final = await runner.session_service.get_session(
+            app_name="research", user_id="student", session_id=session.id
+        )
+        return left.state, texts, final.state
+
+    left, texts, state = asyncio.run(run())
+    assert left[DEADLINE_STATE_KEY] < time.time()
+    assert fan_out_deadline(left, "next-invocation") is None
+    assert sorted(texts) == ["first findings", "second findings"]
+    status = state["research_worker_status"]
+    assert status["partial"] is False and status["timed_out"] == []
+    assert state.get(DEADLINE_STATE_KEY) is None
+
+
+def test_nested_fan_out_restores_the_outer_deadline():
+    """A tighter inner deadline applies to the inner workers only."""
+    seen = {}
+
+    def record_deadline(callback_context, llm_request):
+        seen[callback_context.agent_name] = fan_out_deadline(
+            callback_context.state, callback_context.invocation_id
+        )
+
+    def researcher(name):
+        return LlmAgent(
+            name=name,
+            model=_SleepyLlm(model=f"{name} findings", delay=0.01),
+            before_model_callback=record_deadline,
+        )
+
+    inner = DeadlineParallelAgent(
+        name="quick_checks",
+        deadline_seconds=0.5,
+        status_key="quick_checks_status",
+        sub_agents=[researcher("fact_checker")],
+    )
+    coordinator = DeadlineParallelAgent(
+        name="research_coordinator",
+        deadline_seconds=30,
+        sub_agents=[SequentialAgent(name="pipeline", sub_agents=[inner, researcher("writer")])],
+    )
+
+    async def run():
+        runner = InMemoryRunner(agent=coordinator, app_name="research")
+        session = await runner.session_service.create_session(
+            app_name="research", user_id="student"
+        )
+        async for _ in runner.run_async(
+            user_id="student",
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text="topic")]),
+        ):
+            pass
+        return await runner.session_service.get_session(
+            app_name="research", user_id="student", session_id=session.id
+        )
+
+    start = time.time()
+    session = asyncio.run(run())
+    assert seen["fact_checker"] < start + 1
+    assert seen["writer"] > start + 20
+    assert session.state.get(DEADLINE_STATE_KEY) is None
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing deadline/hedging fan-out...\n")
+
+    tests = [
+        ("Hedging p99 Simulation", test_hedging_and_deadline_cut_p99),
+        ("Deadline Partial Results", test_deadline_returns_partial_results),
+        ("Hedge Winner", test_hedge_wins_and_output_is_not_duplicated),
+        ("Failed Worker", test_failed_worker_does_not_abort_fan_out),
+        ("DeadlineParallelAgent", test_deadline_parallel_agent_with_runner),
+        ("Aborted Run Deadline", test_aborted_run_does_not_leak_its_deadline),
+        ("Nested Deadlines", test_nested_fan_out_restores_the_outer_deadline),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
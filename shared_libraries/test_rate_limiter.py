@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Simulation tests for the rate-limit-aware model call scheduler.
+
+A fake quota-limited backend rejects calls beyond its quota with the 429
+error google-genai raises. The simulation sends a burst of interactive and
+background calls at it, once with every caller retrying on its own
+(exponential backoff, no coordination) and once through the scheduler.
+
+    python -m pytest shared_libraries/test_rate_limiter.py
+    python -m shared_libraries.test_rate_limiter --benchmark
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import errors, types
+
+from shared_libraries import rate_limiter
+from shared_libraries.instrumentation import MetricsRegistry
+from shared_libraries.parallel import DeadlineParallelAgent
+from shared_libraries.rate_limiter import (
+    ModelLimits,
+    Priority,
+    RateLimitScheduler,
+    ScheduledLlm,
+    TokenBucket,
+    schedule_models,
+)
+
+MODEL = "gemini-2.5-flash"
+
+
+def _resource_exhausted():
+    return errors.ClientError(429, {"error": {
+        "code": 429, "message": "Resource exhausted.", "status": "RESOURCE_EXHAUSTED"
+    }})
+
+
+class QuotaBackend:
+    """Serves ``quota`` calls per second (small bursts allowed), 429 beyond."""
+
+    def __init__(self, quota: float, latency: float, burst_seconds: float = 0.1):
+        self.bucket = TokenBucket(quota, quota * burst_seconds, time.monotonic())
+        self.latency = latency
+        self.served = 0
+        self.rejected = 0
+
+    async def generate(self) -> str:
+        if self.bucket.wait_time(time.monotonic()) > 0:
+            self.rejected += 1
+            await asyncio.sleep(self.latency / 10)
+            raise _resource_exhausted()
+        self.bucket.take()
+        await asyncio.sleep(self.latency)
+        self.served += 1
+        return "ok"
+
+
+class _QuotaLlm(BaseLlm):
+    """Stub model in front of a ``QuotaBackend``; records call priorities."""
+
+    backend: QuotaBackend
+    priorities: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.priorities.append(rate_limiter._priority.get())
+        text = await self.backend.generate()
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+async def _independent_retries(backend, attempts=5, backoff=0.02):
+    """How agents retried before: each on its own, same schedule for everyone."""
+    for attempt in range(attempts):
+        try:
+            return await backend.generate()
+        except errors.ClientError:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+
+async def _burst(call, interactive, background):
+    """Fires all calls at once; returns (finish times per class, failures, elapsed)."""
+    finished = {Priority.INTERACTIVE: [], Priority.BACKGROUND: []}
+    failures = 0
+    start = time.monotonic()
+
+    async def one(priority):
+        nonlocal failures
+        try:
+            await call(priority)
+            finished[priority].append(time.monotonic() - start)
+        except errors.ClientError:
+            failures += 1
+
+    calls = [Priority.BACKGROUND] * background + [Priority.INTERACTIVE] * interactive
+    await asyncio.gather(*(one(priority) for priority in calls))
+    return finished, failures, time.monotonic() - start
+
+
+def simulate(scheduled, quota=200.0, latency=0.05, interactive=40, background=160, limits=None):
+    """Runs one burst against a fresh backend; returns throughput, 429s and latency."""
+    backend = QuotaBackend(quota, latency)
+    scheduler = RateLimitScheduler(
+        limits=limits, backoff_seconds=0.05, max_backoff_seconds=0.5, max_attempts=8,
+        rng=random.Random(3),
+    )
+
+    async def call(priority):
+        if scheduled:
+            return await scheduler.call(MODEL, backend.generate, priority)
+        return await _independent_retries(backend)
+
+    finished, failures, elapsed = asyncio.run(_burst(call, interactive, background))
+    throughput = backend.served / elapsed
+    mean = {p.name.lower(): sum(t) / len(t) if t else None for p, t in finished.items()}
+    return {
+        "throughput": throughput,
+        "quota_fraction": throughput / quota,
+        "rejected": backend.rejected,
+        "failures": failures,
+        "interactive_seconds": mean["interactive"],
+        "background_seconds": mean["background"],
+        "stats": scheduler.stats.as_dict(),
+    }
+
+
+def test_priority_order():
+    async def run():
+        scheduler = RateLimitScheduler(default_limits=ModelLimits(max_concurrency=1))
+        order = []
+        held = await scheduler.acquire(MODEL)
+
+        async def wait(name, priority):
+            permit = await scheduler.acquire(MODEL, priority)
+            order.append(name)
+            permit.release()
+
+        tasks = [asyncio.create_task(wait("background-1", "background"))]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(wait("background-2", Priority.BACKGROUND)))
+        await asyncio.sleep(0.01)
+        with rate_limiter.priority_scope("interactive"):
+            tasks.append(asyncio.create_task(wait("interactive", None)))
+        await asyncio.sleep(0.01)
+        assert order == []
+        held.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["interactive", "background-1", "background-2"]
+
+
+def test_aimd_and_backoff():
+    now = [0.0]
+    scheduler = RateLimitScheduler(
+        default_limits=ModelLimits(max_concurrency=8), backoff_seconds=1.0,
+        max_backoff_seconds=4.0, clock=lambda: now[0], rng=random.Random(0),
+    )
+
+    async def admit(n):
+        return [await scheduler.acquire(MODEL) for _ in range(n)]
+
+    permits = asyncio.run(admit(4))
+    # Four in-flight calls hit the quota together: one cut, one pause.
+    for permit in permits:
+        permit.release(throttled=True)
+    assert scheduler.concurrency_limit(MODEL) == 4
+    pause = scheduler._lanes[MODEL].paused_until
+    assert 0.5 <= pause <= 1.0 and scheduler.stats.backoffs == 1 and scheduler.stats.throttled == 4
+
+    # The next 429 after the pause halves again and doubles the pause.
+    now[0] = pause
+    asyncio.run(admit(1))[0].release(throttled=True)
+    assert scheduler.concurrency_limit(MODEL) == 2
+    assert 1.0 <= scheduler._lanes[MODEL].paused_until - now[0] <= 2.0
+
+    # Successes add about one per window of `limit` calls, up to max_concurrency.
+    now[0] = 100.0
+    for _ in range(2 + 3):
+        asyncio.run(admit(1))[0].release()
+    assert scheduler.concurrency_limit(MODEL) == 3
+    assert scheduler._lanes[MODEL].streak == 0
+    for _ in range(100):
+        asyncio.run(admit(1))[0].release()
+    assert scheduler.concurrency_limit(MODEL) == 8
+    assert all(scheduler.backoff(10) <= 4.0 for _ in range(20))
+
+
+def test_token_bucket_paces_calls():
+    async def run():
+        scheduler = RateLimitScheduler(
+            limits={MODEL: ModelLimits(requests_per_minute=6000, burst_seconds=0.05)}
+        )
+        start = time.monotonic()
+        for _ in range(25):
+            (await scheduler.acquire(MODEL)).release()
+        return time.monotonic() - start
+
+    # 5 calls of burst, then 100 per second.
+    assert 0.18 <= asyncio.run(run()) < 0.5
+
+
+class _FlakyLlm(BaseLlm):
+    """Raises ``failures`` 429s, then answers; optionally fails mid-stream."""
+
+    failures: int = 0
+    fail_after_partial: bool = False
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise _resource_exhausted()
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="hi")]), partial=True)
+        if self.fail_after_partial:
+            raise _resource_exhausted()
+
+
+def test_scheduled_llm_retries_before_first_response():
+    async def collect(llm):
+        request = LlmRequest(model=MODEL, contents=[])
+        return [r async for r in llm.generate_content_async(request, stream=True)]
+
+    scheduler = RateLimitScheduler(backoff_seconds=0.01)
+    flaky = _FlakyLlm(model=MODEL, failures=2)
+    responses = asyncio.run(collect(ScheduledLlm(model=MODEL, llm=flaky, scheduler=scheduler)))
+    assert len(responses) == 1 and flaky.calls == 3
+    assert scheduler.stats.retries == 2 and scheduler.stats.throttled == 2
+
+    # A 429 after output was streamed is not retried (it would duplicate text).
+    streamed = _FlakyLlm(model=MODEL, fail_after_partial=True)
+    try:
+        asyncio.run(collect(ScheduledLlm(model=MODEL, llm=streamed, scheduler=scheduler)))
+        raise AssertionError("expected a 429")
+    except errors.ClientError:
+        pass
+    assert streamed.calls == 1 and scheduler.stats.failed == 1
+    assert scheduler._lanes[MODEL].in_flight == 0
+
+
+class _DelegatingLlm(BaseLlm):
+    """Calls the ``delegate`` tool once, then answers."""
+
+    delegate: str = ""
+
+    async def generate_content_async(self, llm_request, stream=False):
+        called = any(
+            part.function_response for content in llm_request.contents for part in content.parts or []
+        )
+        if self.delegate and not called:
+            part = types.Part(function_call=types.FunctionCall(name=self.delegate, args={"request": "go"}))
+        else:
+            part = types.Part(text=f"{self.model} done")
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def test_agent_tool_does_not_hold_the_parent_permit():
+    child = LlmAgent(name="data_analyst_agent", model=_DelegatingLlm(model=MODEL))
+    parent = LlmAgent(
+        name="financial_coordinator",
+        model=_DelegatingLlm(model=MODEL, delegate="data_analyst_agent"),
+        tools=[AgentTool(agent=child)],
+    )
+    scheduler = RateLimitScheduler(limits={MODEL: ModelLimits(max_concurrency=1)})
+    for agent in (parent, child):
+        agent.model = ScheduledLlm(model=MODEL, llm=agent.model, scheduler=scheduler)
+
+    async def run():
+        runner = InMemoryRunner(agent=parent, app_name="advisor")
+        session = await runner.session_service.create_session(app_name="advisor", user_id="u")
+        answers = []
+        async for event in runner.run_async(
+            user_id="u",
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text="advise")]),
+        ):
+            if event.is_final_response() and event.content and event.content.parts:
+                answers.append(event.content.parts[0].text)
+        return answers
+
+    # Before, the child queued behind its parent's permit forever.
+    answers = asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert answers[-1] == f"{MODEL} done"
+    lane = scheduler._lanes[MODEL]
+    assert lane.in_flight == 0 and not lane.waiters and scheduler.stats.peak_in_flight == 1
+
+
+def test_research_workers_run_in_background():
+    backend = QuotaBackend(quota=1000, latency=0.0)
+    workers = [
+        LlmAgent(name=f"research_sub_agent_{i}", model=_QuotaLlm(model=MODEL, backend=backend, priorities=[]))
+        for i in (1, 2)
+    ]
+    coordinator = DeadlineParallelAgent(name="research_coordinator", sub_agents=workers)
+    teacher_model = _QuotaLlm(model=MODEL, backend=backend, priorities=[])
+    teacher = LlmAgent(name="teacher_agent", model=teacher_model, sub_agents=[coordinator])
+    schedule_models(teacher)
+    assert isinstance(teacher.model, ScheduledLlm) and teacher.model.llm is teacher_model
+
+    async def run():
+        runner = InMemoryRunner(agent=coordinator, app_name="research")
+        session = await runner.session_service.create_session(app_name="research", user_id="u")
+        async for _ in runner.run_async(
+            user_id="u",
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text="research")]),
+        ):
+            pass
+
+    registry = MetricsRegistry()
+    rate_limiter._default_scheduler = RateLimitScheduler(registry=registry)
+    try:
+        asyncio.run(run())
+    finally:
+        rate_limiter._default_scheduler = None
+    assert [w.model.llm.priorities for w in workers] == [[Priority.BACKGROUND]] * 2
+    assert registry.histogram(
+        "adk_scheduler_wait_seconds", model=MODEL, priority="background"
+    ).count == 2
+
+
+def test_burst_stays_near_quota_without_error_storm():
+    naive = simulate(scheduled=False)
+    adaptive = simulate(scheduled=True)
+    paced = simulate(scheduled=True, limits={MODEL: ModelLimits(requests_per_minute=200 * 60)})
+
+    # Independent retries: most attempts are rejected and some calls give up.
+    assert naive["rejected"] > 200 and naive["failures"] > 0, naive
+    # AIMD alone, quota unknown: a handful of 429s, every call served.
+    assert adaptive["failures"] == 0 and adaptive["rejected"] < 40, adaptive
+    assert adaptive["quota_fraction"] > 0.5, adaptive
+    # Quota configured: paced at the quota, no 429s.
+    assert paced["failures"] == 0 and paced["rejected"] <= 2, paced
+    assert paced["quota_fraction"] > 0.8, paced
+    # Interactive turns go first.
+    for result in (adaptive, paced):
+        assert result["interactive_seconds"] < result["background_seconds"] / 2, result
+
+
+def benchmark(**kwargs):
+    """Throughput, 429s and latency per class for the three strategies."""
+    results = {}
+    for name, scheduled, limits in (
+        ("independent retries", False, None),
+        ("scheduler, quota unknown (AIMD)", True, None),
+        ("scheduler, quota configured", True, {MODEL: ModelLimits(requests_per_minute=200 * 60)}),
+    ):
+        result = results[name] = simulate(scheduled, limits=limits, **kwargs)
+        latency = ", ".join(
+            f"{kind} {result[f'{kind}_seconds']:.2f}s" if result[f"{kind}_seconds"] is not None
+            else f"{kind} all failed"
+            for kind in ("interactive", "background")
+        )
+        print(f"   - {name}: {result['throughput']:.0f} calls/s "
+              f"({result['quota_fraction']:.0%} of quota), {result['rejected']} x 429, "
+              f"{result['failures']} failed, {latency}")
+    return results
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing the rate-limit-aware scheduler...\n")
+
+    tests = [
+        ("Priority Order", test_priority_order),
+        ("AIMD and Backoff", test_aimd_and_backoff),
+        ("Token Bucket", test_token_bucket_paces_calls),
+        ("ScheduledLlm Retries", test_scheduled_llm_retries_before_first_response),
+        ("Nested AgentTool", test_agent_tool_does_not_hold_the_parent_permit),
+        ("Background Research Workers", test_research_workers_run_in_background),
+        ("Quota Simulation", test_burst_stays_near_quota_without_error_storm),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (200 calls at once, quota 200/s, 50ms per call)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the record/replay layer.
+
+A stub advisor with a live-like latency calls a price tool and an
+``AgentTool`` risk analyst. Sessions recorded against it replay in strict
+mode with models and tools that fail if they are called.
+
+    python -m pytest shared_libraries/test_replay.py
+    python -m shared_libraries.test_replay --benchmark
+"""
+
+import asyncio
+import gzip
+import os
+import sys
+import tempfile
+import time
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+
+from shared_libraries import replay
+from shared_libraries.replay import ReplayMissError, ReplayStore, replay_agent, request_key, tool_key
+
+QUESTIONS = ["Price of AAPL?", "Price of MSFT?", "Risk of NVDA?", "Price of AAPL?"]
+
+
+class _AdvisorLlm(BaseLlm):
+    """Stub coordinator and risk analyst; raises when ``live`` is False."""
+
+    latency: float = 0.0
+    live: bool = True
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        if not self.live:
+            raise AssertionError(f"{self.model} called during replay")
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        last = llm_request.contents[-1].parts[0]
+        if self.model == "risk":
+            part = types.Part(text=f"Risk: high volatility ({last.text}).")
+        elif last.function_response:
+            part = types.Part(text=f"Answer: {last.function_response.response}")
+        else:
+            text = last.text
+            ticker = text.split()[-1].strip("?")
+            if text.startswith("Risk"):
+                part = types.Part(function_call=types.FunctionCall(
+                    name="risk_analyst", args={"request": ticker}
+                ))
+            else:
+                part = types.Part(function_call=types.FunctionCall(
+                    name="get_price", args={"ticker": ticker}
+                ))
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+_tool_calls = []
+_tools_live = [True]
+
+
+def get_price(ticker: str, tool_context) -> dict:
+    """Latest close of a ticker.
+
+    Args:
+        ticker: The ticker symbol.
+
+    Returns:
+        dict: status and price.
+    """
+    if not _tools_live[0]:
+        raise AssertionError("get_price called during replay")
+    _tool_calls.append(ticker)
+    tool_context.state["last_ticker"] = ticker
+    return {"status": "success", "price": 100.0 + len(_tool_calls)}
+
+
+def _agent(live=True, latency=0.0):
+    risk = LlmAgent(
+        name="risk_analyst", model=_AdvisorLlm(model="risk", live=live, latency=latency),
+        output_key="final_risk_assessment_output",
+    )
+    coordinator = LlmAgent(
+        name="financial_coordinator",
+        model=_AdvisorLlm(model="coordinator", live=live, latency=latency),
+        tools=[get_price, AgentTool(agent=risk)],
+    )
+    _tools_live[0] = live
+    return coordinator
+
+
+def run_session(agent, questions=QUESTIONS):
+    """Runs ``questions`` in one session; returns (answers, final state)."""
+
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="replay")
+        session = await runner.session_service.create_session(app_name="replay", user_id="u")
+        answers = []
+        for question in questions:
+            async for event in runner.run_async(
+                user_id="u",
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text=question)]),
+            ):
+                if event.is_final_response() and event.content and event.content.parts[0].text:
+                    answers.append(event.content.parts[0].text)
+        final = await runner.session_service.get_session(
+            app_name="replay", user_id="u", session_id=session.id
+        )
+        return answers, final.state
+
+    return asyncio.run(run())
+
+
+def _record(path):
+    _tool_calls.clear()
+    store = ReplayStore(path, mode="record")
+    answers, state = run_session(replay_agent(_agent(), store))
+    store.close()
+    return answers, state, store
+
+
+def test_request_keys_normalize_volatile_fields():
+    def request(call_id, text):
+        return LlmRequest(model="gemini-2.5-flash", contents=[
+            types.Content(role="user", parts=[types.Part(text=text)]),
+            types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(
+                id=call_id, name="get_price", args={"ticker": "AAPL"}
+            ))]),
+        ])
+
+    first = request("adk-1a2b", "Price of AAPL as of 2026-10-19T09:30:00Z?")
+    second = request("adk-9f8e", "Price of  AAPL as of 2026-10-20T16:00:00Z?")
+    assert request_key(first) == request_key(second)
+    assert request_key(first) != request_key(request("adk-1a2b", "Price of MSFT?"))
+    assert tool_key("get_price", {"a": 1, "b": 2}) == tool_key("get_price", {"b": 2, "a": 1})
+
+
+def test_record_then_strict_replay():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "replay.jsonl.gz")
+        answers, state, recorder = _record(path)
+        assert len(_tool_calls) == 3 and recorder.stats.recorded == 13
+        assert state["final_risk_assessment_output"].startswith("Risk")
+
+        store = ReplayStore(path, mode="strict")
+        replayed_answers, replayed_state = run_session(replay_agent(_agent(live=False), store))
+        assert replayed_answers == answers
+        assert replayed_state == state
+        # The repeated AAPL question replays the second recorded price, in order.
+        assert answers[0] != answers[3]
+        assert store.stats.model_misses == store.stats.tool_misses == 0
+        assert store.stats.tool_hits == 4 and store.stats.hit_rate == 1.0
+
+
+def test_strict_mode_fails_on_miss():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "replay.jsonl.gz")
+        _record(path)
+        store = ReplayStore(path, mode="strict")
+        try:
+            run_session(replay_agent(_agent(live=False), store), ["Price of GOOG?"])
+            assert False, "expected ReplayMissError"
+        except ReplayMissError as e:
+            assert "model:" in str(e)
+
+
+def test_replay_mode_records_misses():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "replay.jsonl.gz")
+        _record(path)
+        _tool_calls.clear()
+        store = ReplayStore(path, mode="replay")
+        run_session(replay_agent(_agent(), store), QUESTIONS[:2] + ["Price of GOOG?"])
+        store.close()
+        assert _tool_calls == ["GOOG"] and store.stats.model_misses == 2
+        # A torn last record from a killed recorder is skipped on load.
+        with open(path, "ab") as f:
+            f.write(gzip.compress(b'{"k": "model:abc", "n": 0, "v": [')[:-8])
+        store = ReplayStore(path, mode="strict")
+        run_session(replay_agent(_agent(live=False), store), QUESTIONS[:2] + ["Price of GOOG?"])
+        assert store.stats.hit_rate == 1.0
+
+
+def test_off_by_default():
+    saved = os.environ.pop("REPLAY_MODE", None)
+    try:
+        agent = _agent()
+        model = agent.model
+        assert replay_agent(agent) is agent and agent.model is model
+        os.environ["REPLAY_MODE"] = "strict"
+        os.environ["REPLAY_PATH"] = os.path.join(tempfile.gettempdir(), "missing-replay.jsonl.gz")
+        replay._default_store = None
+        replay_agent(agent)
+        assert isinstance(agent.model, replay.ReplayLlm) and agent.model.llm is model
+        assert agent.before_tool_callback[0] == replay.default_store().before_tool
+        # Wrapping twice leaves one wrapper and one pair of callbacks.
+        replay_agent(agent)
+        assert agent.model.llm is model and len(agent.before_tool_callback) == 1
+    finally:
+        replay._default_store = None
+        os.environ.pop("REPLAY_PATH", None)
+        os.environ.pop("REPLAY_MODE", None)
+        if saved is not None:
+            os.environ["REPLAY_MODE"] = saved
+
+
+def benchmark(sessions=5, latency=0.3):
+    """Wall time of the sessions against a live-like model vs replayed."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "replay.jsonl.gz")
+        store = ReplayStore(path, mode="record")
+        agent = replay_agent(_agent(latency=latency), store)
+        start = time.perf_counter()
+        for _ in range(sessions):
+            store.rewind()
+            run_session(agent)
+        live = time.perf_counter() - start
+        store.close()
+
+        store = ReplayStore(path, mode="strict")
+        agent = replay_agent(_agent(live=False), store)
+        start = time.perf_counter()
+        for _ in range(sessions):
+            store.rewind()
+            run_session(agent)
+        replayed = time.perf_counter() - start
+        size = os.path.getsize(path)
+    print(f"   - live ({latency * 1000:.0f} ms per model call): {live:.2f}s")
+    print(f"   - strict replay: {replayed:.2f}s, {store.stats.hit_rate:.0%} hits, "
+          f"{len(store)} recordings in {size / 1024:.1f} KiB")
+    print(f"   - {live / replayed:.0f}x faster")
+    return live / replayed
+
+
+def test_benchmark_small():
+    assert benchmark(sessions=2, latency=0.1) > 3
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing record/replay...\n")
+
+    tests = [
+        ("Request Keys", test_request_keys_normalize_volatile_fields),
+        ("Record and Strict Replay", test_record_then_strict_replay),
+        ("Strict Miss", test_strict_mode_fails_on_miss),
+        ("Replay Records Misses", test_replay_mode_records_misses),
+        ("Off by Default", test_off_by_default),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (5 four-question advisory sessions, 300 ms stub model)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared search cache used by the google_search-based agents.
+
+Everything runs offline against FakeSearchBackend and a fake grounded model.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from google.adk.agents import LlmAgent, ParallelAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from shared_libraries import search_cache
+from shared_libraries.parallel import DeadlineParallelAgent
+from shared_libraries.search_cache import (
+    FakeSearchBackend,
+    SearchCache,
+    SqliteSearchStore,
+    make_search_tool,
+    normalize_query,
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalization_merges_near_identical_queries():
+    assert normalize_query("What is the latest AAPL news?") == normalize_query(
+        "what is latest  AAPL news, please"
+    )
+    assert normalize_query("Rust ownership") != normalize_query("Rust borrowing")
+    assert SearchCache.key("AAPL news", "a") != SearchCache.key("AAPL news", "b")
+
+
+def test_normalization_keeps_word_order():
+    assert normalize_query("Is AAPL better than MSFT?") != normalize_query(
+        "Is MSFT better than AAPL?"
+    )
+    assert normalize_query("rates up, stocks down") != normalize_query("rates down, stocks up")
+    assert SearchCache.key("AAPL better than MSFT") != SearchCache.key("MSFT better than AAPL")
+
+
+def test_question_words_and_prepositions_stay_in_the_key():
+    for first, second in (
+        ("Why is AAPL down today", "When is AAPL down today"),
+        ("How to learn python", "Why learn python"),
+        ("Flights from Paris", "Flights to Paris"),
+        ("Which stocks fell", "Who fell"),
+    ):
+        assert SearchCache.key(first) != SearchCache.key(second), (first, second)
+
+
+def test_ttl_and_lru_eviction():
+    clock = _Clock()
+    cache = SearchCache(ttl_seconds=10, max_entries=2, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+    cache.put("c", 3)  # evicts "b"
+    assert cache.get("b") is None
+    clock.now += 11
+    assert cache.get("a") is None
+    assert cache.stats.evictions == 1
+    assert cache.stats.expirations == 1
+
+
+def test_sqlite_tier_survives_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search_cache.db")
+        clock = _Clock()
+        first = SearchCache(ttl_seconds=60, store=SqliteSearchStore(path), clock=clock)
+        first.put("k", [{"url": "https://example.com"}])
+
+        second = SearchCache(ttl_seconds=60, store=SqliteSearchStore(path), clock=clock)
+        assert second.get("k") == [{"url": "https://example.com"}]
+        assert second.stats.disk_hits == 1
+        assert second.get("k") is not None
+        assert second.stats.memory_hits == 1
+
+        clock.now += 61
+        third = SearchCache(ttl_seconds=60, store=SqliteSearchStore(path), clock=clock)
+        assert third.get("k") is None
+
+
+def test_parallel_workers_search_once():
+    """Ten workers asking near-identical questions trigger one backend search."""
+    backend = FakeSearchBackend(latency_seconds=0.05)
+    cache = SearchCache()
+    search_web = make_search_tool(backend.search, cache)
+    queries = [
+        "quantum error correction 2024",
+        "Quantum error-correction 2024?",
+        "The quantum error correction 2024",
+    ] * 3 + ["quantum error correction 2024, please"]
+
+    async def run():
+        return await asyncio.gather(*(search_web(q) for q in queries))
+
+    responses = asyncio.run(run())
+    assert len(backend.calls) == 1
+    assert all(r == responses[0] for r in responses)
+
+    asyncio.run(search_web("quantum error correction 2024"))
+    stats = cache.stats.as_dict()
+    print(f"   - cache stats: {stats}")
+    assert len(backend.calls) == 1
+    assert stats["dedup_joins"] == 9
+    assert stats["memory_hits"] == 1
+    assert cache.stats.hit_rate == 10 / 11
+
+
+def test_failed_fetch_is_not_cached():
+    cache = SearchCache()
+    calls = []
+
+    async def flaky(query):
+        calls.append(query)
+        if len(calls) == 1:
+            raise RuntimeError("quota exceeded")
+        return ["ok"]
+
+    async def run():
+        try:
+            await cache.get_or_fetch("topic", flaky)
+        except RuntimeError:
+            pass
+        return await cache.get_or_fetch("topic", flaky)
+
+    assert asyncio.run(run()) == ["ok"]
+    assert len(calls) == 2
+
+
+class _GroundedLlm(BaseLlm):
+    """Fake model that 'searches' and returns a grounded answer."""
+
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        yield LlmResponse(
+            content=types.Content(
+                role="model", parts=[types.Part(text="grounded findings")]
+            ),
+            grounding_metadata=types.GroundingMetadata(
+                web_search_queries=["quantum error correction"]
+            ),
+        )
+
+
+def test_parallel_research_workers_share_grounded_answer():
+    """The two YAML research workers share one search-grounded model call."""
+    search_cache._default_cache = SearchCache()
+    model = _GroundedLlm(model="fake-grounded")
+    instruction = "You are a Research Sub-Agent."
+    workers = [
+        LlmAgent(
+            name=f"research_sub_agent_{i}",
+            model=model,
+            instruction=instruction,
+            before_model_callback=search_cache.cache_search_before_model,
+            after_model_callback=search_cache.cache_search_after_model,
+        )
+        for i in (1, 2)
+    ]
+    coordinator = ParallelAgent(name="research_coordinator", sub_agents=workers)
+
+    async def ask(runner, text):
+        session = await runner.session_service.create_session(
+            app_name="research", user_id="student"
+        )
+        texts = []
+        async for event in runner.run_async(
+            user_id="student",
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=text)]),
+        ):
+            if event.content and event.content.parts:
+                texts.extend(p.text for p in event.content.parts if p.text)
+        return texts
+
+    async def run():
+        runner = InMemoryRunner(agent=coordinator, app_name="research")
+        first = await ask(runner, "Quantum error correction in 2024")
+        second = await ask(runner, "the quantum error correction in 2024?")
+        return first, second
+
+    try:
+        first, second = asyncio.run(run())
+        assert first == ["grounded findings", "grounded findings"]
+        assert second == first
+        assert model.calls == 1
+    finally:
+        search_cache._default_cache = None
+
+
+def test_abandoned_claim_releases_waiters():
+    """A fetch cancelled mid-flight (fan-out deadline) does not block same-key callers."""
+    cache = SearchCache()
+
+    async def run():
+        async def owner():
+            assert cache.claim("topic") is None
+            await asyncio.sleep(100)
+
+        task = asyncio.create_task(owner())
+        await asyncio.sleep(0)
+        pending = cache.claim("topic")
+        assert pending is not None
+        task.cancel()
+        start = time.monotonic()
+        value = await cache.wait(pending)
+        return value, time.monotonic() - start, cache.claim("topic")
+
+    value, waited, claim = asyncio.run(run())
+    assert value is None and waited < 1
+    assert claim is None
+
+
+class _FailingLlm(BaseLlm):
+    """Fake grounded model whose first call fails."""
+
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("503 UNAVAILABLE")
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text="retried findings")]),
+            grounding_metadata=types.GroundingMetadata(web_search_queries=["topic"]),
+        )
+
+
+def test_model_error_releases_claim():
+    """A failed grounded call frees its key for the next same-topic request."""
+    search_cache._default_cache = SearchCache()
+    model = _FailingLlm(model="fake-grounded")
+    agent = LlmAgent(
+        name="teaching_assistant",
+        model=model,
+        instruction="Help students learn.",
+        before_model_callback=search_cache.cache_search_before_model,
+        after_model_callback=search_cache.cache_search_after_model,
+        on_model_error_callback=search_cache.cache_search_on_model_error,
+    )
+
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="teacher")
+
+        async def ask():
+            session = await runner.session_service.create_session(
+                app_name="teacher", user_id="student"
+            )
+            texts = []
+            async for event in runner.run_async(
+                user_id="student",
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text="Rust ownership")]),
+            ):
+                if event.content and event.content.parts:
+                    texts.extend(p.text for p in event.content.parts if p.text)
+            return texts
+
+        try:
+            await ask()
+            assert False, "expected the model error"
+        except RuntimeError:
+            pass
+        # Same task, so only the error callback can release the claim.
+        start = time.monotonic()
+        texts = await ask()
+        return texts, time.monotonic() - start
+
+    try:
+        texts, seconds = asyncio.run(run())
+        assert texts == ["retried findings"] and seconds < 2
+        assert model.calls == 2 and not search_cache._owned_keys
+    finally:
+        search_cache._default_cache = None
+
+
+class _StallingLlm(BaseLlm):
+    """Fake grounded model whose first call stalls, like a stuck search."""
+
+    stall_seconds: float = 100.0
+    calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(self.stall_seconds)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text="hedged findings")]),
+            grounding_metadata=types.GroundingMetadata(web_search_queries=["topic"]),
+        )
+
+
+def _run_research(agent, text):
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="research")
+        session = await runner.session_service.create_session(
+            app_name="research", user_id="student"
+        )
+        texts = []
+        async for event in runner.run_async(
+            user_id="student",
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=text)]),
+        ):
+            if event.content and event.content.parts:
+                texts.extend(p.text for p in event.content.parts if p.text)
+        return texts
+
+    return asyncio.run(run())
+
+
+def test_hedged_attempt_does_not_wait_on_its_primary():
+    """The hedge of a stalled worker calls the model instead of joining the primary's claim."""
+    search_cache._default_cache = SearchCache()
+    model = _StallingLlm(model="fake-grounded")
+    worker = LlmAgent(
+        name="research_sub_agent_1",
+        model=model,
+        instruction="You are a Research Sub-Agent.",
+        before_model_callback=search_cache.cache_search_before_model,
+        after_model_callback=search_cache.cache_search_after_model,
+    )
+    coordinator = DeadlineParallelAgent(
+        name="research_coordinator",
+        deadline_seconds=3,
+        hedge_after_seconds=0.3,
+        sub_agents=[worker],
+    )
+    try:
+        start = time.monotonic()
+        texts = _run_research(coordinator, "Quantum error correction")
+        assert time.monotonic() - start < 2
+        assert texts == ["hedged findings"] and model.calls == 2
+        # The hedge's answer is shared even though the stalled primary owned the key.
+        assert _run_research(coordinator, "quantum error correction") == ["hedged findings"]
+        assert model.calls == 2
+    finally:
+        search_cache._default_cache = None
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing shared search cache...\n")
+
+    tests = [
+        ("Query Normalization", test_normalization_merges_near_identical_queries),
+        ("Word Order", test_normalization_keeps_word_order),
+        ("Question Words", test_question_words_and_prepositions_stay_in_the_key),
+        ("TTL and LRU", test_ttl_and_lru_eviction),
+        ("SQLite Tier", test_sqlite_tier_survives_restart),
+        ("In-flight Dedup", test_parallel_workers_search_once),
+        ("Failed Fetch", test_failed_fetch_is_not_cached),
+        ("Grounded Callbacks", test_parallel_research_workers_share_grounded_answer),
+        ("Abandoned Claim", test_abandoned_claim_releases_waiters),
+        ("Model Error Releases Claim", test_model_error_releases_claim),
+        ("Hedged Attempt", test_hedged_attempt_does_not_wait_on_its_primary),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the persistent session services.
+
+    python -m pytest shared_libraries/test_session_service.py
+    python -m shared_libraries.test_session_service --benchmark   # 100k sessions
+"""
+
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types
+
+from shared_libraries.session_service import RedisSessionService, SqliteSessionService
+
+APP = "financial_advisor_agent"
+
+
+def _event(text, state_delta=None, author="financial_coordinator"):
+    return Event(
+        invocation_id="inv",
+        author=author,
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        actions=EventActions(state_delta=state_delta or {}),
+    )
+
+
+async def _exercise(service, reopen):
+    session = await service.create_session(
+        app_name=APP,
+        user_id="u1",
+        state={"risk": "moderate", "app:version": 1, "user:name": "Ana"},
+    )
+    await service.append_event(session, _event("hello", {"ticker": "AAPL", "temp:x": 1}))
+    await service.append_event(session, _event("strategies", {"user:name": "Ana B."}))
+    await service.append_event(session, _event("plan"))
+
+    await service.flush()
+    other = await service.create_session(app_name=APP, user_id="u1", session_id="s2")
+    # App and user scoped state is shared by every session of the user.
+    assert other.state == {"app:version": 1, "user:name": "Ana B."}
+
+    service = await reopen(service)
+    loaded = await service.get_session(app_name=APP, user_id="u1", session_id=session.id)
+    assert [e.content.parts[0].text for e in loaded.events] == ["hello", "strategies", "plan"]
+    assert loaded.state == {
+        "risk": "moderate",
+        "ticker": "AAPL",
+        "app:version": 1,
+        "user:name": "Ana B.",
+    }
+    recent = await service.get_session(
+        app_name=APP,
+        user_id="u1",
+        session_id=session.id,
+        config=GetSessionConfig(num_recent_events=2),
+    )
+    assert [e.content.parts[0].text for e in recent.events] == ["strategies", "plan"]
+
+    listed = await service.list_sessions(app_name=APP, user_id="u1")
+    assert sorted(s.id for s in listed.sessions) == sorted([session.id, "s2"])
+    assert all(s.events == [] for s in listed.sessions)
+
+    await service.delete_session(app_name=APP, user_id="u1", session_id="s2")
+    assert await service.get_session(app_name=APP, user_id="u1", session_id="s2") is None
+    await service.close()
+
+
+def test_sqlite_round_trip_survives_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+
+        async def reopen(service):
+            await service.close()
+            return SqliteSessionService(path)
+
+        asyncio.run(_exercise(SqliteSessionService(path, batch_size=2), reopen))
+
+
+def test_sqlite_is_shared_between_service_instances():
+    """Two services on one file behave like two worker processes."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+
+        async def run():
+            writer = SqliteSessionService(path)
+            reader = SqliteSessionService(path)
+            session = await writer.create_session(app_name=APP, user_id="u1")
+            await writer.append_event(session, _event("from worker 1"))
+            await writer.flush()
+            loaded = await reader.get_session(
+                app_name=APP, user_id="u1", session_id=session.id
+            )
+            await writer.close()
+            await reader.close()
+            return loaded
+
+        loaded = asyncio.run(run())
+        assert loaded.events[0].content.parts[0].text == "from worker 1"
+
+
+def test_sqlite_ttl_expiry():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+
+        async def run():
+            service = SqliteSessionService(path, ttl_seconds=0.2)
+            old = await service.create_session(app_name=APP, user_id="u1")
+            await service.append_event(old, _event("old"))
+            await asyncio.sleep(0.3)
+            fresh = await service.create_session(app_name=APP, user_id="u1")
+            listed = await service.list_sessions(app_name=APP, user_id="u1")
+            expired = await service.get_session(
+                app_name=APP, user_id="u1", session_id=old.id
+            )
+            purged = await service.purge_expired()
+            await service.close()
+            return fresh, listed, expired, purged
+
+        fresh, listed, expired, purged = asyncio.run(run())
+        assert [s.id for s in listed.sessions] == [fresh.id]
+        assert expired is None
+        assert purged == 0  # get_session already removed it
+
+
+def test_redis_round_trip():
+    try:
+        import fakeredis
+    except ImportError:
+        print("   - fakeredis not installed, skipping")
+        return
+    server = fakeredis.FakeServer()
+
+    def service():
+        return RedisSessionService(
+            client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+            batch_size=2,
+        )
+
+    async def reopen(old):
+        await old.close()
+        return service()
+
+    asyncio.run(_exercise(service(), reopen))
+
+
+def test_events_are_written_in_batches():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        batches = []
+
+        async def run():
+            service = SqliteSessionService(path, batch_size=50, flush_interval=10)
+            write_batch = service._write_batch
+
+            async def recording(batch):
+                batches.append(len(batch))
+                await write_batch(batch)
+
+            service._write_batch = recording
+            session = await service.create_session(app_name=APP, user_id="u1")
+            for i in range(120):
+                await service.append_event(session, _event(f"e{i}"))
+            loaded = await service.get_session(
+                app_name=APP, user_id="u1", session_id=session.id
+            )
+            await service.close()
+            return loaded
+
+        loaded = asyncio.run(run())
+        assert batches == [50, 50, 20]
+        assert len(loaded.events) == 120
+
+
+def test_failed_flush_keeps_the_batch():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        failures = [2]
+
+        async def run():
+            service = SqliteSessionService(path, flush_interval=0.01)
+            write_batch = service._write_batch
+
+            async def flaky(batch):
+                if failures[0]:
+                    failures[0] -= 1
+                    raise sqlite3.OperationalError("database is locked")
+                await write_batch(batch)
+
+            service._write_batch = flaky
+            session = await service.create_session(app_name=APP, user_id="u1")
+            await service.append_event(session, _event("first"))
+            # The background flush fails; its error is logged, not lost.
+            await service._flush_timer
+            await service.append_event(session, _event("second"))
+            try:
+                await service.flush()
+                assert False, "expected the write error"
+            except sqlite3.OperationalError:
+                pass
+            loaded = await service.get_session(
+                app_name=APP, user_id="u1", session_id=session.id
+            )
+            await service.close()
+            return loaded
+
+        loaded = asyncio.run(run())
+        assert [e.content.parts[0].text for e in loaded.events] == ["first", "second"]
+
+
+def benchmark(num_sessions=100_000, events_per_session=2, loads=2_000):
+    """Appends/sec and session load latency with ``num_sessions`` stored."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+
+        async def run():
+            service = SqliteSessionService(path, pool_size=8, batch_size=512)
+            start = time.perf_counter()
+            sessions = []
+            for i in range(num_sessions):
+                sessions.append(
+                    await service.create_session(
+                        app_name=APP, user_id=f"user{i % 1000}", state={"n": i}
+                    )
+                )
+            create_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for round_ in range(events_per_session):
+                for session in sessions:
+                    await service.append_event(
+                        session, _event(f"turn {round_}", {"turn": round_})
+                    )
+            await service.flush()
+            append_seconds = time.perf_counter() - start
+
+            latencies = []
+            step = max(1, num_sessions // loads)
+            for session in sessions[::step][:loads]:
+                t0 = time.perf_counter()
+                await service.get_session(
+                    app_name=APP, user_id=session.user_id, session_id=session.id
+                )
+                latencies.append(time.perf_counter() - t0)
+            await service.close()
+            return create_seconds, append_seconds, sorted(latencies)
+
+        create_seconds, append_seconds, latencies = asyncio.run(run())
+        appends = num_sessions * events_per_session
+        print(f"   - sessions: {num_sessions:,} "
+              f"(created at {num_sessions / create_seconds:,.0f}/s)")
+        print(f"   - appends: {appends:,} at {appends / append_seconds:,.0f} events/s")
+        print(f"   - session load latency: p50 "
+              f"{statistics.median(latencies) * 1000:.2f} ms, p99 "
+              f"{latencies[int(0.99 * (len(latencies) - 1))] * 1000:.2f} ms")
+        return appends / append_seconds, latencies
+
+
+def test_benchmark_small():
+    appends_per_second, latencies = benchmark(num_sessions=2_000, loads=200)
+    assert appends_per_second > 1_000
+    assert statistics.median(latencies) < 0.05
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing persistent session services...\n")
+
+    tests = [
+        ("SQLite Round Trip", test_sqlite_round_trip_survives_restart),
+        ("SQLite Shared File", test_sqlite_is_shared_between_service_instances),
+        ("SQLite TTL", test_sqlite_ttl_expiry),
+        ("Redis Round Trip", test_redis_round_trip),
+        ("Batched Appends", test_events_are_written_in_batches),
+        ("Failed Flush", test_failed_flush_keeps_the_batch),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (100k sessions)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Tests for the NL-to-SQL template cache of the BigQuery analyst.
+
+A rule-based stub model writes the SQL and an ``execute_sql`` tool runs it
+on the in-process BigQuery stand-in, so everything runs offline.
+
+    python -m pytest shared_libraries/test_sql_template_cache.py
+    python -m shared_libraries.test_sql_template_cache --benchmark
+"""
+
+import asyncio
+import os
+import re
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pandas as pd
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from shared_libraries import fake_bigquery, sql_template_cache
+from shared_libraries.sql_template_cache import SqlTemplateCache
+
+GENERATOR_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bq_test_data_generation"
+)
+sys.path.append(GENERATOR_DIR)
+
+import generate_market_data as gmd  # noqa: E402
+
+FIXTURE_CSV = os.path.join(GENERATOR_DIR, "stock_market_data_10000_rows.csv")
+
+PROJECT = "test-project"
+TABLE = f"`{PROJECT}.hist_stock_market.daily_prices`"
+
+# Phrases the stub model understands; deliberately not the cache's vocabulary.
+_COLUMNS = {
+    "closing price": "close_price",
+    "close price": "close_price",
+    "opening price": "open_price",
+    "volume": "volume",
+    "market cap": "market_cap",
+    "pe ratio": "pe_ratio",
+}
+_COLUMN = "(" + "|".join(_COLUMNS) + ")"
+
+
+def write_sql(question: str) -> str:
+    """What the stub analyst model writes for a question."""
+    q = question.lower()
+    if m := re.search(rf"average {_COLUMN} of (\w+) in (\d{{4}})", q):
+        column, symbol, year = _COLUMNS[m[1]], m[2].upper(), m[3]
+        return (
+            f"SELECT AVG({column}) AS value FROM {TABLE}\n"
+            f"WHERE symbol = '{symbol}' AND EXTRACT(YEAR FROM date) = {year}"
+        )
+    if m := re.search(rf"top (\d+) symbols by {_COLUMN}", q):
+        limit, column = m[1], _COLUMNS[m[2]]
+        return (
+            f"SELECT symbol, AVG({column}) AS value FROM {TABLE}\n"
+            f"GROUP BY symbol ORDER BY value DESC LIMIT {limit}"
+        )
+    if m := re.search(r"days did (\w+) close above (\d+(?:\.\d+)?)", q):
+        symbol, price = m[1].upper(), m[2]
+        return f"SELECT COUNTIF(close_price > {price}) AS value FROM {TABLE} WHERE symbol = '{symbol}'"
+    if m := re.search(rf"highest {_COLUMN} day for (\w+)", q):
+        column, symbol = _COLUMNS[m[1]], m[2].upper()
+        return (
+            f"SELECT date, {column} AS value FROM {TABLE} "
+            f"WHERE symbol = '{symbol}' ORDER BY value DESC LIMIT 1"
+        )
+    return f"SELECT sector, COUNT(*) AS value FROM {TABLE} GROUP BY sector ORDER BY sector"
+
+
+class _AnalystLlm(BaseLlm):
+    """Stub analyst: writes SQL, retries after a failed query, then answers."""
+
+    calls: int = 0
+    sql_calls: int = 0
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.calls += 1
+        last = llm_request.contents[-1]
+        responses = [p.function_response for p in last.parts if p.function_response]
+        if responses and str(responses[0].response.get("status")).upper() == "SUCCESS":
+            rows = responses[0].response["rows"]
+            yield LlmResponse(
+                content=types.Content(role="model", parts=[types.Part(text=f"{len(rows)} rows: {rows[:2]}")])
+            )
+            return
+        question = next(
+            p.text for c in reversed(llm_request.contents) if c.role == "user" for p in c.parts if p.text
+        )
+        self.sql_calls += 1
+        call = types.FunctionCall(
+            name="execute_sql", args={"project_id": PROJECT, "query": write_sql(question)}
+        )
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+
+
+def execute_sql(project_id: str, query: str) -> dict:
+    """Run a GoogleSQL query.
+
+    Args:
+        project_id: The GCP project to bill.
+        query: The GoogleSQL query.
+
+    Returns:
+        The rows, or the error.
+    """
+    try:
+        rows = fake_bigquery.Client(project=project_id).query_and_wait(query)
+        return {"status": "SUCCESS", "rows": [{k: str(v) for k, v in row.items()} for row in rows]}
+    except Exception as e:
+        return {"status": "ERROR", "error_details": str(e)}
+
+
+QUESTION_LOG = [
+    "What was the average closing price of AAPL in 2024?",
+    "What was the average closing price of MSFT in 2024?",
+    "What was the average volume of TSLA in 2025?",
+    "What was the average market cap of NVDA in 2024?",
+    "Show the top 5 symbols by volume",
+    "Show the top 3 symbols by closing price",
+    "Show the top 10 symbols by market cap",
+    "How many trading days did AAPL close above 150?",
+    "How many trading days did TSLA close above 200?",
+    "How many trading days did SNOW close above 100.5?",
+    "What was the average pe ratio of ORCL in 2025?",
+    "Show the top 7 symbols by pe ratio",
+    "What was the highest volume day for AMD?",
+    "How many trading days did META close above 300?",
+    "What was the average opening price of NFLX in 2023?",
+    "How many rows are there per sector?",
+    "Show the top 4 symbols by opening price",
+    "What was the average closing price of GOOGL in 2025?",
+    "What was the highest volume day for COIN?",
+    "How many trading days did AMZN close above 120?",
+]
+
+
+def replay(questions, cache=None):
+    """Run questions through the analyst; returns the stub model and the answers."""
+    model = _AnalystLlm(model="fake-analyst")
+    callbacks = {}
+    if cache is not None:
+        callbacks = dict(
+            before_model_callback=cache.before_model,
+            after_tool_callback=cache.after_tool,
+            after_agent_callback=cache.after_agent,
+        )
+    agent = LlmAgent(name="bq_data_analyst_agent", model=model, tools=[execute_sql], **callbacks)
+
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="analyst")
+        answers = []
+        for question in questions:
+            # One session per question, as analysts ask from fresh chats.
+            session = await runner.session_service.create_session(app_name="analyst", user_id="analyst")
+            texts = []
+            async for event in runner.run_async(
+                user_id="analyst",
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text=question)]),
+            ):
+                if event.content and event.content.parts:
+                    texts.extend(p.text for p in event.content.parts if p.text)
+            answers.append(texts)
+        return answers
+
+    with fake_bigquery.install():
+        gmd.upload_to_bigquery(
+            pd.read_csv(FIXTURE_CSV), gmd.create_bigquery_dataset_and_table(PROJECT), PROJECT
+        )
+        return model, asyncio.run(run())
+
+
+def test_slot_extraction_and_shapes():
+    cache = SqlTemplateCache()
+    slots = cache.extractor.extract("Average closing price of SNOW in 2024 after snow days?")
+    assert [(s.name, s.value) for s in slots] == [
+        ("metric", "close_price"), ("symbol", "SNOW"), ("year", "2024")
+    ]
+    a = "What was the average closing price of AAPL in 2024?"
+    b = "what was the average volume of msft in 2023"
+    shape_a = cache.extractor.shape(a, cache.extractor.extract(a))
+    assert shape_a == "what was average slot_metric of slot_symbol in slot_year"
+    # Lower-case "msft" is not a ticker: different slots, different shape.
+    assert [s.name for s in cache.extractor.extract(b)] == ["metric", "year"]
+    assert cache.extractor.extract("on 2024-01-05 above 5")[0].value == "2024-01-05"
+
+
+def test_template_building():
+    cache = SqlTemplateCache()
+    question = "How many trading days did AAPL close above 150?"
+    template = cache.build_template(question, {"project_id": PROJECT, "query": write_sql(question)})
+    assert template.slot_names == ["symbol", "metric", "number"]
+    assert template.fixed == {}
+    assert "'__slot0__'" in template.args["query"] and "__slot1__ > __slot2__" in template.args["query"]
+
+    other = "How many trading days did TSLA close above 99.5?"
+    assert template.fill(cache.extractor.extract(other), "query")["query"] == write_sql(other)
+    assert template.fill(cache.extractor.extract("How many days did TSLA close above 2024-01-05?"), "query") is None
+
+    # A slot the SQL does not use is fixed: only the same value is served.
+    question = "Show the top 5 symbols by volume in 2024"
+    template = cache.build_template(question, {"query": write_sql(question)})
+    assert template.fixed == {2: "2024"}
+    assert template.fill(cache.extractor.extract("Show the top 3 symbols by volume in 2024"), "query")
+    assert template.fill(cache.extractor.extract("Show the top 3 symbols by volume in 2023"), "query") is None
+
+    # Two slots with one value: the SQL cannot tell which is which.
+    assert cache.build_template("AAPL vs AAPL", {"query": "SELECT 'AAPL'"}) is None
+
+
+def test_support_similarity_and_persistence():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "templates.json")
+        cache = SqlTemplateCache(path=path)
+        first = "What was the average closing price of AAPL in 2024?"
+        cache.observe(first, {"project_id": PROJECT, "query": write_sql(first)})
+        assert cache.match("What was the average volume of MSFT in 2023?") is None  # support 1
+        second = "What was the average volume of TSLA in 2025?"
+        cache.observe(second, {"project_id": PROJECT, "query": write_sql(second)})
+        assert cache.stats.confirmed == 1
+
+        question = "what was the average market cap of NVDA in 2024"
+        found = cache.match(question)
+        assert found is not None and found.confidence > 0.99
+        assert found.args["query"] == write_sql(question)
+
+        # Same slot types and operators, different question: not confident enough.
+        assert cache.match("What analysts published estimates of the average volume of AMD in 2024?") is None
+        assert cache.stats.low_confidence == 1
+        # Different operator words never match, however similar the rest is.
+        assert cache.match("Which quarter had the lowest volume for AMD in 2024 on average?") is None
+        assert cache.stats.unmatched == 2
+
+        # A run whose SQL disagrees with the template replaces it.
+        cache.observe(second, {"project_id": PROJECT, "query": write_sql(second) + " LIMIT 1"})
+        assert cache.stats.replaced == 1 and cache.match(question) is None
+
+        cache.observe(first, {"project_id": PROJECT, "query": write_sql(first) + " LIMIT 1"})
+        reloaded = SqlTemplateCache(path=path)
+        assert reloaded.match(question).args["query"] == write_sql(question) + " LIMIT 1"
+
+
+def test_operator_words_must_match():
+    """Questions differing only in comparator or ordering words are never served each other's SQL."""
+    cache = SqlTemplateCache()
+    for question in (
+        "How many days did AAPL close above 150 in 2024?",
+        "How many days did TSLA close above 200 in 2024?",
+        "Show the top 5 symbols by volume",
+        "Show the top 3 symbols by market cap",
+        "What was the highest volume day for AMD?",
+        "What was the highest closing price day for COIN?",
+    ):
+        cache.observe(question, {"project_id": PROJECT, "query": write_sql(question)})
+
+    found = cache.match("How many days did NVDA close above 400 in 2024?")
+    assert found is not None and "close_price > 400" in found.args["query"]
+    for question in (
+        "How many days did NVDA close below 400 in 2024?",
+        "Show the bottom 5 symbols by volume",
+        "What was the lowest volume day for AMD?",
+        "How many days did NVDA close above 400 after 2024?",
+        "Which days did NVDA close above 400 in 2024?",
+        "When did NVDA close above 400 in 2024?",
+    ):
+        assert cache.match(question) is None, question
+    assert cache.extractor.operators("days slot_symbol close below slot_number") == ("below",)
+
+
+def test_aborted_turns_are_bounded():
+    """Runs that never reach after_agent do not keep their bookkeeping forever."""
+    sql_template_cache._turns.clear()
+    for i in range(sql_template_cache.MAX_OPEN_TURNS + 10):
+        context = SimpleNamespace(invocation_id=f"e-{i}", agent_name="bq_data_analyst_agent")
+        sql_template_cache._turn(context)["calls"] = 1
+    assert len(sql_template_cache._turns) == sql_template_cache.MAX_OPEN_TURNS
+    assert ("e-0", "bq_data_analyst_agent") not in sql_template_cache._turns
+    sql_template_cache._turns.clear()
+
+
+def test_replayed_log_saves_model_calls():
+    baseline, expected = replay(QUESTION_LOG)
+    cache = SqlTemplateCache()
+    model, answers = replay(QUESTION_LOG, cache)
+    stats = cache.stats.as_dict()
+    print(f"   - model calls: {baseline.calls} -> {model.calls}, stats: {stats}")
+    # Same answers, fewer model calls.
+    assert answers == expected
+    assert baseline.calls == 2 * len(QUESTION_LOG)
+    assert stats["model_calls_saved"] == stats["served"] == baseline.calls - model.calls
+    assert model.sql_calls == len(QUESTION_LOG) - stats["served"]
+    assert stats["served"] >= 6 and stats["invalidated"] == 0
+
+
+def test_failed_template_falls_back_to_model():
+    cache = SqlTemplateCache()
+    question = "What was the average closing price of AAPL in 2024?"
+    template = cache.build_template(question, {"project_id": PROJECT, "query": write_sql(question)})
+    template.args["query"] = template.args["query"].replace("AVG(", "AVERAGE(")
+    template.support = 2
+    cache.templates[(template.shape, tuple(template.slot_names))] = template
+
+    _, expected = replay([question])
+    model, answers = replay([question], cache)
+    assert answers == expected
+    assert model.sql_calls == 1 and model.calls == 2
+    assert cache.stats.served == 1 and cache.stats.invalidated == 1
+    assert cache.stats.model_calls_saved == 0 and not cache.templates
+
+
+def benchmark(repeats=5):
+    """Model calls saved on the replayed question log, repeated ``repeats`` times."""
+    questions = QUESTION_LOG * repeats
+    baseline, _ = replay(questions)
+    cache = SqlTemplateCache()
+    model, _ = replay(questions, cache)
+    saved = baseline.calls - model.calls
+    print(f"   - {len(questions)} questions: {baseline.calls} model calls without the cache, "
+          f"{model.calls} with it ({saved} saved, {saved / baseline.calls:.0%}); "
+          f"templates served: {cache.stats.served}, fell back: "
+          f"{cache.stats.unmatched + cache.stats.low_confidence}")
+    return saved / baseline.calls
+
+
+def test_benchmark_small():
+    assert benchmark(repeats=2) > 0.25
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing SQL template cache...\n")
+
+    tests = [
+        ("Slot Extraction", test_slot_extraction_and_shapes),
+        ("Template Building", test_template_building),
+        ("Support and Similarity", test_support_similarity_and_persistence),
+        ("Operator Words", test_operator_words_must_match),
+        ("Aborted Turns", test_aborted_turns_are_bounded),
+        ("Replayed Log", test_replayed_log_saves_model_calls),
+        ("Failed Template", test_failed_template_falls_back_to_model),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (100 replayed questions)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-token tests for streaming AgentTool sub-agents.
+
+A fake sub-agent model writes a long risk report in chunks; the stub
+coordinator calls it through AgentTool and re-emits the report. The tests
+measure how long a streaming (SSE) client waits for the first text.
+
+    python -m pytest shared_libraries/test_sub_agent_streaming.py
+    python -m shared_libraries.test_sub_agent_streaming --benchmark
+"""
+
+import asyncio
+import sys
+import time
+
+from google.adk.agents import LlmAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+
+from shared_libraries.sub_agent_streaming import (
+    SUB_AGENT_METADATA_KEY,
+    ForwardingLlm,
+    StreamingCoordinator,
+)
+
+CHUNKS = [f"Risk factor {i}: exposure is moderate and hedged by stop losses. " for i in range(40)]
+REPORT = "".join(CHUNKS)
+
+
+class _ReportLlm(BaseLlm):
+    """Fake risk analyst model that produces ``CHUNKS`` at a fixed pace."""
+
+    chunk_seconds: float = 0.02
+    final_chunk: bool = True
+
+    async def generate_content_async(self, llm_request, stream=False):
+        if not stream:
+            await asyncio.sleep(self.chunk_seconds * len(CHUNKS))
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=REPORT)]))
+            return
+        for chunk in CHUNKS:
+            await asyncio.sleep(self.chunk_seconds)
+            yield LlmResponse(
+                content=types.Content(role="model", parts=[types.Part(text=chunk)]), partial=True
+            )
+        if self.final_chunk:
+            # Like Gemini's streaming aggregator: the whole text, not partial.
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=REPORT)]))
+
+
+class _CoordinatorLlm(BaseLlm):
+    """Stub coordinator: asks the risk analyst, then re-emits its report."""
+
+    async def generate_content_async(self, llm_request, stream=False):
+        last = llm_request.contents[-1].parts[0]
+        if last.function_response:
+            part = types.Part(text="Final risk assessment:\n" + last.function_response.response["result"])
+        else:
+            part = types.Part(function_call=types.FunctionCall(
+                name="risk_analyst_agent", args={"request": "Assess the plan."}
+            ))
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def _coordinator(stream_sub_agents=True, chunk_seconds=0.02, final_chunk=True):
+    risk_analyst = LlmAgent(
+        name="risk_analyst_agent",
+        model=_ReportLlm(model="fake-risk", chunk_seconds=chunk_seconds, final_chunk=final_chunk),
+        instruction="Assess the risk.",
+        output_key="final_risk_assessment_output",
+    )
+    return StreamingCoordinator(
+        name="financial_coordinator",
+        model=_CoordinatorLlm(model="fake-coordinator"),
+        tools=[AgentTool(agent=risk_analyst)],
+        stream_sub_agents=stream_sub_agents,
+    )
+
+
+def run_turn(agent, streaming_mode=StreamingMode.SSE):
+    """Runs one turn; returns (seconds to first text, events, session state, stored events)."""
+
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="advisor")
+        session = await runner.session_service.create_session(app_name="advisor", user_id="u")
+        events, first_text = [], None
+        start = time.perf_counter()
+        async for event in runner.run_async(
+            user_id="u",
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text="Assess my plan")]),
+            run_config=RunConfig(streaming_mode=streaming_mode),
+        ):
+            if first_text is None and event.content and any(p.text for p in event.content.parts or []):
+                first_text = time.perf_counter() - start
+            events.append(event)
+        session = await runner.session_service.get_session(
+            app_name="advisor", user_id="u", session_id=session.id
+        )
+        return first_text, events, session.state, session.events
+
+    return asyncio.run(run())
+
+
+def _warm_up():
+    """The first run in a process pays one-off ADK setup; keep it out of TTFT."""
+    run_turn(_coordinator(chunk_seconds=0.0), StreamingMode.NONE)
+
+
+def test_sub_agent_tokens_are_forwarded():
+    _warm_up()
+    ttft, events, state, stored = run_turn(_coordinator())
+    chunks = [e for e in events if e.partial]
+    assert [e.content.parts[0].text for e in chunks] == CHUNKS
+    assert all(e.author == "risk_analyst_agent" for e in chunks)
+    assert all(e.custom_metadata[SUB_AGENT_METADATA_KEY] == "risk_analyst_agent" for e in chunks)
+    # The report is still stored, returned to the coordinator and re-emitted.
+    assert state["final_risk_assessment_output"] == REPORT
+    assert events[-1].content.parts[0].text == "Final risk assessment:\n" + REPORT
+    assert not any(e.partial for e in stored)
+    assert ttft < 0.2, ttft
+
+
+def test_stream_without_final_aggregate():
+    _, events, state, _ = run_turn(_coordinator(final_chunk=False))
+    assert len([e for e in events if e.partial]) == len(CHUNKS)
+    assert state["final_risk_assessment_output"] == REPORT
+
+
+def test_unary_runs_are_unchanged():
+    for agent, mode in (
+        (_coordinator(), StreamingMode.NONE),
+        (_coordinator(stream_sub_agents=False), StreamingMode.SSE),
+    ):
+        ttft, events, state, _ = run_turn(agent, mode)
+        assert not any(e.partial for e in events)
+        assert state["final_risk_assessment_output"] == REPORT
+        assert ttft >= 0.02 * len(CHUNKS)
+
+
+def test_financial_coordinator_streams_its_sub_agents():
+    from financial_advisor_agent.agent import root_agent
+
+    assert isinstance(root_agent, StreamingCoordinator)
+    for tool in root_agent.tools:
+        wrapped = tool.agent.model
+        while not isinstance(wrapped, ForwardingLlm):
+            wrapped = wrapped.llm
+        assert wrapped.agent_name == tool.agent.name and wrapped.model == "gemini-2.5-flash"
+
+
+def benchmark(chunk_seconds=0.05):
+    """TTFT of a risk report turn, waiting for the sub-agent vs streaming it."""
+    _warm_up()
+    results = {}
+    for stream in (False, True):
+        ttft, events, _, _ = run_turn(_coordinator(stream, chunk_seconds))
+        results[stream] = ttft
+        print(f"   - {'streamed' if stream else 'AgentTool result only'}: first text after "
+              f"{ttft:.3f}s, {len(events)} events")
+    print(f"   - TTFT {results[False] / results[True]:.0f}x lower")
+    return results[False] / results[True]
+
+
+def test_benchmark_small():
+    assert benchmark(chunk_seconds=0.01) > 5
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing sub-agent streaming...\n")
+
+    tests = [
+        ("Forwarded Tokens", test_sub_agent_tokens_are_forwarded),
+        ("Stream Without Aggregate", test_stream_without_final_aggregate),
+        ("Unary Runs", test_unary_runs_are_unchanged),
+        ("Financial Coordinator", test_financial_coordinator_streams_its_sub_agents),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (40-chunk risk report, 50ms per chunk)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the compact tabular tool-result encoding.
+
+Tables come from the in-process BigQuery stand-in and the financial
+advisor's quant tools; tokens are estimated like compaction.py does.
+
+    python -m pytest shared_libraries/test_tabular_encoding.py
+    python -m shared_libraries.test_tabular_encoding --benchmark
+"""
+
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from shared_libraries import fake_bigquery, tabular_encoding
+from shared_libraries.bq_batch_query import BatchQueryRunner
+from shared_libraries.compaction import CHARS_PER_TOKEN
+from shared_libraries.tabular_encoding import TableEncoder, compact_tool_result, format_number
+
+GENERATOR_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bq_test_data_generation"
+)
+sys.path.append(GENERATOR_DIR)
+
+import generate_market_data as gmd  # noqa: E402
+
+FIXTURE_CSV = os.path.join(GENERATOR_DIR, "stock_market_data_10000_rows.csv")
+PROJECT = "test-project"
+TABLE = f"`{PROJECT}.hist_stock_market.daily_prices`"
+
+# Representative analyst queries, as execute_sql would return them.
+QUERIES = {
+    "AAPL rows (SELECT *, 50 rows)": f"SELECT * FROM {TABLE} WHERE symbol = 'AAPL' ORDER BY date LIMIT 50",
+    "Monthly AAPL close (24 rows)": (
+        f"SELECT DATE_TRUNC(date, MONTH) AS month, AVG(close_price) AS avg_close, "
+        f"MIN(low_price) AS low, MAX(high_price) AS high FROM {TABLE} "
+        f"WHERE symbol = 'AAPL' GROUP BY month ORDER BY month"
+    ),
+    "Averages per symbol (30 rows)": (
+        f"SELECT symbol, sector, AVG(close_price) AS avg_close, AVG(volume) AS avg_volume, "
+        f"AVG(market_cap) AS avg_market_cap FROM {TABLE} GROUP BY symbol, sector ORDER BY symbol"
+    ),
+    "Sector volume (4 rows)": (
+        f"SELECT sector, AVG(volume) AS avg_volume FROM {TABLE} GROUP BY sector ORDER BY avg_volume DESC"
+    ),
+    "Latest rows (SELECT *, 500 rows)": f"SELECT * FROM {TABLE} ORDER BY date DESC, symbol LIMIT 500",
+}
+
+
+def _tokens(value):
+    return len(json.dumps(value, default=str)) // CHARS_PER_TOKEN
+
+
+def _query_results():
+    """execute_sql-style responses for QUERIES, keyed like QUERIES."""
+    with fake_bigquery.install():
+        gmd.upload_to_bigquery(
+            pd.read_csv(FIXTURE_CSV), gmd.create_bigquery_dataset_and_table(PROJECT), PROJECT
+        )
+        runner = BatchQueryRunner(max_rows=1000)
+        try:
+            return {name: runner.run_query(PROJECT, query) for name, query in QUERIES.items()}
+        finally:
+            runner.shutdown()
+
+
+def _read_csv(encoded):
+    return list(csv.DictReader(io.StringIO(encoded["csv"])))
+
+
+def test_number_and_timestamp_formatting():
+    assert format_number(185.23456789, 6) == "185.235"
+    assert format_number(0.012345678, 4) == "0.01235"
+    assert format_number(2512345678901.23, 6) == "2.51235e12"
+    assert format_number(float("nan"), 6) == ""
+    encoded = TableEncoder().encode_table([
+        {"t": "2025-09-06T12:34:56.123456+00:00", "d": "2024-01-02T00:00:00", "ok": True, "n": None},
+        {"t": "2025-09-07 01:02:03 UTC", "d": "2024-01-03", "ok": False, "n": 7},
+    ])
+    assert _read_csv(encoded) == [
+        {"t": "2025-09-06 12:34:56", "d": "2024-01-02", "ok": "true", "n": ""},
+        {"t": "2025-09-07 01:02:03", "d": "2024-01-03", "ok": "false", "n": "7"},
+    ]
+
+
+def test_daily_prices_rows_round_trip():
+    result = _query_results()["AAPL rows (SELECT *, 50 rows)"]
+    rows = result["rows"]
+    encoder = TableEncoder()
+    encoded = encoder.encode_table(rows)
+    assert encoded["row_count"] == 50 and "summary" not in encoded
+    assert encoded["constant"] == {"symbol": "AAPL", "sector": "Technology"}
+    decoded = _read_csv(encoded)
+    assert len(decoded) == 50 and "symbol" not in decoded[0]
+    for row, original in zip(decoded, rows):
+        assert row["date"] == original["date"]
+        assert np.isclose(float(row["close_price"]), original["close_price"], rtol=1e-5)
+        assert int(row["volume"]) == original["volume"]
+        assert (row["pe_ratio"] == "") == (original["pe_ratio"] is None)
+    stats = encoder.stats.as_dict()
+    assert stats["tables"] == 1 and stats["saved_fraction"] > 0.5, stats
+
+
+def test_large_tables_are_summarized():
+    rows = _query_results()["Latest rows (SELECT *, 500 rows)"]["rows"]
+    encoded = TableEncoder(max_rows=50, head_rows=10, tail_rows=5).encode_table(rows)
+    assert encoded["row_count"] == 500 and encoded["omitted_rows"] == 485
+    decoded = _read_csv(encoded)
+    assert [r["symbol"] for r in decoded] == [r["symbol"] for r in rows[:10] + rows[-5:]]
+
+    summary = encoded["summary"]
+    closes = [r["close_price"] for r in rows]
+    assert float(summary["close_price"]["mean"]) == float(format_number(np.mean(closes), 6))
+    assert float(summary["close_price"]["max"]) == float(format_number(max(closes), 6))
+    assert summary["symbol"]["distinct"] == len({r["symbol"] for r in rows})
+    assert summary["date"]["max"] == max(r["date"] for r in rows)
+    assert summary["pe_ratio"]["nulls"] == sum(r["pe_ratio"] is None for r in rows)
+    assert len(summary["sector"]["top"]) == 3
+
+
+def test_callback_rewrites_only_tables():
+    from financial_advisor_agent.tools.backtest import optimize_strategy_parameters
+    from financial_advisor_agent.tools.execution_cost import estimate_execution_costs
+    from financial_advisor_agent.tools.quant_tools import get_technical_indicators
+
+    tabular_encoding._default_encoder = TableEncoder()
+    try:
+        # Non-tabular responses are kept as they are.
+        assert compact_tool_result(None, {}, None, get_technical_indicators("AAPL")) is None
+        single = {"status": "SUCCESS", "rows": [{"records": 10000}]}
+        assert compact_tool_result(None, {}, None, single) is None
+
+        # Nested parameters become dotted columns.
+        sweep = optimize_strategy_parameters(
+            "sma_crossover", {"fast_window": [5, 10], "slow_window": [50, 100]}, ["AAPL"], top_n=4
+        )
+        compacted = compact_tool_result(None, {}, None, sweep)
+        assert compacted["strategy"] == "sma_crossover"
+        assert _read_csv(compacted["top"])[0]["parameters.fast_window"] in ("5", "10")
+
+        costs = estimate_execution_costs("AAPL", [1e4, 1e5, 1e6])
+        compacted = compact_tool_result(None, {}, None, costs)
+        assert compacted["orders"]["row_count"] == 3
+        assert compacted["last_close"] == costs["last_close"]
+
+        # Tables inside lists of results (execute_sql_batch) are found too.
+        batch = {"status": "SUCCESS", "results": [
+            {"query": "q1", "status": "SUCCESS", "rows": [{"a": 1.0}, {"a": 2.0}]},
+            {"query": "q2", "status": "ERROR", "error_details": "boom"},
+        ]}
+        compacted = compact_tool_result(None, {}, None, batch)
+        assert compacted["results"][0]["rows"]["csv"] == "a\n1\n2"
+        assert compacted["results"][1] is batch["results"][1]
+        assert tabular_encoding.default_encoder().stats.tables == 3
+    finally:
+        tabular_encoding._default_encoder = None
+
+
+class _ReadingLlm(BaseLlm):
+    """Stub model that calls get_prices once and records what it was sent."""
+
+    seen: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        last = llm_request.contents[-1].parts[0]
+        if last.function_response:
+            self.seen.append(last.function_response.response)
+            part = types.Part(text="done")
+        else:
+            part = types.Part(function_call=types.FunctionCall(name="get_prices", args={}))
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+def get_prices() -> dict:
+    """Daily closes of AAPL.
+
+    Returns:
+        dict: status and rows.
+    """
+    return {"status": "success", "rows": [
+        {"date": f"2024-01-0{i}", "symbol": "AAPL", "close_price": 185.0 + i / 3} for i in range(1, 6)
+    ]}
+
+
+def test_model_receives_csv():
+    tabular_encoding._default_encoder = TableEncoder()
+    model = _ReadingLlm(model="fake-reader", seen=[])
+    agent = LlmAgent(
+        name="reader", model=model, tools=[get_prices], after_tool_callback=compact_tool_result
+    )
+
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="reader")
+        session = await runner.session_service.create_session(app_name="reader", user_id="u")
+        async for _ in runner.run_async(
+            user_id="u",
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text="prices?")]),
+        ):
+            pass
+
+    try:
+        asyncio.run(run())
+    finally:
+        tabular_encoding._default_encoder = None
+    rows = model.seen[0]["rows"]
+    assert rows["constant"] == {"symbol": "AAPL"}
+    assert rows["csv"].splitlines()[:2] == ["date,close_price", "2024-01-01,185.333"]
+
+
+def benchmark():
+    """Estimated tokens per tool result, JSON rows vs compact encoding."""
+    from financial_advisor_agent.tools.backtest import optimize_strategy_parameters
+    from financial_advisor_agent.tools.execution_cost import estimate_execution_costs
+
+    results = _query_results()
+    results["execution costs (5 orders)"] = estimate_execution_costs(
+        "AAPL", [1e3, 1e4, 1e5, 1e6, 1e7]
+    )
+    results["parameter sweep (top 10)"] = optimize_strategy_parameters(
+        "sma_crossover", {"fast_window": [5, 10, 20], "slow_window": [50, 100, 200]},
+        ["AAPL", "MSFT"], top_n=10,
+    )
+    encoder = TableEncoder()
+    total_before = total_after = 0
+    for name, result in results.items():
+        before, after = _tokens(result), _tokens(encoder.compact(result))
+        total_before += before
+        total_after += after
+        print(f"   - {name}: {before:,} -> {after:,} tokens ({1 - after / before:.0%} saved)")
+    print(f"   - total: {total_before:,} -> {total_after:,} tokens "
+          f"({1 - total_after / total_before:.0%} saved)")
+    return 1 - total_after / total_before
+
+
+def test_benchmark_small():
+    assert benchmark() > 0.5
+
+
+def main():
+    """
+    Run all tests.
+    """
+    print("🧪 Testing tabular tool-result encoding...\n")
+
+    tests = [
+        ("Formatting", test_number_and_timestamp_formatting),
+        ("daily_prices Round Trip", test_daily_prices_rows_round_trip),
+        ("Summarization", test_large_tables_are_summarized),
+        ("Tool Callback", test_callback_rewrites_only_tables),
+        ("Model Input", test_model_receives_csv),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"🔍 Running {test_name} test...")
+        try:
+            test_func()
+            passed += 1
+            print("✅ Passed\n")
+        except AssertionError as e:
+            print(f"❌ Failed: {e}\n")
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+    if "--benchmark" in sys.argv:
+        print("\n⏱️  Benchmark (tokens per result)...")
+        benchmark()
+
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
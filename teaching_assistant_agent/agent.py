@@ -17,7 +17,17 @@ load_dotenv()
 from . import prompt
 
 from google.adk import Agent
+from google.adk.apps import App
 from google.adk.tools import google_search
+from shared_libraries.instrumentation import instrumentation_plugins
+from shared_libraries.search_cache import (
+    cache_search_after_model,
+    cache_search_before_model,
+)
+from shared_libraries.memory_service import recall_memory, remember_after_agent
+from shared_libraries.model_router import route_after_model, route_before_model
+from shared_libraries.rate_limiter import schedule_models
+from shared_libraries.replay import replay_agent
 
 import os
 from dotenv import load_dotenv
@@ -47,6 +57,14 @@ root_agent=Agent(
     name="teaching_assistant_agent_model_2_5",
     instruction=prompt.TEACHING_ASSISTANT_PROMPT,
     # tools=[FunctionTool(get_weather), FunctionTool(get_current_time)],    
-    tools=[google_search],
+    # recall_memory adds the student's earlier goals and findings to each request.
+    tools=[google_search, recall_memory],
+    before_model_callback=[cache_search_before_model, route_before_model],
+    after_model_callback=[route_after_model, cache_search_after_model],
+    after_agent_callback=remember_after_agent,
     description="Agent to assist students to plan and learn any skills that they want to learn. "   # purpose of the agent
-)
\ No newline at end of file
+)
+
+replay_agent(schedule_models(root_agent))
+# `adk web` / `adk run` serve the App; ADK_INSTRUMENTATION=1 adds the timing plugin.
+app = App(name="teaching_assistant_agent", root_agent=root_agent, plugins=instrumentation_plugins())